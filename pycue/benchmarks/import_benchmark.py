@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks the startup of short lived pycue scripts.
+
+Times `python -c "import opencue"` and a script making its first RPC,
+getJobs, against a fake cuebot served by this process.  Each case runs in
+a new interpreter, with and without the config cache.  The eager cases
+import every stub module up front and parse the config, like opencue.cuebot
+used to.
+
+Usage: python import_benchmark.py [--runs 10]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+from concurrent import futures
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+from opencue.compiled_proto import cue_pb2
+from opencue.compiled_proto import cue_pb2_grpc
+from opencue.compiled_proto import job_pb2
+from opencue.compiled_proto import job_pb2_grpc
+
+
+IMPORT = 'import opencue'
+FIRST_RPC = 'import opencue; opencue.api.getJobs(show=["pipe"])'
+# Imports every stub module like opencue.cuebot did before they were loaded on use.
+EAGER = ('import opencue; '
+         '[opencue.Cuebot.getService(name) for name in opencue.Cuebot.SERVICE_MAP]; ')
+
+
+class CueServicer(cue_pb2_grpc.CueInterfaceServicer):
+
+    def GetSystemStats(self, request, context):
+        return cue_pb2.CueGetSystemStatsResponse()
+
+
+class JobServicer(job_pb2_grpc.JobInterfaceServicer):
+
+    def GetJobs(self, request, context):
+        return job_pb2.JobGetJobsResponse(
+            jobs=job_pb2.JobSeq(jobs=[job_pb2.Job(name='pipe-shot-user_job%d' % index)
+                                      for index in range(10)]))
+
+
+def startCuebot():
+    """Returns a fake cuebot server and its host"""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    cue_pb2_grpc.add_CueInterfaceServicer_to_server(CueServicer(), server)
+    job_pb2_grpc.add_JobInterfaceServicer_to_server(JobServicer(), server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    return server, 'localhost:%d' % port
+
+
+def timeScript(script, env, runs):
+    """Returns the minimum and median wall time in ms of running a script in
+    a new interpreter"""
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', script], env=env)
+        times.append((time.time() - start) * 1000)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    server, host = startCuebot()
+    cacheDir = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), CUEBOT_HOSTS=host,
+                   OPENCUE_CONFIG_CACHE=os.path.join(cacheDir, 'config.pickle'))
+        uncachedEnv = dict(env, OPENCUE_CONFIG_CACHE='')
+        # Write the config cache
+        subprocess.check_call([sys.executable, '-c', IMPORT], env=env)
+
+        print('%-28s %10s %10s' % ('', 'min ms', 'median ms'))
+        for name, script, scriptEnv in (
+                ('import opencue', IMPORT, env),
+                ('import, uncached config', IMPORT, uncachedEnv),
+                ('import, eager stubs', EAGER, uncachedEnv),
+                ('first rpc', FIRST_RPC, env),
+                ('first rpc, eager stubs', EAGER + FIRST_RPC, uncachedEnv)):
+            print('%-28s %10.2f %10.2f' % ((name,) + timeScript(script, scriptEnv, args.runs)))
+    finally:
+        server.stop(None)
+        shutil.rmtree(cacheDir)
+
+
+if __name__ == '__main__':
+    main()
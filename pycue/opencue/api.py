@@ -23,6 +23,10 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+from concurrent import futures
+
+from . import cache
+from . import exception
 from . import search
 from . import util
 from opencue.compiled_proto import comment_pb2
@@ -74,6 +78,7 @@ __wrappers = [Action, Allocation, Comment, Depend, Filter, Frame, Group, Host, J
 # These are convenience methods that get imported into
 # the package namespace.
 #
+@cache.cached('service')
 @util.grpcExceptionParser
 def getDefaultServices():
     """
@@ -86,6 +91,7 @@ def getDefaultServices():
     return Service.getDefaultServices()
 
 
+@cache.cached('service')
 @util.grpcExceptionParser
 def getService(name):
     """
@@ -98,6 +104,7 @@ def getService(name):
     return Service.getService(name)
 
 
+@cache.invalidates('service')
 @util.grpcExceptionParser
 def createService(data):
     """
@@ -194,6 +201,7 @@ def getDepartmentNames():
 #
 # Shows
 #
+@cache.invalidates('show')
 @util.grpcExceptionParser
 def createShow(show):
     """Creates a new show.
@@ -206,6 +214,7 @@ def createShow(show):
         show_pb2.ShowCreateShowRequest(name=show), timeout=Cuebot.Timeout).show)
 
 
+@cache.invalidates('show')
 @util.grpcExceptionParser
 def deleteShow(show_id):
     """Deletes a show.
@@ -217,6 +226,7 @@ def deleteShow(show_id):
         show_pb2.ShowDeleteRequest(show=show.data), timeout=Cuebot.Timeout)
 
 
+@cache.cached('show')
 @util.grpcExceptionParser
 def getShows():
     """Returns a list of show objects.
@@ -228,6 +238,7 @@ def getShows():
     return [Show(s) for s in showSeq.shows]
 
 
+@cache.cached('show')
 @util.grpcExceptionParser
 def getActiveShows():
     """Returns a list of all active shows.
@@ -239,6 +250,7 @@ def getActiveShows():
     return [Show(s) for s in showSeq.shows]
 
 
+@cache.cached('show')
 @util.grpcExceptionParser
 def findShow(name):
     """Returns a list of show objects.
@@ -283,6 +295,7 @@ def getGroup(uniq):
 #
 # Jobs
 #
+@cache.cached('job')
 @util.grpcExceptionParser
 def findJob(name):
     """Returns a Job object for the given job name.
@@ -296,6 +309,7 @@ def findJob(name):
         job_pb2.JobFindJobRequest(name=name), timeout=Cuebot.Timeout).job)
 
 
+@cache.cached('job')
 @util.grpcExceptionParser
 def getJob(uniq):
     """Returns a Job object for the given job ID.
@@ -383,6 +397,33 @@ def launchSpecAndWait(spec):
     return [Job(j) for j in jobSeq.jobs]
 
 
+def launchSpecsAndWait(specs, maxWorkers=4):
+    """Launch many job specs, up to maxWorkers of them at the same time,
+    waiting on the server until the jobs are committed in the database.
+    A spec failing to launch doesn't stop the others.
+
+    :type specs: list<str>
+    :param specs: XML strings containing job specs
+    :type maxWorkers: int
+    :param maxWorkers: the maximum number of specs launched at the same time
+    :rtype: list
+    :return: a (jobs, exception) tuple per spec, in the order of the specs.
+             jobs is the list of Job objects that were submitted, or None if
+             the spec failed to launch with the CueException"""
+    executor = futures.ThreadPoolExecutor(max_workers=max(maxWorkers, 1))
+    try:
+        pending = [executor.submit(launchSpecAndWait, spec) for spec in specs]
+        results = []
+        for launch in pending:
+            try:
+                results.append((launch.result(), None))
+            except exception.CueException as e:
+                results.append((None, e))
+        return results
+    finally:
+        executor.shutdown()
+
+
 #
 # Job Names
 #
@@ -475,6 +516,35 @@ def getFrames(job, **options):
     return [Frame(f) for f in framesSeq.frames]
 
 
+def iterFrames(job, pageSize=None, prefetch=False, **options):
+    """Iterates over the frames in a job that match the search critieria,
+    without the 1000 frame limit of getFrames.  Frames are fetched a page
+    at a time, so callers can stop early and memory use doesn't grow with
+    the size of the job.
+
+    For example::
+
+        for frame in opencue.api.iterFrames('show-shot-job', prefetch=True, layer=['render']):
+            frame.retry()
+
+    :type job: str
+    :param job: the job name
+    :type pageSize: int
+    :param pageSize: the frames fetched per call, up to 1000
+    :type prefetch: bool
+    :param prefetch: fetch the next page in a background thread
+    :rtype: generator
+    :return: the matching Frame objects"""
+    @util.grpcExceptionParser
+    def _getPage(criteria):
+        return Cuebot.getStub('frame').GetFrames(
+            job_pb2.FrameGetFramesRequest(job=job, r=criteria), timeout=Cuebot.Timeout).frames.frames
+
+    for page in search.FrameSearch.iterPages(_getPage, pageSize, prefetch, **options):
+        for frame in page:
+            yield Frame(frame)
+
+
 #
 # Depends
 #
@@ -529,6 +599,7 @@ def getHosts(**options):
     return search.HostSearch.byOptions(**options)
 
 
+@cache.cached('host')
 @util.grpcExceptionParser
 def findHost(name):
     """Returns the host for the matching hostname.
@@ -541,6 +612,7 @@ def findHost(name):
         host_pb2.HostFindHostRequest(name=name), timeout=Cuebot.Timeout).host)
 
 
+@cache.cached('host')
 @util.grpcExceptionParser
 def getHost(uniq):
     """Returns a Host object from a unique identifier.
@@ -587,6 +659,7 @@ def findFilter(show_name, filter_name):
 #
 # Allocation
 #
+@cache.invalidates('allocation')
 @util.grpcExceptionParser
 def createAllocation(name, tag, facility):
     """Creates and returns an allocation.
@@ -603,6 +676,7 @@ def createAllocation(name, tag, facility):
         timeout=Cuebot.Timeout).allocation)
 
 
+@cache.cached('allocation')
 @util.grpcExceptionParser
 def getAllocations():
     """Returns a list of allocation objects.
@@ -614,6 +688,7 @@ def getAllocations():
     return [Allocation(a) for a in allocationSeq.allocations]
 
 
+@cache.cached('allocation')
 @util.grpcExceptionParser
 def findAllocation(name):
     """Returns the Allocation object that matches the name.
@@ -626,6 +701,7 @@ def findAllocation(name):
         facility_pb2.AllocFindRequest(name=name), timeout=Cuebot.Timeout).allocation)
 
 
+@cache.cached('allocation')
 @util.grpcExceptionParser
 def getAllocation(allocId):
     """Returns the Allocation object that matches the ID.
@@ -638,12 +714,14 @@ def getAllocation(allocId):
         facility_pb2.AllocGetRequest(id=allocId), timeout=Cuebot.Timeout).allocation)
 
 
+@cache.invalidates('allocation')
 @util.grpcExceptionParser
 def deleteAllocation(alloc):
     return Cuebot.getStub('allocation').Delete(
         facility_pb2.AllocDeleteRequest(allocation=alloc), timeout=Cuebot.Timeout)
 
 
+@cache.invalidates('allocation')
 @util.grpcExceptionParser
 def allocSetBillable(alloc, is_billable):
     return Cuebot.getStub('allocation').SetBillable(
@@ -651,12 +729,14 @@ def allocSetBillable(alloc, is_billable):
         timeout=Cuebot.Timeout)
 
 
+@cache.invalidates('allocation')
 @util.grpcExceptionParser
 def allocSetName(alloc, name):
     return Cuebot.getStub('allocation').SetName(
         facility_pb2.AllocSetNameRequest(allocation=alloc, name=name), timeout=Cuebot.Timeout)
 
 
+@cache.invalidates('allocation')
 @util.grpcExceptionParser
 def allocSetTag(alloc, tag):
     return Cuebot.getStub('allocation').SetTag(
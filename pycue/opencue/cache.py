@@ -0,0 +1,258 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Project: opencue Library
+Module: cache.py
+
+An opt-in client side cache of the lookups that rarely change, like
+findShow or getDefaultServices.  Entries expire after a per-entity TTL and
+the least recently used entries are evicted beyond a maximum size.  Wrapper
+methods changing an entity drop the cached entries of that entity.
+
+Enable it with cache.enabled in the pycue config, or with enable().
+Every caller gets its own copy of the cached wrappers.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import functools
+import logging
+import threading
+import time
+
+from google.protobuf import message
+
+from .cuebot import Cuebot
+
+
+__all__ = ["TtlLruCache",
+           "cached",
+           "invalidates",
+           "enable",
+           "disable",
+           "isEnabled",
+           "invalidate",
+           "clear",
+           "stats"]
+
+logger = logging.getLogger("opencue")
+
+DEFAULT_MAX_SIZE = 1000
+
+# Seconds entries of each entity are kept.
+DEFAULT_TTLS = {
+    'allocation': 300,
+    'host': 30,
+    'job': 10,
+    'service': 300,
+    'show': 300,
+}
+
+# The cache used by the cached functions, None when disabled.
+_cache = None
+
+
+class TtlLruCache(object):
+    """A thread safe cache whose keys start with the entity kind.  Entries
+    expire after the TTL of their kind and the least recently used entry is
+    evicted when the cache is full."""
+
+    def __init__(self, maxSize=DEFAULT_MAX_SIZE, ttls=None):
+        """
+        :type  maxSize: int
+        :param maxSize: The maximum number of entries
+        :type  ttls: dict
+        :param ttls: Seconds entries are kept by entity kind, kinds not
+                     listed are not cached"""
+        self.maxSize = maxSize
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the entry of a key.
+
+        :type  key: tuple
+        :param key: The key, its first item is the entity kind
+        :rtype:  tuple
+        :return: (True, value) on a hit, (False, None) on a miss"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.time():
+                    # Move the entry to the most recently used end.
+                    del self.__entries[key]
+                    self.__entries[key] = entry
+                    self.hits += 1
+                    return True, value
+                del self.__entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Stores the value of a key, unless its kind isn't cached.
+
+        :type  key: tuple
+        :param key: The key, its first item is the entity kind
+        :param value: The value"""
+        ttl = self.ttls.get(key[0])
+        if not ttl:
+            return
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (time.time() + ttl, value)
+            while len(self.__entries) > self.maxSize:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, kind=None):
+        """Drops the entries of an entity kind, or every entry."""
+        with self.__lock:
+            if kind is None:
+                self.__entries.clear()
+            else:
+                for key in [key for key in self.__entries if key[0] == kind]:
+                    del self.__entries[key]
+
+    def stats(self):
+        """Returns the hits, misses, evictions and size of the cache."""
+        with self.__lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self.__entries)}
+
+
+def cached(kind):
+    """Decorator caching the result of a lookup of an entity kind while the
+    cache is enabled.  Callers get copies of the cached lists and wrappers,
+    so changing them doesn't change the cached value.
+
+    :type  kind: str
+    :param kind: The entity kind, ex: show"""
+    def _decorator(func):
+        @functools.wraps(func)
+        def _cached(*args, **kwargs):
+            cache = _cache
+            if cache is None:
+                return func(*args, **kwargs)
+            key = (kind, func.__name__, args, tuple(sorted(kwargs.items())))
+            try:
+                hit, value = cache.get(key)
+            except TypeError:
+                # Unhashable arguments
+                return func(*args, **kwargs)
+            if not hit:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return _copy(value)
+        return _cached
+    return _decorator
+
+
+def _copy(value):
+    """Returns a copy of a cached value, a list of wrappers or a wrapper
+    is copied with the protobuf messages of the wrappers."""
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    data = getattr(value, 'data', None)
+    if isinstance(data, message.Message):
+        copied = type(data)()
+        copied.CopyFrom(data)
+        return type(value)(copied)
+    return value
+
+
+def invalidates(*kinds):
+    """Decorator dropping the cached entries of entity kinds once the
+    decorated function, which changes them, returns.
+
+    :type  kinds: str
+    :param kinds: The entity kinds"""
+    def _decorator(func):
+        @functools.wraps(func)
+        def _invalidates(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for kind in kinds:
+                    invalidate(kind)
+        return _invalidates
+    return _decorator
+
+
+def enable(maxSize=None, ttls=None):
+    """Enables the cache, replacing the current one.
+
+    :type  maxSize: int
+    :param maxSize: The maximum number of entries, defaults to cache.max_size
+    :type  ttls: dict
+    :param ttls: Seconds entries are kept by entity kind, defaults to cache.ttls"""
+    global _cache
+    config = Cuebot.getConfig()
+    ttls = dict(DEFAULT_TTLS, **(ttls if ttls is not None else config.get('cache.ttls') or {}))
+    _cache = TtlLruCache(maxSize or config.get('cache.max_size', DEFAULT_MAX_SIZE), ttls)
+    logger.debug("enabled the lookup cache, ttls: %s" % ttls)
+
+
+def disable():
+    """Disables the cache and drops its entries."""
+    global _cache
+    _cache = None
+
+
+def isEnabled():
+    return _cache is not None
+
+
+def invalidate(kind=None):
+    """Drops the cached entries of an entity kind, or every entry.
+
+    :type  kind: str
+    :param kind: The entity kind, ex: show"""
+    cache = _cache
+    if cache is not None:
+        cache.invalidate(kind)
+
+
+def clear():
+    """Drops every cached entry."""
+    invalidate()
+
+
+def stats():
+    """Returns the hits, misses, evictions and size of the cache, None if
+    it is disabled.
+
+    :rtype:  dict
+    :return: The cache statistics"""
+    cache = _cache
+    if cache is None:
+        return None
+    return cache.stats()
+
+
+if Cuebot.getConfig().get('cache.enabled', False):
+    enable()
@@ -21,39 +21,19 @@ from builtins import object
 from random import shuffle
 import atexit
 import grpc
+import importlib
+import itertools
 import logging
 import os
-import yaml
-
-from opencue.compiled_proto import comment_pb2
-from opencue.compiled_proto import comment_pb2_grpc
-from opencue.compiled_proto import criterion_pb2
-from opencue.compiled_proto import cue_pb2
-from opencue.compiled_proto import cue_pb2_grpc
-from opencue.compiled_proto import department_pb2
-from opencue.compiled_proto import department_pb2_grpc
-from opencue.compiled_proto import depend_pb2
-from opencue.compiled_proto import depend_pb2_grpc
-from opencue.compiled_proto import facility_pb2
-from opencue.compiled_proto import facility_pb2_grpc
-from opencue.compiled_proto import filter_pb2
-from opencue.compiled_proto import filter_pb2_grpc
-from opencue.compiled_proto import host_pb2
-from opencue.compiled_proto import host_pb2_grpc
-from opencue.compiled_proto import job_pb2
-from opencue.compiled_proto import job_pb2_grpc
-from opencue.compiled_proto import limit_pb2
-from opencue.compiled_proto import limit_pb2_grpc
-from opencue.compiled_proto import renderPartition_pb2
-from opencue.compiled_proto import renderPartition_pb2_grpc
-from opencue.compiled_proto import service_pb2
-from opencue.compiled_proto import service_pb2_grpc
-from opencue.compiled_proto import show_pb2
-from opencue.compiled_proto import show_pb2_grpc
-from opencue.compiled_proto import subscription_pb2
-from opencue.compiled_proto import subscription_pb2_grpc
-from opencue.compiled_proto import task_pb2
-from opencue.compiled_proto import task_pb2_grpc
+import pickle
+import threading
+import uuid
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 from opencue.exception import ConnectionException
 from opencue.exception import CueException
 
@@ -62,18 +42,314 @@ __all__ = ["Cuebot"]
 
 logger = logging.getLogger("opencue")
 
+# The parsed config is cached, keyed on the size and modification time of
+# the config files, so short lived scripts don't import yaml and parse the
+# files every time.  Set OPENCUE_CONFIG_CACHE to another path, or to an
+# empty string to disable the cache.
+DEFAULT_CONFIG_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'opencue',
+                                    'config.pickle')
+
+
+def _getConfigKey(paths):
+    """Returns what identifies the version of the config files."""
+    key = []
+    for path in paths:
+        stat = os.stat(path)
+        key.append((path, stat.st_size, stat.st_mtime))
+    return key
+
+
+def _writeConfigCache(cachePath, key, config):
+    """Writes the config cache, failing to is not an error."""
+    tmpPath = '%s.%s' % (cachePath, uuid.uuid4().hex[:8])
+    try:
+        if not os.path.isdir(os.path.dirname(cachePath)):
+            os.makedirs(os.path.dirname(cachePath))
+        with open(tmpPath, 'wb') as file_object:
+            pickle.dump((key, config), file_object, protocol=2)
+        os.rename(tmpPath, cachePath)
+    except Exception as e:
+        logger.debug('failed to write the config cache %s: %s', cachePath, e)
+        if os.path.exists(tmpPath):
+            os.unlink(tmpPath)
+
+
+def loadConfig(paths, cachePath=None):
+    """Returns the config of yaml files, the later files overriding the
+    earlier ones.  The config is read from the cache when the files haven't
+    changed since it was written.
+
+    :type  paths: list<str>
+    :param paths: The config files
+    :type  cachePath: str
+    :param cachePath: The config cache, None to always parse the files
+    :rtype:  dict
+    :return: The config"""
+    key = _getConfigKey(paths)
+    if cachePath:
+        try:
+            with open(cachePath, 'rb') as file_object:
+                cachedKey, cachedConfig = pickle.load(file_object)
+            if cachedKey == key:
+                return cachedConfig
+        except Exception:
+            pass
+
+    import yaml
+    config = {}
+    for path in paths:
+        with open(path) as file_object:
+            config.update(yaml.load(file_object, Loader=yaml.SafeLoader))
+    if cachePath:
+        _writeConfigCache(cachePath, key, config)
+    return config
+
+
 default_config = os.path.join(os.path.dirname(__file__), 'default.yaml')
-with open(default_config) as file_object:
-    config = yaml.load(file_object, Loader=yaml.SafeLoader)
+config_paths = [default_config]
 
 # check for facility specific configurations.
 fcnf = os.environ.get('OPENCUE_CONF', '')
 if os.path.exists(fcnf):
-    with open(fcnf) as file_object:
-        config.update(yaml.load(file_object, Loader=yaml.SafeLoader))
+    config_paths.append(fcnf)
+
+config = loadConfig(config_paths, os.environ.get('OPENCUE_CONFIG_CACHE', DEFAULT_CONFIG_CACHE))
 
 DEFAULT_MAX_MESSAGE_BYTES = 1024 ** 2 * 10
 DEFAULT_GRPC_PORT = 8443
+DEFAULT_POOL_POLICY = 'round_robin'
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_HEALTH_CHECK_TIMEOUT = 5
+
+# Status codes that eject a cuebot from the pool until a health check passes.
+UNHEALTHY_CODES = (grpc.StatusCode.UNAVAILABLE,)
+
+
+class _CallTracker(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+    """Counts the outstanding calls of a HostChannel and ejects its host
+    when a call fails with an UNHEALTHY_CODES status."""
+
+    def __init__(self, hostChannel):
+        self.hostChannel = hostChannel
+
+    def __track(self, continuation, clientCallDetails, request):
+        self.hostChannel.callStarted()
+        try:
+            call = continuation(clientCallDetails, request)
+        except Exception:
+            self.hostChannel.callEnded(grpc.StatusCode.UNKNOWN)
+            raise
+        call.add_done_callback(lambda done: self.hostChannel.callEnded(done.code()))
+        return call
+
+    def intercept_unary_unary(self, continuation, clientCallDetails, request):
+        return self.__track(continuation, clientCallDetails, request)
+
+    def intercept_unary_stream(self, continuation, clientCallDetails, request):
+        return self.__track(continuation, clientCallDetails, request)
+
+
+class HostChannel(object):
+    """The channel to a single cuebot and its health."""
+
+    def __init__(self, host, options):
+        """
+        :type  host: str
+        :param host: The cuebot host, with an optional port
+        :type  options: list<tuple>
+        :param options: The gRPC channel options"""
+        self.host = host
+        if ':' in host:
+            self.connectStr = host
+        else:
+            self.connectStr = '%s:%s' % (host, config.get('cuebot.grpc_port', DEFAULT_GRPC_PORT))
+        logger.debug('connecting to gRPC at %s', self.connectStr)
+        # TODO(bcipriano) Configure gRPC TLS. (Issue #150)
+        self.rawChannel = grpc.insecure_channel(self.connectStr, options=options)
+        self.channel = grpc.intercept_channel(self.rawChannel, _CallTracker(self))
+        self.stubs = {}
+        self.healthy = True
+        self.outstanding = 0
+        self.failures = 0
+        self.__lock = threading.Lock()
+
+    def callStarted(self):
+        with self.__lock:
+            self.outstanding += 1
+
+    def callEnded(self, code):
+        with self.__lock:
+            self.outstanding -= 1
+        if code in UNHEALTHY_CODES:
+            self.markUnhealthy()
+
+    def markUnhealthy(self):
+        """Ejects the host until a health check passes."""
+        if self.healthy:
+            logger.warning('Ejecting cuebot %s from the channel pool', self.connectStr)
+        self.healthy = False
+        self.failures += 1
+
+    def markHealthy(self):
+        if not self.healthy:
+            logger.info('Cuebot %s is back in the channel pool', self.connectStr)
+        self.healthy = True
+
+    def check(self, timeout):
+        """Calls GetSystemStats on the cuebot and updates its health.
+
+        :type  timeout: float
+        :param timeout: The timeout of the call in seconds
+        :rtype:  bool
+        :return: True if the cuebot answered"""
+        try:
+            Cuebot.getService('cue')(self.rawChannel).GetSystemStats(
+                Cuebot.getProto('cue').CueGetSystemStatsRequest(), timeout=timeout)
+        except Exception:
+            self.markUnhealthy()
+            return False
+        self.markHealthy()
+        return True
+
+    def getStub(self, name):
+        """Returns the stub of a SERVICE_MAP service on this channel, stubs
+        are created once per channel.
+
+        :type  name: str
+        :param name: The SERVICE_MAP key of the service"""
+        stub = self.stubs.get(name)
+        if stub is None:
+            stub = self.stubs[name] = Cuebot.getService(name)(self.channel)
+        return stub
+
+    def close(self):
+        self.rawChannel.close()
+
+
+class ChannelPool(object):
+    """Channels to every configured cuebot.  Each call goes to a healthy
+    cuebot, picked round robin or by the fewest outstanding calls.  A cuebot
+    failing a call is ejected, a background thread checks every cuebot
+    periodically and brings back the ones that answer."""
+
+    POLICIES = ('round_robin', 'least_outstanding')
+
+    def __init__(self, hosts, policy=None, healthCheckInterval=None, healthCheckTimeout=None):
+        """
+        :type  hosts: list<str>
+        :param hosts: The cuebot hosts
+        :type  policy: str
+        :param policy: round_robin or least_outstanding
+        :type  healthCheckInterval: float
+        :param healthCheckInterval: Seconds between health checks, 0 disables them
+        :type  healthCheckTimeout: float
+        :param healthCheckTimeout: Seconds a health check may take"""
+        self.policy = policy or config.get('cuebot.pool_policy', DEFAULT_POOL_POLICY)
+        if self.policy not in self.POLICIES:
+            raise ValueError('Unknown channel pool policy {}'.format(self.policy))
+        if healthCheckInterval is None:
+            healthCheckInterval = config.get('cuebot.health_check_interval',
+                                             DEFAULT_HEALTH_CHECK_INTERVAL)
+        self.healthCheckInterval = healthCheckInterval
+        self.healthCheckTimeout = healthCheckTimeout or config.get(
+            'cuebot.health_check_timeout', DEFAULT_HEALTH_CHECK_TIMEOUT)
+
+        maxMessageBytes = config.get('cuebot.max_message_bytes', DEFAULT_MAX_MESSAGE_BYTES)
+        options = [('grpc.max_send_message_length', maxMessageBytes),
+                   ('grpc.max_receive_message_length', maxMessageBytes)]
+        self.hostChannels = [HostChannel(host, options) for host in hosts]
+        self.__counter = itertools.count()
+        self.__stopEvent = threading.Event()
+        self.__healthThread = None
+
+    def getHostChannel(self):
+        """Returns the HostChannel the next call should use.  If every cuebot
+        is ejected they are all tried again.
+
+        :rtype:  HostChannel
+        :return: A cuebot channel"""
+        candidates = [hostChannel for hostChannel in self.hostChannels if hostChannel.healthy]
+        if not candidates:
+            candidates = self.hostChannels
+        offset = next(self.__counter)
+        if self.policy == 'least_outstanding':
+            # Ties go round robin
+            return min(candidates, key=lambda hostChannel: (
+                hostChannel.outstanding,
+                (self.hostChannels.index(hostChannel) - offset) % len(self.hostChannels)))
+        return candidates[offset % len(candidates)]
+
+    def getChannel(self):
+        """Returns the gRPC channel the next call should use."""
+        return self.getHostChannel().channel
+
+    def hasHealthyHosts(self):
+        return any(hostChannel.healthy for hostChannel in self.hostChannels)
+
+    def checkHealth(self):
+        """Checks every cuebot once."""
+        for hostChannel in self.hostChannels:
+            hostChannel.check(self.healthCheckTimeout)
+
+    def startHealthChecks(self):
+        """Starts checking the cuebots every healthCheckInterval seconds in a
+        daemon thread."""
+        if self.healthCheckInterval and self.__healthThread is None:
+            self.__healthThread = threading.Thread(target=self.__checkHealthForever,
+                                                   name='cuebotHealthCheck')
+            self.__healthThread.daemon = True
+            self.__healthThread.start()
+
+    def __checkHealthForever(self):
+        while not self.__stopEvent.wait(self.healthCheckInterval):
+            self.checkHealth()
+
+    def close(self):
+        """Stops the health checks and closes every channel."""
+        self.__stopEvent.set()
+        for hostChannel in self.hostChannels:
+            hostChannel.close()
+
+
+class _LazyModuleMap(MutableMapping):
+    """A dict of compiled proto modules, or of classes in them, which
+    imports each module the first time one of its values is used."""
+
+    def __init__(self, specs):
+        """
+        :type  specs: dict
+        :param specs: (module, attribute) by key, the module is in
+                      opencue.compiled_proto, attribute is None for the
+                      module itself"""
+        self.__specs = dict(specs)
+        self.__values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self.__values[key]
+        except KeyError:
+            pass
+        moduleName, attribute = self.__specs[key]
+        value = importlib.import_module('opencue.compiled_proto.%s' % moduleName)
+        if attribute is not None:
+            value = getattr(value, attribute)
+        self.__values[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.__specs[key] = None
+        self.__values[key] = value
+
+    def __delitem__(self, key):
+        del self.__specs[key]
+        self.__values.pop(key, None)
+
+    def __iter__(self):
+        return iter(self.__specs)
+
+    def __len__(self):
+        return len(self.__specs)
+
 
 class Cuebot(object):
     """Used to manage the connection to the Cuebot.  Normally the connection
@@ -85,60 +361,61 @@ class Cuebot(object):
        Cuebot.setHosts or set the CUEBOT_HOSTS environment variable
        to a comma delimited list of host names."""
     RpcChannel = None
+    Pool = None
     Hosts = []
     Stubs = {}
     Timeout = config.get('cuebot.timeout', 10000)
 
-    PROTO_MAP = {
-        'action': filter_pb2,
-        'allocation': facility_pb2,
-        'comment': comment_pb2,
-        'criterion': criterion_pb2,
-        'cue': cue_pb2,
-        'department': department_pb2,
-        'depend': depend_pb2,
-        'facility': facility_pb2,
-        'filter': filter_pb2,
-        'frame': job_pb2,
-        'group': job_pb2,
-        'host': host_pb2,
-        'job': job_pb2,
-        'layer': job_pb2,
-        'limit': limit_pb2,
-        'matcher': filter_pb2,
-        'owner': host_pb2,
-        'proc': host_pb2,
-        'renderPartition': renderPartition_pb2,
-        'service': service_pb2,
-        'show': show_pb2,
-        'subscription': subscription_pb2,
-        'task': task_pb2
-    }
-
-    SERVICE_MAP = {
-        'action': filter_pb2_grpc.ActionInterfaceStub,
-        'allocation': facility_pb2_grpc.AllocationInterfaceStub,
-        'comment': comment_pb2_grpc.CommentInterfaceStub,
-        'cue': cue_pb2_grpc.CueInterfaceStub,
-        'depend': depend_pb2_grpc.DependInterfaceStub,
-        'department': department_pb2_grpc.DepartmentInterfaceStub,
-        'facility': facility_pb2_grpc.FacilityInterfaceStub,
-        'filter': filter_pb2_grpc.FilterInterfaceStub,
-        'frame': job_pb2_grpc.FrameInterfaceStub,
-        'group': job_pb2_grpc.GroupInterfaceStub,
-        'host': host_pb2_grpc.HostInterfaceStub,
-        'job': job_pb2_grpc.JobInterfaceStub,
-        'layer': job_pb2_grpc.LayerInterfaceStub,
-        'limit': limit_pb2_grpc.LimitInterfaceStub,
-        'matcher': filter_pb2_grpc.MatcherInterfaceStub,
-        'owner': host_pb2_grpc.OwnerInterfaceStub,
-        'proc': host_pb2_grpc.ProcInterfaceStub,
-        'renderPartition': renderPartition_pb2_grpc.RenderPartitionInterfaceStub,
-        'service': service_pb2_grpc.ServiceInterfaceStub,
-        'show': show_pb2_grpc.ShowInterfaceStub,
-        'subscription': subscription_pb2_grpc.SubscriptionInterfaceStub,
-        'task': task_pb2_grpc.TaskInterfaceStub
-    }
+    PROTO_MAP = _LazyModuleMap({
+        'action': ('filter_pb2', None),
+        'allocation': ('facility_pb2', None),
+        'comment': ('comment_pb2', None),
+        'criterion': ('criterion_pb2', None),
+        'cue': ('cue_pb2', None),
+        'department': ('department_pb2', None),
+        'depend': ('depend_pb2', None),
+        'facility': ('facility_pb2', None),
+        'filter': ('filter_pb2', None),
+        'frame': ('job_pb2', None),
+        'group': ('job_pb2', None),
+        'host': ('host_pb2', None),
+        'job': ('job_pb2', None),
+        'layer': ('job_pb2', None),
+        'limit': ('limit_pb2', None),
+        'matcher': ('filter_pb2', None),
+        'owner': ('host_pb2', None),
+        'proc': ('host_pb2', None),
+        'renderPartition': ('renderPartition_pb2', None),
+        'service': ('service_pb2', None),
+        'show': ('show_pb2', None),
+        'subscription': ('subscription_pb2', None),
+        'task': ('task_pb2', None)
+    })
+
+    SERVICE_MAP = _LazyModuleMap({
+        'action': ('filter_pb2_grpc', 'ActionInterfaceStub'),
+        'allocation': ('facility_pb2_grpc', 'AllocationInterfaceStub'),
+        'comment': ('comment_pb2_grpc', 'CommentInterfaceStub'),
+        'cue': ('cue_pb2_grpc', 'CueInterfaceStub'),
+        'depend': ('depend_pb2_grpc', 'DependInterfaceStub'),
+        'department': ('department_pb2_grpc', 'DepartmentInterfaceStub'),
+        'facility': ('facility_pb2_grpc', 'FacilityInterfaceStub'),
+        'filter': ('filter_pb2_grpc', 'FilterInterfaceStub'),
+        'frame': ('job_pb2_grpc', 'FrameInterfaceStub'),
+        'group': ('job_pb2_grpc', 'GroupInterfaceStub'),
+        'host': ('host_pb2_grpc', 'HostInterfaceStub'),
+        'job': ('job_pb2_grpc', 'JobInterfaceStub'),
+        'layer': ('job_pb2_grpc', 'LayerInterfaceStub'),
+        'limit': ('limit_pb2_grpc', 'LimitInterfaceStub'),
+        'matcher': ('filter_pb2_grpc', 'MatcherInterfaceStub'),
+        'owner': ('host_pb2_grpc', 'OwnerInterfaceStub'),
+        'proc': ('host_pb2_grpc', 'ProcInterfaceStub'),
+        'renderPartition': ('renderPartition_pb2_grpc', 'RenderPartitionInterfaceStub'),
+        'service': ('service_pb2_grpc', 'ServiceInterfaceStub'),
+        'show': ('show_pb2_grpc', 'ShowInterfaceStub'),
+        'subscription': ('subscription_pb2_grpc', 'SubscriptionInterfaceStub'),
+        'task': ('task_pb2_grpc', 'TaskInterfaceStub')
+    })
 
     @staticmethod
     def init():
@@ -156,39 +433,32 @@ class Cuebot(object):
 
     @staticmethod
     def setChannel():
-        """Sets the gRPC channel connection"""
-        # gRPC must specify a single host. Randomize host list to balance load across cuebots.
-        hosts = list(Cuebot.Hosts)
-        shuffle(hosts)
-        maxMessageBytes = config.get('cuebot.max_message_bytes', DEFAULT_MAX_MESSAGE_BYTES)
-        for host in hosts:
-            if ':' in host:
-                connectStr = host
-            else:
-                connectStr = '%s:%s' % (host, config.get('cuebot.grpc_port', DEFAULT_GRPC_PORT))
-            logger.debug('connecting to gRPC at %s', connectStr)
-            # TODO(bcipriano) Configure gRPC TLS. (Issue #150)
-            try:
-                Cuebot.RpcChannel = grpc.insecure_channel(connectStr, options=[
-                    ('grpc.max_send_message_length', maxMessageBytes),
-                    ('grpc.max_receive_message_length', maxMessageBytes)])
-                # Test the connection
-                Cuebot.getStub('cue').GetSystemStats(
-                    cue_pb2.CueGetSystemStatsRequest(), timeout=Cuebot.Timeout)
-            except Exception:
-                logger.warning('Could not establish grpc channel with {}.'.format(connectStr))
-                continue
-            atexit.register(Cuebot.closeChannel)
-            return None
+        """Sets the gRPC channel pool, with a channel to every host.
+        Fails unless at least one host answers."""
+        pool = ChannelPool(Cuebot.Hosts)
+        # Randomize the host checked first to balance load across cuebots.
+        hostChannels = list(pool.hostChannels)
+        shuffle(hostChannels)
+        for hostChannel in hostChannels:
+            # Test the connection
+            if hostChannel.check(Cuebot.Timeout):
+                Cuebot.Pool = pool
+                Cuebot.RpcChannel = hostChannel.channel
+                pool.startHealthChecks()
+                atexit.register(Cuebot.closeChannel)
+                return None
+            logger.warning('Could not establish grpc channel with {}.'.format(
+                hostChannel.connectStr))
+        pool.close()
         raise ConnectionException('No grpc connection could be established. ' +
                                   'Please check configured cuebot hosts.')
 
     @staticmethod
     def closeChannel():
-        """Close the gRPC channel, delete it and reset it to None."""
-        if Cuebot and Cuebot.RpcChannel is not None:
-            Cuebot.RpcChannel.close()
-            del Cuebot.RpcChannel
+        """Close the gRPC channels, delete them and reset them to None."""
+        if Cuebot and Cuebot.Pool is not None:
+            Cuebot.Pool.close()
+            Cuebot.Pool = None
             Cuebot.RpcChannel = None
 
     @staticmethod
@@ -251,16 +521,21 @@ class Cuebot(object):
 
     @classmethod
     def getStub(cls, name):
-        """Get the matching stub from the SERVICE_MAP.
-        Reuse an existing one if possible.
+        """Get the matching stub from the SERVICE_MAP, on the channel of
+        the cuebot the channel pool picks for the next call.
 
         :param name: name of stub key for SERVICE_MAP
         :type name: str"""
-        if Cuebot.RpcChannel is None:
+        if Cuebot.Pool is None:
             cls.init()
 
-        service = cls.getService(name)
-        return service(Cuebot.RpcChannel)
+        return Cuebot.Pool.getHostChannel().getStub(name)
+
+    @staticmethod
+    def hasHealthyHosts():
+        """Returns True if a call failing over to another cuebot can be
+        retried right away."""
+        return Cuebot.Pool is not None and Cuebot.Pool.hasHealthyHosts()
 
     @staticmethod
     def getConfig():
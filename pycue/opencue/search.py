@@ -52,6 +52,7 @@ from __future__ import print_function
 from __future__ import division
 
 from builtins import object
+from concurrent import futures
 import logging
 
 import six
@@ -123,6 +124,54 @@ class FrameSearch(BaseSearch):
     def byRange(cls, job, val):
         cls.byOptions(job, frame_range=val)
 
+    @classmethod
+    def iterPages(cls, getPage, pageSize=None, prefetch=False, **options):
+        """Yields the pages of frames matching the options, up to the 1000
+        frames the cuebot returns per page each.  The next page is fetched
+        once the current one is consumed, or in a background thread while it
+        is consumed when prefetching.  Stops at the first short page.
+
+        :type  getPage: callable
+        :param getPage: Returns the frames matching a FrameSearchCriteria
+        :type  pageSize: int
+        :param pageSize: The frames per page, defaults to the limit option
+        :type  prefetch: bool
+        :param prefetch: Fetch the next page in the background
+        :rtype:  generator
+        :return: Lists of job_pb2.Frame"""
+        pageSize = min(pageSize or options.get('limit', cls.limit), cls.limit)
+        page = options.pop('page', cls.page)
+        options['limit'] = pageSize
+
+        def _fetch(page):
+            return list(getPage(cls.criteriaFromOptions(page=page, **options)))
+
+        if not prefetch:
+            while True:
+                frames = _fetch(page)
+                if frames:
+                    yield frames
+                if len(frames) < pageSize:
+                    return
+                page += 1
+
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        try:
+            pending = executor.submit(_fetch, page)
+            while True:
+                frames = pending.result()
+                if len(frames) < pageSize:
+                    if frames:
+                        yield frames
+                    return
+                page += 1
+                pending = executor.submit(_fetch, page)
+                yield frames
+        finally:
+            # A caller stopping early leaves at most one page in flight,
+            # it is dropped once fetched.
+            executor.shutdown(wait=False)
+
 class HostSearch(BaseSearch):
     def __init__(self, **options):
         super(HostSearch, self).__init__(**options)
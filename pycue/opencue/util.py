@@ -39,7 +39,8 @@ logger = logging.getLogger('opencue')
 
 def grpcExceptionParser(grpcFunc):
     """Decorator to wrap functions making GRPC calls.
-    Attempts to throw the appropriate exception based on grpc status code."""
+    Attempts to throw the appropriate exception based on grpc status code.
+    Retried calls get a new stub, so they fail over to another cuebot."""
     def _decorator(*args, **kwargs):
         triesRemaining = opencue.exception.getRetryCount() + 1
         while triesRemaining > 0:
@@ -53,7 +54,11 @@ def grpcExceptionParser(grpcFunc):
                 if exception:
                     if exception.retryable and triesRemaining >= 1:
                         logger.warning(exception.retryMsg)
-                        time.sleep(exception.retryBackoff)
+                        # The failed cuebot was ejected from the channel pool,
+                        # the retry goes to another one without waiting.
+                        if not (code in opencue.cuebot.UNHEALTHY_CODES and
+                                opencue.cuebot.Cuebot.hasHealthyHosts()):
+                            time.sleep(exception.retryBackoff)
                     else:
                         future.utils.raise_with_traceback(
                             exception(exception.failMsg.format(details=details)))
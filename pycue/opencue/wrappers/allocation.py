@@ -18,6 +18,7 @@ allocation module
 """
 
 
+from opencue import cache
 from opencue.compiled_proto import facility_pb2
 from opencue.compiled_proto import host_pb2
 from opencue.cuebot import Cuebot
@@ -30,8 +31,13 @@ class Allocation(object):
 
     def __init__(self, allocation=None):
         self.data = allocation
-        self.stub = Cuebot.getStub('allocation')
 
+    @property
+    def stub(self):
+        """The allocation stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('allocation')
+
+    @cache.invalidates('allocation')
     def delete(self):
         """Delete the record of the allocation from the cuebot"""
         self.stub.Delete(
@@ -60,6 +66,7 @@ class Allocation(object):
             timeout=Cuebot.Timeout).subscriptions
         return [opencue.wrappers.subscription.Subscription(sub) for sub in subscriptionSeq.subscriptions]
 
+    @cache.invalidates('allocation', 'host')
     def reparentHosts(self, hosts):
         """Moves the given hosts to the allocation
 
@@ -73,6 +80,7 @@ class Allocation(object):
             timeout=Cuebot.Timeout
         )
       
+    @cache.invalidates('allocation', 'host')
     def reparentHostIds(self, hostIds):
         """Moves the given hosts to the allocation
 
@@ -82,6 +90,7 @@ class Allocation(object):
         hosts = [opencue.wrappers.host.Host(host_pb2.Host(id=hostId)) for hostId in hostIds]
         self.reparentHosts(hosts)
 
+    @cache.invalidates('allocation')
     def setName(self, name):
         """Sets a new name for the allocation.
 
@@ -92,6 +101,7 @@ class Allocation(object):
             facility_pb2.AllocSetNameRequest(allocation=self.data, name=name),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('allocation')
     def setTag(self, tag):
         """Sets a new tag for the allocation.
 
@@ -30,7 +30,11 @@ class Comment(object):
 
     def __init__(self, comment=None):
         self.data = comment
-        self.stub = Cuebot.getStub('comment')
+
+    @property
+    def stub(self):
+        """The comment stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('comment')
 
     def delete(self):
         """Delete this comment"""
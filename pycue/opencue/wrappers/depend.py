@@ -51,7 +51,11 @@ class Depend(object):
 
     def __init__(self, depend=None):
         self.data = depend
-        self.stub = Cuebot.getStub('depend')
+
+    @property
+    def stub(self):
+        """The depend stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('depend')
 
     def satisfy(self):
         self.stub.Satisfy(
@@ -54,7 +54,11 @@ class Filter(object):
     def __init__(self, filter=None):
         """_Filter class initialization"""
         self.data = filter
-        self.stub = Cuebot.getStub('filter')
+
+    @property
+    def stub(self):
+        """The filter stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('filter')
 
     def delete(self):
         """Deletes the filter"""
@@ -250,7 +254,11 @@ class Action(object):
 
     def __init__(self, action=None):
         self.data = action
-        self.stub = Cuebot.getStub('action')
+
+    @property
+    def stub(self):
+        """The action stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('action')
 
     def getParentFilter(self):
         response = self.stub.GetParentFilter(
@@ -364,7 +372,11 @@ class Matcher(object):
 
     def __init__(self, matcher=None):
         self.data = matcher
-        self.stub = Cuebot.getStub('matcher')
+
+    @property
+    def stub(self):
+        """The matcher stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('matcher')
 
     def getParentFilter(self):
         response = self.stub.GetParentFilter(
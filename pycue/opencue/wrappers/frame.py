@@ -55,7 +55,11 @@ class Frame(object):
     def __init__(self, frame=None):
         """_Frame class initialization"""
         self.data = frame
-        self.stub = Cuebot.getStub('frame')
+
+    @property
+    def stub(self):
+        """The frame stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('frame')
 
     def eat(self):
         """Eat frame"""
@@ -28,7 +28,11 @@ class Group(object):
 
     def __init__(self, group=None):
         self.data = group
-        self.stub = Cuebot.getStub('group')
+
+    @property
+    def stub(self):
+        """The group stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('group')
 
     def createSubGroup(self, name):
         return Group(self.stub.CreateSubGroup(
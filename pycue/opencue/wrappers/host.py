@@ -26,6 +26,7 @@ import os
 import time
 
 from opencue import Cuebot
+from opencue import cache
 from opencue.compiled_proto import comment_pb2
 from opencue.compiled_proto import host_pb2
 import opencue.wrappers.comment
@@ -62,18 +63,25 @@ class Host(object):
         """Host class initialization"""
         self.data = host
         self.__id = host.id
-        self.stub = Cuebot.getStub('host')
 
+    @property
+    def stub(self):
+        """The host stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('host')
+
+    @cache.invalidates('host')
     def lock(self):
         """Locks the host so that it no longer accepts new frames"""
         self.stub.Lock(host_pb2.HostLockRequest(host=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def unlock(self):
         """Unlocks the host and cancels any actions that were waiting for all
         running frames to finish.
         """
         self.stub.Unlock(host_pb2.HostUnlockRequest(host=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def delete(self):
         """Delete the host from the cuebot"""
         self.stub.Delete(host_pb2.HostDeleteRequest(host=self.data), timeout=Cuebot.Timeout)
@@ -99,6 +107,7 @@ class Host(object):
         partitionSeq = response.render_partitions
         return partitionSeq.render_partitions
 
+    @cache.invalidates('host')
     def rebootWhenIdle(self):
         """Causes the host to no longer accept new frames and
         when the machine is idle it will reboot.
@@ -106,10 +115,12 @@ class Host(object):
         self.stub.RebootWhenIdle(host_pb2.HostRebootWhenIdleRequest(host=self.data),
                                  timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def reboot(self):
         """Causes the host to kill all running frames and reboot the machine."""
         self.stub.Reboot(host_pb2.HostRebootRequest(host=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def addTags(self, tags):
         """Adds tags to a host.
 
@@ -119,6 +130,7 @@ class Host(object):
         self.stub.AddTags(host_pb2.HostAddTagsRequest(host=self.data, tags=tags),
                           timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def removeTags(self, tags):
         """Remove tags from this host.
 
@@ -128,6 +140,7 @@ class Host(object):
         self.stub.RemoveTags(host_pb2.HostRemoveTagsRequest(host=self.data, tags=tags),
                              timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def renameTag(self, oldTag, newTag):
         """Renames a tag.
 
@@ -140,6 +153,7 @@ class Host(object):
             host_pb2.HostRenameTagRequest(host=self.data, old_tag=oldTag, new_tag=newTag),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host', 'allocation')
     def setAllocation(self, allocation):
         """Sets the host to the given allocation.
 
@@ -150,6 +164,7 @@ class Host(object):
             host_pb2.HostSetAllocationRequest(host=self.data, allocation_id=allocation.id()),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def addComment(self, subject, message):
         """Appends a comment to the hosts's comment list.
 
@@ -174,6 +189,7 @@ class Host(object):
         commentSeq = response.comments
         return [opencue.wrappers.comment.Comment(c) for c in commentSeq.comments]
 
+    @cache.invalidates('host')
     def setHardwareState(self, state):
         """Sets the host's hardware state
 
@@ -183,6 +199,7 @@ class Host(object):
             host_pb2.HostSetHardwareStateRequest(host=self.data, state=state),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def setOs(self, osName):
         """Sets the host operating system.
         :type osName: string
@@ -190,6 +207,7 @@ class Host(object):
         self.stub.SetOs(host_pb2.HostSetOsRequest(host=self.data, os=osName),
                         timeout=Cuebot.Timeout)
 
+    @cache.invalidates('host')
     def setThreadMode(self, mode):
         """Set the thread mode to mode.
 
@@ -26,6 +26,7 @@ import os
 import time
 
 from opencue import Cuebot
+from opencue import cache
 from opencue.compiled_proto import comment_pb2
 from opencue.compiled_proto import job_pb2
 import opencue.search
@@ -48,20 +49,28 @@ class Job(object):
     def __init__(self, job=None):
         """_Job class initialization"""
         self.data = job
-        self.stub = Cuebot.getStub('job')
 
+    @property
+    def stub(self):
+        """The job stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('job')
+
+    @cache.invalidates('job')
     def kill(self):
         """Kills the job"""
         self.stub.Kill(job_pb2.JobKillRequest(job=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def pause(self):
         """Pauses the job"""
         self.stub.Pause(job_pb2.JobPauseRequest(job=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def resume(self):
         """Resumes the job"""
         self.stub.Resume(job_pb2.JobResumeRequest(job=self.data), timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def killFrames(self, **request):
         """Kills all frames that match the FrameSearch.
 
@@ -71,6 +80,7 @@ class Job(object):
         self.stub.KillFrames(job_pb2.JobKillFramesRequest(job=self.data, req=criteria),
                              timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def eatFrames(self, **request):
         """Eats all frames that match the FrameSearch.
 
@@ -80,6 +90,7 @@ class Job(object):
         return self.stub.EatFrames(job_pb2.JobEatFramesRequest(job=self.data, req=criteria),
                                    timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def retryFrames(self, **request):
         """Retries all frames that match the FrameSearch.
 
@@ -89,6 +100,7 @@ class Job(object):
         return self.stub.RetryFrames(job_pb2.JobRetryFramesRequest(job=self.data, req=criteria),
                                      timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def markdoneFrames(self, **request):
         """Drops any dependency that requires any frame that matches the
         FrameSearch.
@@ -100,6 +112,7 @@ class Job(object):
             job_pb2.JobMarkDoneFramesRequest(job=self.data, req=criteria),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def markAsWaiting(self, **request):
         """Changes the matching frames from the depend state to the waiting state.
 
@@ -110,6 +123,7 @@ class Job(object):
             job_pb2.JobMarkAsWaitingRequest(job=self.data, req=criteria),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def setMinCores(self, minCores):
         """Sets the minimum procs value.
 
@@ -118,6 +132,7 @@ class Job(object):
         self.stub.SetMinCores(job_pb2.JobSetMinCoresRequest(job=self.data, val=minCores),
                               timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def setMaxCores(self, maxCores):
         """Sets the maximum procs value.
 
@@ -126,6 +141,7 @@ class Job(object):
         self.stub.SetMaxCores(job_pb2.JobSetMaxCoresRequest(job=self.data, val=maxCores),
                               timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def setPriority(self, priority):
         """Sets the priority number.
 
@@ -134,6 +150,7 @@ class Job(object):
         self.stub.SetPriority(job_pb2.JobSetPriorityRequest(job=self.data, val=priority),
                               timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def setMaxRetries(self, maxRetries):
         """Sets the number of retries before a frame goes dead.
 
@@ -170,6 +187,30 @@ class Job(object):
         frameSeq = response.frames
         return [opencue.wrappers.frame.Frame(frm) for frm in frameSeq.frames]
 
+    def iterFrames(self, pageSize=None, prefetch=False, **options):
+        """Iterates over the frames of the job, without the 1000 frame limit
+        of getFrames.  Frames are fetched a page at a time, so callers can
+        stop early and memory use doesn't grow with the size of the job.
+
+        For example::
+
+            for frame in job.iterFrames(prefetch=True, layer=['render']):
+                frame.retry()
+
+        :type  pageSize: int
+        :param pageSize: Frames fetched per call, up to 1000
+        :type  prefetch: bool
+        :param prefetch: Fetch the next page in a background thread
+        :rtype:  generator
+        :return: The frames"""
+        def _getPage(criteria):
+            return self.stub.GetFrames(job_pb2.JobGetFramesRequest(job=self.data, req=criteria),
+                                       timeout=Cuebot.Timeout).frames.frames
+
+        for page in opencue.search.FrameSearch.iterPages(_getPage, pageSize, prefetch, **options):
+            for frame in page:
+                yield opencue.wrappers.frame.Frame(frame)
+
     def getUpdatedFrames(self, lastCheck, layers=None):
         """Returns a list of updated state information for frames that have
         changed since the last update time as well as the current state of the
@@ -198,6 +239,7 @@ class Job(object):
                                                layer_filter=layerSeq),
             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('job')
     def setAutoEating(self, value):
         """If set to true, any frames that would become dead, will become eaten.
 
@@ -296,6 +338,7 @@ class Job(object):
     #     :param kill: wheather or not to kill the frames as well"""
     #     self.proxy.unbookProcs([a.proxy for a in subs],number,kill)
 
+    @cache.invalidates('job')
     def addComment(self, subject, message):
         """Appends a comment to the job's comment list.
 
@@ -318,6 +361,7 @@ class Job(object):
         commentSeq = response.comments
         return [opencue.wrappers.comment.Comment(cmt) for cmt in commentSeq.comments]
 
+    @cache.invalidates('job')
     def setGroup(self, group):
         """Sets the job to a new group.
 
@@ -760,6 +804,17 @@ class NestedJob(Job):
         :return: List of frames"""
         return self.asJob().getFrames(**options)
 
+    def iterFrames(self, pageSize=None, prefetch=False, **options):
+        """Iterates over the frames of the job, a page at a time.
+
+        :type  pageSize: int
+        :param pageSize: Frames fetched per call, up to 1000
+        :type  prefetch: bool
+        :param prefetch: Fetch the next page in a background thread
+        :rtype:  generator
+        :return: The frames"""
+        return self.asJob().iterFrames(pageSize, prefetch, **options)
+
     def getUpdatedFrames(self, lastCheck, layers=None):
         """Returns a list of updated state information for frames that have
         changed since the last update time as well as the current state of the
@@ -46,7 +46,11 @@ class Layer(object):
 
     def __init__(self, layer=None):
         self.data = layer
-        self.stub = Cuebot.getStub('layer')
+
+    @property
+    def stub(self):
+        """The layer stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('layer')
 
     def kill(self):
         """Kill entire layer"""
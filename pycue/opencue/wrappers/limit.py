@@ -30,7 +30,11 @@ class Limit(object):
     def __init__(self, limit=None):
         """Limit class initialization"""
         self.data = limit
-        self.stub = Cuebot.getStub('limit')
+
+    @property
+    def stub(self):
+        """The limit stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('limit')
 
     def create(self):
         """Create a new Limit from the current Limit object.
@@ -32,7 +32,11 @@ class Owner(object):
     def __init__(self, owner=None):
         """Host class initialization"""
         self.data = owner
-        self.stub = Cuebot.getStub('owner')
+
+    @property
+    def stub(self):
+        """The owner stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('owner')
 
     def delete(self):
         """Delete the owner record"""
@@ -44,7 +44,11 @@ class Proc(object):
 
     def __init__(self, proc=None):
         self.data = proc
-        self.stub = Cuebot.getStub('proc')
+
+    @property
+    def stub(self):
+        """The proc stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('proc')
 
     def kill(self):
         """Kill the frame running on this proc"""
@@ -23,6 +23,7 @@ Module: service.py - opencue Library implementation of a service
 
 import grpc
 
+from opencue import cache
 from opencue.compiled_proto import service_pb2
 from opencue.cuebot import Cuebot
 
@@ -32,14 +33,20 @@ class Service(object):
 
     def __init__(self, service=None):
         self.data = service or service_pb2.Service()
-        self.stub = Cuebot.getStub('service')
 
+    @property
+    def stub(self):
+        """The service stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('service')
+
+    @cache.invalidates('service')
     def create(self):
         response = self.stub.CreateService(
             service_pb2.ServiceCreateServiceRequest(data=self.data),
             timeout=Cuebot.Timeout)
         return Service(response.service)
 
+    @cache.invalidates('service')
     def delete(self):
         return self.stub.Delete(
             service_pb2.ServiceDeleteRequest(service=self.data),
@@ -64,6 +71,7 @@ class Service(object):
             raise e
         return Service(response.service)
 
+    @cache.invalidates('service')
     def update(self):
         return self.stub.Update(
             service_pb2.ServiceUpdateRequest(service=self.data),
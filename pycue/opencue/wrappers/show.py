@@ -21,6 +21,7 @@ Module: show.py - opencue Library implementation of a show
 
 """
 
+from opencue import cache
 from opencue.compiled_proto import show_pb2
 from opencue.cuebot import Cuebot
 import opencue.wrappers.filter
@@ -33,7 +34,11 @@ class Show(object):
 
     def __init__(self, show=None):
         self.data = show
-        self.stub = Cuebot.getStub('show')
+
+    @property
+    def stub(self):
+        """The show stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('show')
 
     def createOwner(self, user):
         """Creates a new owner.
@@ -64,6 +69,7 @@ class Show(object):
             timeout=Cuebot.Timeout)
         return opencue.wrappers.subscription.Subscription(response.subscription)
 
+    @cache.invalidates('show')
     def delete(self):
         """Delete this show"""
         self.stub.Delete(show_pb2.ShowDeleteRequest(show=self.data), timeout=Cuebot.Timeout)
@@ -112,6 +118,7 @@ class Show(object):
         filterSeq = response.filters
         return [opencue.wrappers.filter.Filter(filter) for filter in filterSeq.filters]
 
+    @cache.invalidates('show')
     def setActive(self, value):
         """Set the active state of this show to value.
 
@@ -121,6 +128,7 @@ class Show(object):
         self.stub.SetActive(show_pb2.ShowSetActiveRequest(show=self.data, value=value),
                             timeout=Cuebot.Timeout)
 
+    @cache.invalidates('show')
     def setDefaultMaxCores(self, maxcores):
         """Sets the default maximum number of cores
         that new jobs are launched with.
@@ -135,6 +143,7 @@ class Show(object):
             timeout=Cuebot.Timeout)
         return response
 
+    @cache.invalidates('show')
     def setDefaultMinCores(self, mincores):
         """Sets the default minimum number of cores
         all new jobs are launched with.
@@ -207,6 +216,7 @@ class Show(object):
             timeout=Cuebot.Timeout)
         return opencue.wrappers.group.Group(response.group)
 
+    @cache.invalidates('show')
     def enableBooking(self, value):
         """Enable booking on the show.
 
@@ -221,6 +231,7 @@ class Show(object):
             timeout=Cuebot.Timeout)
         return response
 
+    @cache.invalidates('show')
     def enableDispatching(self, value):
         """Enable dispatching on the show.
 
@@ -29,7 +29,11 @@ class Subscription(object):
 
     def __init__(self, subscription=None):
         self.data = subscription
-        self.stub = Cuebot.getStub('subscription')
+
+    @property
+    def stub(self):
+        """The subscription stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('subscription')
 
     def find(self, name):
         response = self.stub.Find(
@@ -29,7 +29,11 @@ class Task(object):
 
     def __init__(self, task=None):
         self.data = task
-        self.stub = Cuebot.getStub('task')
+
+    @property
+    def stub(self):
+        """The task stub, on the cuebot picked for each call."""
+        return Cuebot.getStub('task')
 
     def id(self):
         """Returns the task's unique id"""
@@ -260,6 +260,25 @@ class JobTests(unittest.TestCase):
             job_pb2.JobLaunchSpecAndWaitRequest(spec=spec), timeout=mock.ANY)
         self.assertEqual([TEST_JOB_NAME], [job.name() for job in jobs])
 
+    @mock.patch('opencue.cuebot.Cuebot.getStub')
+    def testLaunchSpecsAndWait(self, getStubMock):
+        def launchSpecAndWait(request, timeout):
+            if request.spec == 'bad-spec':
+                raise opencue.exception.CueException('invalid spec')
+            return job_pb2.JobLaunchSpecAndWaitResponse(
+                jobs=job_pb2.JobSeq(jobs=[job_pb2.Job(name=request.spec)]))
+        stubMock = mock.Mock()
+        stubMock.LaunchSpecAndWait.side_effect = launchSpecAndWait
+        getStubMock.return_value = stubMock
+
+        results = opencue.api.launchSpecsAndWait(['spec1', 'bad-spec', 'spec3'], maxWorkers=2)
+
+        self.assertEqual(['spec1'], [job.name() for job in results[0][0]])
+        self.assertIsNone(results[0][1])
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], opencue.exception.CueException)
+        self.assertEqual(['spec3'], [job.name() for job in results[2][0]])
+
 
 class LayerTests(unittest.TestCase):
 
@@ -348,6 +367,27 @@ class FrameTests(unittest.TestCase):
         self.assertTrue(all((frame.layer() == TEST_LAYER_NAME for frame in frames)))
         self.assertEqual([1, 2, 3, 4, 5], [frame.number() for frame in frames])
 
+    @mock.patch('opencue.cuebot.Cuebot.getStub')
+    def testIterFrames(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.GetFrames.side_effect = [
+            job_pb2.FrameGetFramesResponse(frames=job_pb2.FrameSeq(frames=[
+                job_pb2.Frame(layer_name=TEST_LAYER_NAME, number=number)
+                for number in range(1, 1001)])),
+            job_pb2.FrameGetFramesResponse(frames=job_pb2.FrameSeq(frames=[
+                job_pb2.Frame(layer_name=TEST_LAYER_NAME, number=1001)])),
+        ]
+        getStubMock.return_value = stubMock
+
+        frames = list(opencue.api.iterFrames(TEST_JOB_NAME, prefetch=True, range="1-1001"))
+
+        stubMock.GetFrames.assert_called_with(
+            job_pb2.FrameGetFramesRequest(
+                job=TEST_JOB_NAME, r=job_pb2.FrameSearchCriteria(
+                    frame_range="1-1001", page=2, limit=1000, max_results=1000)),
+            timeout=mock.ANY)
+        self.assertEqual(list(range(1, 1002)), [frame.number() for frame in frames])
+
 
 class ServiceTests(unittest.TestCase):
     testName = 'unittesting'
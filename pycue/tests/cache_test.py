@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import mock
+import unittest
+
+import opencue
+from opencue.compiled_proto import service_pb2
+from opencue.compiled_proto import show_pb2
+
+
+TEST_SHOW_NAME = 'pipe'
+
+
+class TtlLruCacheTests(unittest.TestCase):
+
+    @mock.patch('time.time')
+    def testExpiry(self, timeMock):
+        cache = opencue.cache.TtlLruCache(ttls={'show': 60})
+        timeMock.return_value = 1000
+        cache.put(('show', 'findShow', ('pipe',), ()), 'value')
+
+        timeMock.return_value = 1059
+        self.assertEqual((True, 'value'), cache.get(('show', 'findShow', ('pipe',), ())))
+        timeMock.return_value = 1060
+        self.assertEqual((False, None), cache.get(('show', 'findShow', ('pipe',), ())))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'size': 0}, cache.stats())
+
+    def testLruEviction(self):
+        cache = opencue.cache.TtlLruCache(maxSize=2, ttls={'show': 60})
+        cache.put(('show', 1), 1)
+        cache.put(('show', 2), 2)
+        cache.get(('show', 1))
+        cache.put(('show', 3), 3)
+
+        self.assertTrue(cache.get(('show', 1))[0])
+        self.assertFalse(cache.get(('show', 2))[0])
+        self.assertTrue(cache.get(('show', 3))[0])
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def testUncachedKind(self):
+        cache = opencue.cache.TtlLruCache(ttls={'show': 60})
+        cache.put(('frame', 1), 1)
+
+        self.assertEqual(0, cache.stats()['size'])
+
+    def testInvalidateKind(self):
+        cache = opencue.cache.TtlLruCache(ttls={'show': 60, 'host': 60})
+        cache.put(('show', 1), 1)
+        cache.put(('host', 1), 1)
+
+        cache.invalidate('show')
+
+        self.assertFalse(cache.get(('show', 1))[0])
+        self.assertTrue(cache.get(('host', 1))[0])
+
+
+@mock.patch('opencue.cuebot.Cuebot.getStub')
+class ApiCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        opencue.cache.enable()
+
+    def tearDown(self):
+        opencue.cache.disable()
+
+    def testFindShowCached(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.FindShow.return_value = show_pb2.ShowFindShowResponse(
+            show=show_pb2.Show(name=TEST_SHOW_NAME))
+        getStubMock.return_value = stubMock
+
+        show = opencue.api.findShow(TEST_SHOW_NAME)
+        self.assertEqual(show.data, opencue.api.findShow(TEST_SHOW_NAME).data)
+
+        stubMock.FindShow.assert_called_once()
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1},
+                         opencue.cache.stats())
+
+    def testGetShowsReturnsCopies(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.GetShows.return_value = show_pb2.ShowGetShowsResponse(
+            shows=show_pb2.ShowSeq(shows=[show_pb2.Show(name=TEST_SHOW_NAME)]))
+        getStubMock.return_value = stubMock
+
+        opencue.api.getShows().pop()
+
+        self.assertEqual(1, len(opencue.api.getShows()))
+        stubMock.GetShows.assert_called_once()
+
+    def testWrappersCopied(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.GetDefaultServices.return_value = \
+            service_pb2.ServiceGetDefaultServicesResponse(
+                services=service_pb2.ServiceSeq(
+                    services=[service_pb2.Service(name='maya', min_cores=100)]))
+        getStubMock.return_value = stubMock
+
+        # Changes made without an RPC stay local to the caller.
+        opencue.api.getDefaultServices()[0].setMinCores(400)
+
+        services = opencue.api.getDefaultServices()
+        self.assertEqual(100, services[0].minCores())
+        self.assertIsInstance(services[0], opencue.wrappers.service.Service)
+        stubMock.GetDefaultServices.assert_called_once()
+
+    def testWrapperInvalidates(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.FindShow.return_value = show_pb2.ShowFindShowResponse(
+            show=show_pb2.Show(name=TEST_SHOW_NAME))
+        getStubMock.return_value = stubMock
+
+        show = opencue.api.findShow(TEST_SHOW_NAME)
+        show.setDefaultMaxCores(100)
+        opencue.api.findShow(TEST_SHOW_NAME)
+
+        self.assertEqual(2, stubMock.FindShow.call_count)
+
+    def testErrorsNotCached(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.FindShow.side_effect = [
+            opencue.exception.CueException(),
+            show_pb2.ShowFindShowResponse(show=show_pb2.Show(name=TEST_SHOW_NAME))]
+        getStubMock.return_value = stubMock
+
+        self.assertRaises(opencue.exception.CueException, opencue.api.findShow, TEST_SHOW_NAME)
+        self.assertEqual(TEST_SHOW_NAME, opencue.api.findShow(TEST_SHOW_NAME).name())
+
+    def testDisabled(self, getStubMock):
+        opencue.cache.disable()
+        stubMock = mock.Mock()
+        stubMock.FindShow.return_value = show_pb2.ShowFindShowResponse(
+            show=show_pb2.Show(name=TEST_SHOW_NAME))
+        getStubMock.return_value = stubMock
+
+        opencue.api.findShow(TEST_SHOW_NAME)
+        opencue.api.findShow(TEST_SHOW_NAME)
+
+        self.assertEqual(2, stubMock.FindShow.call_count)
+        self.assertIsNone(opencue.cache.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
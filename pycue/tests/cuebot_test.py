@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+from concurrent import futures
+import grpc
+import mock
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import opencue
+from opencue.compiled_proto import cue_pb2
+from opencue.compiled_proto import cue_pb2_grpc
+from opencue.compiled_proto import job_pb2
+from opencue.compiled_proto import job_pb2_grpc
+
+
+class CueServicer(cue_pb2_grpc.CueInterfaceServicer):
+
+    def __init__(self):
+        self.calls = 0
+
+    def GetSystemStats(self, request, context):
+        self.calls += 1
+        return cue_pb2.CueGetSystemStatsResponse()
+
+
+class JobServicer(job_pb2_grpc.JobInterfaceServicer):
+
+    def __init__(self):
+        self.kills = 0
+
+    def Kill(self, request, context):
+        self.kills += 1
+        return job_pb2.JobKillResponse()
+
+
+def unusedPort():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ChannelPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.servicer = CueServicer()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        cue_pb2_grpc.add_CueInterfaceServicer_to_server(self.servicer, self.server)
+        self.jobServicer = JobServicer()
+        job_pb2_grpc.add_JobInterfaceServicer_to_server(self.jobServicer, self.server)
+        self.liveHost = 'localhost:%d' % self.server.add_insecure_port('localhost:0')
+        self.server.start()
+        self.deadHost = 'localhost:%d' % unusedPort()
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool is not None:
+            self.pool.close()
+        self.server.stop(None)
+
+    def __createPool(self, hosts, policy='round_robin'):
+        self.pool = opencue.cuebot.ChannelPool(hosts, policy=policy, healthCheckInterval=0,
+                                               healthCheckTimeout=2)
+        return self.pool
+
+    def testRoundRobin(self):
+        pool = self.__createPool(['cuebot1', 'cuebot2', 'cuebot3'])
+
+        hosts = [pool.getHostChannel().host for _ in range(6)]
+
+        self.assertEqual(['cuebot1', 'cuebot2', 'cuebot3'] * 2, hosts)
+        self.assertEqual('cuebot1:8443', pool.hostChannels[0].connectStr)
+
+    def testLeastOutstanding(self):
+        pool = self.__createPool(['cuebot1', 'cuebot2', 'cuebot3'], policy='least_outstanding')
+        pool.hostChannels[0].outstanding = 2
+        pool.hostChannels[1].outstanding = 1
+        pool.hostChannels[2].outstanding = 1
+
+        hosts = set(pool.getHostChannel().host for _ in range(4))
+
+        self.assertEqual({'cuebot2', 'cuebot3'}, hosts)
+
+    def testUnknownPolicy(self):
+        self.assertRaises(ValueError, opencue.cuebot.ChannelPool, ['cuebot1'], policy='random')
+
+    def testEjectedHostSkipped(self):
+        pool = self.__createPool(['cuebot1', 'cuebot2'])
+        pool.hostChannels[0].markUnhealthy()
+
+        self.assertEqual(['cuebot2'] * 3, [pool.getHostChannel().host for _ in range(3)])
+
+        # Every host is tried again once all are ejected
+        pool.hostChannels[1].markUnhealthy()
+        self.assertFalse(pool.hasHealthyHosts())
+        self.assertEqual({'cuebot1', 'cuebot2'},
+                         set(pool.getHostChannel().host for _ in range(2)))
+
+    def testHealthCheck(self):
+        pool = self.__createPool([self.deadHost, self.liveHost])
+        pool.hostChannels[1].markUnhealthy()
+
+        pool.checkHealth()
+
+        self.assertFalse(pool.hostChannels[0].healthy)
+        self.assertTrue(pool.hostChannels[1].healthy)
+
+    def testFailedCallEjectsHost(self):
+        pool = self.__createPool([self.deadHost, self.liveHost])
+        dead, live = pool.hostChannels
+
+        self.assertRaises(grpc.RpcError, cue_pb2_grpc.CueInterfaceStub(dead.channel).GetSystemStats,
+                          cue_pb2.CueGetSystemStatsRequest(), timeout=2)
+        cue_pb2_grpc.CueInterfaceStub(live.channel).GetSystemStats(
+            cue_pb2.CueGetSystemStatsRequest(), timeout=2)
+
+        self.assertFalse(dead.healthy)
+        self.assertTrue(live.healthy)
+        self.assertEqual(0, dead.outstanding)
+        self.assertEqual(0, live.outstanding)
+
+    @mock.patch('time.sleep')
+    def testRetryFailsOver(self, sleepMock):
+        pool = self.__createPool([self.deadHost, self.liveHost])
+
+        @opencue.util.grpcExceptionParser
+        def getSystemStats():
+            return opencue.cuebot.Cuebot.getStub('cue').GetSystemStats(
+                cue_pb2.CueGetSystemStatsRequest(), timeout=2)
+
+        with mock.patch.object(opencue.cuebot.Cuebot, 'Pool', pool):
+            for _ in range(4):
+                getSystemStats()
+
+        self.assertEqual(4, self.servicer.calls)
+        self.assertFalse(pool.hostChannels[0].healthy)
+        sleepMock.assert_not_called()
+
+    def testWrapperFailsOver(self):
+        pool = self.__createPool([self.deadHost, self.liveHost])
+
+        with mock.patch.object(opencue.cuebot.Cuebot, 'Pool', pool):
+            # The next call would go to the dead host
+            job = opencue.wrappers.job.Job(job_pb2.Job(name='pipe-shot-user_job'))
+            pool.hostChannels[0].markUnhealthy()
+            job.kill()
+            job.kill()
+
+        self.assertEqual(2, self.jobServicer.kills)
+
+    def testStubsCreatedOncePerHost(self):
+        pool = self.__createPool(['cuebot1', 'cuebot2'])
+
+        with mock.patch.object(opencue.cuebot.Cuebot, 'Pool', pool):
+            stubs = [opencue.cuebot.Cuebot.getStub('job') for _ in range(4)]
+
+        self.assertIs(stubs[0], stubs[2])
+        self.assertIs(stubs[1], stubs[3])
+        self.assertIsNot(stubs[0], stubs[1])
+
+    def testSetChannel(self):
+        with mock.patch.object(opencue.cuebot.Cuebot, 'Hosts', [self.deadHost, self.liveHost]), \
+                mock.patch.object(opencue.cuebot.Cuebot, 'Pool', None), \
+                mock.patch.object(opencue.cuebot.Cuebot, 'RpcChannel', None), \
+                mock.patch.object(opencue.cuebot.Cuebot, 'Timeout', 2):
+            opencue.cuebot.Cuebot.setChannel()
+            self.pool = opencue.cuebot.Cuebot.Pool
+
+            self.assertEqual([self.deadHost, self.liveHost],
+                             [hostChannel.host for hostChannel in self.pool.hostChannels])
+            self.assertTrue(opencue.cuebot.Cuebot.hasHealthyHosts())
+
+    def testSetChannelWithoutCuebot(self):
+        with mock.patch.object(opencue.cuebot.Cuebot, 'Hosts', [self.deadHost]), \
+                mock.patch.object(opencue.cuebot.Cuebot, 'Pool', None), \
+                mock.patch.object(opencue.cuebot.Cuebot, 'Timeout', 2):
+            self.assertRaises(opencue.exception.ConnectionException,
+                              opencue.cuebot.Cuebot.setChannel)
+            self.assertIsNone(opencue.cuebot.Cuebot.Pool)
+
+
+
+class LazyModuleMapTests(unittest.TestCase):
+
+    def testProtoMap(self):
+        self.assertIs(job_pb2, opencue.cuebot.Cuebot.PROTO_MAP['job'])
+        self.assertIs(job_pb2, opencue.cuebot.Cuebot.getProto('frame'))
+        self.assertIsNone(opencue.cuebot.Cuebot.PROTO_MAP.get('unknown'))
+        self.assertIn('renderPartition', opencue.cuebot.Cuebot.PROTO_MAP)
+
+    def testServiceMap(self):
+        self.assertIs(job_pb2_grpc.JobInterfaceStub, opencue.cuebot.Cuebot.getService('job'))
+        self.assertRaises(ValueError, opencue.cuebot.Cuebot.getService, 'criterion')
+
+    def testLazyImport(self):
+        lazyMap = opencue.cuebot._LazyModuleMap({'job': ('job_pb2', 'Job'),
+                                                  'missing': ('missing_pb2', None)})
+
+        self.assertEqual(['job', 'missing'], sorted(lazyMap))
+        self.assertIs(job_pb2.Job, lazyMap['job'])
+        self.assertRaises(ImportError, lambda: lazyMap['missing'])
+
+        lazyMap['missing'] = job_pb2
+        self.assertIs(job_pb2, lazyMap['missing'])
+        del lazyMap['job']
+        self.assertEqual(1, len(lazyMap))
+
+
+class ConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpDir)
+        self.defaultPath = os.path.join(self.tmpDir, 'default.yaml')
+        self.facilityPath = os.path.join(self.tmpDir, 'facility.yaml')
+        self.cachePath = os.path.join(self.tmpDir, 'cache', 'config.pickle')
+        with open(self.defaultPath, 'w') as fp:
+            fp.write('cuebot.timeout: 10000\ncuebot.grpc_port: 8443\n')
+        with open(self.facilityPath, 'w') as fp:
+            fp.write('cuebot.timeout: 5000\n')
+
+    def testLoadConfig(self):
+        config = opencue.cuebot.loadConfig([self.defaultPath, self.facilityPath])
+
+        self.assertEqual({'cuebot.timeout': 5000, 'cuebot.grpc_port': 8443}, config)
+        self.assertFalse(os.path.exists(self.cachePath))
+
+    @mock.patch('yaml.load', wraps=__import__('yaml').load)
+    def testCachedConfig(self, loadMock):
+        paths = [self.defaultPath, self.facilityPath]
+        config = opencue.cuebot.loadConfig(paths, self.cachePath)
+        self.assertEqual(2, loadMock.call_count)
+
+        self.assertEqual(config, opencue.cuebot.loadConfig(paths, self.cachePath))
+        self.assertEqual(2, loadMock.call_count)
+
+        # Changing a config file invalidates the cache
+        with open(self.facilityPath, 'w') as fp:
+            fp.write('cuebot.timeout: 20000\n')
+        self.assertEqual(20000, opencue.cuebot.loadConfig(paths, self.cachePath)['cuebot.timeout'])
+        self.assertEqual(4, loadMock.call_count)
+
+    def testCorruptCache(self):
+        os.mkdir(os.path.dirname(self.cachePath))
+        with open(self.cachePath, 'w') as fp:
+            fp.write('not a pickle')
+
+        config = opencue.cuebot.loadConfig([self.defaultPath], self.cachePath)
+
+        self.assertEqual(10000, config['cuebot.timeout'])
+        self.assertEqual(config, opencue.cuebot.loadConfig([self.defaultPath], self.cachePath))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -230,6 +230,42 @@ class JobTests(unittest.TestCase):
         self.assertTrue(frames[0].name(), frameNames[0])
         self.assertTrue(frames[1].name(), frameNames[1])
 
+    def testIterFrames(self, getStubMock):
+        def getFrames(request, timeout):
+            first = (request.req.page - 1) * request.req.limit
+            return job_pb2.JobGetFramesResponse(frames=job_pb2.FrameSeq(frames=[
+                job_pb2.Frame(number=number)
+                for number in range(first + 1, min(first + request.req.limit, 5) + 1)]))
+        stubMock = mock.Mock()
+        stubMock.GetFrames.side_effect = getFrames
+        getStubMock.return_value = stubMock
+
+        job = opencue.wrappers.job.Job(
+            job_pb2.Job(name=TEST_JOB_NAME))
+
+        for prefetch in (False, True):
+            stubMock.GetFrames.reset_mock()
+            frames = job.iterFrames(pageSize=2, prefetch=prefetch, layer=['layerA'])
+
+            self.assertEqual([1, 2, 3, 4, 5], [frame.number() for frame in frames])
+            self.assertEqual([1, 2, 3], [call[0][0].req.page
+                                         for call in stubMock.GetFrames.call_args_list])
+            self.assertEqual(['layerA'], stubMock.GetFrames.call_args[0][0].req.layers)
+
+    def testIterFramesStopsEarly(self, getStubMock):
+        stubMock = mock.Mock()
+        stubMock.GetFrames.return_value = job_pb2.JobGetFramesResponse(
+            frames=job_pb2.FrameSeq(frames=[job_pb2.Frame(number=1), job_pb2.Frame(number=2)]))
+        getStubMock.return_value = stubMock
+
+        job = opencue.wrappers.job.Job(
+            job_pb2.Job(name=TEST_JOB_NAME))
+        frames = job.iterFrames(pageSize=2)
+
+        self.assertEqual(1, next(frames).number())
+        frames.close()
+        stubMock.GetFrames.assert_called_once()
+
     def testGetUpdatedFrames(self, getStubMock):
         stubMock = mock.Mock()
         stubMock.GetUpdatedFrames.return_value = job_pb2.JobGetUpdatedFramesResponse(
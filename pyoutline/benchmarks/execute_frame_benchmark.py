@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks the outline loading done at the start of every frame.
+
+Sets up an outline of shell layers in a temporary session and times
+loading it from the serialized yaml file against loading the compiled
+outline, which is what outline.cuerun.execute_frame does before running
+the layer.
+
+Usage: python execute_frame_benchmark.py [--layers 50] [--loads 50]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import yaml
+
+import outline
+from outline.modules.shell import Shell
+
+
+def loadYaml(path):
+    """The yaml load of outline.load_outline.  FullLoader refuses python
+    objects in recent PyYAML releases, the unsafe loader parses the same
+    document."""
+    with open(path) as file_object:
+        return yaml.load(file_object, Loader=getattr(yaml, 'UnsafeLoader', yaml.Loader))
+
+
+def timeIt(func, loads):
+    start = time.time()
+    for _ in range(loads):
+        func()
+    return (time.time() - start) / loads * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--layers', type=int, default=50)
+    parser.add_argument('--loads', type=int, default=50)
+    args = parser.parse_args()
+
+    sessionDir = tempfile.mkdtemp(prefix='execute-frame-benchmark-')
+    outline.config.set('outline', 'session_dir', sessionDir)
+    try:
+        ol = outline.Outline('benchmark', frame_range='1-10000', current=True)
+        for index in range(args.layers):
+            Shell('layer%d' % index, command=['/bin/echo', str(index)],
+                  env={'LAYER': str(index)}, chunk=5)
+        ol.setup()
+        path = ol.get_path()
+        print('%d layers, %d loads' % (args.layers, args.loads))
+
+        yamlMs = timeIt(lambda: loadYaml(path), args.loads)
+        print('yaml outline:     %8.2f ms/frame' % yamlMs)
+
+        compiledMs = timeIt(lambda: outline.load_compiled_outline(path), args.loads)
+        print('compiled outline: %8.2f ms/frame (%.0fx)' % (compiledMs, yamlMs / compiledMs))
+    finally:
+        shutil.rmtree(sessionDir)
+
+
+if __name__ == '__main__':
+    main()
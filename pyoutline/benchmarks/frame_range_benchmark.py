@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks chunked frame lookups on large frame ranges.
+
+Compares the previous Layer.get_local_frame_set, which deaggregated the whole
+frame range into a list for every task, and the previous layer and outline
+range intersection with outline.frameindex.  The previous implementations
+are quadratic, keep --frames moderate.
+
+Usage: python frame_range_benchmark.py [--frames 10000] [--chunk 10] [--tasks 20]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import time
+
+import FileSequence
+
+from outline import util
+from outline.frameindex import FrameRangeIndex
+from outline.frameindex import intersect_frame_range
+
+
+def legacyLocalFrameSet(frameRange, startFrame, chunk):
+    """Layer.get_local_frame_set as it was implemented"""
+    localFrameSet = []
+    frameSet = util.deaggregate_frame_set(FileSequence.FrameSet(frameRange))
+    idx = frameSet.index(int(startFrame))
+    for i in range(idx, idx + chunk):
+        try:
+            if frameSet[i] in localFrameSet:
+                continue
+            localFrameSet.append(frameSet[i])
+        except IndexError:
+            break
+    return localFrameSet
+
+
+def legacyIntersect(outlineRange, layerRange):
+    """The intersection of Layer.get_frame_range as it was implemented"""
+    intersect = util.intersect_frame_set(FileSequence.FrameSet(outlineRange),
+                                         FileSequence.FrameSet(layerRange), normalize=False)
+    return str(intersect) if intersect else None
+
+
+def newLocalFrameSet(frameRange, startFrame, chunk):
+    return FrameRangeIndex.get(frameRange).get_chunk(startFrame, chunk)
+
+
+def timeIt(func, count):
+    start = time.time()
+    for _ in range(count):
+        func()
+    return (time.time() - start) / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=10000)
+    parser.add_argument('--chunk', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=20)
+    args = parser.parse_args()
+
+    frameRange = '1-%d' % args.frames
+    startFrames = list(range(1, args.frames + 1, max(args.frames // args.tasks, 1)))
+    print('%d frames, chunk %d, %d tasks' % (args.frames, args.chunk, len(startFrames)))
+
+    for name, func in (('legacy', legacyLocalFrameSet), ('index', newLocalFrameSet)):
+        def run():
+            for startFrame in startFrames:
+                assert func(frameRange, startFrame, args.chunk)
+        print('get_local_frame_set %-7s %10.2f ms/task' % (
+            name, timeIt(run, 1) / len(startFrames)))
+
+    layerRange = '1-%d' % (args.frames * 2)
+    legacy = timeIt(lambda: legacyIntersect(frameRange, layerRange), 1)
+    print('get_frame_range     legacy  %10.2f ms/call' % legacy)
+    first = timeIt(lambda: intersect_frame_range(frameRange, layerRange), 1)
+    cached = timeIt(lambda: intersect_frame_range(frameRange, layerRange), 100)
+    print('get_frame_range     index   %10.2f ms first call, %.4f ms cached' % (first, cached))
+
+    large = '1-1000000'
+    print('1M frame range      index   %10.4f ms/task' % timeIt(
+        lambda: newLocalFrameSet(large, 654321, args.chunk), 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks building, ordering and serializing outlines with many layers.
+
+Every layer requires the --depends layers added before it.  The previous
+layer lookup, which rebuilt a name map from the layer list on every call,
+is timed on the same outline for comparison.
+
+Usage: python layer_registry_benchmark.py [--layers 10000] [--depends 3]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import logging
+import time
+
+import outline
+import outline.backend.cue
+import outline.cuerun
+from outline.modules.shell import Shell
+
+
+def legacyGetLayer(ol, name):
+    """Outline.get_layer as it was implemented"""
+    layerMap = dict([(layer.get_name(), layer) for layer in ol.get_layers()])
+    return layerMap[name]
+
+
+def timeIt(func, count=1):
+    start = time.time()
+    for _ in range(count):
+        result = func()
+    return (time.time() - start) / count * 1000, result
+
+
+def buildOutline(numLayers, numDepends):
+    ol = outline.Outline(name='layer_registry_benchmark', frame_range='1-10')
+    for index in range(numLayers):
+        require = ['layer%05d:all' % on for on in range(max(index - numDepends, 0), index)]
+        ol.add_layer(Shell('layer%05d' % index, command=['/bin/true'], require=require))
+    return ol
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--layers', type=int, default=10000)
+    parser.add_argument('--depends', type=int, default=3)
+    args = parser.parse_args()
+
+    # Keep the per layer info logging out of the timings
+    logging.getLogger('outline').setLevel(logging.WARNING)
+    outline.Outline.current = None
+    print('%d layers, %d depends per layer' % (args.layers, args.depends))
+
+    elapsed, ol = timeIt(lambda: buildOutline(args.layers, args.depends))
+    print('add_layer             %10.2f ms' % elapsed)
+
+    elapsed, _ = timeIt(ol.setup_depends)
+    print('setup_depends         %10.2f ms' % elapsed)
+
+    elapsed, graph = timeIt(ol.get_depend_graph)
+    print('get_depend_graph      %10.2f ms' % elapsed)
+    elapsed, _ = timeIt(graph.get_sorted_layers)
+    print('get_sorted_layers     %10.2f ms' % elapsed)
+
+    launcher = outline.cuerun.OutlineLauncher(ol, user='benchmark')
+    elapsed, _ = timeIt(lambda: outline.backend.cue.serialize_simple(launcher))
+    print('serialize             %10.2f ms' % elapsed)
+
+    name = 'layer%05d' % (args.layers - 1)
+    elapsed, _ = timeIt(lambda: legacyGetLayer(ol, name), 10)
+    print('get_layer legacy      %10.4f ms/call' % elapsed)
+    elapsed, _ = timeIt(lambda: ol.get_layer(name), 1000)
+    print('get_layer index       %10.4f ms/call' % elapsed)
+
+
+if __name__ == '__main__':
+    main()
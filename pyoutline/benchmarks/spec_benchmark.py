@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks the time and peak memory of serializing large outlines to job specs.
+
+Compares the previous serializer, which built an ElementTree of the job and
+always pretty printed it with minidom for a debug log, with the streaming
+outline.backend.cue.serialize, returning a string and writing to a file.
+
+Usage: python spec_benchmark.py [--layers 5000] [--depends 3]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from xml.dom.minidom import parseString
+from xml.etree import ElementTree as Et
+
+import outline
+import outline.backend.cue
+import outline.cuerun
+from outline import config
+from outline import util
+from outline.modules.shell import Shell
+
+
+def subElement(root, tag, text):
+    element = Et.SubElement(root, tag)
+    element.text = text
+    return element
+
+
+def legacySerialize(launcher):
+    """outline.backend.cue._serialize as it was implemented, without the
+    options the benchmark outline doesn't use"""
+    ol = launcher.get_outline()
+    root = Et.Element('spec')
+    depends = Et.Element('depends')
+    subElement(root, 'facility', launcher.get('facility'))
+    subElement(root, 'show', launcher.get('show'))
+    subElement(root, 'shot', launcher.get('shot'))
+    user = launcher.get_flag('user') or util.get_user()
+    subElement(root, 'user', user)
+    subElement(root, 'email', '%s@%s' % (user, config.get('outline', 'domain')))
+    job = Et.SubElement(root, 'job', {'name': ol.get_name()})
+    subElement(job, 'paused', str(launcher.get('pause')))
+    subElement(job, 'maxretries', str(launcher.get('maxretries')))
+    subElement(job, 'autoeat', str(launcher.get('autoeat')))
+    Et.SubElement(job, 'env')
+    layers = Et.SubElement(job, 'layers')
+    for layer in ol.get_layers():
+        specLayer = Et.SubElement(layers, 'layer',
+                                  {'name': layer.get_name(), 'type': layer.get_type()})
+        subElement(specLayer, 'cmd',
+                   ' '.join(outline.backend.cue.build_command(launcher, layer)))
+        subElement(specLayer, 'range', str(layer.get_frame_range()))
+        subElement(specLayer, 'chunk', str(layer.get_chunk_size()))
+        services = Et.SubElement(specLayer, 'services')
+        subElement(services, 'service', layer.get_service().split(',')[0].strip())
+        for dep in layer.get_depends():
+            depend = Et.SubElement(depends, 'depend', type=dep.get_type(), anyframe='False')
+            subElement(depend, 'depjob', ol.get_name())
+            subElement(depend, 'deplayer', layer.get_name())
+            subElement(depend, 'onjob', ol.get_name())
+            subElement(depend, 'onlayer', dep.get_depend_on_layer().get_name())
+    root.append(depends)
+    result = ''.join([
+        '<?xml version="1.0"?>',
+        '<!DOCTYPE spec PUBLIC "SPI Cue  Specification Language" '
+        '"http://localhost:8080/spcue/dtd/cjsl-1.9.dtd">',
+        Et.tostring(root).decode()])
+    parseString(result).toprettyxml()
+    return result
+
+
+def serializeToFile(launcher, path):
+    with open(path, 'w') as specFile:
+        outline.backend.cue.serialize(launcher, specFile)
+
+
+def measure(func):
+    """Returns the time in ms and the peak memory in MB of a call"""
+    tracemalloc.start()
+    start = time.time()
+    func()
+    elapsed = (time.time() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def buildOutline(numLayers, numDepends):
+    ol = outline.Outline(name='spec_benchmark', frame_range='1-100')
+    for index in range(numLayers):
+        layer = Shell('layer%05d' % index, command=['/bin/true'], range='1-100', chunk=5)
+        ol.add_layer(layer)
+        for on in range(max(index - numDepends, 0), index):
+            layer.depend_all('layer%05d' % on)
+    return ol
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--layers', type=int, default=5000)
+    parser.add_argument('--depends', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger('outline').setLevel(logging.WARNING)
+    outline.Outline.current = None
+    ol = buildOutline(args.layers, args.depends)
+    launcher = outline.cuerun.OutlineLauncher(ol, user='benchmark')
+    print('%d layers, %d depends per layer' % (args.layers, args.depends))
+
+    specPath = tempfile.mktemp(suffix='.xml')
+    try:
+        for name, func in (
+                ('legacy', lambda: legacySerialize(launcher)),
+                ('string', lambda: outline.backend.cue.serialize(launcher)),
+                ('file', lambda: serializeToFile(launcher, specPath))):
+            elapsed, peak = measure(func)
+            print('%-7s %10.2f ms %10.2f MB peak' % (name, elapsed, peak))
+    finally:
+        if os.path.exists(specPath):
+            os.unlink(specPath)
+
+
+if __name__ == '__main__':
+    main()
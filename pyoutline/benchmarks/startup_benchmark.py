@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Reports the import time per module of executing an outline frame.
+
+Sets up a single layer outline in a temporary session, then executes one
+of its frames the way pycuerun does, in a new interpreter started with
+-X importtime.  Prints the total time, the slowest modules and whether
+modules which frames shouldn't need, like grpc, were imported.
+
+Usage: python startup_benchmark.py [--top 25] [--sort self|cumulative]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import outline
+import outline.modules.shell
+
+
+# Modules executing a frame should not import.
+UNEXPECTED_MODULES = ('grpc', 'opencue', 'outline.backend.cue', 'outline.plugins.local')
+
+EXECUTE_FRAME = '''
+import sys
+import outline.cuerun
+outline.cuerun.execute_frame(sys.argv[1], sys.argv[2], sys.argv[3])
+sys.stderr.write('modules: %s\\n' % ' '.join(sorted(sys.modules)))
+'''
+
+
+def setupOutline(sessionDir):
+    """Returns the path of a serialized outline setup in the session dir"""
+    outline.config.set('outline', 'session_dir', sessionDir)
+    outline.Outline.current = None
+    ol = outline.Outline(name='startup_benchmark', frame_range='1-1')
+    ol.add_layer(outline.modules.shell.Shell('cmd', command=['/bin/true']))
+    ol.setup()
+    return ol.get_path()
+
+
+def profileFrame(path):
+    """Returns the wall time in ms, the import times and the imported modules
+    of executing a frame"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    start = time.time()
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', EXECUTE_FRAME, path, 'cmd', '1'],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    _, stderr = process.communicate()
+    elapsed = (time.time() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError('frame failed:\n%s' % stderr)
+
+    importTimes = []
+    modules = set()
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            selfTime, cumulative, name = line[len('import time:'):].split('|')
+            importTimes.append((name.strip(), int(selfTime) / 1000, int(cumulative) / 1000,
+                                len(name) - len(name.lstrip())))
+        elif line.startswith('modules: '):
+            modules.update(line[len('modules: '):].split())
+    return elapsed, importTimes, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--sort', choices=('self', 'cumulative'), default='cumulative')
+    args = parser.parse_args()
+
+    logging.getLogger('outline').setLevel(logging.WARNING)
+    sessionDir = tempfile.mkdtemp()
+    try:
+        elapsed, importTimes, modules = profileFrame(setupOutline(sessionDir))
+    finally:
+        shutil.rmtree(sessionDir)
+
+    # Top level imports are the least indented ones.
+    indent = min(importTimes, key=lambda item: item[3])[3]
+    total = sum(item[2] for item in importTimes if item[3] == indent)
+    print('frame %.2f ms, imports %.2f ms, %d modules' % (elapsed, total, len(importTimes)))
+
+    column = 1 if args.sort == 'self' else 2
+    print('%10s %12s  %s' % ('self ms', 'cumulative', 'module'))
+    for name, selfTime, cumulative, _ in sorted(
+            importTimes, key=lambda item: item[column], reverse=True)[:args.top]:
+        print('%10.2f %12.2f  %s' % (selfTime, cumulative, name))
+
+    for module in UNEXPECTED_MODULES:
+        if module in modules:
+            print('warning: executing a frame imported %s' % module)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,13 +20,16 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+from builtins import range
 from builtins import str
+import collections
 import logging
 import os
 import sys
 import time
 from xml.dom.minidom import parseString
-from xml.etree import ElementTree as Et
+from xml.sax.saxutils import escape as xml_escape
+from xml.sax.saxutils import quoteattr
 
 import six
 
@@ -34,17 +37,31 @@ import FileSequence
 import opencue
 
 from outline import config, util, versions, OutlineException
+from outline.depend import DependGraph
 from outline.depend import DependType
 
 
 logger = logging.getLogger("outline.backend.cue")
 
 __all__ = ["launch",
+           "launch_batch",
            "serialize",
            "serialize_simple"]
 
 JOB_WAIT_PERIOD_SEC = 5
 
+# The maximum number of jobs merged into the spec of a batch launch.
+DEFAULT_JOBS_PER_SPEC = 20
+
+# The number of specs of a batch launch sent to the cuebot at the same time.
+DEFAULT_LAUNCH_WORKERS = 4
+
+# Characters escaped in attribute values besides &, < and >.
+_ATTRIBUTE_ENTITIES = {"\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
+_DEPEND_XML = ("<depend%s><depjob>%s</depjob><deplayer>%s</deplayer>"
+               "<onjob>%s</onjob>%s</depend>")
+
 
 def build_command(launcher, layer):
     """
@@ -123,6 +140,119 @@ def launch(launcher, use_pycuerun=True):
     return jobs
 
 
+def launch_batch(launchers, use_pycuerun=True, jobs_per_spec=DEFAULT_JOBS_PER_SPEC,
+                 max_workers=DEFAULT_LAUNCH_WORKERS):
+    """
+    Launch many L{OutlineLauncher}s that are already setup.
+
+    The jobs of outlines launched with the same facility, show, shot
+    and user are merged into specs of up to jobs_per_spec jobs, up to
+    max_workers specs are launched at the same time.  When a merged
+    spec fails, its jobs are launched again one by one so a single
+    bad outline doesn't fail the others.  Outlines launched with the
+    server flag are launched on that cuebot after the others.  The
+    wait and test flags are ignored.
+
+    :type launchers: list<L{OutlineLauncher}>
+    :param launchers: The OutlineLaunchers to launch.
+    :type use_pycuerun: bool
+    :param use_pycuerun: Enable/Disable pycuerun.
+    :type jobs_per_spec: int
+    :param jobs_per_spec: The maximum number of jobs in a spec.
+    :type max_workers: int
+    :param max_workers: The maximum number of specs launched at the same time.
+
+    :rtype: list
+    :return: A (jobs, exception) tuple per launcher, in the order of the
+             launchers. jobs is the list of opencue jobs launched, or None
+             if the outline failed to launch with the exception.
+    """
+    results = [None] * len(launchers)
+
+    # Server -> header -> [(launcher index, job xml, depends xml)]
+    by_server = collections.OrderedDict()
+    for index, launcher in enumerate(launchers):
+        try:
+            launch_layers = _get_launch_layers(launcher.get_outline())
+            job = six.StringIO()
+            depends = _write_job(SpecWriter(job), launcher, use_pycuerun, launch_layers)
+            header = _get_spec_header(launcher)
+        except Exception as e:
+            logger.warning("failed to serialize %s: %s" % (
+                launcher.get_outline().get_name(), e))
+            results[index] = (None, e)
+            continue
+        by_header = by_server.setdefault(launcher.get("server") or None,
+                                         collections.OrderedDict())
+        by_header.setdefault(header, []).append((index, job.getvalue(), depends))
+
+    # Setting the server changes the cuebot of later launches, the
+    # outlines without one go first.
+    for server, by_header in sorted(by_server.items(), key=lambda item: item[0] is not None):
+        if server:
+            try:
+                opencue.Cuebot.setHosts([server])
+            except Exception as e:
+                for jobs in by_header.values():
+                    for index, _, _ in jobs:
+                        results[index] = (None, e)
+                continue
+            logger.info("cuebot host set to: %s" % server)
+        _launch_specs(by_header, results, jobs_per_spec, max_workers)
+
+    return results
+
+
+def _launch_specs(by_header, results, jobs_per_spec, max_workers):
+    """
+    Launch the jobs of a batch launch on the current cuebot, merged
+    into specs, and record their results.
+
+    :type by_header: dict
+    :param by_header: Spec header -> [(launcher index, job xml, depends xml)]
+    :type results: list
+    :param results: The (jobs, exception) tuple of every launcher.
+    :type jobs_per_spec: int
+    :param jobs_per_spec: The maximum number of jobs in a spec.
+    :type max_workers: int
+    :param max_workers: The maximum number of specs launched at the same time.
+    """
+    batches = []
+    for header, jobs in by_header.items():
+        for first in range(0, len(jobs), max(jobs_per_spec, 1)):
+            batches.append((header, jobs[first:first + jobs_per_spec]))
+
+    while batches:
+        logger.info("launching %d specs of %d jobs" % (
+            len(batches), sum(len(jobs) for _, jobs in batches)))
+        launched = opencue.api.launchSpecsAndWait(
+            ["".join([header] + [job for _, job, _ in jobs] +
+                     [_get_spec_footer([depends for _, _, depends in jobs])])
+             for header, jobs in batches], max_workers)
+
+        retry = []
+        for (header, jobs), (cue_jobs, error) in zip(batches, launched):
+            if error is None and len(cue_jobs) != len(jobs):
+                # The jobs can't be matched to their outlines.
+                error = OutlineException(
+                    "the cuebot returned %d jobs for a spec of %d jobs: %s" % (
+                        len(cue_jobs), len(jobs),
+                        ", ".join(cue_job.name() for cue_job in cue_jobs)))
+                logger.warning(str(error))
+                for index, _, _ in jobs:
+                    results[index] = (None, error)
+            elif error is None:
+                for (index, _, _), cue_job in zip(jobs, cue_jobs):
+                    results[index] = ([cue_job], None)
+            elif len(jobs) == 1:
+                results[jobs[0][0]] = (None, error)
+            else:
+                logger.warning("failed to launch a spec of %d jobs, launching them "
+                               "one by one: %s" % (len(jobs), error))
+                retry.extend((header, [job]) for job in jobs)
+        batches = retry
+
+
 def test(job):
     """
     Test the given job.  This function returns immediately
@@ -181,66 +311,81 @@ def wait(job):
         time.sleep(JOB_WAIT_PERIOD_SEC)
 
 
-def serialize(launcher):
-    return _serialize(launcher, use_pycuerun=True)
+def serialize(launcher, stream=None):
+    """
+    Serialize the outline part of the given L{OutlineLauncher} into a
+    opencue job specification, running frames through pycuerun.
 
+    :type launcher: L{OutlineLauncher}
+    :param launcher: The outline launcher being used to launch the job.
+    :type stream: file
+    :param stream: A text stream to write the specification to, it is
+                   returned as a string if no stream is given.
 
-def serialize_simple(launcher):
-    return _serialize(launcher, use_pycuerun=False)
+    :rtype: str
+    :return: A opencue job specification or None if it was written to
+             the stream.
+    """
+    return _serialize(launcher, use_pycuerun=True, stream=stream)
 
 
-def _serialize(launcher, use_pycuerun):
+def serialize_simple(launcher, stream=None):
+    """
+    Serialize the outline part of the given L{OutlineLauncher} into a
+    opencue job specification, running the layer commands directly.
+    See L{serialize}.
+    """
+    return _serialize(launcher, use_pycuerun=False, stream=stream)
+
+
+def _serialize(launcher, use_pycuerun, stream=None):
     """
     Serialize the outline part of the given L{OutlineLauncher} into a
     opencue job specification.
 
+    The specification is written out as it is built, the depends of
+    each layer are kept as xml fragments until all the layers are
+    written.
+
     :type launcher: L{OutlineLauncher}
     :param launcher: The outline launcher being used to launch the job.
+    :type use_pycuerun: bool
+    :param use_pycuerun: Run frames through pycuerun.
+    :type stream: file
+    :param stream: A text stream to write the specification to.
 
     :rtype: str
-    :return: A opencue job specification.
+    :return: A opencue job specification or None if it was written to
+             the stream.
     """
-    ol = launcher.get_outline()
+    # Find the layers to launch first, so nothing is written
+    # for a job that can't be launched.
+    launch_layers = _get_launch_layers(launcher.get_outline())
 
-    root = Et.Element("spec")
-    depends = Et.Element("depends")
+    output = stream if stream is not None else six.StringIO()
+    output.write(_get_spec_header(launcher))
+    depends = _write_job(SpecWriter(output), launcher, use_pycuerun, launch_layers)
+    output.write(_get_spec_footer([depends]))
 
-    sub_element(root, "facility", launcher.get("facility"))
-    sub_element(root, "show", launcher.get("show"))
-    sub_element(root, "shot", launcher.get("shot"))
-    user = launcher.get_flag("user")
-    if not user:
-        user = util.get_user()
-    sub_element(root, "user", user)
-    if not launcher.get("nomail"):
-        sub_element(root, "email", "%s@%s" % (user,
-                                              config.get("outline", "domain")))
-    uid = util.get_uid()
-    if uid is not None:
-        sub_element(root, "uid", str(uid))
+    if stream is not None:
+        return None
 
-    j = Et.SubElement(root, "job", {"name": ol.get_name()})
-    sub_element(j, "paused", str(launcher.get("pause")))
-    sub_element(j, "maxretries", str(launcher.get("maxretries")))
-    sub_element(j, "autoeat", str(launcher.get("autoeat")))
+    result = output.getvalue()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(parseString(result).toprettyxml())
+    return result
 
-    if ol.get_arg("localbook"):
-        Et.SubElement(j, "localbook", ol.get_arg("localbook"))
 
-    if launcher.get("os"):
-        sub_element(j, "os", launcher.get("os"))
-    elif os.environ.get("OL_OS", False):
-        sub_element(j, "os", os.environ.get("OL_OS"))
+def _get_launch_layers(ol):
+    """
+    Return the layers of an outline launched to the cue.
 
-    env = Et.SubElement(j, "env")
-    for env_k, env_v in ol.get_env().items():
-        # Only pre-setshot environment variables are
-        # passed up to the cue.
-        if env_v[1]:
-            pair = Et.SubElement(env, "key", {"name": env_k})
-            pair.text = env_v[0]
+    :rtype: list
+    :return: A (layer, frame range) tuple for each layer.
 
-    layers = Et.SubElement(j, "layers")
+    :raises OutlineException: There are no layers to launch.
+    """
+    launch_layers = []
     for layer in ol.get_layers():
 
         # Unregistered layers are in the job but don't show up on the cue.
@@ -260,69 +405,183 @@ def _serialize(launcher, use_pycuerun):
                         "with ol range %s" % (layer, layer.get_arg("range"),
                                               ol.get_frame_range()))
             continue
+        launch_layers.append((layer, frame_range))
+
+    if not launch_layers:
+        raise OutlineException("Failed to launch job.  There are no layers with frame "
+                               "ranges that intersect the job's frame range: %s"
+                               % ol.get_frame_range())
+    return launch_layers
 
-        spec_layer = Et.SubElement(layers, "layer",
-                                   {"name": layer.get_name(),
-                                    "type": layer.get_type()})
+
+def _get_spec_header(launcher):
+    """
+    Return the start of a spec, up to its jobs.  Jobs with the
+    same header can be launched in the same spec.
+    """
+    output = six.StringIO()
+    spec = SpecWriter(output)
+    spec.write('<?xml version="1.0"?>'
+               '<!DOCTYPE spec PUBLIC "SPI Cue  Specification Language" '
+               '"http://localhost:8080/spcue/dtd/cjsl-1.9.dtd">')
+    spec.start("spec")
+
+    spec.element("facility", launcher.get("facility"))
+    spec.element("show", launcher.get("show"))
+    spec.element("shot", launcher.get("shot"))
+    user = launcher.get_flag("user")
+    if not user:
+        user = util.get_user()
+    spec.element("user", user)
+    if not launcher.get("nomail"):
+        spec.element("email", "%s@%s" % (user, config.get("outline", "domain")))
+    uid = util.get_uid()
+    if uid is not None:
+        spec.element("uid", str(uid))
+    return output.getvalue()
+
+
+def _get_spec_footer(depends):
+    """Return the end of a spec with the given depend fragments."""
+    return "<depends>%s</depends></spec>" % "".join(depends)
+
+
+def _write_job(spec, launcher, use_pycuerun, launch_layers):
+    """
+    Write the job element of an outline.
+
+    :type spec: L{SpecWriter}
+    :param spec: The spec to write the job to.
+    :type launcher: L{OutlineLauncher}
+    :param launcher: The outline launcher being used to launch the job.
+    :type use_pycuerun: bool
+    :param use_pycuerun: Run frames through pycuerun.
+    :type launch_layers: list
+    :param launch_layers: The layers to launch, see L{_get_launch_layers}.
+
+    :rtype: str
+    :return: The depends of the job, they go after all the jobs.
+    """
+    ol = launcher.get_outline()
+    spec.start("job", {"name": ol.get_name()})
+    spec.element("paused", str(launcher.get("pause")))
+    spec.element("maxretries", str(launcher.get("maxretries")))
+    spec.element("autoeat", str(launcher.get("autoeat")))
+
+    if ol.get_arg("localbook"):
+        spec.element("localbook", None, ol.get_arg("localbook"))
+
+    if launcher.get("os"):
+        spec.element("os", launcher.get("os"))
+    elif os.environ.get("OL_OS", False):
+        spec.element("os", os.environ.get("OL_OS"))
+
+    spec.start("env")
+    for env_k, env_v in ol.get_env().items():
+        # Only pre-setshot environment variables are
+        # passed up to the cue.
+        if env_v[1]:
+            spec.element("key", env_v[0], {"name": env_k})
+    spec.end()
+
+    graph = ol.get_depend_graph()
+    depends = []
+    spec.start("layers")
+    for layer, frame_range in launch_layers:
+        spec.start("layer", {"name": layer.get_name(), "type": layer.get_type()})
         if use_pycuerun:
-            sub_element(spec_layer, "cmd",
-                        " ".join(build_command(launcher, layer)))
+            spec.element("cmd", " ".join(build_command(launcher, layer)))
         else:
-            sub_element(spec_layer, "cmd", " ".join(layer.get_arg("command")))
-        sub_element(spec_layer, "range", str(frame_range))
-        sub_element(spec_layer, "chunk", str(layer.get_chunk_size()))
+            spec.element("cmd", " ".join(layer.get_arg("command")))
+        spec.element("range", str(frame_range))
+        spec.element("chunk", str(layer.get_chunk_size()))
 
         # opencue specific options
         if layer.get_arg("threads"):
-            sub_element(spec_layer, "cores", "%0.1f" % (layer.get_arg("threads")))
+            spec.element("cores", "%0.1f" % (layer.get_arg("threads")))
 
         if layer.is_arg_set("threadable"):
-            sub_element(spec_layer, "threadable",
-                        bool_to_str(layer.get_arg("threadable")))
+            spec.element("threadable", bool_to_str(layer.get_arg("threadable")))
 
         if layer.get_arg("memory"):
-            sub_element(spec_layer, "memory", "%s" % (layer.get_arg("memory")))
+            spec.element("memory", "%s" % (layer.get_arg("memory")))
 
         if os.environ.get("OL_TAG_OVERRIDE", False):
-            sub_element(spec_layer, "tags",
-                        scrub_tags(os.environ["OL_TAG_OVERRIDE"]))
+            spec.element("tags", scrub_tags(os.environ["OL_TAG_OVERRIDE"]))
         elif layer.get_arg("tags"):
-            sub_element(spec_layer, "tags", scrub_tags(layer.get_arg("tags")))
+            spec.element("tags", scrub_tags(layer.get_arg("tags")))
 
         layer_limits = layer.get_limits()
         if layer_limits:
-            limits = Et.SubElement(spec_layer, "limits")
+            spec.start("limits")
             for limit_name in layer_limits:
-                limit = Et.SubElement(limits, "limit")
-                limit.text = limit_name
+                spec.element("limit", limit_name)
+            spec.end()
 
-        services = Et.SubElement(spec_layer, "services")
-        service = Et.SubElement(services, "service")
         try:
-            service.text = layer.get_service().split(",")[0].strip()
+            service = layer.get_service().split(",")[0].strip()
         except Exception:
-            service.text = "default"
+            service = "default"
+        spec.start("services")
+        spec.element("service", service)
+        spec.end()
+        spec.end()
 
-        build_dependencies(ol, layer, depends)
+        depends.append(build_dependencies(ol, layer, graph))
+    spec.end()
+    spec.end()
+    return "".join(depends)
 
-    if not len(layers):
-        raise OutlineException("Failed to launch job.  There are no layers with frame "
-                               "ranges that intersect the job's frame range: %s"
-                               % ol.get_frame_range())
 
-    # Dependencies go after all of the layers
-    root.append(depends)
+class SpecWriter(object):
+    """
+    Writes the xml of a job specification to a text stream
+    as it is built.
+    """
+
+    def __init__(self, stream):
+        """
+        :type stream: file
+        :param stream: The text stream to write to.
+        """
+        object.__init__(self)
+        self.__stream = stream
+        self.__open = []
 
-    xml = [
-        '<?xml version="1.0"?>',
-        '<!DOCTYPE spec PUBLIC "SPI Cue  Specification Language" '
-            '"http://localhost:8080/spcue/dtd/cjsl-1.9.dtd">',
-        Et.tostring(root).decode()
-    ]
+    def write(self, xml):
+        """Write an xml fragment as is."""
+        self.__stream.write(xml)
 
-    result = "".join(xml)
-    logger.debug(parseString(result).toprettyxml())
-    return result
+    def start(self, tag, attrs=None):
+        """Write the start tag of an element, see L{end}."""
+        self.__stream.write("<%s%s>" % (tag, _attributes(attrs)))
+        self.__open.append(tag)
+
+    def end(self):
+        """Write the end tag of the last started element."""
+        self.__stream.write("</%s>" % self.__open.pop())
+
+    def element(self, tag, text, attrs=None):
+        """Write an element with the given text, if any."""
+        self.__stream.write(_element(tag, text, attrs))
+
+
+def _escape(text):
+    return xml_escape(str(text))
+
+
+def _attributes(attrs):
+    if not attrs:
+        return ""
+    return "".join(' %s=%s' % (key, quoteattr(str(value), _ATTRIBUTE_ENTITIES))
+                   for key, value in attrs.items())
+
+
+def _element(tag, text, attrs=None):
+    """Return the xml of an element with the given text, if any."""
+    if text is None:
+        return "<%s%s />" % (tag, _attributes(attrs))
+    return "<%s%s>%s</%s>" % (tag, _attributes(attrs), _escape(text), tag)
 
 
 def scrub_tags(tags):
@@ -345,36 +604,31 @@ def bool_to_str(value):
     return "False"
 
 
-def build_dependencies(ol, layer, all_depends):
-    """
-    Iterate through all the layer's dependencies and
-    add them to the job spec.
+def build_dependencies(ol, layer, graph=None):
     """
-    for dep in layer.get_depends():
-
-        depend = Et.SubElement(all_depends, "depend",
-                               type=dep.get_type(),
-                               anyframe=bool_to_str(dep.is_any_frame()))
+    Return the xml of all the layer's dependencies in the job
+    spec.  The depends are read from the outline's depend
+    graph when one is given.
 
+    :rtype: str
+    :return: The depend elements of the layer.
+    """
+    if graph is None:
+        graph = DependGraph([layer])
+
+    # Names are escaped once for all the depends.
+    job_name = _escape(ol.get_name())
+    layer_name = _escape(layer.get_name())
+    result = []
+    for dep in graph.get_depends(layer):
         if dep.get_type() == DependType.LayerOnSimFrame:
-
             frame_range = dep.get_depend_on_layer().get_frame_range()
             first_frame = FileSequence.FrameSet(frame_range)[0]
-
-            sub_element(depend, "depjob", ol.get_name())
-            sub_element(depend, "deplayer", layer.get_name())
-            sub_element(depend, "onjob", ol.get_name())
-            sub_element(depend, "onframe", "%04d-%s"
-                        % (first_frame, dep.get_depend_on_layer().get_name()))
+            on = _element("onframe", "%04d-%s"
+                          % (first_frame, dep.get_depend_on_layer().get_name()))
         else:
-            sub_element(depend, "depjob", ol.get_name())
-            sub_element(depend, "deplayer", layer.get_name())
-            sub_element(depend, "onjob", ol.get_name())
-            sub_element(depend, "onlayer", dep.get_depend_on_layer().get_name())
-
-
-def sub_element(root, tag, text):
-    """Convenience method to create a sub element with text"""
-    e = Et.SubElement(root, tag)
-    e.text = text
-    return e
+            on = _element("onlayer", dep.get_depend_on_layer().get_name())
+        result.append(_DEPEND_XML % (
+            _attributes({"type": dep.get_type(), "anyframe": bool_to_str(dep.is_any_frame())}),
+            job_name, layer_name, job_name, on))
+    return "".join(result)
@@ -18,15 +18,33 @@ from __future__ import division
 from __future__ import absolute_import
 
 from builtins import object
-from builtins import range
+import heapq
+import logging
+import math
+import multiprocessing
 import subprocess
+import threading
+import time
 
-import sqlite3
+from six.moves import queue
 
 import FileSequence
 
 from outline import config
 from outline import versions
+from outline.depend import DependType
+from outline.frameindex import FrameRangeIndex
+
+
+logger = logging.getLogger("outline.backend.local")
+
+# Task states
+WAITING = "WAITING"
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+DEAD = "DEAD"
+# Tasks that can not run because a task they depend on died.
+DEPEND_DEAD = "DEPEND_DEAD"
 
 
 def build_command(ol, layer, frame):
@@ -82,82 +100,268 @@ def build_frame_range(frame_range, chunk_size):
     """
     Return an array of frames with no duplicates and chunking applied.
     """
-    frame_set = FileSequence.FrameSet(frame_range)
-    frames = []
     if chunk_size > 1:
-        if chunk_size >= len(frame_set):
-            frames.append(frame_set.__getitem__(0))
-        else:
-            unique_frames = list(set(frame_set))
-            for i in range(0, len(unique_frames)):
-                if i % chunk_size == 0:
-                    frames.append(unique_frames[i])
-    else:
-        frames = list(FileSequence.FrameSet(frame_range))
-    return frames
+        return FrameRangeIndex.get(frame_range).get_chunk_starts(chunk_size)
+    return list(FileSequence.FrameSet(frame_range))
+
+
+def get_local_workers():
+    """
+    Return the number of cores the local dispatcher uses, the
+    local_cores option of the outline section of the config or
+    all the cores of the machine.
+    """
+    if config.has_option("outline", "local_cores"):
+        cores = config.get("outline", "local_cores")
+        if cores:
+            return max(int(cores), 1)
+    return multiprocessing.cpu_count()
+
+
+class Task(object):
+    """A chunk of frames of a layer run by the local dispatcher."""
+
+    def __init__(self, layer, frame, frames, cores, layer_order):
+        self.layer = layer
+        self.frame = frame
+        self.frames = frames
+        self.cores = cores
+        self.state = WAITING
+        self.exit_status = None
+        self.start_time = None
+        self.stop_time = None
+        # The LayerProgress of the layer of the task.
+        self.progress = None
+        # Tasks of frame depends to check once this one is done.
+        self.dependents = []
+        # The number of depends this task still waits on.
+        self.waiting_on = 0
+        self.priority = (int(frame), layer_order)
+
+    def get_name(self):
+        """Return the name of the task, FRAME-LAYER like cue frames."""
+        return "%04d-%s" % (self.frame, self.layer.get_name())
+
+    def __lt__(self, other):
+        return self.priority < other.priority
+
+
+class LayerProgress(object):
+    """
+    The progress of the tasks of a layer, layer depends wait on it
+    instead of on each task of the layer.
+    """
+
+    def __init__(self):
+        self.total = 0
+        # Tasks not finished yet, neither succeeded nor dead.
+        self.pending = 0
+        self.succeeded = 0
+        # Tasks waiting for every task of the layer to succeed.
+        self.all_waiters = []
+        # Tasks waiting for one task of the layer to succeed.
+        self.any_waiters = []
 
 
 class Dispatcher(object):
-    def __init__(self, ol):
-        self.__ol = ol
+    """
+    Runs the frames of an outline on the local machine.
+
+    Frames run in parallel on up to get_local_workers() cores, a layer
+    with a threads argument uses that many cores per frame.  Frames
+    are started in frame order then layer order, like the cue does,
+    once the frames they depend on through the outline's depends
+    have succeeded.  When a frame fails, the frames depending on it
+    are not run.
+    """
 
-        self.__conn = sqlite3.connect(":memory:")
+    def __init__(self, ol, workers=None):
+        self.__ol = ol
+        self.__workers = workers or get_local_workers()
+        self.__tasks = []
+        self.__ready = []
+        self.__done = queue.Queue()
+        self.__running = 0
+        self.__cores_used = 0
         self.__create_dispatch_list()
 
+    def get_tasks(self):
+        """Return all the tasks of the outline."""
+        return list(self.__tasks)
+
+    def get_progress(self):
+        """
+        Return the number of tasks in each state.
+
+        :rtype: dict
+        :return: state -> number of tasks
+        """
+        progress = dict((state, 0) for state in
+                        (WAITING, RUNNING, SUCCEEDED, DEAD, DEPEND_DEAD))
+        for task in self.__tasks:
+            progress[task.state] += 1
+        return progress
 
     def dispatch(self):
-        try:
-            while True:
-                l, f = self.__get_next_frame()
-                layer = self.__ol.get_layer(l)
-
-                command = build_command(self.__ol, layer, f)
-                try:
-                    retcode = subprocess.call(command, shell=False)
-                    if retcode != 0:
-                        raise Exception("frame failed")
-                except Exception as e:
-                    # Failed to run frame
-                    # Set frame to dead
-                     c = self.__conn.cursor()
-                     c.execute("UPDATE frames SET state=? WHERE layer=? AND frame=?",
-                               ('DEAD', l, f))
-                     self.__conn.commit()
+        """
+        Run all the frames and wait for them to finish.
 
+        :rtype: bool
+        :return: True if every frame succeeded.
+        """
+        total = len(self.__tasks)
+        finished = 0
+        start = time.time()
+        while self.__ready or self.__running:
+            self.__start_ready_tasks()
+            task, exit_status = self.__done.get()
+            self.__finish_task(task, exit_status)
+            finished += 1
+            logger.info("[%d/%d] %s %s exit status %s in %0.1fs" % (
+                finished, total, task.get_name(), task.state, exit_status,
+                task.stop_time - task.start_time))
+
+        progress = self.get_progress()
+        print("Job is done: %d succeeded, %d dead, %d not run in %0.1fs" % (
+            progress[SUCCEEDED], progress[DEAD],
+            progress[DEPEND_DEAD] + progress[WAITING], time.time() - start))
+        return progress[SUCCEEDED] == total
+
+    def __start_ready_tasks(self):
+        """Start ready tasks in priority order while there are free cores."""
+        while self.__ready:
+            task = self.__ready[0]
+            if self.__running and self.__cores_used + task.cores > self.__workers:
+                break
+            heapq.heappop(self.__ready)
+            task.state = RUNNING
+            task.start_time = time.time()
+            self.__running += 1
+            self.__cores_used += task.cores
+            thread = threading.Thread(target=self.__run_task, args=(task,))
+            thread.daemon = True
+            thread.start()
+
+    def __run_task(self, task):
+        """Run the command of a task, runs on its own thread."""
+        command = build_command(self.__ol, task.layer, task.frame)
+        try:
+            exit_status = subprocess.call(command, shell=False)
         except Exception as e:
-            print("Job is done: %s" % e)
-        finally:
-            self.__conn.close()
+            logger.warning("failed to run %s, %s" % (task.get_name(), e))
+            exit_status = -1
+        self.__done.put((task, exit_status))
+
+    def __finish_task(self, task, exit_status):
+        """Record the result of a task and release its dependents."""
+        self.__running -= 1
+        self.__cores_used -= task.cores
+        task.stop_time = time.time()
+        task.exit_status = exit_status
+        if exit_status != 0:
+            task.state = DEAD
+            self.__kill_dependents(task)
+            return
+
+        task.state = SUCCEEDED
+        progress = task.progress
+        progress.pending -= 1
+        progress.succeeded += 1
+        released = list(task.dependents)
+        if progress.succeeded == progress.total:
+            released.extend(progress.all_waiters)
+            progress.all_waiters = []
+        if progress.succeeded == 1:
+            released.extend(progress.any_waiters)
+            progress.any_waiters = []
+        for dependent in released:
+            if dependent.state != WAITING:
+                continue
+            dependent.waiting_on -= 1
+            if dependent.waiting_on == 0:
+                heapq.heappush(self.__ready, dependent)
+
+    def __kill_dependents(self, task):
+        """Mark the tasks that can no longer run as DEPEND_DEAD."""
+        stack = [task]
+        while stack:
+            dead = stack.pop()
+            progress = dead.progress
+            progress.pending -= 1
+            # The layer can no longer succeed as a whole.
+            killed = list(dead.dependents) + progress.all_waiters
+            progress.all_waiters = []
+            # Nor any of its tasks once none is left to run.
+            if progress.pending == 0 and progress.succeeded == 0:
+                killed.extend(progress.any_waiters)
+                progress.any_waiters = []
+            for dependent in killed:
+                if dependent.state == WAITING:
+                    dependent.state = DEPEND_DEAD
+                    stack.append(dependent)
 
     def __create_dispatch_list(self):
         """
-        Creates a list of dispatchable frames.
+        Creates the tasks of every layer and links them through
+        the layer depends.
         """
-        c = self.__conn.cursor()
-        c.execute('''create table frames (layer text, frame int, state string, layer_order int, frame_order int)''')
-
-        for layer in self.__ol.get_layers():
-
-            frames = build_frame_range(layer.get_frame_range(),
-                                       layer.get_chunk_size())
-            for frame in frames:
-                c.execute('insert into frames values (?,?,?,?,?)',
-                          (layer.get_name(),
-                          frame,
-                          'WAITING',
-                          self.__ol.get_layers().index(layer),
-                          int(frame)))
-        self.__conn.commit()
-
-    def __get_next_frame(self):
-
-        c = self.__conn.cursor()
-        c.execute("SELECT layer, frame, state FROM frames WHERE state='WAITING' ORDER BY frame_order,layer_order LIMIT 1")
-        result = c.fetchone()
-
-        if result:
-            c.execute("UPDATE frames SET state=? WHERE layer=? AND frame=?",
-                      ('RUNNING', result[0], result[1]))
-            self.__conn.commit()
-            return result[0], result[1]
-        raise Exception("Frame not found")
+        graph = self.__ol.get_depend_graph()
+        by_layer = {}
+        for layer_order, layer in enumerate(graph.get_layers()):
+            frame_range = layer.get_frame_range()
+            if not frame_range:
+                continue
+            chunk = layer.get_chunk_size()
+            cores = min(max(int(math.ceil(layer.get_arg("threads") or 1)), 1), self.__workers)
+            index = FrameRangeIndex.get(frame_range)
+            progress = LayerProgress()
+            tasks = {}
+            for frame in build_frame_range(frame_range, chunk):
+                frames = index.get_chunk(frame, chunk) if chunk > 1 else [frame]
+                task = Task(layer, frame, frames, cores, layer_order)
+                task.progress = progress
+                tasks[frame] = task
+                self.__tasks.append(task)
+            progress.total = progress.pending = len(tasks)
+            by_layer[layer] = (index, chunk, tasks, progress)
+
+        for task in self.__tasks:
+            for depend in graph.get_depends(task.layer):
+                on = by_layer.get(depend.get_depend_on_layer())
+                if on is not None:
+                    self.__add_depend(task, depend, on)
+
+        for task in self.__tasks:
+            if task.waiting_on == 0:
+                heapq.heappush(self.__ready, task)
+
+    @staticmethod
+    def __add_depend(task, depend, on):
+        """
+        Make a task wait for the tasks of the depend on layer, the
+        frames of frame depends or the progress of the layer.
+        """
+        index, chunk, tasks, progress = on
+        depend_type = depend.get_type()
+        if depend_type in (DependType.FrameByFrame, DependType.PreviousFrame):
+            offset = 1 if depend_type == DependType.PreviousFrame else 0
+            found = []
+            for frame in task.frames:
+                position = index.index(frame - offset)
+                if position == -1:
+                    continue
+                on_task = tasks[index[position - position % chunk]]
+                if on_task not in found:
+                    found.append(on_task)
+            for on_task in found:
+                on_task.dependents.append(task)
+                task.waiting_on += 1
+        elif not tasks:
+            return
+        elif depend_type == DependType.LayerOnAny or depend.is_any_frame():
+            progress.any_waiters.append(task)
+            task.waiting_on += 1
+        else:
+            # LayerOnLayer, LayerOnSimFrame
+            progress.all_waiters.append(task)
+            task.waiting_on += 1
@@ -49,3 +49,9 @@ FRAME_RANGE_LAST = 2
 # Util = setup or cleanup layer
 # Post = A post job layer
 LAYER_TYPES = ("Render", "Util", "Post")
+
+# Extension and format version of the compiled outline written
+# next to the serialized outline in the session.  Frames load the
+# compiled outline instead of parsing the yaml file.
+COMPILED_OUTLINE_EXT = "pickle"
+COMPILED_OUTLINE_VERSION = 1
@@ -39,12 +39,18 @@ logger = logging.getLogger("outline.cuerun")
 
 __all__ = ["OutlineLauncher",
            "CuerunOptionParser",
-           "launch"]
+           "launch",
+           "launch_batch"]
+
+# The number of outlines setup at the same time by launch_batch.
+DEFAULT_SETUP_WORKERS = 8
 
 
 def execute_frame(script, layer, frame):
     """
-    Execute the specified frame.
+    Execute the specified frame.  If the outline was compiled
+    when it was setup, the compiled outline is loaded instead
+    of parsing the yaml file.
     """
     ol = load_outline(script)
     ol.get_layer(layer).execute(int(frame))
@@ -100,6 +106,84 @@ def launch(ol, use_pycuerun=True, **args):
     return launcher.launch(use_pycuerun)
 
 
+def launch_batch(outlines, use_pycuerun=True, setup_workers=DEFAULT_SETUP_WORKERS,
+                 **args):
+    """
+    Launch many outlines at once, for example the render and comp
+    outlines of every shot of a sequence.
+
+    The outlines are setup concurrently, which creates their sessions,
+    then launched together by the backend.  The cue backend merges the
+    jobs into few specs and launches them concurrently, other backends
+    launch the outlines one by one.  An outline failing to setup or
+    launch doesn't stop the others.
+
+    :type outlines: list
+    :param outlines: The outlines to launch, or OutlineLaunchers to
+                     launch outlines with their own flags.
+    :type use_pycuerun: bool
+    :param use_pycuerun: True will wrap the command using pycuerun
+    :type setup_workers: int
+    :param setup_workers: The number of outlines setup at the same time.
+    :type args: keyword arguments
+    :param args: The launch flags of the outlines, see L{launch}.
+
+    :rtype: list
+    :return: A (jobs, exception) tuple per outline, in the order of the
+             outlines. jobs is what the backend launch returned for the
+             outline, or None if it failed with the exception.
+    """
+    from concurrent import futures
+
+    launchers = []
+    for ol in outlines:
+        launcher = ol if isinstance(ol, OutlineLauncher) else OutlineLauncher(ol, **args)
+        # Setup sets the SHOT environment variable, pin the show and
+        # shot first so the concurrent setups don't depend on it.
+        launcher.get_outline().set_show(launcher.get_flag("show"))
+        launcher.get_outline().set_shot(launcher.get_flag("shot"))
+        launchers.append(launcher)
+
+    def _setup(launcher):
+        if launcher.get_outline().get_mode() < constants.OUTLINE_MODE_SETUP:
+            launcher.setup()
+
+    results = [None] * len(launchers)
+    executor = futures.ThreadPoolExecutor(max_workers=max(setup_workers, 1))
+    try:
+        pending = [executor.submit(_setup, launcher) for launcher in launchers]
+        for index, setup in enumerate(pending):
+            try:
+                setup.result()
+            except Exception as e:
+                logger.warning("failed to setup %s: %s" % (
+                    launchers[index].get_outline().get_name(), e))
+                results[index] = (None, e)
+    finally:
+        executor.shutdown()
+
+    by_backend = {}
+    for index, launcher in enumerate(launchers):
+        if results[index] is None:
+            by_backend.setdefault(launcher.get("backend"), []).append(index)
+
+    for name, indexes in by_backend.items():
+        backend = import_backend_module(name)
+        if hasattr(backend, "launch_batch"):
+            launched = backend.launch_batch([launchers[index] for index in indexes],
+                                            use_pycuerun=use_pycuerun)
+            for index, result in zip(indexes, launched):
+                results[index] = result
+            continue
+        for index in indexes:
+            try:
+                results[index] = (launchers[index].launch(use_pycuerun), None)
+            except Exception as e:
+                results[index] = (None, e)
+
+    return results
+
+
 class OutlineLauncher(object):
     """
     The OutlineLauncher class encapsulates all of the possible
@@ -22,9 +22,14 @@ from __future__ import absolute_import
 
 from builtins import str
 from builtins import object
+import collections
+import heapq
+
+from .exception import DependCycleException
 
 
 __all__ = ["Depend",
+           "DependGraph",
            "DependType",
            "parse_require_str"]
 
@@ -131,3 +136,148 @@ class Depend(object):
         :return: True if the depend is an any frame depend.
         """
         return self.__any_frame
+
+
+class DependGraph(object):
+    """
+    The dependencies between layers, indexed by the depending
+    layer and by the layer depended on.
+
+    The graph is a snapshot of the depends of its layers, depends
+    added to the layers afterwards are not seen by the graph.
+    """
+
+    def __init__(self, layers=()):
+        """
+        :type  layers: list<L{Layer}>
+        :param layers: The layers to add along with their depends.
+        """
+        object.__init__(self)
+        # layer -> {depend on layer: Depend}, in the order layers are added.
+        self.__depends = collections.OrderedDict()
+        # depend on layer -> {layer: Depend}
+        self.__dependents = collections.defaultdict(collections.OrderedDict)
+        for layer in layers:
+            self.add_layer(layer)
+
+    def add_layer(self, layer):
+        """
+        Add a layer and its depends to the graph.
+
+        :type  layer: L{Layer}
+        :param layer: The layer to add.
+        """
+        if layer not in self.__depends:
+            self.__depends[layer] = collections.OrderedDict()
+        for depend in layer.get_depends():
+            self.add_depend(depend)
+
+    def add_depend(self, depend):
+        """
+        Add a depend to the graph, the depending layer is added
+        if it isn't part of the graph yet.
+
+        :type  depend: L{Depend}
+        :param depend: The depend to add.
+
+        :rtype: boolean
+        :return: False if the layer already depends on that layer.
+        """
+        layer = depend.get_dependant_layer()
+        on_layer = depend.get_depend_on_layer()
+        depends = self.__depends.setdefault(layer, collections.OrderedDict())
+        if on_layer in depends:
+            return False
+        depends[on_layer] = depend
+        self.__dependents[on_layer][layer] = depend
+        return True
+
+    def has_depend(self, layer, on_layer):
+        """Return true if the layer depends on the given layer."""
+        return on_layer in self.__depends.get(layer, ())
+
+    def get_layers(self):
+        """Return the layers of the graph in the order they were added."""
+        return list(self.__depends)
+
+    def get_depends(self, layer):
+        """Return the depends of the given layer."""
+        return list(self.__depends.get(layer, {}).values())
+
+    def get_dependents(self, layer):
+        """Return the depends on the given layer."""
+        return list(self.__dependents.get(layer, {}).values())
+
+    def find_cycle(self):
+        """
+        Find a cycle in the dependencies between the layers of the graph.
+
+        Layers may still be able to run through a cycle, for example a
+        frame by frame depend one way and a previous frame depend the
+        other way.
+
+        :rtype: list<L{Layer}>
+        :return: The layers of a cycle, the first one repeated at the
+                 end, or None if there is no cycle.
+        """
+        # 0 not visited, 1 on the current path, 2 done
+        state = dict((layer, 0) for layer in self.__depends)
+        for start in self.__depends:
+            if state[start]:
+                continue
+            state[start] = 1
+            path = [start]
+            stack = [iter(self.__depends[start])]
+            while stack:
+                for on_layer in stack[-1]:
+                    if on_layer not in state:
+                        # Not part of the graph
+                        continue
+                    if state[on_layer] == 1:
+                        return path[path.index(on_layer):] + [on_layer]
+                    if state[on_layer] == 0:
+                        state[on_layer] = 1
+                        path.append(on_layer)
+                        stack.append(iter(self.__depends[on_layer]))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    stack.pop()
+        return None
+
+    def get_sorted_layers(self):
+        """
+        Return the layers of the graph, every layer after the layers
+        it depends on.  Layers are otherwise kept in the order they
+        were added in.
+
+        :rtype: list<L{Layer}>
+        :return: The layers in dependency order.
+
+        :raises DependCycleException: The depends between the layers
+                                      form a cycle.
+        """
+        position = dict((layer, i) for i, layer in enumerate(self.__depends))
+        waiting_on = {}
+        ready = []
+        for layer, depends in self.__depends.items():
+            waiting_on[layer] = len([on for on in depends if on in position])
+            if not waiting_on[layer]:
+                ready.append(position[layer])
+
+        layers = list(self.__depends)
+        result = []
+        while ready:
+            layer = layers[heapq.heappop(ready)]
+            result.append(layer)
+            for dependent in self.__dependents.get(layer, ()):
+                waiting_on[dependent] -= 1
+                if not waiting_on[dependent]:
+                    heapq.heappush(ready, position[dependent])
+
+        if len(result) != len(layers):
+            cycle = self.find_cycle()
+            raise DependCycleException(
+                "The depends between layers form a cycle: %s"
+                % " -> ".join(str(layer) for layer in cycle))
+        return result
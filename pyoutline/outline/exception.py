@@ -23,6 +23,7 @@ from __future__ import absolute_import
 
 __all__ = ["OutlineException",
            "LayerException",
+           "DependCycleException",
            "ShellCommandFailureException",
            "SessionException",
            "FileSpecException",
@@ -43,6 +44,15 @@ class LayerException(OutlineException):
     pass
 
 
+class DependCycleException(OutlineException):
+    """Depend cycle exception
+
+    This exception is raised when layers can't be ordered
+    because their dependencies form a cycle.
+    """
+    pass
+
+
 class ShellCommandFailureException(OutlineException):
     """ShellCommandFailureException
 
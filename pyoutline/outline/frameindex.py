@@ -0,0 +1,277 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""Constant time frame lookups in frame range specs."""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import str
+from builtins import range
+from builtins import object
+import bisect
+import re
+import threading
+
+from FileSequence.FrameRange import FrameRange
+
+
+__all__ = ["FrameRangeIndex",
+           "intersect_frame_range"]
+
+# The number of compiled frame ranges and intersections kept.
+CACHE_SIZE = 64
+
+# Intersections computed by intersect_frame_range.
+_intersect_cache = {}
+_intersect_lock = threading.Lock()
+
+STEP_PATTERN = re.compile(r'^(?P<sf>(-?)\d+)-(?P<ef>(-?)\d+)x(?P<step>(-?)\d+)$')
+
+
+class FrameRangeIndex(object):
+    """
+    The unique frames of a frame range spec in their execution order,
+    the order FileSequence.FrameSet iterates them with duplicates removed.
+
+    The spec is compiled into runs of evenly spaced frames, so a range
+    like 1-100000 is a single run and looking up a frame or its position
+    is arithmetic.  Runs are searched with bisect over their bounds.  Specs
+    whose runs overlap, and so contain duplicates, are expanded into a list
+    with a frame to position map.
+    """
+
+    __cache = {}
+    __cache_lock = threading.Lock()
+
+    def __init__(self, frame_range):
+        """
+        :type  frame_range: str
+        :param frame_range: A frame range spec, ex: 1-10,20-100x2
+        """
+        self.__frame_range = str(frame_range)
+
+        # (first frame, step, number of frames)
+        self.__runs = []
+        for section in self.__frame_range.split(","):
+            self.__add_section(section)
+
+        # The position of the first frame of each run.
+        self.__offsets = []
+        size = 0
+        for run in self.__runs:
+            self.__offsets.append(size)
+            size += run[2]
+        self.__size = size
+
+        # (lowest frame, highest frame, run) sorted by lowest frame.
+        self.__bounds = sorted(
+            (min(start, start + step * (count - 1)),
+             max(start, start + step * (count - 1)), idx)
+            for idx, (start, step, count) in enumerate(self.__runs))
+        self.__lows = [bound[0] for bound in self.__bounds]
+
+        # Only set if runs overlap.
+        self.__frames = None
+        self.__positions = None
+        for prev, bound in zip(self.__bounds, self.__bounds[1:]):
+            if bound[0] <= prev[1]:
+                self.__expand()
+                break
+
+    @classmethod
+    def get(cls, frame_range):
+        """
+        Return the compiled index of a frame range spec, indexes are
+        shared between all the layers using the same spec.
+
+        :type  frame_range: str
+        :param frame_range: A frame range spec.
+
+        :rtype: FrameRangeIndex
+        :return: The index of the frame range.
+        """
+        frame_range = str(frame_range)
+        with cls.__cache_lock:
+            index = cls.__cache.get(frame_range)
+        if index is None:
+            index = cls(frame_range)
+            with cls.__cache_lock:
+                if len(cls.__cache) >= CACHE_SIZE:
+                    cls.__cache.clear()
+                cls.__cache[frame_range] = index
+        return index
+
+    def __add_section(self, section):
+        """Add the runs of a single FrameRange spec."""
+        match = STEP_PATTERN.match(section)
+        if match:
+            start = int(match.group('sf'))
+            end = int(match.group('ef'))
+            step = int(match.group('step'))
+            FrameRange.validateStepSign(start, end, step)
+        else:
+            match = FrameRange.SIMPLE_FRAME_RANGE_PATTERN.match(section)
+            if match:
+                start = int(match.group('sf'))
+                end = int(match.group('ef'))
+                step = 1 if end >= start else -1
+            else:
+                # Single frames, inverted steps and interleaves.
+                for frame in FrameRange.parseFrameRange(section):
+                    self.__add_run(frame, 1, 1)
+                return
+        count = len(range(start, end + (step // abs(step)), step))
+        if count:
+            self.__add_run(start, step, count)
+
+    def __add_run(self, start, step, count):
+        """Add a run, merging it into the last one if it continues it."""
+        if self.__runs:
+            last_start, last_step, last_count = self.__runs[-1]
+            if count == 1:
+                if last_count == 1 and start != last_start:
+                    self.__runs[-1] = (last_start, start - last_start, 2)
+                    return
+                if last_count > 1 and start == last_start + last_step * last_count:
+                    self.__runs[-1] = (last_start, last_step, last_count + 1)
+                    return
+            elif step == last_step and start == last_start + last_step * last_count:
+                self.__runs[-1] = (last_start, last_step, last_count + count)
+                return
+        self.__runs.append((start, step, count))
+
+    def __expand(self):
+        """Switch to a list of frames for specs with duplicates."""
+        frames = []
+        positions = {}
+        for start, step, count in self.__runs:
+            for frame in range(start, start + step * count, step):
+                if frame not in positions:
+                    positions[frame] = len(frames)
+                    frames.append(frame)
+        self.__frames = frames
+        self.__positions = positions
+        self.__size = len(frames)
+
+    def __str__(self):
+        return self.__frame_range
+
+    def __len__(self):
+        return self.__size
+
+    def __iter__(self):
+        if self.__frames is not None:
+            return iter(self.__frames)
+        return (frame for start, step, count in self.__runs
+                for frame in range(start, start + step * count, step))
+
+    def __contains__(self, frame):
+        return self.index(frame) != -1
+
+    def __getitem__(self, idx):
+        """Return the frame at the given position."""
+        if idx < 0:
+            idx += self.__size
+        if not 0 <= idx < self.__size:
+            raise IndexError("frame index %d out of range" % idx)
+        if self.__frames is not None:
+            return self.__frames[idx]
+        run = bisect.bisect_right(self.__offsets, idx) - 1
+        start, step, _ = self.__runs[run]
+        return start + step * (idx - self.__offsets[run])
+
+    def index(self, frame):
+        """
+        Return the position of a frame.
+
+        :type  frame: int
+        :param frame: The frame number.
+
+        :rtype: int
+        :return: The position of the frame, -1 if it is not in the range.
+        """
+        frame = int(frame)
+        if self.__positions is not None:
+            return self.__positions.get(frame, -1)
+        bound = bisect.bisect_right(self.__lows, frame) - 1
+        if bound < 0 or frame > self.__bounds[bound][1]:
+            return -1
+        run = self.__bounds[bound][2]
+        start, step, _ = self.__runs[run]
+        if (frame - start) % abs(step):
+            return -1
+        return self.__offsets[run] + (frame - start) // step
+
+    def get_chunk(self, start_frame, chunk_size):
+        """
+        Return the frames a task starting at the given frame handles.
+
+        :type  start_frame: int
+        :param start_frame: The first frame of the task.
+        :type  chunk_size: int
+        :param chunk_size: The number of frames per task.
+
+        :rtype: list<int>
+        :return: The frames of the task, empty if start_frame is not
+                 in the range.
+        """
+        idx = self.index(start_frame)
+        if idx == -1:
+            return []
+        return [self[i] for i in range(idx, min(idx + chunk_size, self.__size))]
+
+    def get_chunk_starts(self, chunk_size):
+        """
+        Return the first frame of every task.
+
+        :type  chunk_size: int
+        :param chunk_size: The number of frames per task.
+
+        :rtype: list<int>
+        :return: The first frames.
+        """
+        return [self[i] for i in range(0, self.__size, max(chunk_size, 1))]
+
+
+def intersect_frame_range(range1, range2):
+    """
+    Return the frames of range1 that are also in range2 as a comma
+    separated spec, in the order of range1 with duplicates removed.
+    Results are cached, so repeated calls with the same ranges are free.
+
+    :type  range1: str
+    :param range1: A frame range spec.
+    :type  range2: str
+    :param range2: A frame range spec.
+
+    :rtype: str
+    :return: The intersection or None if there are no common frames.
+    """
+    key = (str(range1), str(range2))
+    with _intersect_lock:
+        if key in _intersect_cache:
+            return _intersect_cache[key]
+    index1 = FrameRangeIndex.get(range1)
+    index2 = FrameRangeIndex.get(range2)
+    frames = [str(frame) for frame in index1 if frame in index2]
+    result = ",".join(frames) if frames else None
+    with _intersect_lock:
+        if len(_intersect_cache) >= CACHE_SIZE:
+            _intersect_cache.clear()
+        _intersect_cache[key] = result
+    return result
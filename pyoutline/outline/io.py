@@ -23,10 +23,12 @@ from __future__ import division
 from builtins import map
 from builtins import str
 from builtins import object
+import collections
 import os
 import re
 import logging
 import shlex
+import stat
 import subprocess
 import tempfile
 import yaml
@@ -42,6 +44,13 @@ logger = logging.getLogger("outline.io")
 # Used to match version number in paths
 VERSION_REGEX = re.compile("_v([\d+])")
 
+# The number of directories of a sequence listed in parallel.
+CHECK_THREADS = 8
+
+# The result of check_paths.  missing is the set of keys whose path does
+# not exist or is empty, size is the total size of the existing paths.
+PathCheck = collections.namedtuple("PathCheck", ["missing", "size"])
+
 
 def prep_shell_command(cmd, frame=None):
     """
@@ -104,6 +113,101 @@ def resolve(path):
     return path
 
 
+def list_dir(path):
+    """
+    List a directory once, returning the size of every regular file
+    in it.  Uses os.scandir where available, which on most file systems
+    returns the file type without a separate stat.
+
+    :type  path: str
+    :param path: The directory to list.
+
+    :rtype: dict
+    :return: file name -> size, empty if the directory does not exist.
+    """
+    sizes = {}
+    try:
+        if hasattr(os, "scandir"):
+            for entry in os.scandir(path):
+                try:
+                    if entry.is_file():
+                        sizes[entry.name] = entry.stat().st_size
+                except OSError:
+                    continue
+        else:
+            for name in os.listdir(path):
+                try:
+                    st = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    sizes[name] = st.st_size
+    except OSError as e:
+        logger.debug("unable to list %s, %s" % (path, e))
+    return sizes
+
+
+def check_paths(paths, check_ext=None, threads=CHECK_THREADS):
+    """
+    Check the existence and size of many files, listing each directory
+    once instead of checking every path.  Files of size 0 are
+    considered missing.
+
+    :type  paths: dict
+    :param paths: key -> path, usually frame number -> frame path.
+    :type  check_ext: list<str>
+    :param check_ext: Alternative extensions, a missing path is found
+                      if a file with the same name but one of these
+                      extensions exists.
+    :type  threads: int
+    :param threads: The number of directories listed in parallel.
+
+    :rtype: PathCheck
+    :return: The missing keys and the total size of the existing files.
+    """
+    by_dir = collections.defaultdict(list)
+    for key, path in paths.items():
+        by_dir[os.path.dirname(path)].append((key, os.path.basename(path)))
+
+    def check_dir(item):
+        dirname, entries = item
+        sizes = list_dir(dirname or ".")
+        missing = set()
+        total = 0
+        for key, name in entries:
+            size = sizes.get(name)
+            if not size:
+                root = os.path.splitext(name)[0]
+                for ext in check_ext or ():
+                    size = sizes.get("%s%s" % (root, ext))
+                    if size:
+                        break
+            if size:
+                total += size
+            else:
+                missing.add(key)
+        return missing, total
+
+    items = list(by_dir.items())
+    if threads > 1 and len(items) > 1:
+        # multiprocessing is slow to import, frames rarely get here.
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(threads, len(items)))
+        try:
+            results = pool.map(check_dir, items)
+        finally:
+            pool.close()
+    else:
+        results = [check_dir(item) for item in items]
+
+    missing = set()
+    total = 0
+    for dir_missing, dir_total in results:
+        missing.update(dir_missing)
+        total += dir_total
+    return PathCheck(missing, total)
+
+
 class Path(object):
     """
     Any non-image shot tree path, trunk, or branch.
@@ -235,55 +339,54 @@ class FileSpec(Path):
         :rtype:  boolean
         :return: true if image(s) exist
         """
-        def exists(path):
-            logger.info("checking for existance of path: %s" % path)
-            if not os.path.exists(path):
-                return False
-            if os.path.getsize(path) == 0:
-                return False
-            return True
-        
-        if frame_set:
-            for f in frame_set:
-                path = self.get_frame_path(f)
-                if not exists(path):
-                    for ext in self.get_attribute("checkExt", list()):
-                        n = path[0:path.rfind(self.get_ext())]
-                        n = "%s%s" % (n, ext)
-                        if exists(n):
-                            return True
-                    return False
-        else:
-            for path in self.__fs:
-                if not exists(path):
-                    for ext in self.get_attribute("checkExt", list()):
-                        n = path[0:path.rfind(self.get_ext())]
-                        n = "%s%s" % (n, ext)
-                        if exists(n):
-                            return True
-                    return False
-        return True
+        return self.check_frames(frame_set)[0]
+
+    def check_frames(self, frame_set=None):
+        """
+        Check the existence of the images in the sequence.  Each
+        directory of the sequence is listed once.  An image of size
+        0 is missing, an image is found under any of the extensions
+        in the checkExt attribute.
+
+        :type  frame_set: FrameSet
+        :param frame_set: The frames to check, defaults to the frame
+                          set of the spec.
+
+        :rtype:  tuple
+        :return: true if all images exist, and the set of missing frames
+        """
+        missing = self.__check(frame_set).missing
+        logger.info("checked %s, %d frames missing" % (self.get_path(), len(missing)))
+        return not missing, missing
+
+    def get_missing_frames(self, frame_set=None):
+        """
+        Return the frames of the sequence that do not exist.
+
+        :rtype:  set<int>
+        :return: the missing frame numbers, or paths for a single file
+        """
+        return self.check_frames(frame_set)[1]
 
     def get_size(self, frame_set=None):
         """
         Return the size of the file or path.
         """
-        size = 0
+        result = self.__check(frame_set)
+        if result.missing:
+            logger.warn("Failed to find the size of %d frames of %s" % (
+                len(result.missing), self.get_path()))
+        return result.size
+
+    def __check(self, frame_set):
         if frame_set:
-            for f in frame_set:
-                path = self.get_frame_path(f)
-                try:
-                    size += os.path.getsize(path)
-                except OSError as e:
-                    logger.warn("Failed to find the size of: %s, %s" % (path, e))
+            paths = dict((f, self.get_frame_path(f)) for f in frame_set)
+        elif self.__fs.frameSet:
+            paths = dict(zip(self.get_frame_set(), self.__fs))
         else:
-            for path in self.__fs:
-                try:
-                    size += os.path.getsize(path)
-                except OSError as e:
-                    logger.warn("Failed to find the size of: %s, %s" % (path, e))
-                    
-        return size
+            # A single file spec has no frame numbers, key it by path.
+            paths = dict((path, path) for path in self.__fs)
+        return check_paths(paths, self.get_attribute("checkExt", list()))
 
     def get_basename(self):
         """
@@ -21,7 +21,6 @@ from __future__ import print_function
 from __future__ import division
 
 from builtins import str
-from builtins import range
 from builtins import object
 import future.types
 from future.utils import with_metaclass
@@ -41,6 +40,8 @@ from .depend import DependType
 from . import event
 from .exception import LayerException
 from .exception import SessionException
+from .frameindex import FrameRangeIndex
+from .frameindex import intersect_frame_range
 from . import io
 from .loader import current_outline
 from . import util
@@ -100,6 +101,9 @@ class Layer(with_metaclass(LayerType, object)):
         # A list to store what this layer depends on.
         self.__depends = []
 
+        # The layers this layer depends on, to skip duplicate depends.
+        self.__depend_on_layers = set()
+
         # If this layer is embedded within a another layer
         # the parent value will point to that layer.
         self.__parent = None
@@ -322,7 +326,10 @@ class Layer(with_metaclass(LayerType, object)):
         if self.__outline and self.__outline.get_mode() > 1:
             msg = "Layer names may only be changed in outline init mode."
             raise LayerException(msg)
+        old_name = self.__name
         self.__name = name
+        if self.__outline:
+            self.__outline.update_layer_name(self, old_name)
 
     def get_type(self):
         """
@@ -692,20 +699,7 @@ class Layer(with_metaclass(LayerType, object)):
             # if there is neither a layer range or ol range, return a single frame range.
 
             if rng and self.__outline.get_frame_range():
-                ol_rng = FileSequence.FrameSet(self.__outline.get_frame_range())
-                ly_rng = FileSequence.FrameSet(rng)
-
-                intersect = util.intersect_frame_set(ol_rng, ly_rng, normalize=False)
-                if not intersect:
-                    return None
-
-                # If nomalizing does not change the order of frames, return normalized
-                normalized = FileSequence.FrameSet(str(intersect))
-                normalized.normalize()
-                if list(intersect) == list(normalized):
-                    return str(normalized)
-
-                return str(intersect)
+                return intersect_frame_range(self.__outline.get_frame_range(), rng)
             elif rng:
                 return rng
 
@@ -736,26 +730,13 @@ class Layer(with_metaclass(LayerType, object)):
         if chunk == 1:
             return util.make_frame_set([int(start_frame)])
         else:
-            local_frame_set = []
             #
-            # Remove the duplicates out of our frame range.
+            # The frames this instance is responsible for are the chunk
+            # starting at the current frame in the frame range with
+            # duplicates removed.
             #
-            frame_range = FileSequence.FrameSet(self.get_frame_range())
-            frame_set = util.deaggregate_frame_set(frame_range)
-
-            #
-            # Now find the index for the current frame and start
-            # frame there. Find all of frames this instance
-            # is responsible for.
-            #
-            idx = frame_set.index(int(start_frame))
-            for i in range(idx, idx + chunk):
-                try:
-                    if frame_set[i] in local_frame_set:
-                        continue
-                    local_frame_set.append(frame_set[i])
-                except IndexError:
-                    break
+            frame_index = FrameRangeIndex.get(self.get_frame_range())
+            local_frame_set = frame_index.get_chunk(int(start_frame), chunk)
             if not local_frame_set:
                 raise LayerException("Frame %d is outside of the frame range."
                                      % start_frame)
@@ -824,13 +805,6 @@ class Layer(with_metaclass(LayerType, object)):
         :param any_frame: Wheaether or not to setup a depend any.
                           Default to False.
         """
-        # Check for duplicates.
-        for depend in self.__depends:
-            if depend.get_depend_on_layer() == on_layer:
-                logger.info("Skipping duplicated depend %s on %s" %
-                            (self, on_layer))
-                return
-
         if str(self) == str(on_layer):
             logger.info("Skipping setting up dependency on self %s" % self)
             return
@@ -841,6 +815,12 @@ class Layer(with_metaclass(LayerType, object)):
             logger.warn("%s layer does not exist, depend failed" % on_layer)
             return
 
+        # Check for duplicates.
+        if on_layer in self.__get_depend_on_layers():
+            logger.info("Skipping duplicated depend %s on %s" %
+                        (self, on_layer))
+            return
+
         logger.info("adding depend %s on %s" % (self, on_layer))
         #
         # Handle the depend any bullshit
@@ -858,6 +838,7 @@ class Layer(with_metaclass(LayerType, object)):
 
         depend = Depend(self, on_layer, depend_type, propigate, any_frame)
         self.__depends.append(depend)
+        self.__depend_on_layers.add(on_layer)
 
         # Setup pre-process dependencies
         for my_preprocess in self.get_preprocess_layers():
@@ -893,6 +874,8 @@ class Layer(with_metaclass(LayerType, object)):
             self.__depends.remove(depend)
         except Exception as e:
             logger.warn("failed to remove dependency %s, %s" % (depend, e))
+            return
+        self.__depend_on_layers = None
 
     def get_depends(self):
         """Return a tuple of dependencies this layer depends on."""
@@ -1097,6 +1080,21 @@ class Layer(with_metaclass(LayerType, object)):
             if out.get_attribute("mkdir"):
                 out.mkdir()
 
+    def __get_depend_on_layers(self):
+        """
+        Return the set of layers this layer depends on.  The set is
+        not serialized, it is rebuilt once the layer is loaded.
+        """
+        if self.__dict__.get("_Layer__depend_on_layers") is None:
+            self.__depend_on_layers = set(
+                depend.get_depend_on_layer() for depend in self.__depends)
+        return self.__depend_on_layers
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_Layer__depend_on_layers", None)
+        return state
+
     def __resolve_layer_name(self, layer):
         """
         Resolve a layer name to a layer object
@@ -25,7 +25,7 @@ from builtins import str
 from builtins import object
 import os
 import logging
-import simplejson
+import pickle
 import time
 import uuid
 import yaml
@@ -35,11 +35,14 @@ import six
 import FileSequence
 
 from . import constants
+from .depend import DependGraph
 from .depend import parse_require_str
+from .exception import DependCycleException
 from .exception import OutlineException
 from .exception import SessionException
 from .session import is_session_path
 from .session import Session
+from .session import YamlDataStore
 from . import util
 
 
@@ -47,6 +50,8 @@ logger = logging.getLogger("outline.loader")
 
 __all__ = ["Outline",
            "load_outline",
+           "load_compiled_outline",
+           "write_compiled_outline",
            "load_json",
            "parse_outline_script",
            "current_outline"]
@@ -77,8 +82,10 @@ def load_outline(path):
 
     ext = os.path.splitext(path)
     if ext[1] == ".yaml" or path.find("cue_archive") != -1:
-        with open(path) as file_object:
-            ol = yaml.load(file_object, Loader=yaml.FullLoader)
+        ol = load_compiled_outline(path)
+        if ol is None:
+            with open(path) as file_object:
+                ol = yaml.load(file_object, Loader=yaml.FullLoader)
         Outline.current = ol
         if not isinstance(ol, Outline):
             raise OutlineException("The file %s did not produce "
@@ -93,6 +100,95 @@ def load_outline(path):
 
     return ol
 
+def get_compiled_path(path):
+    """
+    Return the path of the compiled version of a serialized outline.
+
+    :type  path: str
+    :param path: The path to the serialized outline.
+
+    :rtype: str
+    :return: The path to the compiled outline.
+    """
+    return "%s.%s" % (os.path.splitext(path)[0], constants.COMPILED_OUTLINE_EXT)
+
+
+def write_compiled_outline(ol, path):
+    """
+    Write a compiled version of a serialized outline next to it.  The
+    compiled outline is a pickle of the outline, which frames load much
+    faster than the yaml.  It is only used as long as the size and
+    modification time of the yaml file match the ones recorded in it,
+    so editing the yaml file in the session still takes effect.
+
+    Failing to compile the outline is not an error, frames fall back
+    to loading the yaml file.
+
+    :type  ol: L{Outline}
+    :param ol: The outline, must not have a session set.
+    :type  path: str
+    :param path: The path to the serialized outline.
+
+    :rtype: str
+    :return: The path to the compiled outline or None if it failed.
+    """
+    compiled_path = get_compiled_path(path)
+    tmp_path = "%s.%s" % (compiled_path, uuid.uuid4().hex[:8])
+    try:
+        stat = os.stat(path)
+        header = {"version": constants.COMPILED_OUTLINE_VERSION,
+                  "size": stat.st_size,
+                  "mtime": stat.st_mtime}
+        with open(tmp_path, "wb") as file_object:
+            pickle.dump(header, file_object, protocol=2)
+            pickle.dump(ol, file_object, protocol=2)
+        os.rename(tmp_path, compiled_path)
+    except Exception as exp:
+        logger.warning("failed to compile outline %s, frames will load the "
+                       "yaml file instead, %s" % (path, exp))
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return None
+    return compiled_path
+
+
+def load_compiled_outline(path):
+    """
+    Load the compiled version of a serialized outline written by
+    L{write_compiled_outline}.
+
+    :type  path: str
+    :param path: The path to the serialized outline.
+
+    :rtype: L{Outline}
+    :return: The outline or None if there is no up to date compiled
+             version of the file.
+    """
+    compiled_path = get_compiled_path(path)
+    try:
+        stat = os.stat(path)
+        with open(compiled_path, "rb") as file_object:
+            header = pickle.load(file_object)
+            if (header.get("version") != constants.COMPILED_OUTLINE_VERSION or
+                    header.get("size") != stat.st_size or
+                    header.get("mtime") != stat.st_mtime):
+                logger.info("compiled outline %s is out of date" % compiled_path)
+                return None
+            ol = pickle.load(file_object)
+    except (IOError, OSError):
+        return None
+    except Exception as exp:
+        logger.warning("failed to load compiled outline %s, %s" % (compiled_path, exp))
+        return None
+
+    if not isinstance(ol, Outline):
+        logger.warning("compiled outline %s did not produce an "
+                       "Outline object." % compiled_path)
+        return None
+    logger.info("loaded compiled outline: %s" % compiled_path)
+    return ol
+
+
 def load_json(json):
     """
     Parse a json repesentation of an outline file.
@@ -117,6 +213,7 @@ def load_json(json):
         del result["name"]
         return result
 
+    import simplejson
     data = simplejson.loads(json)
     ol = Outline(current=True)
 
@@ -302,6 +399,12 @@ class Outline(object):
         #
         self.__layers = []
 
+        #
+        # The layers by name, maintained along with the list of
+        # layers.  It is not serialized, see __get_layer_map.
+        #
+        self.__layer_map = {}
+
         #
         # A hash of environement variables that are passed up
         # to opencue and then set before each frame is run.
@@ -425,9 +528,12 @@ class Outline(object):
             session = self.__session
             self.__session = None
 
-            # Now copy outline file in.
+            # Now copy outline file in.  It is always stored as yaml,
+            # whatever the session data store, since frames load it
+            # from its path.
             logger.info("serializing outline script to session path.")
-            session.put_data(os.path.basename(yaml_file), self)
+            YamlDataStore().put(session.get_path(), os.path.basename(yaml_file), self)
+            write_compiled_outline(self, yaml_file)
 
             # Switch the session back in.
             self.__session = session
@@ -450,7 +556,7 @@ class Outline(object):
         via the "require" argument.
         """
         logger.info("Setting up dependencies")
-        for layer in self.get_layers():
+        for layer in self.__layers:
             # Setup dependencies passed in via the layer's require argument.
             if layer.get_arg("require", False):
                 if not isinstance(layer.get_arg("require"), (tuple, list, set)):
@@ -470,22 +576,39 @@ class Outline(object):
                             logger.warn("Invalid layer in depend %s, skipping" % require)
                             continue
 
+        try:
+            self.get_depend_graph().get_sorted_layers()
+        except DependCycleException as e:
+            logger.warn("%s, frames in the cycle may never run." % e)
+
+    def get_depend_graph(self):
+        """
+        Return a graph of the dependencies between the outline's layers.
+
+        :rtype: L{DependGraph}
+        :return: The current dependencies of the layers.
+        """
+        return DependGraph(self.__layers)
+
     def add_layer(self, layer):
         """Adds a new layer."""
 
         if not layer.get_arg("register"):
             return
 
-        if layer in self.__layers:
+        layer_map = self.__get_layer_map()
+        existing = layer_map.get(layer.get_name())
+        if existing is layer:
             logger.info("The layer %s was already added to this outline." %
                         layer.get_name())
             return
 
-        if self.is_layer(layer.get_name()):
+        if existing is not None:
             raise OutlineException("The layer %s already exists"
                                    % layer.get_name())
 
         self.__layers.append(layer)
+        layer_map[layer.get_name()] = layer
         layer.set_outline(self)
         layer.after_init(self)
 
@@ -510,15 +633,26 @@ class Outline(object):
             msg = "Cannot remove layers to an outline not in init mode."
             raise OutlineException(msg)
 
-        if layer in self.__layers:
+        layer_map = self.__get_layer_map()
+        if layer_map.get(layer.get_name()) is layer:
             self.__layers.remove(layer)
+            del layer_map[layer.get_name()]
+
+    def update_layer_name(self, layer, old_name):
+        """
+        Re-index a layer of the outline under its new name.  Called
+        by L{Layer.set_name}.
+        """
+        layer_map = self.__get_layer_map()
+        if layer_map.get(old_name) is layer:
+            del layer_map[old_name]
+            layer_map[layer.get_name()] = layer
 
     def get_layer(self, name):
         """Return an later by name."""
 
-        layer_map = dict([(evt.get_name(), evt) for evt in self.__layers])
         try:
-            return layer_map[name]
+            return self.__get_layer_map()[name]
         except Exception as e:
             raise OutlineException("invalid layer name: %s, %s" % (name, e))
 
@@ -532,8 +666,22 @@ class Outline(object):
 
     def is_layer(self, name):
         """Return true if a layer exists with the specified name."""
-        layer_map = dict([(evt.get_name(), evt) for evt in self.__layers])
-        return name in layer_map
+        return name in self.__get_layer_map()
+
+    def __get_layer_map(self):
+        """
+        Return the layers by name.  The map is not serialized, it is
+        rebuilt once the outline is loaded.
+        """
+        if self.__dict__.get("_Outline__layer_map") is None:
+            self.__layer_map = dict(
+                (layer.get_name(), layer) for layer in self.__layers)
+        return self.__layer_map
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_Outline__layer_map", None)
+        return state
 
     def get_path(self):
         """Return the path to the outline file."""
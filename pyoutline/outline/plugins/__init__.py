@@ -18,5 +18,3 @@ from __future__ import print_function
 from __future__ import division
 
 from .manager import PluginManager
-
-PluginManager.load_all_plugins()
@@ -31,9 +31,14 @@ class PluginManager(object):
 
     registered_plugins = []
 
+    # The plugins enabled in the config are loaded when they are first
+    # used rather than when outline is imported, so executing a frame
+    # doesn't import the plugins and their dependencies.
+    all_plugins_loaded = False
+
     @classmethod
     def init_cuerun_plugins(cls, cuerun):
-        for plugin in cls.registered_plugins:
+        for plugin in cls.get_plugins():
             try:
                 plugin.init_cuerun_plugin(cuerun)
             except AttributeError as e:
@@ -73,6 +78,7 @@ class PluginManager(object):
 
     @classmethod
     def load_all_plugins(cls):
+        cls.all_plugins_loaded = True
         def section_priority(section_needing_key):
             priority_option = "priority"
             if config.has_option(section_needing_key, priority_option):
@@ -89,5 +95,7 @@ class PluginManager(object):
 
     @classmethod
     def get_plugins(cls):
+        if not cls.all_plugins_loaded:
+            cls.load_all_plugins()
         return cls.registered_plugins
 
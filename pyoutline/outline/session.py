@@ -24,7 +24,9 @@ from builtins import str
 from builtins import object
 import os
 import logging
+import pickle
 import shutil
+import threading
 import uuid
 import yaml
 
@@ -33,10 +35,18 @@ from .exception import SessionException
 
 
 __all__ = ["is_session_path",
+           "get_data_store",
+           "DataStore",
+           "YamlDataStore",
+           "PickleDataStore",
+           "SqliteDataStore",
            "Session"]
 
 logger = logging.getLogger("outline.session")
 
+# The data store used when outline.cfg doesn't set session_store.
+DEFAULT_DATA_STORE = "yaml"
+
 
 def is_session_path(folder):
     """
@@ -58,6 +68,280 @@ def is_session_path(folder):
     return True
 
 
+def get_data_store(name=None, cache=None):
+    """
+    Create the data store session data is put into and read from.
+
+    :type  name: str
+    :param name: yaml, pickle or sqlite. Defaults to the session_store
+                 option of outline.cfg.
+    :type  cache: bool
+    :param cache: Keep the data read in memory. Defaults to the
+                  session_cache option of outline.cfg.
+
+    :rtype: L{DataStore}
+    :return: A new data store.
+    """
+    if name is None:
+        name = DEFAULT_DATA_STORE
+        if config.has_option("outline", "session_store"):
+            name = config.get("outline", "session_store") or name
+    if cache is None:
+        cache = False
+        if config.has_option("outline", "session_cache"):
+            cache = config.getboolean("outline", "session_cache")
+    try:
+        return DATA_STORES[name](cache=cache)
+    except KeyError:
+        raise SessionException("Invalid session store %s, must be one of: %s" % (
+            name, ", ".join(sorted(DATA_STORES))))
+
+
+def _write_atomic(path, payload):
+    """
+    Write a file by renaming a temporary file over it, so readers on
+    other hosts never see a partially written file.
+    """
+    tmp_path = "%s.%s" % (path, uuid.uuid4().hex[:8])
+    try:
+        with open(tmp_path, "wb") as file_object:
+            file_object.write(payload)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _read_file(path):
+    """Return the contents of a file or None if it does not exist."""
+    try:
+        with open(path, "rb") as file_object:
+            return file_object.read()
+    except (IOError, OSError):
+        return None
+
+
+class DataStore(object):
+    """
+    Stores the session data of a session path, which is the session
+    or a layer directory.  Subclasses implement the encoding and the
+    storage of the data.
+
+    The data read can be kept in memory, which saves frames reading
+    the same data many times from the shot tree.  Data changed by
+    another process is not seen once it has been read.
+    """
+
+    # The session_store name of the store.
+    NAME = None
+
+    def __init__(self, cache=False):
+        object.__init__(self)
+        self.__cache = {} if cache else None
+
+    def encode(self, data):
+        """Encode data into the stored bytes."""
+        raise NotImplementedError()
+
+    def decode(self, payload):
+        """Decode stored bytes into data."""
+        raise NotImplementedError()
+
+    def write(self, path, name, payload, force):
+        """
+        Store the payload of a name.  Raise a SessionException if
+        force is false and there is already data stored under the name.
+        """
+        raise NotImplementedError()
+
+    def read(self, path, name):
+        """Return the payload of a name or None if nothing is stored."""
+        raise NotImplementedError()
+
+    def put(self, path, name, data, force=False):
+        """
+        Serialize and store data under a name.
+
+        :type  path: str
+        :param path: The session path of the session or layer.
+        :type  name: str
+        :param name: A unique name for the data.
+        :type  data: mixed
+        :param data: The data.
+        :type  force: bool
+        :param force: Overwrite data with the same name if it exists.
+        """
+        payload = self.encode(data)
+        self.write(path, name, payload, force)
+        if self.__cache is not None:
+            self.__cache[(path, name)] = payload
+
+    def get(self, path, name):
+        """
+        Retrieve the data stored under a name.
+
+        :type  path: str
+        :param path: The session path of the session or layer.
+        :type  name: str
+        :param name: The name given to the data.
+
+        :rtype: mixed
+        :return: The data.
+        """
+        key = (path, name)
+        if self.__cache is not None and key in self.__cache:
+            return self.decode(self.__cache[key])
+
+        payload = self.read(path, name)
+        if payload is None:
+            return self.get_missing(path, name)
+        if self.__cache is not None:
+            self.__cache[key] = payload
+        try:
+            return self.decode(payload)
+        except Exception as exp:
+            msg = "failed to load data %s from %s, %s"
+            raise SessionException(msg % (name, path, exp))
+
+    def get_missing(self, path, name):
+        """Called by get when nothing is stored under a name."""
+        raise SessionException("There is not data in the session \
+                stored under that name.")
+
+
+class YamlDataStore(DataStore):
+    """
+    Stores each value as a yaml file named after it.  Outlines are
+    always stored this way, so they can be loaded from their path.
+    """
+
+    NAME = "yaml"
+
+    def encode(self, data):
+        return yaml.dump(data).encode("utf-8")
+
+    def decode(self, payload):
+        return yaml.load(payload, Loader=yaml.FullLoader)
+
+    def write(self, path, name, payload, force):
+        file_path = "%s/%s" % (path, name)
+        if not force and os.path.exists(file_path):
+            raise SessionException("There is already data being \
+                stored under this name.")
+        _write_atomic(file_path, payload)
+
+    def read(self, path, name):
+        file_path = "%s/%s" % (path, name)
+        logger.debug("opening data path for %s : %s" % (name, file_path))
+        return _read_file(file_path)
+
+    def exists(self, path, name):
+        """Return true if there is a yaml file stored under a name."""
+        return os.path.exists("%s/%s" % (path, name))
+
+
+class PickleDataStore(YamlDataStore):
+    """
+    Stores each value as a pickle file named after it, which is much
+    faster to read than yaml.  Data stored as yaml by an older session
+    is still read.
+    """
+
+    NAME = "pickle"
+    EXT = "pickle"
+
+    def encode(self, data):
+        return pickle.dumps(data, protocol=2)
+
+    def decode(self, payload):
+        return pickle.loads(payload)
+
+    def write(self, path, name, payload, force):
+        if not force and self.exists(path, name):
+            raise SessionException("There is already data being \
+                stored under this name.")
+        _write_atomic("%s/%s.%s" % (path, name, self.EXT), payload)
+
+    def read(self, path, name):
+        return _read_file("%s/%s.%s" % (path, name, self.EXT))
+
+    def exists(self, path, name):
+        return (os.path.exists("%s/%s.%s" % (path, name, self.EXT)) or
+                YamlDataStore.exists(self, path, name))
+
+    def get_missing(self, path, name):
+        return YamlDataStore().get(path, name)
+
+
+class SqliteDataStore(PickleDataStore):
+    """
+    Stores the pickled values of a session path in a single sqlite
+    database, so reading data opens one file per session path instead
+    of one per value.  Sqlite locking is not reliable on every network
+    file system, prefer the pickle store on those.  Data stored as
+    yaml by an older session is still read.  sqlite3 is imported on use.
+    """
+
+    NAME = "sqlite"
+    DB_NAME = "session.db"
+
+    def __init__(self, cache=False):
+        PickleDataStore.__init__(self, cache=cache)
+        self.__local = threading.local()
+
+    def __get_connection(self, path):
+        """Return this thread's connection to the database of a path."""
+        import sqlite3
+        connections = getattr(self.__local, "connections", None)
+        if connections is None:
+            connections = self.__local.connections = {}
+        if path not in connections:
+            connection = sqlite3.connect("%s/%s" % (path, self.DB_NAME), timeout=60)
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS data "
+                                   "(name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            connections[path] = connection
+        return connections[path]
+
+    def write(self, path, name, payload, force):
+        import sqlite3
+        if not force and YamlDataStore.exists(self, path, name):
+            raise SessionException("There is already data being \
+                stored under this name.")
+        statement = "INSERT OR REPLACE" if force else "INSERT"
+        try:
+            with self.__get_connection(path) as connection:
+                connection.execute("%s INTO data (name, value) VALUES (?, ?)" % statement,
+                                   (name, sqlite3.Binary(payload)))
+        except sqlite3.IntegrityError:
+            raise SessionException("There is already data being \
+                stored under this name.")
+        except sqlite3.Error as exp:
+            raise SessionException("failed to store data %s in %s, %s" % (name, path, exp))
+
+    def read(self, path, name):
+        import sqlite3
+        try:
+            row = self.__get_connection(path).execute(
+                "SELECT value FROM data WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error as exp:
+            raise SessionException("failed to read data %s from %s, %s" % (name, path, exp))
+        if row is None:
+            return None
+        return bytes(row[0])
+
+    def exists(self, path, name):
+        return self.read(path, name) is not None or YamlDataStore.exists(self, path, name)
+
+
+DATA_STORES = {
+    "yaml": YamlDataStore,
+    "pickle": PickleDataStore,
+    "sqlite": SqliteDataStore,
+}
+
+
 class Session(object):
     """
     The session provides global storage space for an outline.  This
@@ -67,7 +351,9 @@ class Session(object):
     Using put_file, get_file you can copy files into this location which
     can be used by all frames. Useing put_data, get_data you can
     serialize and unserialize data into this session than can be used
-    by all frames.
+    by all frames.  The data is stored by the L{DataStore} selected with
+    the session_store option of outline.cfg when the session is created,
+    loaded sessions keep the store they were created with.
     """
 
     def __init__(self, ol):
@@ -83,6 +369,9 @@ class Session(object):
         # The path of a loaded session.
         self.__path = None
 
+        # Stores the session data.
+        self.__data_store = None
+
         if is_session_path(self.__outline.get_path()):
             self.__load_session()
         else:
@@ -122,6 +411,12 @@ class Session(object):
                 finally:
                     os.umask(old_mask)
 
+            # Frames read the data with the store it was written with,
+            # whatever their own outline.cfg says.
+            self.__data_store = get_data_store()
+            _write_atomic("%s/session_store" % base_path,
+                          self.__data_store.NAME.encode("utf-8"))
+
             # finally, set the session path so any calls to get_path
             # will return the proper value.
             self.__path = base_path
@@ -147,6 +442,10 @@ class Session(object):
                 raise SessionException(msg % (session, exp))
         self.__name = data
         self.__path = os.path.dirname(self.__outline.get_path())
+        # Sessions created before the store was recorded use the
+        # configured one.
+        store = _read_file("%s/session_store" % self.__path)
+        self.__data_store = get_data_store(store.decode("utf-8").strip() if store else None)
         logger.info("session loaded: %s" % self.__name)
 
     def get_name(self):
@@ -318,16 +617,7 @@ class Session(object):
                       [Optional]
         """
 
-        path = "%s/%s" % (self.get_path(layer), name)
-        if os.path.exists(path) and not force:
-            raise SessionException("There is already data being \
-                stored under this name.")
-
-        fp = open(path, "w")
-        try:
-            fp.write(yaml.dump(data))
-        finally:
-            fp.close()
+        self.__data_store.put(self.get_path(layer), name, data, force)
 
     def get_data(self, name, layer=None):
         """
@@ -343,18 +633,16 @@ class Session(object):
         :return: Previously stored data.
         """
 
-        path = "%s/%s" % (self.get_path(layer), name)
-        if not os.path.exists(path):
-            raise SessionException("There is not data in the session \
-                stored under that name.")
+        return self.__data_store.get(self.get_path(layer), name)
 
-        logger.debug("opening data path for %s : %s" % (name, path))
-        with open(path) as file_object:
-            try:
-                return yaml.load(file_object, Loader=yaml.FullLoader)
-            except Exception as exp:
-                msg = "failed to load yaml data from %s, %s"
-                raise SessionException(msg % (path, exp))
+    def get_data_store(self):
+        """
+        Return the data store of the session.
+
+        :rtype: L{DataStore}
+        :return: The store put_data and get_data use.
+        """
+        return self.__data_store
 
     def get_path(self, layer=None):
         """
@@ -24,11 +24,16 @@ import os
 import unittest
 import xml.etree.ElementTree as ET
 
+import six
+
 import opencue.compiled_proto.job_pb2
+import opencue.exception
 import opencue.wrappers.job
 
 import outline
 import outline.backend.cue
+import outline.cuerun
+from outline.modules.shell import Shell
 from .. import test_utils
 
 
@@ -86,6 +91,58 @@ class SerializeTest(unittest.TestCase):
         self.assertEqual(0, len(list(outlineXml.find('depends'))))
 
 
+    def testSerializeDepends(self):
+        outline.Outline.current = None
+        ol = outline.Outline(name='depends&test', frame_range='1-10')
+        layerA = Shell('a<1>', command=['echo', '"a" & b'])
+        layerB = Shell('b', command=['/bin/ls'], limits=['lic'])
+        ol.add_layer(layerA)
+        ol.add_layer(layerB)
+        layerB.depend_all(layerA)
+        launcher = outline.cuerun.OutlineLauncher(ol, user=TEST_USER)
+
+        outlineXml = ET.fromstring(outline.backend.cue.serialize_simple(launcher))
+
+        job = outlineXml.find('job')
+        self.assertEqual('depends&test', job.get('name'))
+        layers = job.find('layers').findall('layer')
+        self.assertEqual(['a<1>', 'b'], [layer.get('name') for layer in layers])
+        self.assertEqual('echo "a" & b', layers[0].find('cmd').text)
+        self.assertEqual(['lic'], [limit.text for limit in layers[1].find('limits')])
+        depends = outlineXml.find('depends').findall('depend')
+        self.assertEqual(1, len(depends))
+        self.assertEqual('LAYER_ON_LAYER', depends[0].get('type'))
+        self.assertEqual('False', depends[0].get('anyframe'))
+        self.assertEqual(['depends&test', 'b', 'depends&test', 'a<1>'],
+                         [element.text for element in depends[0]])
+
+    def testSerializeToStream(self):
+        path = os.path.join(SCRIPTS_DIR, 'shell.outline')
+        ol = outline.load_outline(path)
+        launcher = outline.cuerun.OutlineLauncher(ol, user=TEST_USER)
+        stream = six.StringIO()
+
+        with mock.patch('outline.backend.cue.parseString') as parseStringMock:
+            self.assertIsNone(outline.backend.cue.serialize(launcher, stream))
+            spec = outline.backend.cue.serialize(launcher)
+
+        self.assertEqual(spec, stream.getvalue())
+        self.assertTrue(spec.startswith('<?xml version="1.0"?><!DOCTYPE spec'))
+        # The spec is only pretty printed for debug logging
+        parseStringMock.assert_not_called()
+
+    def testSerializeWithoutLayers(self):
+        outline.Outline.current = None
+        ol = outline.Outline(name='empty', frame_range='1-10')
+        ol.add_layer(Shell('a', command=['/bin/ls'], range='20-30'))
+        launcher = outline.cuerun.OutlineLauncher(ol, user=TEST_USER)
+        stream = six.StringIO()
+
+        self.assertRaises(outline.OutlineException,
+                          outline.backend.cue.serialize, launcher, stream)
+        self.assertEqual('', stream.getvalue())
+
+
 class BuildCommandTest(unittest.TestCase):
     def setUp(self):
         path = os.path.join(SCRIPTS_DIR, 'shell.outline')
@@ -205,6 +262,120 @@ class LaunchTest(unittest.TestCase):
         launchSpecAndWaitMock.assert_called_with(serializedXml)
 
 
+
+def launchSpecAndWait(spec):
+    """Returns a job per job of a spec, fails on jobs named bad."""
+    names = [job.get('name') for job in ET.fromstring(spec[spec.index('<spec>'):]).iter('job')]
+    if 'bad' in names:
+        raise opencue.exception.CueException('failed to launch %s' % names)
+    return [opencue.wrappers.job.Job(opencue.compiled_proto.job_pb2.Job(name=name))
+            for name in names]
+
+
+@mock.patch('opencue.cuebot.Cuebot.getStub')
+@mock.patch('opencue.api.launchSpecAndWait', side_effect=launchSpecAndWait)
+class LaunchBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        outline.Outline.current = None
+        # Outline setup exports the show and shot
+        environ = mock.patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def createOutline(self, name, layerRange='1-10'):
+        ol = outline.Outline(name=name, frame_range='1-10')
+        ol.add_layer(Shell('cmd', command=['/bin/ls'], range=layerRange))
+        return ol
+
+    def testMergedSpecs(self, launchSpecAndWaitMock, getStubMock):
+        outlines = [self.createOutline('render'), self.createOutline('comp'),
+                    outline.cuerun.OutlineLauncher(self.createOutline('other'),
+                                                   shot='other', user=TEST_USER)]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, user=TEST_USER)
+
+        self.assertEqual([['render'], ['comp'], ['other']],
+                         [[job.name() for job in jobs] for jobs, _ in results])
+        self.assertEqual([None] * 3, [error for _, error in results])
+        # Outlines of the same shot are launched in a single spec
+        self.assertEqual([['render', 'comp'], ['other']], [
+            [job.get('name') for job in ET.fromstring(call[0][0][call[0][0].index('<spec>'):])
+             .iter('job')] for call in launchSpecAndWaitMock.call_args_list])
+        for ol in outlines[:2]:
+            self.assertEqual(outline.constants.OUTLINE_MODE_READY, ol.get_mode())
+
+    def testFailedSpecRetriedPerJob(self, launchSpecAndWaitMock, getStubMock):
+        outlines = [self.createOutline('good'), self.createOutline('bad')]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, user=TEST_USER)
+
+        self.assertEqual(['good'], [job.name() for job in results[0][0]])
+        self.assertIsNone(results[0][1])
+        self.assertIsNone(results[1][0])
+        self.assertIsInstance(results[1][1], opencue.exception.CueException)
+        self.assertEqual(3, launchSpecAndWaitMock.call_count)
+
+    def testOutlineWithoutLayers(self, launchSpecAndWaitMock, getStubMock):
+        outlines = [self.createOutline('empty', layerRange='20-30'), self.createOutline('render')]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, user=TEST_USER)
+
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], outline.OutlineException)
+        self.assertEqual(['render'], [job.name() for job in results[1][0]])
+        launchSpecAndWaitMock.assert_called_once()
+
+    def testSerializeError(self, launchSpecAndWaitMock, getStubMock):
+        broken = self.createOutline('broken')
+        broken.get_layer('cmd').set_arg('command', None)
+        outlines = [broken, self.createOutline('render')]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, use_pycuerun=False,
+                                                  user=TEST_USER)
+
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], TypeError)
+        self.assertEqual(['render'], [job.name() for job in results[1][0]])
+
+    @mock.patch('opencue.Cuebot.setHosts')
+    def testServer(self, setHostsMock, launchSpecAndWaitMock, getStubMock):
+        launched = []
+        setHostsMock.side_effect = lambda hosts: launched.append(hosts)
+        launchSpecAndWaitMock.side_effect = lambda spec: (
+            launched.append(spec), launchSpecAndWait(spec))[1]
+        outlines = [outline.cuerun.OutlineLauncher(self.createOutline('other'),
+                                                   server='cuebot2', user=TEST_USER),
+                    self.createOutline('render')]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, user=TEST_USER)
+
+        self.assertEqual([['other'], ['render']],
+                         [[job.name() for job in jobs] for jobs, _ in results])
+        # Outlines without a server are launched before the host is set
+        self.assertEqual(3, len(launched))
+        self.assertIn('render', launched[0])
+        self.assertEqual(['cuebot2'], launched[1])
+        self.assertIn('other', launched[2])
+
+    def testMissingJobs(self, launchSpecAndWaitMock, getStubMock):
+        launchSpecAndWaitMock.side_effect = lambda spec: launchSpecAndWait(spec)[:1]
+        outlines = [self.createOutline('render'), self.createOutline('comp')]
+
+        with test_utils.TemporarySessionDirectory():
+            results = outline.cuerun.launch_batch(outlines, user=TEST_USER)
+
+        self.assertEqual([None, None], [jobs for jobs, _ in results])
+        for _, error in results:
+            self.assertIsInstance(error, outline.OutlineException)
+        launchSpecAndWaitMock.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
 
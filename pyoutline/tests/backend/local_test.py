@@ -20,11 +20,14 @@ from __future__ import division
 from __future__ import absolute_import
 
 import os
+import threading
 import mock
 import unittest
 
 import outline
 import outline.backend.local
+from outline.depend import DependType
+from outline.modules.shell import Shell
 
 
 SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
@@ -91,5 +94,198 @@ class DispatcherTest(unittest.TestCase):
         outline.backend.local.launch(launcher)
 
 
+class ParallelDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        outline.config.set('outline', 'home', '')
+        outline.config.set('outline', 'user_dir', '')
+        self.ol = outline.Outline('local_test', frame_range='1-4', current=True)
+        self.ol.set_path('/tmp/local_test.outline')
+        self.lock = threading.Lock()
+        self.ran = []
+        self.failures = set()
+
+    def run_frame(self, command, shell=False):
+        """Record the FRAME-LAYER the command runs."""
+        task = command[5].split()[-1]
+        with self.lock:
+            self.ran.append(task)
+        return 1 if task in self.failures else 0
+
+    def dispatch(self, workers=4):
+        with mock.patch('subprocess.call', side_effect=self.run_frame):
+            dispatcher = outline.backend.local.Dispatcher(self.ol, workers)
+            result = dispatcher.dispatch()
+        return dispatcher, result
+
+    def testDispatchAll(self):
+        Shell('a', command=['/bin/true'])
+        Shell('b', command=['/bin/true'])
+
+        dispatcher, result = self.dispatch()
+
+        self.assertTrue(result)
+        self.assertEqual(8, len(self.ran))
+        self.assertEqual(8, dispatcher.get_progress()[outline.backend.local.SUCCEEDED])
+        self.assertTrue(all(task.exit_status == 0 for task in dispatcher.get_tasks()))
+
+    def testSerialOrder(self):
+        Shell('a', command=['/bin/true'])
+        Shell('b', command=['/bin/true'])
+
+        self.dispatch(workers=1)
+
+        self.assertEqual(['1-a', '1-b', '2-a', '2-b', '3-a', '3-b', '4-a', '4-b'], self.ran)
+
+    def testLayerOnLayer(self):
+        layer_a = Shell('a', command=['/bin/true'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_b.depend_all(layer_a)
+
+        self.dispatch()
+
+        self.assertEqual({'1-a', '2-a', '3-a', '4-a'}, set(self.ran[:4]))
+        self.assertEqual({'1-b', '2-b', '3-b', '4-b'}, set(self.ran[4:]))
+
+    def testLayerDependsWaitOnLayerProgress(self):
+        layer_a = Shell('a', command=['/bin/true'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_b.depend_all(layer_a)
+
+        dispatcher = outline.backend.local.Dispatcher(self.ol, 4)
+
+        tasks = dispatcher.get_tasks()
+        # Layer depends don't link every pair of tasks.
+        self.assertEqual([], [t for t in tasks if t.dependents])
+        progress = tasks[0].progress
+        self.assertEqual(4, progress.total)
+        self.assertEqual(['b'] * 4, [t.layer.get_name() for t in progress.all_waiters])
+        self.assertEqual([1] * 4, [t.waiting_on for t in tasks if t.layer is layer_b])
+
+    def testLayerOnLayerFailed(self):
+        layer_a = Shell('a', command=['/bin/true'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_b.depend_all(layer_a)
+        self.failures.add('4-a')
+
+        dispatcher, result = self.dispatch(workers=1)
+
+        self.assertFalse(result)
+        self.assertEqual(['1-a', '2-a', '3-a', '4-a'], self.ran)
+        self.assertEqual(4, dispatcher.get_progress()[outline.backend.local.DEPEND_DEAD])
+
+    def testFrameByFrame(self):
+        layer_a = Shell('a', command=['/bin/true'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_b.depend_on(layer_a, DependType.FrameByFrame)
+
+        dispatcher, _ = self.dispatch()
+
+        for frame in range(1, 5):
+            self.assertLess(self.ran.index('%d-a' % frame), self.ran.index('%d-b' % frame))
+        task = [t for t in dispatcher.get_tasks() if t.get_name() == '0002-b'][0]
+        self.assertEqual(['0002-a'], [t.get_name() for t in
+                                       dispatcher.get_tasks() if task in t.dependents])
+
+    def testFailedFrameSkipsDependents(self):
+        layer_a = Shell('a', command=['/bin/false'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_b.depend_on(layer_a, DependType.FrameByFrame)
+        self.failures.add('2-a')
+
+        dispatcher, result = self.dispatch()
+
+        self.assertFalse(result)
+        self.assertNotIn('2-b', self.ran)
+        progress = dispatcher.get_progress()
+        self.assertEqual(6, progress[outline.backend.local.SUCCEEDED])
+        self.assertEqual(1, progress[outline.backend.local.DEAD])
+        self.assertEqual(1, progress[outline.backend.local.DEPEND_DEAD])
+        dead = [t for t in dispatcher.get_tasks() if t.state == outline.backend.local.DEAD]
+        self.assertEqual(1, dead[0].exit_status)
+
+    def create_depend_any_layers(self):
+        """
+        Create layers a, b and c, the preprocess of c depends on any
+        frame of a and on all of b.
+        """
+        Shell('a', command=['/bin/true'])
+        layer_b = Shell('b', command=['/bin/true'])
+        layer_c = Shell('c', command=['/bin/true'])
+        preprocess = outline.layer.LayerPreProcess(layer_c, command=['/bin/true'])
+        layer_c.depend_all('a', any_frame=True)
+        preprocess.depend_all(layer_b)
+        return preprocess
+
+    def testDependAnyWithLayerDepend(self):
+        preprocess = self.create_depend_any_layers()
+
+        dispatcher, result = self.dispatch(workers=1)
+
+        self.assertTrue(result)
+        task = [t for t in dispatcher.get_tasks() if t.layer is preprocess][0]
+        self.assertEqual(0, task.waiting_on)
+        last_b = max(self.ran.index('%d-b' % frame) for frame in range(1, 5))
+        self.assertGreater(self.ran.index('1-c_preprocess'), last_b)
+
+    def testDependAnyWithFailedLayerDepend(self):
+        self.create_depend_any_layers()
+        self.failures.add('3-b')
+
+        dispatcher, result = self.dispatch(workers=1)
+
+        self.assertFalse(result)
+        self.assertEqual([], [task for task in self.ran if task.endswith('c_preprocess')])
+        self.assertEqual([], [task for task in self.ran if task.endswith('-c')])
+        self.assertEqual(5, dispatcher.get_progress()[outline.backend.local.DEPEND_DEAD])
+
+    def testDependAnyAllFailed(self):
+        self.create_depend_any_layers()
+        self.failures.update(['1-a', '2-a', '3-a', '4-a'])
+
+        dispatcher, result = self.dispatch(workers=1)
+
+        self.assertFalse(result)
+        self.assertEqual([], [task for task in self.ran if 'c' in task])
+        self.assertEqual(5, dispatcher.get_progress()[outline.backend.local.DEPEND_DEAD])
+
+    def testDependAnyOneSucceeded(self):
+        self.create_depend_any_layers()
+        self.failures.update(['1-a', '2-a', '3-a'])
+
+        dispatcher, result = self.dispatch(workers=1)
+
+        self.assertFalse(result)
+        # The preprocess waits on any frame of a, c on its frames of a.
+        self.assertIn('1-c_preprocess', self.ran)
+        self.assertIn('4-c', self.ran)
+        self.assertEqual(3, dispatcher.get_progress()[outline.backend.local.DEAD])
+        self.assertEqual(3, dispatcher.get_progress()[outline.backend.local.DEPEND_DEAD])
+
+    def testThreadsLimitParallelFrames(self):
+        Shell('a', command=['/bin/true'], threads=2)
+        running = []
+        peak = []
+
+        def run_frame(command, shell=False):
+            with self.lock:
+                running.append(command)
+                peak.append(len(running))
+            threading.Event().wait(0.01)
+            with self.lock:
+                running.remove(command)
+            return 0
+
+        with mock.patch('subprocess.call', side_effect=run_frame):
+            self.assertTrue(outline.backend.local.Dispatcher(self.ol, 4).dispatch())
+
+        self.assertEqual(2, max(peak))
+
+    def testLocalCores(self):
+        outline.config.set('outline', 'local_cores', '3')
+        self.addCleanup(outline.config.set, 'outline', 'local_cores', '')
+
+        self.assertEqual(3, outline.backend.local.get_local_workers())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import os
+import subprocess
+import sys
+import unittest
+
+import outline
+from outline.modules.shell import Shell
+from . import test_utils
+
+
+EXECUTE_FRAME = '''
+import sys
+import outline.cuerun
+outline.cuerun.execute_frame(sys.argv[1], sys.argv[2], sys.argv[3])
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+class ExecuteFrameTest(unittest.TestCase):
+
+    def test_execute_frame_imports(self):
+        """Test executing a frame doesn't import the cue backend or plugins."""
+        outline.Outline.current = None
+        ol = outline.Outline(name='execute_frame', frame_range='1-1')
+        ol.add_layer(Shell('cmd', command=['/bin/true']))
+
+        with test_utils.TemporarySessionDirectory():
+            ol.setup()
+            # Run the frame in a new interpreter, this one has already
+            # imported most modules.
+            output = subprocess.check_output(
+                [sys.executable, '-c', EXECUTE_FRAME, ol.get_path(), 'cmd', '1'],
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+                universal_newlines=True)
+
+        modules = set(output.splitlines()[-1].split())
+        self.assertIn('outline.cuerun', modules)
+        for module in ('grpc', 'opencue', 'outline.backend.cue', 'outline.plugins.local'):
+            self.assertNotIn(module, modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,6 +22,7 @@ from __future__ import division
 import unittest
 
 import outline
+from outline.depend import DependGraph
 from outline.depend import DependType
 from outline.modules.shell import Shell
 from . import test_utils
@@ -85,6 +86,70 @@ class DependTest(unittest.TestCase):
             self.assertEqual(layer1, depends[0].get_depend_on_layer())
 
 
+    def testDuplicateDependByName(self):
+        layer1 = Shell('bah1', command=['/bin/ls'])
+        layer2 = Shell('bah2', command=['/bin/ls'])
+
+        ol = outline.Outline(name='depend_test_duplicate')
+        ol.add_layer(layer1)
+        ol.add_layer(layer2)
+        layer1.depend_all(layer2)
+        layer1.depend_all('bah2')
+        layer1.depend_on('bah2')
+
+        self.assertEqual(1, len(layer1.get_depends()))
+
+        layer1.undepend(layer1.get_depends()[0])
+        layer1.depend_on('bah2')
+        self.assertEqual(DependType.FrameByFrame, layer1.get_depends()[0].get_type())
+
+
+class DependGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        outline.Outline.current = None
+        self.ol = outline.Outline(name='depend_graph_test')
+        self.layers = []
+        for name in ('a', 'b', 'c', 'd'):
+            layer = Shell(name, command=['/bin/ls'])
+            self.ol.add_layer(layer)
+            self.layers.append(layer)
+
+    def testSortedLayers(self):
+        a, b, c, d = self.layers
+        a.depend_on(c)
+        c.depend_on(d)
+        b.depend_on(d)
+
+        graph = self.ol.get_depend_graph()
+
+        self.assertEqual([d, b, c, a], graph.get_sorted_layers())
+        self.assertIsNone(graph.find_cycle())
+        self.assertTrue(graph.has_depend(a, c))
+        self.assertFalse(graph.has_depend(c, a))
+        self.assertEqual([b, c], [depend.get_dependant_layer()
+                                  for depend in graph.get_dependents(d)])
+
+    def testCycle(self):
+        a, b, c, d = self.layers
+        a.depend_on(b)
+        b.depend_on(c)
+        c.depend_previous(a)
+
+        graph = self.ol.get_depend_graph()
+
+        self.assertEqual([a, b, c, a], graph.find_cycle())
+        self.assertRaises(outline.exception.DependCycleException, graph.get_sorted_layers)
+
+    def testDuplicateDepend(self):
+        a, b, c, d = self.layers
+        a.depend_on(b)
+        graph = DependGraph([a, b])
+
+        self.assertFalse(graph.add_depend(outline.depend.Depend(a, b, DependType.LayerOnLayer)))
+        self.assertEqual(1, len(graph.get_depends(a)))
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import unittest
+
+import FileSequence
+
+from outline import util
+from outline.frameindex import FrameRangeIndex
+from outline.frameindex import intersect_frame_range
+
+
+SPECS = ['1', '-5', '1-10', '10-1', '1-100x3', '100-1x-7', '-10--1', '1-10y3',
+         '1-10:5', '1-5,10-20x2', '20-30,1-10', '1-10,5-15', '1,2,3,4,10,12,14',
+         '1,3,2', '5,5,5', '1-10x2,2-10x2', '1-20x4,3-20x4']
+
+
+class FrameRangeIndexTest(unittest.TestCase):
+
+    def test_frames_match_frame_set(self):
+        for spec in SPECS:
+            expected = util.deaggregate_frame_set(FileSequence.FrameSet(spec))
+            index = FrameRangeIndex(spec)
+
+            self.assertEqual(expected, list(index), spec)
+            self.assertEqual(len(expected), len(index), spec)
+            self.assertEqual(expected, [index[i] for i in range(len(index))], spec)
+            for position, frame in enumerate(expected):
+                self.assertEqual(position, index.index(frame), spec)
+
+    def test_missing_frames(self):
+        index = FrameRangeIndex('1-100x3,200-300')
+
+        for frame in (0, 2, 101, 150, 199, 301):
+            self.assertEqual(-1, index.index(frame))
+            self.assertFalse(frame in index)
+
+    def test_get_chunk(self):
+        index = FrameRangeIndex('1-10,20-25')
+
+        self.assertEqual([8, 9, 10, 20, 21], index.get_chunk(8, 5))
+        self.assertEqual([24, 25], index.get_chunk(24, 5))
+        self.assertEqual([], index.get_chunk(15, 5))
+
+    def test_get_chunk_starts(self):
+        self.assertEqual([1, 11, 21], FrameRangeIndex('1-30').get_chunk_starts(10))
+        self.assertEqual([1], FrameRangeIndex('1-30').get_chunk_starts(100))
+
+    def test_large_range(self):
+        index = FrameRangeIndex('1-1000000')
+
+        self.assertEqual(1000000, len(index))
+        self.assertEqual(500000, index[499999])
+        self.assertEqual(list(range(999998, 1000001)), index.get_chunk(999998, 10))
+
+    def test_get_is_cached(self):
+        self.assertIs(FrameRangeIndex.get('1-50'), FrameRangeIndex.get('1-50'))
+
+    def test_intersect_frame_range(self):
+        self.assertEqual('1000,1008,1016', intersect_frame_range('1000-1016x8', '1000-2000'))
+        self.assertEqual('3,2', intersect_frame_range('5-1x-1', '2-3'))
+        self.assertIsNone(intersect_frame_range('1-10', '11-20'))
+
+
+if __name__ == '__main__':
+    unittest.main()
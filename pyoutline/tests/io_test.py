@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import outline.io
+
+
+class CheckPathsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def create(self, name, contents='data'):
+        path = os.path.join(self.tmp_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fp:
+            fp.write(contents)
+        return path
+
+    def frame_paths(self, frames, dirname=''):
+        return dict((f, os.path.join(self.tmp_dir, dirname, 'foo.%04d.exr' % f))
+                    for f in frames)
+
+    def test_check_paths(self):
+        for f in (1, 2, 4):
+            self.create('foo.%04d.exr' % f)
+        self.create('foo.0005.exr', contents='')
+
+        result = outline.io.check_paths(self.frame_paths(range(1, 6)))
+
+        self.assertEqual({3, 5}, result.missing)
+        self.assertEqual(12, result.size)
+
+    def test_check_paths_alternative_extension(self):
+        self.create('foo.0001.exr')
+        self.create('foo.0002.tif')
+
+        result = outline.io.check_paths(self.frame_paths([1, 2, 3]), check_ext=['.tif'])
+
+        self.assertEqual({3}, result.missing)
+
+    def test_check_paths_multiple_directories(self):
+        self.create('a/foo.0001.exr')
+        paths = self.frame_paths([1, 2], 'a')
+        paths.update(dict(('b%d' % f, path) for f, path in self.frame_paths([1], 'b').items()))
+
+        result = outline.io.check_paths(paths, threads=4)
+
+        self.assertEqual({2, 'b1'}, result.missing)
+
+    @mock.patch('outline.io.list_dir', wraps=outline.io.list_dir)
+    def test_check_paths_lists_directory_once(self, list_dir_mock):
+        outline.io.check_paths(self.frame_paths(range(1, 1001)))
+
+        list_dir_mock.assert_called_once_with(self.tmp_dir)
+
+    def test_list_dir_missing_directory(self):
+        self.assertEqual({}, outline.io.list_dir(os.path.join(self.tmp_dir, 'missing')))
+
+
+class FileSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for f in (1, 2, 3, 5):
+            with open(os.path.join(self.tmp_dir, 'foo.%04d.exr' % f), 'w') as fp:
+                fp.write('data')
+
+        sequence = mock.MagicMock()
+        sequence.side_effect = lambda f: os.path.join(self.tmp_dir, 'foo.%04d.exr' % f)
+        sequence.frameSet = '1-5'
+        sequence.__iter__.side_effect = lambda: iter(
+            [os.path.join(self.tmp_dir, 'foo.%04d.exr' % f) for f in range(1, 6)])
+        patcher = mock.patch('FileSequence.FileSequence', create=True, return_value=sequence)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.spec = outline.io.FileSpec(os.path.join(self.tmp_dir, 'foo.1-5#.exr'))
+
+    def test_check_frames(self):
+        self.assertEqual((False, {4}), self.spec.check_frames())
+        self.assertFalse(self.spec.exists())
+
+    def test_exists_frame_set(self):
+        self.assertTrue(self.spec.exists([1, 2, 3]))
+        self.assertEqual(set(), self.spec.get_missing_frames([5]))
+
+    def test_get_size(self):
+        self.assertEqual(16, self.spec.get_size())
+        self.assertEqual(4, self.spec.get_size([2]))
+
+    def test_single_file_missing(self):
+        path = os.path.join(self.tmp_dir, 'missing.exr')
+        single = mock.MagicMock()
+        single.frameSet = None
+        single.__iter__.side_effect = lambda: iter([path])
+        with mock.patch('FileSequence.FileSequence', create=True, return_value=single):
+            spec = outline.io.FileSpec(path)
+
+        self.assertEqual((False, {path}), spec.check_frames())
+        self.assertFalse(spec.exists())
+        self.assertEqual(0, spec.get_size())
+
+    def test_single_file_exists(self):
+        path = os.path.join(self.tmp_dir, 'foo.0001.exr')
+        single = mock.MagicMock()
+        single.frameSet = None
+        single.__iter__.side_effect = lambda: iter([path])
+        with mock.patch('FileSequence.FileSequence', create=True, return_value=single):
+            spec = outline.io.FileSpec(path)
+
+        self.assertTrue(spec.exists())
+        self.assertEqual(4, spec.get_size())
+
+
+if __name__ == '__main__':
+    unittest.main()
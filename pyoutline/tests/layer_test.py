@@ -92,6 +92,9 @@ class ChunkingTest(unittest.TestCase):
         self.assertEqual([1, 2, 3, 4, 5], self.event.get_local_frame_set(1).getAll())
         self.assertEqual([8, 9, 10], self.event.get_local_frame_set(8).getAll())
 
+    def test_get_local_frame_set_outside_range(self):
+        self.assertRaises(outline.LayerException, self.event.get_local_frame_set, 11)
+
 
 class RangeTests(unittest.TestCase):
 
@@ -19,11 +19,13 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import mock
 import os
 import unittest
 from xml.etree import ElementTree as Et
 
 import FileSequence
+import yaml
 
 import outline
 from outline.modules.shell import Shell
@@ -78,6 +80,56 @@ class LoaderTest(unittest.TestCase):
         self.assertEqual(ol, outline.current_outline())
 
 
+class CompiledOutlineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(SCRIPTS_DIR, 'shell.outline')
+
+    def test_setup_writes_compiled_outline(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+            ol.setup()
+
+            self.assertTrue(os.path.exists(
+                os.path.join(ol.get_session().get_path(), 'outline.pickle')))
+
+    def test_load_compiled_outline(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+            ol.set_frame_range('1-10')
+            ol.setup()
+
+            with mock.patch('yaml.load', wraps=yaml.load) as yamlLoadMock:
+                loaded = outline.load_outline(ol.get_path())
+
+            # Only the session name is read from yaml
+            self.assertEqual(['session'], [os.path.basename(call[0][0].name)
+                                           for call in yamlLoadMock.call_args_list])
+            self.assertTrue(isinstance(loaded, outline.Outline))
+            self.assertEqual(['cmd'], [layer.get_name() for layer in loaded.get_layers()])
+            self.assertEqual(loaded, loaded.get_layer('cmd').get_outline())
+            self.assertEqual('1-10', loaded.get_frame_range())
+            self.assertEqual(ol.get_session().get_path(), loaded.get_session().get_path())
+            self.assertEqual(loaded, outline.current_outline())
+
+    def test_stale_compiled_outline(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+            ol.setup()
+            stat = os.stat(ol.get_path())
+            os.utime(ol.get_path(), (stat.st_atime, stat.st_mtime + 10))
+
+            self.assertIsNone(outline.load_compiled_outline(ol.get_path()))
+
+    def test_missing_compiled_outline(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+            ol.setup()
+            os.unlink(os.path.join(ol.get_session().get_path(), 'outline.pickle'))
+
+            self.assertIsNone(outline.load_compiled_outline(ol.get_path()))
+
+
 class OutlineTest(unittest.TestCase):
 
     def setUp(self):
@@ -121,6 +173,35 @@ class OutlineTest(unittest.TestCase):
             self.assertTrue(ol.is_layer("cmd"))
             self.assertFalse(ol.is_layer("not_a_layer"))
 
+    def test_renamed_layer(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+
+            ol.get_layer("cmd").set_name("renamed")
+
+            self.assertTrue(ol.is_layer("renamed"))
+            self.assertFalse(ol.is_layer("cmd"))
+            ol.add_layer(Shell("cmd", cmd=["/bin/ls"]))
+            self.assertEqual(["renamed", "cmd"], [layer.get_name() for layer in ol.get_layers()])
+
+    def test_duplicate_layer_name(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+
+            # The current outline registers new layers
+            self.assertRaises(outline.OutlineException, Shell, "cmd", cmd=["/bin/ls"])
+            self.assertEqual(1, len(ol.get_layers()))
+
+    def test_compiled_layer_index(self):
+        with test_utils.TemporarySessionDirectory():
+            ol = outline.load_outline(self.path)
+            ol.setup()
+
+            loaded = outline.load_compiled_outline(ol.get_path())
+
+            self.assertFalse(hasattr(loaded, "_Outline__layer_map"))
+            self.assertTrue(loaded.is_layer("cmd"))
+
     def test_get_set_path(self):
         with test_utils.TemporarySessionDirectory():
             ol = outline.load_outline(self.path)
@@ -18,9 +18,12 @@ from __future__ import division
 from __future__ import absolute_import
 
 import os
+import shutil
+import tempfile
 import unittest
 
 import outline
+from outline import session
 
 
 SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), 'scripts')
@@ -98,6 +101,94 @@ class SessionTest(unittest.TestCase):
        self.assertEqual(value, layer.get_data("foo"))
    
 
+    def test_configured_data_store(self):
+        """Test the session_store option selects the data store."""
+
+        store = session.config.get("outline", "session_store")
+        session.config.set("outline", "session_store", "sqlite")
+        try:
+            ol = outline.load_outline(self.script_path)
+            ol.setup()
+        finally:
+            session.config.set("outline", "session_store", store)
+        layer = ol.get_layer("cmd")
+        layer.put_data("foo", {"frames": [1, 2, 3]})
+
+        self.assertIsInstance(ol.get_session().get_data_store(), session.SqliteDataStore)
+        self.assertEqual({"frames": [1, 2, 3]}, layer.get_data("foo"))
+        self.assertTrue(os.path.exists(os.path.join(layer.get_path(), "session.db")))
+        # The outline is still serialized as yaml
+        self.assertEqual(
+            "cmd", outline.load_outline(ol.get_path()).get_layer("cmd").get_name())
+
+    def test_loaded_session_keeps_data_store(self):
+        """Test a loaded session reads data with the store it was created with."""
+
+        store = session.config.get("outline", "session_store")
+        session.config.set("outline", "session_store", "sqlite")
+        try:
+            ol = outline.load_outline(self.script_path)
+            ol.setup()
+            ol.get_layer("cmd").put_data("foo", {"frames": [1, 2, 3]})
+        finally:
+            session.config.set("outline", "session_store", store)
+
+        # Loaded like a frame whose outline.cfg has the yaml store.
+        loaded = outline.load_outline(ol.get_path())
+
+        self.assertIsInstance(loaded.get_session().get_data_store(), session.SqliteDataStore)
+        self.assertEqual({"frames": [1, 2, 3]}, loaded.get_layer("cmd").get_data("foo"))
+
+
+class DataStoreTest(unittest.TestCase):
+
+    """Tests for the session data stores"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_put_get(self):
+        """Test every store gets what it put."""
+
+        for name in session.DATA_STORES:
+            store = session.get_data_store(name)
+            store.put(self.path, name, [1, 2, 3])
+            self.assertEqual([1, 2, 3], store.get(self.path, name))
+
+            self.assertRaises(outline.SessionException, store.put, self.path, name, [4])
+            store.put(self.path, name, [4], force=True)
+            self.assertEqual([4], store.get(self.path, name))
+
+            self.assertRaises(outline.SessionException, store.get, self.path, "missing")
+
+    def test_read_yaml_data(self):
+        """Test yaml data of older sessions is read by the other stores."""
+
+        session.YamlDataStore().put(self.path, "foo", {"a": 1})
+
+        for name in ("pickle", "sqlite"):
+            store = session.get_data_store(name)
+            self.assertEqual({"a": 1}, store.get(self.path, "foo"))
+            self.assertRaises(outline.SessionException, store.put, self.path, "foo", {})
+
+    def test_cache(self):
+        """Test cached data is not read again."""
+
+        store = session.PickleDataStore(cache=True)
+        store.put(self.path, "foo", [1])
+        os.unlink(os.path.join(self.path, "foo.pickle"))
+
+        self.assertEqual([1], store.get(self.path, "foo"))
+        self.assertRaises(outline.SessionException,
+                          session.PickleDataStore().get, self.path, "foo")
+
+    def test_invalid_store(self):
+        """Test an unknown store is an error."""
+
+        self.assertRaises(outline.SessionException, session.get_data_store, "json")
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks frame process accounting against a synthetic /proc tree.
+
+Compares the previous rssUpdate loop, which read every pid and then scanned
+the whole pid table once per frame, with rqd.rqproc.ProcessAccounting fed by
+a ProcessIndex session scan and by a FrameProcessTracker.
+
+Usage: python rqproc_benchmark.py [--pids 5000] [--frames 32] [--ticks 20]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import rqd.rqconstants
+import rqd.rqproc
+
+
+STAT = ('{pid} (proc-{pid}) S 1 {session} {session} 0 -1 4210688 317 0 1 0 31 13 0 0 20 0 1 0 '
+        '17385159 4460544 154 18446744073709551615 4194304 4204692 140725890735264 0 0 0 0 '
+        '16781318 0 0 0 0 17 4 0 0 0 0 0 6303248 6304296 23932928 140725890743234 '
+        '140725890743420 140725890743420 140725890744298 0\n')
+
+
+def buildProcTree(path, numPids, numFrames, pidsPerFrame):
+    """Writes a fake /proc with numFrames sessions of pidsPerFrame pids each,
+    the remaining pids belong to unrelated sessions."""
+    sessions = []
+    pid = 1000
+    for _ in range(numFrames):
+        session = pid
+        sessions.append(session)
+        writeStat(path, pid, session, children=range(pid + 1, pid + pidsPerFrame))
+        for child in range(pid + 1, pid + pidsPerFrame):
+            writeStat(path, child, session)
+        pid += pidsPerFrame
+    while pid < 1000 + numPids:
+        writeStat(path, pid, 1)
+        pid += 1
+    with open(os.path.join(path, 'loadavg'), 'w') as loadAvgFile:
+        loadAvgFile.write('0.25 0.16 0.11 2/1655 %d\n' % (pid - 1))
+    return sessions
+
+
+def writeStat(path, pid, session, children=()):
+    taskPath = os.path.join(path, str(pid), 'task', str(pid))
+    os.makedirs(taskPath)
+    with open(os.path.join(path, str(pid), 'stat'), 'w') as statFile:
+        statFile.write(STAT.format(pid=pid, session=session))
+    with open(os.path.join(taskPath, 'children'), 'w') as childrenFile:
+        childrenFile.write(' '.join(str(child) for child in children))
+
+
+def legacyRssUpdate(path, sessions):
+    """The accounting loop as it was implemented in Machine.rssUpdate"""
+    pids = {}
+    for pid in os.listdir(path):
+        if pid.isdigit():
+            with open(os.path.join(path, pid, 'stat'), 'r') as statFile:
+                statFields = statFile.read().split()
+            pids[pid] = {
+                "session": statFields[5],
+                "vsize": statFields[22],
+                "rss": statFields[23],
+                "utime": statFields[13],
+                "stime": statFields[14],
+                "cutime": statFields[15],
+                "cstime": statFields[16],
+                "start_time": statFields[21],
+            }
+    results = {}
+    for frameSession in sessions:
+        session = str(frameSession)
+        rss = vsize = totalTime = 0
+        for pid, data in pids.items():
+            if data["session"] == session:
+                rss += int(data["rss"])
+                vsize += int(data["vsize"])
+                totalTime += int(data["utime"]) + int(data["stime"]) + \
+                    int(data["cutime"]) + int(data["cstime"])
+        results[frameSession] = rss, vsize, totalTime
+    return results
+
+
+def timeIt(func, ticks):
+    start = time.time()
+    for _ in range(ticks):
+        func()
+    return (time.time() - start) / ticks * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pids', type=int, default=5000)
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--pids-per-frame', type=int, default=8)
+    parser.add_argument('--ticks', type=int, default=20)
+    args = parser.parse_args()
+
+    rqd.rqconstants.SYS_HERTZ = 100
+    rqd.rqconstants.PAGE_SIZE = 4096
+
+    path = tempfile.mkdtemp(prefix='rqproc-benchmark-')
+    try:
+        sessions = set(buildProcTree(path, args.pids, args.frames, args.pids_per_frame))
+        print('%d pids, %d frames of %d pids, %d ticks' % (
+            args.pids, args.frames, args.pids_per_frame, args.ticks))
+
+        legacy = timeIt(lambda: legacyRssUpdate(path, sessions), args.ticks)
+        print('legacy rssUpdate:       %8.2f ms/tick' % legacy)
+
+        accounting = rqd.rqproc.ProcessAccounting(
+            rqd.rqproc.ProcessIndex(procPath=path, fullScanInterval=0))
+        fullScan = timeIt(lambda: accounting.update(sessions, time.time(), 0), args.ticks)
+        print('ProcessAccounting full: %8.2f ms/tick' % fullScan)
+
+        accounting = rqd.rqproc.ProcessAccounting(
+            rqd.rqproc.ProcessIndex(procPath=path,
+                                    fullScanInterval=rqd.rqconstants.PROC_FULL_SCAN_INTERVAL))
+        incremental = timeIt(lambda: accounting.update(sessions, time.time(), 0), args.ticks)
+        print('ProcessAccounting:      %8.2f ms/tick (full read every %d ticks)' % (
+            incremental, rqd.rqconstants.PROC_FULL_SCAN_INTERVAL))
+
+        tracker = rqd.rqproc.FrameProcessTracker(
+            procPath=path, fullScanInterval=rqd.rqconstants.PROC_FULL_SCAN_INTERVAL,
+            useChildren=True)
+        accounting = rqd.rqproc.ProcessAccounting(tracker)
+        tracked = timeIt(lambda: accounting.update(sessions, time.time(), 0), args.ticks)
+        tracker.close()
+        print('FrameProcessTracker:    %8.2f ms/tick (session scan every %d ticks)' % (
+            tracked, rqd.rqconstants.PROC_FULL_SCAN_INTERVAL))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Stress test of early status reports for a burst of no-op frames.
+
+Every frame runs on its own thread, like a FrameAttendantThread, and asks for
+an early status report when it completes. The previous implementation
+cancelled and re-created a threading.Timer per completion and re-armed the
+rss timer per frame, rqd.rqscheduler coalesces the requests on one thread.
+Reports the number of status reports sent, timers created and peak threads.
+
+Usage: python rqscheduler_benchmark.py [--frames 5000] [--parallel 64]
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import threading
+import time
+
+import rqd.rqscheduler
+
+
+class Counters(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reports = 0
+        self.timers = 0
+        self.peakThreads = 0
+
+    def report(self):
+        with self.lock:
+            self.reports += 1
+
+    def sample(self):
+        self.peakThreads = max(self.peakThreads, threading.active_count())
+
+
+class LegacyCore(object):
+    """The Timer handling of RqCore before the scheduler"""
+
+    def __init__(self, counters, coalesceSec):
+        self.counters = counters
+        self.coalesceSec = coalesceSec
+        self.onIntervalThread = None
+        self.updateRssThread = None
+
+    def onInterval(self):
+        self.counters.report()
+
+    def frameCompleted(self):
+        self.counters.sample()
+        if self.updateRssThread is None or not self.updateRssThread.is_alive():
+            self.updateRssThread = self.timer(self.coalesceSec * 10, lambda: None)
+        if self.onIntervalThread is not None:
+            self.onIntervalThread.cancel()
+        self.onIntervalThread = self.timer(self.coalesceSec, self.onInterval)
+
+    def timer(self, delay, func):
+        timer = threading.Timer(delay, func)
+        timer.start()
+        self.counters.timers += 1
+        return timer
+
+
+class SchedulerCore(object):
+    """The scheduler handling of RqCore"""
+
+    def __init__(self, counters, coalesceSec):
+        self.counters = counters
+        self.coalesceSec = coalesceSec
+        self.scheduler = rqd.rqscheduler.Scheduler()
+        self.scheduler.start()
+        self.scheduler.schedule(3600, self.onInterval, 'onInterval')
+
+    def onInterval(self):
+        self.counters.report()
+        self.scheduler.schedule(3600, self.onInterval, 'onInterval')
+
+    def frameCompleted(self):
+        self.counters.sample()
+        self.scheduler.trigger('onInterval', self.coalesceSec)
+
+
+def run(core, counters, frames, parallel, frameSec):
+    start = time.time()
+    for offset in range(0, frames, parallel):
+        threads = [threading.Thread(target=lambda: (time.sleep(frameSec), core.frameCompleted()))
+                   for _ in range(min(parallel, frames - offset))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.time() - start
+    time.sleep(core.coalesceSec * 2)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--parallel', type=int, default=64)
+    parser.add_argument('--frame-sec', type=float, default=0.001)
+    parser.add_argument('--coalesce-sec', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print('%d frames, %d at a time, %.3fs coalesce window' % (
+        args.frames, args.parallel, args.coalesce_sec))
+    for name, coreClass in (('legacy Timer', LegacyCore), ('Scheduler', SchedulerCore)):
+        counters = Counters()
+        core = coreClass(counters, args.coalesce_sec)
+        elapsed = run(core, counters, args.frames, args.parallel, args.frame_sec)
+        if isinstance(core, SchedulerCore):
+            core.scheduler.stop()
+        print('%-13s %6.2fs  %6d reports  %6d timers  %4d peak threads' % (
+            name, elapsed, counters.reports, counters.timers, counters.peakThreads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+cgroup v2 containment and accounting for running frames.
+
+Each frame is started inside its own cgroup below CGROUP_ROOT, which must be
+a cgroup rqd can write to (delegated to it) and that rqd itself is not a
+member of. Memory, cpu and io usage are then read from the cgroup files
+instead of summing /proc, and every process of the frame, including
+double-forked daemons, is killed with the cgroup.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import errno
+import logging as log
+import os
+import re
+import time
+
+import rqd.rqconstants
+
+
+CONTROLLERS = ('cpu', 'cpuset', 'memory', 'io')
+
+# rss and maxRss in kB, utime and stime in seconds, io in bytes
+CgroupUsage = collections.namedtuple(
+    'CgroupUsage', ['rss', 'maxRss', 'pcpu', 'utime', 'stime', 'readBytes', 'writeBytes'])
+
+
+def readValue(path):
+    """Returns the stripped contents of a cgroup interface file"""
+    with open(path, 'r') as cgroupFile:
+        return cgroupFile.read().strip()
+
+
+def writeValue(path, value):
+    """Writes a value to a cgroup interface file"""
+    with open(path, 'w') as cgroupFile:
+        cgroupFile.write(value)
+
+
+def isCgroup2(root=rqd.rqconstants.CGROUP_ROOT):
+    """Returns True if the parent of root is a cgroup v2 hierarchy"""
+    return os.path.isfile(os.path.join(os.path.dirname(root.rstrip('/')), 'cgroup.controllers'))
+
+
+def setupRoot(root=rqd.rqconstants.CGROUP_ROOT):
+    """Creates the cgroup frames are placed under and enables the controllers
+       used for accounting and pinning in it.
+    @type  root: str
+    @param root: Path of the cgroup
+    @rtype:  str or None
+    @return: root if frames can be placed under it, None otherwise"""
+    if not isCgroup2(root):
+        log.warning('Not using cgroups, %s is not on a cgroup v2 hierarchy' % root)
+        return None
+    try:
+        if not os.path.isdir(root):
+            os.mkdir(root)
+        available = readValue(os.path.join(root, 'cgroup.controllers')).split()
+    except (IOError, OSError) as e:
+        log.warning('Not using cgroups, unable to create %s: %s' % (root, e))
+        return None
+
+    for controller in CONTROLLERS:
+        if controller not in available:
+            log.warning('cgroup controller %s is not delegated to %s' % (controller, root))
+            continue
+        try:
+            writeValue(os.path.join(root, 'cgroup.subtree_control'), '+%s' % controller)
+        except (IOError, OSError) as e:
+            log.warning('Unable to enable cgroup controller %s in %s: %s' % (controller, root, e))
+    return root
+
+
+def parseKeyedFile(contents):
+    """Parses a flat keyed file such as cpu.stat or memory.stat
+    @rtype:  dict
+    @return: key -> int value"""
+    values = {}
+    for line in contents.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            values[fields[0]] = int(fields[1])
+    return values
+
+
+def parseIoStat(contents):
+    """Sums the read and written bytes of every device in io.stat
+    @rtype:  tuple
+    @return: (rbytes, wbytes)"""
+    readBytes = writeBytes = 0
+    for line in contents.splitlines():
+        for key, value in (field.split('=', 1) for field in line.split()[1:]):
+            if key == 'rbytes':
+                readBytes += int(value)
+            elif key == 'wbytes':
+                writeBytes += int(value)
+    return readBytes, writeBytes
+
+
+class FrameCgroup(object):
+    """The cgroup a single frame runs in"""
+
+    def __init__(self, path):
+        """FrameCgroup class initialization
+        @type  path: str
+        @param path: Path of an existing cgroup"""
+        self.path = path
+        self.maxRss = 0
+        self.__lastUsage = None
+
+    @classmethod
+    def create(cls, root, frameId, cpuList=None, memNodes=None):
+        """Creates the cgroup of a frame, must be called with high permissions
+        @type  root: str
+        @param root: The cgroup returned by setupRoot
+        @type  frameId: str
+        @param frameId: The frame's unique Id
+        @type  cpuList: str
+        @param cpuList: The cpus to pin the frame to, ex: '0,1,8,9'
+        @type  memNodes: str
+        @param memNodes: The NUMA nodes to bind the frame memory to, ex: '0'
+        @rtype:  FrameCgroup
+        @return: The new cgroup"""
+        path = os.path.join(root, 'frame-%s' % re.sub(r'[^\w.-]', '_', frameId))
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            log.warning('Reusing leftover cgroup %s' % path)
+        cgroup = cls(path)
+        if cpuList:
+            writeValue(os.path.join(path, 'cpuset.cpus'), cpuList)
+        if memNodes:
+            writeValue(os.path.join(path, 'cpuset.mems'), memNodes)
+        return cgroup
+
+    def attach(self, pid=0):
+        """Moves a process into the cgroup, 0 for the calling process.
+           Used as the preexec_fn of the frame so it starts inside the cgroup."""
+        writeValue(os.path.join(self.path, 'cgroup.procs'), str(pid))
+
+    def pids(self):
+        """Returns the pids of every process in the cgroup"""
+        try:
+            return [int(pid) for pid in readValue(os.path.join(self.path, 'cgroup.procs')).split()]
+        except (IOError, OSError):
+            return []
+
+    def usage(self, now=None):
+        """Samples the resource usage of the cgroup
+        @type  now: float
+        @param now: The current epoch time, used for the cpu percentage
+        @rtype:  CgroupUsage
+        @return: The usage since the cgroup was created"""
+        now = time.time() if now is None else now
+        rss = int(readValue(os.path.join(self.path, 'memory.current'))) // 1024
+        try:
+            peak = int(readValue(os.path.join(self.path, 'memory.peak'))) // 1024
+        except (IOError, OSError):
+            # memory.peak needs Linux 5.19, fall back to the sampled maximum
+            peak = rss
+        self.maxRss = max(self.maxRss, peak, rss)
+
+        cpuStat = parseKeyedFile(readValue(os.path.join(self.path, 'cpu.stat')))
+        usageUsec = cpuStat.get('usage_usec', 0)
+        pcpu = 0
+        if self.__lastUsage is not None and now > self.__lastUsage[1]:
+            # Same unit as the /proc based value, jiffies used per second
+            pcpu = ((usageUsec - self.__lastUsage[0]) / 1e6 / (now - self.__lastUsage[1]) *
+                    rqd.rqconstants.SYS_HERTZ)
+        self.__lastUsage = usageUsec, now
+
+        try:
+            readBytes, writeBytes = parseIoStat(readValue(os.path.join(self.path, 'io.stat')))
+        except (IOError, OSError):
+            readBytes = writeBytes = 0
+
+        return CgroupUsage(rss, self.maxRss, pcpu,
+                           cpuStat.get('user_usec', 0) / 1e6,
+                           cpuStat.get('system_usec', 0) / 1e6,
+                           readBytes, writeBytes)
+
+    def kill(self, signal=rqd.rqconstants.KILL_SIGNAL):
+        """Kills every process in the cgroup, must be called with high permissions"""
+        killFile = os.path.join(self.path, 'cgroup.kill')
+        if signal == 9 and os.path.exists(killFile):
+            writeValue(killFile, '1')
+            return
+        # cgroup.kill needs Linux 5.14
+        for pid in self.pids():
+            try:
+                os.kill(pid, signal)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def remove(self, maxTries=5):
+        """Kills any process left behind by the frame and removes the cgroup,
+           must be called with high permissions"""
+        tries = 0
+        while True:
+            try:
+                os.rmdir(self.path)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    return
+                if e.errno != errno.EBUSY or tries >= maxTries:
+                    log.warning('Unable to remove cgroup %s: %s' % (self.path, e))
+                    return
+            log.info('Killing processes left in %s' % self.path)
+            self.kill()
+            tries += 1
+            time.sleep(0.1 * tries)
@@ -55,12 +55,54 @@ RQD_GRPC_SLEEP_SEC = 60 * 60 * 24
 RQD_GRPC_CONNECTION_ATTEMPT_SLEEP_SEC = 15
 RQD_GRPC_RETRY_CONNECTION = True
 CUEBOT_GRPC_PORT = 8443
+# Keepalive pings of the cuebot channel, the cuebot rejects pings more frequent than 5 minutes
+RQD_GRPC_KEEPALIVE_SEC = 360
+RQD_GRPC_KEEPALIVE_TIMEOUT_SEC = 20
+RQD_GRPC_RECONNECT_MIN_SEC = 1
+RQD_GRPC_RECONNECT_MAX_SEC = 60
+# Calls failing in a row before switching to the next cuebot in CUEBOT_HOSTNAME
+RQD_GRPC_FAILOVER_ERRORS = 3
 
 # RQD behavior:
 RSS_UPDATE_INTERVAL = 10
 RQD_MIN_PING_INTERVAL_SEC = 5
 RQD_MAX_PING_INTERVAL_SEC = 30
+# Frames completing within this many seconds of each other are reported in one batch,
+# followed by a single status report
+RQD_STATUS_COALESCE_SEC = 1
+# Completion reports waiting for the cuebot before frame threads block
+RQD_COMPLETION_QUEUE_SIZE = 256
+RQD_COMPLETION_RETRY_SEC = 2
+RQD_COMPLETION_MAX_RETRIES = 10
+# Seconds each host stat is reused between status reports
+RQD_MEMINFO_INTERVAL_SEC = 5
+RQD_LOAD_INTERVAL_SEC = 5
+RQD_MCP_INTERVAL_SEC = 30
+RQD_SWAPOUT_INTERVAL_SEC = 30
+RQD_GPU_INTERVAL_SEC = 60
+# GPU probe, one of auto, nvml, nvidia-smi, cudaInfo or fake, see rqd.rqgpu
+RQD_GPU_PROVIDER = 'auto'
+RQD_GPU_PROBE_TIMEOUT_SEC = 10
 MAX_LOG_FILES = 15
+# Seconds a log directory known to exist is not checked again
+RQD_LOG_DIR_CACHE_SEC = 300
+# Run frame commands as the frame user directly, without the /bin/su and
+# /usr/bin/time wrapper processes. The su PAM session is skipped.
+RQD_DIRECT_SPAWN = False
+# Pin every frame of whole cores with taskset, not only CUE_THREADABLE frames
+# on hyper-threaded hosts, see rqd.rqtopology
+RQD_PIN_ALL_FRAMES = False
+# Bind the memory of pinned frames to the NUMA nodes of their cores
+RQD_NUMA_MEMBIND = False
+# Frame output goes through a pipe to a local spool, copied to the log file
+# every RQD_LOG_FLUSH_SEC or RQD_LOG_FLUSH_BYTES, see rqd.rqlogspool
+RQD_LOG_PIPELINE = False
+# Local directory of the spools, defaults to the system temp directory
+RQD_LOG_SPOOL_DIR = None
+RQD_LOG_FLUSH_SEC = 2.0
+RQD_LOG_FLUSH_BYTES = 1024 * 1024
+# Lines of frame output kept in memory for getRunningFrameStatus
+RQD_LOG_TAIL_LINES = 100
 CORE_VALUE = 100
 LAUNCH_FRAME_USER_GID = 20
 RQD_RETRY_STARTUP_CONNECT_DELAY = 30
@@ -79,8 +121,23 @@ else:
 # ptree reporting is not actually used, and could be slow
 ENABLE_PTREE = False
 
+# Run each frame in its own cgroup v2 below CGROUP_ROOT, which must be delegated
+# to rqd. Memory and cpu are then read from the cgroup and CPU_LIST is applied
+# through cpuset.cpus instead of taskset.
+RQD_USE_CGROUP = False
+CGROUP_ROOT = '/sys/fs/cgroup/opencue'
+
+# Number of rss updates between full reads of every /proc/<pid>/stat,
+# in between only pids that are new or belong to running frames are read
+PROC_FULL_SCAN_INTERVAL = 6
+# Maximum /proc/<pid>/stat files kept open between rss updates, the stat
+# of other pids is opened on every update
+PROC_MAX_OPEN_STATS = 1024
+
 # Nimby behavior:
 CHECK_INTERVAL_LOCKED = 60  # = seconds to wait before checking if the user has become idle
+CHECK_INTERVAL_UNLOCKED = 5 # = seconds between memory checks while nimby is unlocked
+NIMBY_INPUT_DIR = '/dev/input' # directory of the keyboard and mouse devices nimby monitors
 MINIMUM_IDLE = 900          # seconds of idle time required before nimby unlocks
 MINIMUM_MEM = 524288        # If available memory drops below this amount, lock nimby (need to take into account cache)
 MINIMUM_SWAP = 1048576
@@ -96,9 +153,13 @@ PATH_INIT_TARGET = '/lib/systemd/system/default.target' # rhel7
 PATH_LOADAVG = "/proc/loadavg"
 PATH_STAT = "/proc/stat"
 PATH_MEMINFO = "/proc/meminfo"
+PATH_PROC = "/proc"
+PATH_SYSFS_SYSTEM = "/sys/devices/system"
+PATH_NUMACTL = "/usr/bin/numactl"
 
 if platform.system() == 'Linux':
     SYS_HERTZ = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
 
 if platform.system() == 'Windows':
     CONFIG_FILE = os.path.expandvars('$LOCALAPPDATA/OpenCue/rqd.conf')
@@ -176,6 +237,8 @@ try:
             OVERRIDE_NIMBY = config.getboolean(__section, "OVERRIDE_NIMBY")
         if config.has_option(__section, "GPU"):
             ALLOW_GPU = config.getboolean(__section, "GPU")
+        if config.has_option(__section, "GPU_PROVIDER"):
+            RQD_GPU_PROVIDER = config.get(__section, "GPU_PROVIDER")
         if config.has_option(__section, "PLAYBLAST"):
             ALLOW_PLAYBLAST = config.getboolean(__section, "PLAYBLAST")
         if config.has_option(__section, "LOAD_MODIFIER"):
@@ -186,6 +249,38 @@ try:
             DEFAULT_FACILITY = config.get(__section, "DEFAULT_FACILITY")
         if config.has_option(__section, "LAUNCH_FRAME_USER_GID"):
             LAUNCH_FRAME_USER_GID = config.getint(__section, "LAUNCH_FRAME_USER_GID")
+        if config.has_option(__section, "RQD_USE_CGROUP"):
+            RQD_USE_CGROUP = config.getboolean(__section, "RQD_USE_CGROUP")
+        if config.has_option(__section, "CGROUP_ROOT"):
+            CGROUP_ROOT = config.get(__section, "CGROUP_ROOT")
+        if config.has_option(__section, "PROC_FULL_SCAN_INTERVAL"):
+            PROC_FULL_SCAN_INTERVAL = config.getint(__section, "PROC_FULL_SCAN_INTERVAL")
+        if config.has_option(__section, "PROC_MAX_OPEN_STATS"):
+            PROC_MAX_OPEN_STATS = config.getint(__section, "PROC_MAX_OPEN_STATS")
+        if config.has_option(__section, "RQD_STATUS_COALESCE_SEC"):
+            RQD_STATUS_COALESCE_SEC = config.getfloat(__section, "RQD_STATUS_COALESCE_SEC")
+        if config.has_option(__section, "RQD_COMPLETION_QUEUE_SIZE"):
+            RQD_COMPLETION_QUEUE_SIZE = config.getint(__section, "RQD_COMPLETION_QUEUE_SIZE")
+        if config.has_option(__section, "RQD_DIRECT_SPAWN"):
+            RQD_DIRECT_SPAWN = config.getboolean(__section, "RQD_DIRECT_SPAWN")
+        if config.has_option(__section, "RQD_PIN_ALL_FRAMES"):
+            RQD_PIN_ALL_FRAMES = config.getboolean(__section, "RQD_PIN_ALL_FRAMES")
+        if config.has_option(__section, "RQD_NUMA_MEMBIND"):
+            RQD_NUMA_MEMBIND = config.getboolean(__section, "RQD_NUMA_MEMBIND")
+        if config.has_option(__section, "RQD_LOG_PIPELINE"):
+            RQD_LOG_PIPELINE = config.getboolean(__section, "RQD_LOG_PIPELINE")
+        if config.has_option(__section, "RQD_LOG_SPOOL_DIR"):
+            RQD_LOG_SPOOL_DIR = config.get(__section, "RQD_LOG_SPOOL_DIR")
+        if config.has_option(__section, "RQD_LOG_FLUSH_SEC"):
+            RQD_LOG_FLUSH_SEC = config.getfloat(__section, "RQD_LOG_FLUSH_SEC")
+        if config.has_option(__section, "RQD_LOG_FLUSH_BYTES"):
+            RQD_LOG_FLUSH_BYTES = config.getint(__section, "RQD_LOG_FLUSH_BYTES")
+        if config.has_option(__section, "RQD_LOG_TAIL_LINES"):
+            RQD_LOG_TAIL_LINES = config.getint(__section, "RQD_LOG_TAIL_LINES")
+        if config.has_option(__section, "RQD_GRPC_KEEPALIVE_SEC"):
+            RQD_GRPC_KEEPALIVE_SEC = config.getint(__section, "RQD_GRPC_KEEPALIVE_SEC")
+        if config.has_option(__section, "RQD_GRPC_RECONNECT_MAX_SEC"):
+            RQD_GRPC_RECONNECT_MAX_SEC = config.getint(__section, "RQD_GRPC_RECONNECT_MAX_SEC")
 except Exception as e:
     logging.warning("Failed to read values from config file %s due to %s at %s" % (CONFIG_FILE, e, traceback.extract_tb(sys.exc_info()[2])))
 
@@ -38,11 +38,15 @@ import traceback
 
 import rqd.compiled_proto.host_pb2
 import rqd.compiled_proto.report_pb2
+import rqd.rqcgroup
 import rqd.rqconstants
 import rqd.rqexceptions
+import rqd.rqlaunch
+import rqd.rqlogspool
 import rqd.rqmachine
 import rqd.rqnetwork
 import rqd.rqnimby
+import rqd.rqscheduler
 import rqd.rqutil
 
 
@@ -68,6 +72,7 @@ class FrameAttendantThread(threading.Thread):
         self.frameInfo = frameInfo
         self._tempLocations = []
         self.rqlog = None
+        self.launchTimer = rqd.rqlaunch.LaunchTimer()
 
     def __createEnvVariables(self):
         """Define the environmental variables for the frame"""
@@ -104,6 +109,10 @@ class FrameAttendantThread(threading.Thread):
                 len(self.runFrame.attributes['CPU_LIST'].split(','))))
             self.frameEnv['CUE_HT'] = "True"
 
+        # Only show the gpus assigned to the frame
+        if 'GPU_LIST' in self.runFrame.attributes:
+            self.frameEnv['CUDA_VISIBLE_DEVICES'] = self.runFrame.attributes['GPU_LIST']
+
     def _createCommandFile(self, command):
         """Creates a file that subprocess. Popen then executes.
         @type  command: string
@@ -227,6 +236,8 @@ class FrameAttendantThread(threading.Thread):
                     except Exception as e:
                         log.warning("Unable to delete file: %s due to %s at %s" % (
                             location, e, traceback.extract_tb(sys.exc_info()[2])))
+            if self.frameInfo.cgroup is not None:
+                self.frameInfo.cgroup.remove()
         finally:
             rqd.rqutil.permissionsLow()
 
@@ -243,49 +254,78 @@ class FrameAttendantThread(threading.Thread):
         runFrame = self.runFrame
 
         self.__createEnvVariables()
+        self.launchTimer.mark('environment')
         self.__writeHeader()
         if rqd.rqconstants.RQD_CREATE_USER_IF_NOT_EXISTS:
             rqd.rqutil.permissionsHigh()
             rqd.rqutil.checkAndCreateUser(runFrame.user_name)
             rqd.rqutil.permissionsLow()
+        self.launchTimer.mark('header')
+
+        # Without the su and time wrappers, cpu times are read from wait4
+        directSpawn = rqd.rqconstants.RQD_DIRECT_SPAWN and rqd.rqlaunch.canSpawnDirect()
 
         tempStatFile = "%srqd-stat-%s-%s" % (self.rqCore.machine.getTempPath(),
                                              frameInfo.frameId,
                                              time.time())
-        self._tempLocations.append(tempStatFile)
+        if not directSpawn:
+            self._tempLocations.append(tempStatFile)
+
+        if rqd.rqconstants.RQD_USE_CGROUP and self.rqCore.cgroupRoot:
+            self.__createCgroup()
+
         tempCommand = []
         if self.rqCore.machine.isDesktop():
             tempCommand += ["/bin/nice"]
-        tempCommand += ["/usr/bin/time", "-p", "-o", tempStatFile]
+        if not directSpawn:
+            tempCommand += ["/usr/bin/time", "-p", "-o", tempStatFile]
 
-        if 'CPU_LIST' in runFrame.attributes:
+        if 'CPU_LIST' in runFrame.attributes and frameInfo.cgroup is None:
             tempCommand += ['taskset', '-c', runFrame.attributes['CPU_LIST']]
+            if 'NUMA_NODES' in runFrame.attributes:
+                if os.access(rqd.rqconstants.PATH_NUMACTL, os.X_OK):
+                    tempCommand += [rqd.rqconstants.PATH_NUMACTL,
+                                    '--membind=%s' % runFrame.attributes['NUMA_NODES']]
+                else:
+                    log.warning("%s not found, not binding the memory of %s" % (
+                        rqd.rqconstants.PATH_NUMACTL, runFrame.frame_id))
 
         rqd.rqutil.permissionsHigh()
         try:
-            tempCommand += ["/bin/su", runFrame.user_name, rqd.rqconstants.SU_ARGUEMENT,
-                            '"' + self._createCommandFile(runFrame.command) + '"']
-
-            # Actual cwd is set by /shots/SHOW/home/perl/etc/qwrap.cuerun
-            frameInfo.forkedCommand = subprocess.Popen(tempCommand,
-                                                       env=self.frameEnv,
-                                                       cwd=self.rqCore.machine.getTempPath(),
-                                                       stdin=subprocess.PIPE,
-                                                       stdout=self.rqlog,
-                                                       stderr=self.rqlog,
-                                                       close_fds=True,
-                                                       preexec_fn=os.setsid)
+            if directSpawn:
+                # The command file is a shell script without a shebang, su -c
+                # used to run it through a shell.
+                tempCommand += ['/bin/sh', self._createCommandFile(runFrame.command)]
+                frameInfo.forkedCommand = rqd.rqlaunch.spawn(
+                    tempCommand, runFrame.user_name, self.frameEnv,
+                    self.rqCore.machine.getTempPath(), self.rqlog,
+                    preexec=self.__attachCgroup)
+            else:
+                tempCommand += ["/bin/su", runFrame.user_name, rqd.rqconstants.SU_ARGUEMENT,
+                                '"' + self._createCommandFile(runFrame.command) + '"']
+
+                # Actual cwd is set by /shots/SHOW/home/perl/etc/qwrap.cuerun
+                frameInfo.forkedCommand = subprocess.Popen(tempCommand,
+                                                           env=self.frameEnv,
+                                                           cwd=self.rqCore.machine.getTempPath(),
+                                                           stdin=subprocess.PIPE,
+                                                           stdout=self.rqlog,
+                                                           stderr=self.rqlog,
+                                                           close_fds=True,
+                                                           preexec_fn=self.__preexecLinux)
         finally:
             rqd.rqutil.permissionsLow()
 
         frameInfo.pid = frameInfo.forkedCommand.pid
+        self.__frameStarted()
 
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                           self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
-
-        returncode = frameInfo.forkedCommand.wait()
+        if directSpawn:
+            returncode, rusage = rqd.rqlaunch.wait(frameInfo.forkedCommand)
+            frameInfo.realtime = "%.2f" % (time.time() - self.launchTimer.start)
+            frameInfo.utime = "%.2f" % rusage.ru_utime
+            frameInfo.stime = "%.2f" % rusage.ru_stime
+        else:
+            returncode = frameInfo.forkedCommand.wait()
 
         # Find exitStatus and exitSignal
         if returncode < 0:
@@ -296,25 +336,69 @@ class FrameAttendantThread(threading.Thread):
             frameInfo.exitStatus = returncode
             frameInfo.exitSignal = 0
 
-        try:
-            statFile  = open(tempStatFile,"r")
-            frameInfo.realtime = statFile.readline().split()[1]
-            frameInfo.utime = statFile.readline().split()[1]
-            frameInfo.stime = statFile.readline().split()[1]
-            statFile.close()
-        except Exception:
-            pass # This happens when frames are killed
+        if not directSpawn:
+            try:
+                statFile  = open(tempStatFile,"r")
+                frameInfo.realtime = statFile.readline().split()[1]
+                frameInfo.utime = statFile.readline().split()[1]
+                frameInfo.stime = statFile.readline().split()[1]
+                statFile.close()
+            except Exception:
+                pass # This happens when frames are killed
+
+        if frameInfo.cgroup is not None:
+            self.__readCgroupUsage()
 
         self.__writeFooter()
         self.__cleanup()
 
+    def __createCgroup(self):
+        """Creates the cgroup the frame runs in, the frame is launched without
+           one if that fails"""
+        rqd.rqutil.permissionsHigh()
+        try:
+            self.frameInfo.cgroup = rqd.rqcgroup.FrameCgroup.create(
+                self.rqCore.cgroupRoot, self.runFrame.frame_id,
+                self.runFrame.attributes.get('CPU_LIST'),
+                self.runFrame.attributes.get('NUMA_NODES'))
+        except Exception as e:
+            log.warning("Unable to create cgroup for %s, launching without it: %s" % (
+                self.runFrame.frame_id, e))
+        finally:
+            rqd.rqutil.permissionsLow()
+
+    def __preexecLinux(self):
+        """Runs in the forked child before the frame command is executed"""
+        os.setsid()
+        self.__attachCgroup()
+
+    def __attachCgroup(self):
+        """Moves the forked child into the frame cgroup"""
+        if self.frameInfo.cgroup is not None:
+            self.frameInfo.cgroup.attach()
+
+    def __readCgroupUsage(self):
+        """Reads the final usage of the frame from its cgroup"""
+        frameInfo = self.frameInfo
+        try:
+            usage = frameInfo.cgroup.usage()
+            frameInfo.maxRss = max(frameInfo.maxRss, usage.maxRss)
+            if not frameInfo.utime and not frameInfo.stime:
+                # The stat file is not written when frames are killed
+                frameInfo.utime = "%.2f" % usage.utime
+                frameInfo.stime = "%.2f" % usage.stime
+        except Exception as e:
+            log.warning("Unable to read cgroup usage for %s: %s" % (self.runFrame.frame_id, e))
+
     def runWindows(self):
         """The steps required to handle a frame under windows"""
         frameInfo = self.frameInfo
         runFrame = self.runFrame
 
         self.__createEnvVariables()
+        self.launchTimer.mark('environment')
         self.__writeHeader()
+        self.launchTimer.mark('header')
 
         try:
             runFrame.command = runFrame.command.replace('%{frame}', self.frameEnv['CUE_IFRAME'])
@@ -329,11 +413,7 @@ class FrameAttendantThread(threading.Thread):
                 traceback.format_exception(*sys.exc_info())))
 
         frameInfo.pid = frameInfo.forkedCommand.pid
-
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                          self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
+        self.__frameStarted()
 
         frameInfo.forkedCommand.wait()
 
@@ -354,7 +434,9 @@ class FrameAttendantThread(threading.Thread):
         frameInfo = self.frameInfo
 
         self.__createEnvVariables()
+        self.launchTimer.mark('environment')
         self.__writeHeader()
+        self.launchTimer.mark('header')
 
         rqd.rqutil.permissionsHigh()
         try:
@@ -372,11 +454,7 @@ class FrameAttendantThread(threading.Thread):
             rqd.rqutil.permissionsLow()
 
         frameInfo.pid = frameInfo.forkedCommand.pid
-
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                          self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
+        self.__frameStarted()
 
         frameInfo.forkedCommand.wait()
 
@@ -392,6 +470,38 @@ class FrameAttendantThread(threading.Thread):
         self.__writeFooter()
         self.__cleanup()
 
+    def __openLog(self, runFrame):
+        """Opens the frame log, checking the log directory again if it
+           disappeared since it was cached"""
+        try:
+            return self.__createLog(runFrame)
+        except (IOError, OSError):
+            rqd.rqlaunch.logDirCache.invalidate(runFrame.log_dir)
+            rqd.rqlaunch.logDirCache.ensure(runFrame.log_dir)
+            return self.__createLog(runFrame)
+
+    def __createLog(self, runFrame):
+        """Creates the frame log, written through a local spool in log
+           pipeline mode"""
+        if rqd.rqconstants.RQD_LOG_PIPELINE and platform.system() != "Windows":
+            self.frameInfo.logPipe = rqd.rqlogspool.FrameLogPipe(runFrame.log_dir_file)
+            return self.frameInfo.logPipe
+        return open(runFrame.log_dir_file, "w", 1)
+
+    def __frameStarted(self):
+        """Called once the frame command started"""
+        if self.frameInfo.logPipe is not None:
+            self.frameInfo.logPipe.closeWriter()
+        self.__recordLaunch()
+
+    def __recordLaunch(self):
+        """Records the launch stage timings once the frame command started"""
+        self.launchTimer.mark('spawn')
+        self.runFrame.attributes['launchMs'] = '%.1f' % self.launchTimer.total()
+        self.runFrame.attributes['launchStagesMs'] = self.launchTimer.format()
+        log.info("Launched frameId=%s in %.1fms (%s)", self.frameId,
+                 self.launchTimer.total(), self.launchTimer.format())
+
     def waitForFile(self, filepath, maxTries=5):
         tries = 0
         while tries < maxTries:
@@ -434,41 +544,18 @@ class FrameAttendantThread(threading.Thread):
                     # Setup proc to allow launching of frame
                     #
 
-                    if not os.access(runFrame.log_dir, os.F_OK):
-                        # Attempting mkdir for missing logdir
-                        msg = "No Error"
-                        try:
-                            os.makedirs(runFrame.log_dir)
-                            os.chmod(runFrame.log_dir, 0o777)
-                        except Exception as e:
-                            # This is expected to fail when called in abq
-                            # But the directory should now be visible
-                            msg = e
-
-                        if not os.access(runFrame.log_dir, os.F_OK):
-                            err = "Unable to see log directory: %s, mkdir failed with: %s" % (
-                                runFrame.log_dir, msg)
-                            raise RuntimeError(err)
-
-                    if not os.access(runFrame.log_dir, os.W_OK):
-                        err = "Unable to write to log directory %s" % runFrame.log_dir
-                        raise RuntimeError(err)
+                    rqd.rqlaunch.logDirCache.ensure(runFrame.log_dir)
+                    self.launchTimer.mark('logDir')
 
                     try:
                         # Rotate any old logs to a max of MAX_LOG_FILES:
-                        if os.path.isfile(runFrame.log_dir_file):
-                            rotateCount = 1
-                            while (os.path.isfile("%s.%s" % (runFrame.log_dir_file, rotateCount))
-                                   and rotateCount < rqd.rqconstants.MAX_LOG_FILES):
-                                rotateCount += 1
-                            os.rename(runFrame.log_dir_file,
-                                      "%s.%s" % (runFrame.log_dir_file, rotateCount))
+                        rqd.rqlaunch.rotateLog(runFrame.log_dir_file)
                     except Exception as e:
                         err = "Unable to rotate previous log file due to %s" % e
                         raise RuntimeError(err)
+                    self.launchTimer.mark('rotateLog')
                     try:
-                        self.rqlog = open(runFrame.log_dir_file, "w", 1)
-                        self.waitForFile(runFrame.log_dir_file)
+                        self.rqlog = self.__openLog(runFrame)
                     except Exception as e:
                         err = "Unable to write to %s due to %s" % (runFrame.log_dir_file, e)
                         raise RuntimeError(err)
@@ -477,6 +564,7 @@ class FrameAttendantThread(threading.Thread):
                     except Exception as e:
                         err = "Failed to chmod log file! %s due to %s" % (runFrame.log_dir_file, e)
                         log.warning(err)
+                    self.launchTimer.mark('openLog')
 
                 finally:
                     rqd.rqutil.permissionsLow()
@@ -503,14 +591,12 @@ class FrameAttendantThread(threading.Thread):
                 time.sleep(10)
         finally:
             self.rqCore.releaseCores(self.runFrame.num_cores, runFrame.attributes.get('CPU_LIST'))
+            if 'GPU_LIST' in runFrame.attributes:
+                self.rqCore.machine.releaseGpus(self.runFrame.frame_id)
 
             self.rqCore.deleteFrame(self.runFrame.frame_id)
 
             self.__sendFrameCompleteReport()
-            time_till_next = (self.rqCore.intervalStartTime + self.rqCore.intervalSleepTime) - time.time()
-            if time_till_next > (2 * rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC):
-                self.rqCore.onIntervalThread.cancel()
-                self.rqCore.onInterval(rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC)
 
             log.info("Monitor frame ended for frameId=%s",
                      self.runFrame.frame_id)
@@ -537,15 +623,24 @@ class RqCore(object):
         )
 
         self.nimby = rqd.rqnimby.Nimby(self)
+        # Serializes nimbyOn and nimbyOff
+        self.__nimbyLock = threading.Lock()
 
         self.machine = rqd.rqmachine.Machine(self, self.cores)
 
         self.network = rqd.rqnetwork.Network(self)
         self.__threadLock = threading.Lock()
+
+        self.cgroupRoot = None
+        if rqd.rqconstants.RQD_USE_CGROUP and platform.system() == 'Linux':
+            rqd.rqutil.permissionsHigh()
+            try:
+                self.cgroupRoot = rqd.rqcgroup.setupRoot(rqd.rqconstants.CGROUP_ROOT)
+            finally:
+                rqd.rqutil.permissionsLow()
         self.__cache = {}
 
-        self.updateRssThread = None
-        self.onIntervalThread = None
+        self.scheduler = rqd.rqscheduler.Scheduler()
         self.intervalStartTime = None
         self.intervalSleepTime = rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC
 
@@ -577,19 +672,20 @@ class RqCore(object):
         """After gRPC connects to the cuebot, this function is called"""
         self.network.reportRqdStartup(self.machine.getBootReport())
 
-        self.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss)
-        self.updateRssThread.start()
+        if not self.scheduler.is_alive():
+            self.scheduler.start()
+
+        self.scheduler.schedule(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss, 'updateRss')
 
-        self.onIntervalThread = threading.Timer(self.intervalSleepTime, self.onInterval)
+        self.scheduler.schedule(self.intervalSleepTime, self.onInterval, 'onInterval')
         self.intervalStartTime = time.time()
-        self.onIntervalThread.start()
 
         log.warning('RQD Started')
 
     def onInterval(self, sleepTime=None):
 
-        """This is called by self.grpcConnected as a timer thread to execute
-           every interval"""
+        """This is called by self.grpcConnected through the scheduler to
+           execute every interval"""
         if sleepTime is None:
             self.intervalSleepTime = random.randint(
                 rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC,
@@ -597,9 +693,8 @@ class RqCore(object):
         else:
             self.intervalSleepTime = sleepTime
         try:
-            self.onIntervalThread = threading.Timer(self.intervalSleepTime, self.onInterval)
+            self.scheduler.schedule(self.intervalSleepTime, self.onInterval, 'onInterval')
             self.intervalStartTime = time.time()
-            self.onIntervalThread.start()
         except Exception as e:
             log.critical('Unable to schedule a ping due to {0} at {1}'.format(e, traceback.extract_tb(sys.exc_info()[2])))
 
@@ -620,12 +715,12 @@ class RqCore(object):
 
     def updateRss(self):
         """Triggers and schedules the updating of rss information"""
-        if self.__cache:
-            try:
+        try:
+            if self.__cache:
                 self.machine.rssUpdate(self.__cache)
-            finally:
-                self.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss)
-                self.updateRssThread.start()
+        finally:
+            self.scheduler.schedule(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss,
+                                    'updateRss')
 
     def getFrame(self, frameId):
         """Gets a frame from the cache based on frameId
@@ -665,6 +760,8 @@ class RqCore(object):
                 del self.__cache[frameId]
         finally:
             self.__threadLock.release()
+        # The memory of the frame is free for the next status report
+        self.machine.invalidateStats()
 
     def killAllFrame(self, reason):
         """Will execute .kill() on every frame in cache until no frames remain
@@ -727,10 +824,8 @@ class RqCore(object):
         """Shuts down all rqd systems,
            will call respawn or reboot if requested"""
         self.nimbyOff()
-        if self.onIntervalThread is not None:
-            self.onIntervalThread.cancel()
-        if self.updateRssThread is not None:
-            self.updateRssThread.cancel()
+        self.scheduler.stop()
+        self.network.stopCompletionReporter()
         if self.__respawn:
             log.warning("Respawning RQD by request")
             self.respawn_rqd()
@@ -799,8 +894,26 @@ class RqCore(object):
 
             if runFrame.environment.get('CUE_THREADABLE') == '1':
                 reserveHT = self.machine.reserveHT(runFrame.num_cores)
-                if reserveHT:
-                    runFrame.attributes['CPU_LIST'] = reserveHT
+            elif rqd.rqconstants.RQD_PIN_ALL_FRAMES:
+                try:
+                    reserveHT = self.machine.reserveHT(runFrame.num_cores)
+                except rqd.rqexceptions.CoreReservationFailureException:
+                    # Fractional frames use cores the allocator doesn't know about
+                    log.warning("Launching %s without pinning it" % runFrame.frame_id)
+                    reserveHT = None
+            else:
+                reserveHT = None
+            if reserveHT:
+                runFrame.attributes['CPU_LIST'] = reserveHT
+                if rqd.rqconstants.RQD_NUMA_MEMBIND:
+                    runFrame.attributes['NUMA_NODES'] = self.machine.getNumaNodes(reserveHT)
+
+            # Layers ask for gpus through the CUE_GPUS environment variable
+            numGpus = runFrame.environment.get('CUE_GPUS', '0')
+            if numGpus.isdigit() and int(numGpus) > 0:
+                reserveGpus = self.machine.reserveGpus(runFrame.frame_id, int(numGpus))
+                if reserveGpus:
+                    runFrame.attributes['GPU_LIST'] = reserveGpus
 
             # They must be available at this point, reserve them
             self.cores.idle_cores -= runFrame.num_cores
@@ -884,21 +997,27 @@ class RqCore(object):
         if os.getuid() != 0:
             log.warning("Not starting nimby, not running as root")
             return
-        if not self.nimby.active and platform.system() == "Linux":
-            try:
-                self.nimby.run()
-                log.info("Nimby has been activated")
-            except:
-                self.nimby.locked = False
-                err = "Nimby is in the process of shutting down"
-                log.warning(err)
-                raise rqd.rqexceptions.RqdException(err)
+        with self.__nimbyLock:
+            if not self.nimby.active and platform.system() == "Linux":
+                try:
+                    if self.nimby.ident is not None:
+                        # A thread can only be started once
+                        self.nimby = rqd.rqnimby.Nimby(self)
+                    self.nimby.daemon = True
+                    self.nimby.start()
+                    log.info("Nimby has been activated")
+                except:
+                    self.nimby.locked = False
+                    err = "Nimby is in the process of shutting down"
+                    log.warning(err)
+                    raise rqd.rqexceptions.RqdException(err)
 
     def nimbyOff(self):
         """Deactivates nimby and unlocks any nimby lock"""
-        if self.nimby.active:
-            self.nimby.stop()
-            log.info("Nimby has been deactivated")
+        with self.__nimbyLock:
+            if self.nimby.active:
+                self.nimby.stop()
+                log.info("Nimby has been deactivated")
 
     def onNimbyLock(self):
         """This is called by nimby when it locks the machine.
@@ -1016,7 +1135,9 @@ class RqCore(object):
             self.sendStatusReport()
 
     def sendStatusReport(self):
-        self.network.reportStatus(self.machine.getHostReport())
+        report = self.machine.getHostReport()
+        report.host.attributes.update(self.network.getConnectionStats())
+        self.network.reportStatus(report)
 
     def isWaitingForIdle(self):
         return self.__whenIdle
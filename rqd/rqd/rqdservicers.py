@@ -48,7 +48,7 @@ class RqdInterfaceServicer(rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceServicer)
         frame = self.rqCore.getRunningFrame(request.frameId)
         if frame:
             return rqd.compiled_proto.rqd_pb2.RqdStaticGetRunningFrameStatusResponse(
-                running_frame_info=frame.runningFrameInfo())
+                running_frame_info=frame.status())
         else:
             context.set_details(
                 "The requested frame was not found. frameId: {}".format(request.frameId))
@@ -0,0 +1,332 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+GPU telemetry for rqd.
+
+A GpuProvider probes the devices of the host, through NVML, nvidia-smi or the
+legacy cudaInfo binary. GpuMonitor runs the probe on its own thread with a
+timeout and caches the result, so status reports and frame launches only read
+the cache and never wait on the driver. GpuMonitor also assigns devices to the
+frames that ask for them.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import logging as log
+import math
+import os
+import subprocess
+import threading
+import time
+
+import rqd.rqconstants
+
+
+KILOBYTE = 1024
+
+# The legacy probe, prints " TotalMem 1023 Mb  FreeMem 968 Mb"
+CUDA_INFO_PATH = '/usr/local/spi/rqd3/cudaInfo'
+
+NVIDIA_SMI_QUERY = 'index,name,memory.total,memory.free,utilization.gpu'
+
+# Memory in kB, utilization in percent
+GpuDevice = collections.namedtuple(
+    'GpuDevice', ['index', 'name', 'totalMem', 'freeMem', 'utilization'])
+
+
+class GpuProbeException(Exception):
+    """Raised when a probe fails or times out"""
+    pass
+
+
+def which(program):
+    """Returns the path of an executable in PATH, None if not found"""
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, program)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def runCommand(command, timeout):
+    """Runs a command and returns its output, killing it after timeout seconds
+    @type  command: list<str>
+    @param command: The command and its arguments
+    @type  timeout: float
+    @param timeout: Seconds the command may run
+    @rtype:  str
+    @return: The standard output of the command"""
+    try:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GpuProbeException('Failed to run %s: %s' % (command[0], e))
+    timer = threading.Timer(timeout, proc.kill)
+    timer.daemon = True
+    timer.start()
+    try:
+        output, _ = proc.communicate()
+    finally:
+        timer.cancel()
+    if proc.returncode != 0:
+        raise GpuProbeException('%s exited with %s' % (command[0], proc.returncode))
+    return output.decode('utf-8', 'replace')
+
+
+class GpuProvider(object):
+    """Probes the GPUs of the host"""
+
+    name = None
+
+    def isAvailable(self):
+        """Returns True if the provider can probe this host"""
+        raise NotImplementedError
+
+    def probe(self, timeout):
+        """Returns the GpuDevice of every device of the host
+        @type  timeout: float
+        @param timeout: Seconds the probe may take"""
+        raise NotImplementedError
+
+
+class NvmlProvider(GpuProvider):
+    """Probes the devices through the NVML bindings, when installed"""
+
+    name = 'nvml'
+
+    def __init__(self):
+        self.__nvml = None
+
+    def isAvailable(self):
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+        except Exception:
+            return False
+        self.__nvml = pynvml
+        return True
+
+    def probe(self, timeout):
+        nvml = self.__nvml
+        devices = []
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+            name = nvml.nvmlDeviceGetName(handle)
+            if isinstance(name, bytes):
+                name = name.decode()
+            devices.append(GpuDevice(
+                index, name, memory.total // KILOBYTE, memory.free // KILOBYTE,
+                nvml.nvmlDeviceGetUtilizationRates(handle).gpu))
+        return devices
+
+
+class NvidiaSmiProvider(GpuProvider):
+    """Probes the devices through the csv output of nvidia-smi"""
+
+    name = 'nvidia-smi'
+
+    def isAvailable(self):
+        return which('nvidia-smi') is not None
+
+    def probe(self, timeout):
+        output = runCommand(['nvidia-smi', '--query-gpu=%s' % NVIDIA_SMI_QUERY,
+                             '--format=csv,noheader,nounits'], timeout)
+        devices = []
+        for line in output.splitlines():
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) != 5:
+                continue
+            index, name, totalMb, freeMb, utilization = fields
+            devices.append(GpuDevice(
+                int(index), name, int(totalMb) * KILOBYTE, int(freeMb) * KILOBYTE,
+                int(utilization) if utilization.isdigit() else 0))
+        return devices
+
+
+class CudaInfoProvider(GpuProvider):
+    """Probes the host with the legacy cudaInfo binary, which only reports the
+       memory of a single device"""
+
+    name = 'cudaInfo'
+
+    def isAvailable(self):
+        return os.access(CUDA_INFO_PATH, os.X_OK)
+
+    def probe(self, timeout):
+        output = runCommand([CUDA_INFO_PATH], timeout)
+        if 'There is no device supporting CUDA' in output or not output.strip():
+            return []
+        #  TotalMem 1023 Mb  FreeMem 968 Mb
+        results = output.splitlines()[-1].split()
+        # Rounds the total up to the next multiple of 32 Mb
+        totalMem = int(math.ceil(int(results[1]) / 32.0) * 32) * KILOBYTE
+        return [GpuDevice(0, 'cuda', totalMem, int(results[4]) * KILOBYTE, 0)]
+
+
+class FakeProvider(GpuProvider):
+    """Reports fixed devices, for tests and hosts without a driver"""
+
+    name = 'fake'
+
+    def __init__(self, devices=None):
+        """
+        @type  devices: list<GpuDevice>
+        @param devices: The devices the probe returns"""
+        self.devices = list(devices or [])
+        self.probes = 0
+
+    def isAvailable(self):
+        return True
+
+    def probe(self, timeout):
+        self.probes += 1
+        return list(self.devices)
+
+
+PROVIDERS = collections.OrderedDict(
+    (provider.name, provider) for provider in
+    (NvmlProvider, NvidiaSmiProvider, CudaInfoProvider, FakeProvider))
+
+
+def getProvider(name=None):
+    """Returns the GPU provider to use
+    @type  name: str
+    @param name: A provider name, 'auto' or None for RQD_GPU_PROVIDER. 'auto' picks
+                 the first available of nvml, nvidia-smi and cudaInfo.
+    @rtype:  GpuProvider
+    @return: The provider, None if none is available"""
+    name = name or rqd.rqconstants.RQD_GPU_PROVIDER
+    if name != 'auto':
+        provider = PROVIDERS[name]()
+        return provider if provider.isAvailable() else None
+    for providerClass in (NvmlProvider, NvidiaSmiProvider, CudaInfoProvider):
+        provider = providerClass()
+        if provider.isAvailable():
+            return provider
+    return None
+
+
+class GpuMonitor(threading.Thread):
+    """Probes the GPUs every RQD_GPU_INTERVAL_SEC on its own thread and caches
+       the devices. Readers never wait on a probe, a hung probe only delays the
+       next one."""
+
+    def __init__(self, provider, interval=None, timeout=None):
+        """
+        @type  provider: GpuProvider
+        @param provider: The probe to run
+        @type  interval: float
+        @param interval: Seconds between probes
+        @type  timeout: float
+        @param timeout: Seconds a probe may take"""
+        threading.Thread.__init__(self, name='gpuMonitor')
+        self.daemon = True
+        self.provider = provider
+        self.interval = interval or rqd.rqconstants.RQD_GPU_INTERVAL_SEC
+        self.timeout = timeout or rqd.rqconstants.RQD_GPU_PROBE_TIMEOUT_SEC
+
+        self.devices = []
+        # Time of the last successful probe
+        self.updated = None
+        self.failures = 0
+
+        # frameId -> indexes of the devices assigned to the frame
+        self.__assignments = {}
+        self.__lock = threading.Lock()
+        self.__stopEvent = threading.Event()
+
+    def probe(self):
+        """Runs the probe once and caches the devices
+        @rtype:  bool
+        @return: True if the probe succeeded"""
+        start = time.time()
+        try:
+            devices = self.provider.probe(self.timeout)
+        except Exception as e:
+            self.failures += 1
+            log.warning('GPU probe %s failed: %s' % (self.provider.name, e))
+            return False
+        elapsed = time.time() - start
+        if elapsed > self.timeout:
+            log.warning('GPU probe %s took %.1fs' % (self.provider.name, elapsed))
+        with self.__lock:
+            self.devices = sorted(devices, key=lambda device: device.index)
+            self.updated = time.time()
+        return True
+
+    def run(self):
+        while not self.__stopEvent.is_set():
+            self.probe()
+            self.__stopEvent.wait(self.interval)
+
+    def stop(self):
+        """Stops probing"""
+        self.__stopEvent.set()
+
+    def getTotalMemory(self):
+        """Returns the total memory of all devices in kB"""
+        return sum(device.totalMem for device in self.devices)
+
+    def getFreeMemory(self):
+        """Returns the free memory of all devices in kB"""
+        return sum(device.freeMem for device in self.devices)
+
+    def reserve(self, frameId, count):
+        """Assigns devices to a frame, the devices with the fewest frames
+           then the most free memory first
+        @type  frameId: str
+        @param frameId: The frame to assign devices to
+        @type  count: int
+        @param count: The number of devices the frame needs
+        @rtype:  list<int>
+        @return: The indexes of the assigned devices, empty if the host
+                 doesn't have that many devices"""
+        with self.__lock:
+            if count <= 0 or count > len(self.devices):
+                return []
+            frames = collections.Counter(
+                index for indexes in self.__assignments.values() for index in indexes)
+            devices = sorted(self.devices,
+                             key=lambda device: (frames[device.index], -device.freeMem))
+            indexes = sorted(device.index for device in devices[:count])
+            self.__assignments[frameId] = indexes
+            return indexes
+
+    def release(self, frameId):
+        """Releases the devices assigned to a frame"""
+        with self.__lock:
+            self.__assignments.pop(frameId, None)
+
+    def getAssignment(self, frameId):
+        """Returns the indexes of the devices assigned to a frame"""
+        return list(self.__assignments.get(frameId, []))
+
+    def attributes(self):
+        """Returns the host attributes reporting the devices, gpus is
+           index:freeKb/totalKb:utilization% for every device"""
+        devices = self.devices
+        return {
+            'totalGpu': str(self.getTotalMemory()),
+            'freeGpu': str(self.getFreeMemory()),
+            'gpus': ','.join('%d:%d/%d:%d' % (
+                device.index, device.freeMem, device.totalMem, device.utilization)
+                             for device in devices),
+        }
@@ -0,0 +1,226 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Helpers keeping the frame launch path short.
+
+Log directories live on shared storage, the directories already checked are
+cached so the following frames of a job skip the checks. Log rotation reads
+the log directory once. The direct spawner runs the frame command as the
+frame user without the /bin/su and /usr/bin/time wrapper processes, reading
+the cpu times from wait4. LaunchTimer records the time spent in every launch
+stage.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import errno
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+
+if platform.system() == 'Linux':
+    import pwd
+
+import rqd.rqconstants
+
+
+class LaunchTimer(object):
+    """Records the milliseconds spent in each stage of a frame launch"""
+
+    def __init__(self, start=None):
+        """
+        @type  start: float
+        @param start: The time the launch started, defaults to now"""
+        self.start = start or time.time()
+        self.__last = self.start
+        self.stages = []
+
+    def mark(self, stage):
+        """Ends a stage started at the previous mark
+        @type  stage: str
+        @param stage: The name of the stage"""
+        now = time.time()
+        self.stages.append((stage, (now - self.__last) * 1000))
+        self.__last = now
+
+    def total(self):
+        """Returns the milliseconds since the launch started up to the last mark"""
+        return (self.__last - self.start) * 1000
+
+    def format(self):
+        """Returns the stages as stage:ms,stage:ms"""
+        return ','.join('%s:%.1f' % (stage, ms) for stage, ms in self.stages)
+
+
+class DirectoryCache(object):
+    """Directories known to exist and be writable by an effective user"""
+
+    def __init__(self, ttl=None):
+        """
+        @type  ttl: float
+        @param ttl: Seconds a directory check is trusted"""
+        self.ttl = ttl if ttl is not None else rqd.rqconstants.RQD_LOG_DIR_CACHE_SEC
+        self.__checked = {}
+        self.__lock = threading.Lock()
+
+    def ensure(self, path):
+        """Creates the directory if needed and checks it can be written to,
+           unless that was done recently
+        @type  path: str
+        @param path: The directory
+        @raise RuntimeError: The directory can't be created or written to"""
+        key = (path, os.geteuid() if hasattr(os, 'geteuid') else None)
+        now = time.time()
+        with self.__lock:
+            checked = self.__checked.get(key)
+        if checked is not None and now - checked < self.ttl:
+            return
+
+        if not os.access(path, os.F_OK):
+            # Attempting mkdir for missing logdir
+            msg = "No Error"
+            try:
+                os.makedirs(path)
+                os.chmod(path, 0o777)
+            except Exception as e:
+                # This is expected to fail when called in abq
+                # But the directory should now be visible
+                msg = e
+
+            if not os.access(path, os.F_OK):
+                err = "Unable to see log directory: %s, mkdir failed with: %s" % (path, msg)
+                raise RuntimeError(err)
+
+        if not os.access(path, os.W_OK):
+            err = "Unable to write to log directory %s" % path
+            raise RuntimeError(err)
+
+        with self.__lock:
+            self.__checked[key] = now
+
+    def invalidate(self, path):
+        """Checks the directory again on the next ensure"""
+        with self.__lock:
+            for key in [key for key in self.__checked if key[0] == path]:
+                del self.__checked[key]
+
+    def clear(self):
+        """Forgets every directory"""
+        with self.__lock:
+            self.__checked.clear()
+
+
+logDirCache = DirectoryCache()
+
+
+def rotateLog(logFile, maxLogFiles=None):
+    """Renames an existing log file to the first free logFile.N, with N up to
+       MAX_LOG_FILES, listing the log directory once
+    @type  logFile: str
+    @param logFile: The log file about to be written
+    @rtype:  str
+    @return: The rotated log file, None if there was no log file"""
+    maxLogFiles = maxLogFiles or rqd.rqconstants.MAX_LOG_FILES
+    directory, name = os.path.split(logFile)
+    rotated = re.compile(r'^%s\.(\d+)$' % re.escape(name))
+    exists = False
+    indexes = set()
+    for entry in os.listdir(directory or '.'):
+        if entry == name:
+            exists = True
+            continue
+        match = rotated.match(entry)
+        if match:
+            indexes.add(int(match.group(1)))
+    if not exists:
+        return None
+
+    rotateCount = 1
+    while rotateCount in indexes and rotateCount < maxLogFiles:
+        rotateCount += 1
+    rotatedFile = "%s.%s" % (logFile, rotateCount)
+    os.rename(logFile, rotatedFile)
+    return rotatedFile
+
+
+def canSpawnDirect():
+    """Returns True if frames can be spawned without the su and time wrappers"""
+    return platform.system() == 'Linux' and hasattr(os, 'wait4') and \
+        hasattr(os, 'initgroups')
+
+
+def spawn(command, userName, env, cwd, stdout, preexec=None):
+    """Starts a frame command as the given user in a new session
+    @type  command: list<str>
+    @param command: The command
+    @type  userName: str
+    @param userName: The user the command runs as
+    @type  env: dict
+    @param env: The environment of the command
+    @type  cwd: str
+    @param cwd: The working directory
+    @type  stdout: file
+    @param stdout: The log file, for stdout and stderr
+    @type  preexec: callable
+    @param preexec: Runs in the child before the user is switched, as root
+    @rtype:  subprocess.Popen
+    @return: The started process, wait for it with wait()"""
+    user = pwd.getpwnam(userName)
+
+    def preexecUser():
+        os.setsid()
+        if preexec is not None:
+            preexec()
+        os.initgroups(userName, user.pw_gid)
+        os.setgid(user.pw_gid)
+        os.setuid(user.pw_uid)
+
+    return subprocess.Popen(command,
+                            env=env,
+                            cwd=cwd,
+                            stdin=subprocess.PIPE,
+                            stdout=stdout,
+                            stderr=stdout,
+                            close_fds=True,
+                            preexec_fn=preexecUser)
+
+
+def wait(proc):
+    """Waits for a process started by spawn()
+    @type  proc: subprocess.Popen
+    @param proc: The process
+    @rtype:  tuple
+    @return: The Popen style return code, negative for signals, and the
+             resource.struct_rusage of the process and its children"""
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return proc.returncode, rusage
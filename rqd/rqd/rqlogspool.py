@@ -0,0 +1,233 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Streaming capture of frame output.
+
+Frame logs live on shared storage. Instead of writing every line of output
+to the filer, the frame writes to a pipe. A reader thread drains the pipe
+into a local spool file and keeps the last lines in memory, a flusher thread
+copies the spool to the log file in batches. A slow filer only delays the
+copy, the frame never blocks on it.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import logging as log
+import os
+import select
+import tempfile
+import threading
+import time
+
+import rqd.rqconstants
+
+
+READ_SIZE = 64 * 1024
+
+# Buffer of the spool file, the spool is flushed to disk before every copy
+SPOOL_BUFFER = 1024 * 1024
+
+# Seconds close() waits for processes of the frame still holding the pipe
+DRAIN_TIMEOUT_SEC = 10
+
+
+class FrameLogPipe(object):
+    """A frame log file written through a pipe and a local spool. Pass it as
+       the stdout and stderr of the frame process and call closeWriter() once
+       the process started. rqd writes the header and footer with write()."""
+
+    def __init__(self, logFile, spoolDir=None, tailLines=None, flushInterval=None,
+                 flushBytes=None):
+        """
+        @type  logFile: str
+        @param logFile: The log file on shared storage, created or truncated
+        @type  spoolDir: str
+        @param spoolDir: The local directory of the spool
+        @type  tailLines: int
+        @param tailLines: The number of lines tail() returns
+        @type  flushInterval: float
+        @param flushInterval: Seconds between copies to the log file
+        @type  flushBytes: int
+        @param flushBytes: Spooled bytes that trigger a copy before the interval"""
+        self.name = logFile
+        self.flushInterval = flushInterval or rqd.rqconstants.RQD_LOG_FLUSH_SEC
+        self.flushBytes = flushBytes or rqd.rqconstants.RQD_LOG_FLUSH_BYTES
+
+        self.__log = open(logFile, 'wb')
+        spoolDir = spoolDir or rqd.rqconstants.RQD_LOG_SPOOL_DIR or tempfile.gettempdir()
+        fd, spoolFile = tempfile.mkstemp(prefix='%s.' % os.path.basename(logFile),
+                                         dir=spoolDir)
+        self.__spool = os.fdopen(fd, 'wb', SPOOL_BUFFER)
+        self.__spoolReader = open(spoolFile, 'rb')
+        # Nothing else uses the spool, it is gone once both handles are closed
+        os.unlink(spoolFile)
+
+        self.__readFd, self.__writeFd = os.pipe()
+        self.__writerClosed = False
+
+        self.__tail = collections.deque(maxlen=tailLines or rqd.rqconstants.RQD_LOG_TAIL_LINES)
+        self.__partialLine = b''
+
+        # Bytes in the spool, bytes visible to the flusher and bytes copied
+        self.__spooled = 0
+        self.__spoolFlushed = 0
+        self.__copied = 0
+        self.__lastFlush = time.time()
+
+        self.__lock = threading.Lock()
+        self.__flushNeeded = threading.Condition(self.__lock)
+        self.__stopReading = threading.Event()
+        self.__closed = False
+
+        self.__reader = threading.Thread(target=self.__read, name='logReader')
+        self.__reader.daemon = True
+        self.__reader.start()
+        self.__flusher = threading.Thread(target=self.__flush, name='logFlusher')
+        self.__flusher.daemon = True
+        self.__flusher.start()
+
+    def fileno(self):
+        """Returns the write end of the pipe, for subprocess"""
+        if self.__writerClosed:
+            raise ValueError('The write end of the pipe is closed')
+        return self.__writeFd
+
+    def closeWriter(self):
+        """Closes the write end of the pipe once the frame process has it, the
+           reader stops when the frame and its children exit"""
+        if not self.__writerClosed:
+            self.__writerClosed = True
+            os.close(self.__writeFd)
+
+    def write(self, data):
+        """Appends rqd output to the log. Once the frame process started, waits
+           for its output to be read first so the footer comes last."""
+        if self.__writerClosed and self.__reader.is_alive():
+            self.__reader.join(DRAIN_TIMEOUT_SEC)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8', 'replace')
+        self.__append(data)
+
+    def flush(self):
+        """Makes the written data visible to the flusher"""
+        with self.__lock:
+            self.__flushSpool()
+
+    def tail(self):
+        """Returns the last lines of output"""
+        with self.__lock:
+            lines = list(self.__tail)
+            if self.__partialLine:
+                lines.append(self.__partialLine)
+        return b'\n'.join(lines[-self.__tail.maxlen:]).decode('utf-8', 'replace')
+
+    def close(self):
+        """Waits for the output of the frame, copies the rest of the spool to
+           the log file and closes it"""
+        if self.__closed:
+            return
+        self.closeWriter()
+        self.__reader.join(DRAIN_TIMEOUT_SEC)
+        if self.__reader.is_alive():
+            log.warning('Processes of %s still hold the log pipe, not waiting for them' %
+                        self.name)
+            self.__stopReading.set()
+            self.__reader.join()
+        os.close(self.__readFd)
+        with self.__lock:
+            self.__closed = True
+            self.__flushSpool()
+            self.__flushNeeded.notify()
+        self.__flusher.join()
+        self.__spool.close()
+        self.__spoolReader.close()
+        self.__log.close()
+
+    def __append(self, data):
+        """Spools data and updates the tail"""
+        with self.__lock:
+            self.__spool.write(data)
+            self.__spooled += len(data)
+
+            lines = (self.__partialLine + data).split(b'\n')
+            # Progress output without newlines only keeps its end
+            self.__partialLine = lines.pop()[-READ_SIZE:]
+            self.__tail.extend(lines)
+
+            if self.__spooled - self.__spoolFlushed >= self.flushBytes:
+                self.__flushSpool()
+
+    def __flushSpool(self):
+        """Flushes the spool and wakes the flusher, the lock must be held"""
+        if self.__spooled != self.__spoolFlushed:
+            self.__spool.flush()
+            self.__spoolFlushed = self.__spooled
+            self.__flushNeeded.notify()
+
+    def __read(self):
+        """Drains the pipe into the spool, flushes it every flushInterval"""
+        while not self.__stopReading.is_set():
+            try:
+                ready, _, _ = select.select([self.__readFd], [], [], self.flushInterval)
+            except (OSError, select.error):
+                continue
+            if ready:
+                data = os.read(self.__readFd, READ_SIZE)
+                if not data:
+                    break
+                self.__append(data)
+            if time.time() - self.__lastFlush >= self.flushInterval:
+                self.flush()
+
+    def __flush(self):
+        """Copies the flushed spool to the log file"""
+        while True:
+            with self.__lock:
+                while self.__spoolFlushed == self.__copied and not self.__closed:
+                    self.__flushNeeded.wait()
+                end = self.__spoolFlushed
+                closed = self.__closed
+            if self.__copy(end):
+                if closed:
+                    return
+            elif closed:
+                # The log file is unusable, the output is lost
+                return
+            else:
+                # The spool keeps the output, try again later
+                time.sleep(self.flushInterval)
+
+    def __copy(self, end):
+        """Writes the spool up to end to the log file
+        @rtype:  bool
+        @return: False if the log file couldn't be written"""
+        self.__lastFlush = time.time()
+        try:
+            self.__spoolReader.seek(self.__copied)
+            while self.__copied < end:
+                data = self.__spoolReader.read(min(end - self.__copied, SPOOL_BUFFER))
+                self.__log.write(data)
+                self.__copied += len(data)
+            self.__log.flush()
+        except (IOError, OSError) as e:
+            log.warning('Unable to write to %s: %s' % (self.name, e))
+            return False
+        return True
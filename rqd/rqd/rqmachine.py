@@ -25,24 +25,20 @@ from __future__ import division
 from future import standard_library
 standard_library.install_aliases()
 from builtins import str
-from builtins import range
 from builtins import object
 
 import errno
 import logging as log
-import math
 import os
 import platform
 import psutil
 import re
 import subprocess
-import sys
 import tempfile
+import threading
 import time
-import traceback
 
 if platform.system() in ('Linux', 'Darwin'):
-    import resource
     import yaml
 elif platform.system() == "win32":
     import win32process
@@ -52,13 +48,51 @@ import rqd.compiled_proto.host_pb2
 import rqd.compiled_proto.report_pb2
 import rqd.rqconstants
 import rqd.rqexceptions
+import rqd.rqgpu
+import rqd.rqproc
 import rqd.rqswap
+import rqd.rqtopology
 import rqd.rqutil
 
 
 KILOBYTE = 1024
 
 
+class CachedStat(object):
+    """A machine statistic that is read at most once per interval,
+       unless it has been marked dirty"""
+
+    def __init__(self, update, interval):
+        """
+        @type  update: callable
+        @param update: Reads the statistic into the render host
+        @type  interval: float
+        @param interval: Seconds a reading is reused"""
+        self.update = update
+        self.interval = interval
+        self.updated = None
+        self.dirty = True
+
+    def invalidate(self):
+        """Reads the statistic again on the next refresh"""
+        self.dirty = True
+
+    def refresh(self, force=False):
+        """Reads the statistic if forced, dirty or older than the interval
+        @type  force: bool
+        @param force: Read the statistic regardless of its age
+        @rtype:  bool
+        @return: True if the statistic was read"""
+        now = time.time()
+        if not force and not self.dirty and self.updated is not None and \
+                now - self.updated < self.interval:
+            return False
+        self.update()
+        self.updated = now
+        self.dirty = False
+        return True
+
+
 class Machine(object):
     """Gathers information about the machine and resources"""
     def __init__(self, rqCore, coreInfo):
@@ -70,14 +104,34 @@ class Machine(object):
         """
         self.__rqCore = rqCore
         self.__coreInfo = coreInfo
-        self.__tasksets = set()
+        self.__coreAllocator = None
 
         if platform.system() == 'Linux':
             self.__vmstat = rqd.rqswap.VmStat()
 
+        self.__processTracker = rqd.rqproc.FrameProcessTracker()
+        self.__processAccounting = rqd.rqproc.ProcessAccounting(self.__processTracker)
+
         self.state = rqd.compiled_proto.host_pb2.UP
 
         self.__renderHost = rqd.compiled_proto.report_pb2.RenderHost()
+        self.__gpuMonitor = None
+        self.__gpuNotSupported = False
+        self.__memoryStat = CachedStat(self.__updateMemory,
+                                       rqd.rqconstants.RQD_MEMINFO_INTERVAL_SEC)
+        self.__stats = [
+            self.__memoryStat,
+            CachedStat(self.__updateLoad, rqd.rqconstants.RQD_LOAD_INTERVAL_SEC),
+            CachedStat(self.__updateMcp, rqd.rqconstants.RQD_MCP_INTERVAL_SEC),
+            CachedStat(self.__updateSwapout, rqd.rqconstants.RQD_SWAPOUT_INTERVAL_SEC),
+            CachedStat(self.__updateGpu, rqd.rqconstants.RQD_GPU_INTERVAL_SEC),
+        ]
+
+        # frameId -> RunningFrameInfo, rebuilt only for frames whose usage changed
+        self.__frameInfos = {}
+        self.__dirtyFrames = set()
+        self.__frameInfoLock = threading.Lock()
+
         self.__initMachineTags()
         self.__initMachineStats()
 
@@ -87,14 +141,12 @@ class Machine(object):
         self.__hostReport = rqd.compiled_proto.report_pb2.HostReport()
         self.__hostReport.core_info.CopyFrom(self.__coreInfo)
 
-        self.__pidHistory = {}
-
         self.setupHT()
 
     def isNimbySafeToRunJobs(self):
         """Returns False if nimby should be triggered due to resource limits"""
         if platform.system() == "Linux":
-            self.updateMachineStats()
+            self.__memoryStat.refresh(force=True)
             if self.__renderHost.free_mem < rqd.rqconstants.MINIMUM_MEM:
                 return False
             if self.__renderHost.free_swap < rqd.rqconstants.MINIMUM_SWAP:
@@ -181,102 +233,67 @@ class Machine(object):
         if platform.system() != 'Linux':
             return
 
-        pids = {}
-        for pid in os.listdir("/proc"):
-            if pid.isdigit():
-                try:
-                    with open("/proc/%s/stat" % pid, "r") as statFile:
-                        statFields = statFile.read().split()
-
-                    # See "man proc"
-                    pids[pid] = {
-                        "session": statFields[5],
-                        "vsize": statFields[22],
-                        "rss": statFields[23],
-                        # These are needed to compute the cpu used
-                        "utime": statFields[13],
-                        "stime": statFields[14],
-                        "cutime": statFields[15],
-                        "cstime": statFields[16],
-                        # The time in jiffies the process started
-                        # after system boot.
-                        "start_time": statFields[21],
-                    }
-
-                except Exception as e:
-                    log.exception('failed to read stat file for pid %s' % pid)
-
         try:
-            now = int(time.time())
-            pidData = {"time": now}
-            bootTime = self.getBootTime()
-
-            values = list(frames.values())
-
-            for frame in values:
-                if frame.pid > 0:
-                    session = str(frame.pid)
-                    rss = 0
-                    vsize = 0
-                    pcpu = 0
-                    if rqd.rqconstants.ENABLE_PTREE:
-                        ptree = []
-                    for pid, data in pids.items():
-                        if data["session"] == session:
-                            try:
-                                rss += int(data["rss"])
-                                vsize += int(data["vsize"])
-
-                                # jiffies used by this process, last two means that dead children are counted
-                                totalTime = int(data["utime"]) + \
-                                            int(data["stime"]) + \
-                                            int(data["cutime"]) + \
-                                            int(data["cstime"])
-
-                                # Seconds of process life, boot time is already in seconds
-                                seconds = now - bootTime - \
-                                          float(data["start_time"]) / rqd.rqconstants.SYS_HERTZ
-                                if seconds:
-                                    if pid in self.__pidHistory:
-                                        # Percent cpu using decaying average, 50% from 10 seconds ago, 50% from last 10 seconds:
-                                        oldTotalTime, oldSeconds, oldPidPcpu = self.__pidHistory[pid]
-                                        #checking if already updated data
-                                        if seconds != oldSeconds:
-                                            pidPcpu = (totalTime - oldTotalTime) / float(seconds - oldSeconds)
-                                            pcpu += (oldPidPcpu + pidPcpu) / 2 # %cpu
-                                            pidData[pid] = totalTime, seconds, pidPcpu
-                                    else:
-                                        pidPcpu = totalTime / seconds
-                                        pcpu += pidPcpu
-                                        pidData[pid] = totalTime, seconds, pidPcpu
-
-                                if rqd.rqconstants.ENABLE_PTREE:
-                                    ptree.append({"pid": pid, "seconds": seconds, "total_time": totalTime})
-                            except Exception as e:
-                                log.warning('Failure with pid rss update due to: %s at %s' % \
-                                            (e, traceback.extract_tb(sys.exc_info()[2])))
-
-                    rss = (rss * resource.getpagesize()) // 1024
-                    vsize = int(vsize/1024)
-
-                    frame.rss = rss
-                    frame.maxRss = max(rss, frame.maxRss)
-
-                    frame.vsize = vsize
-                    frame.maxVsize = max(vsize, frame.maxVsize)
-
-                    frame.runFrame.attributes["pcpu"] = str(pcpu)
-
-                    if rqd.rqconstants.ENABLE_PTREE:
-                        frame.runFrame.attributes["ptree"] = str(yaml.load("list: %s" % ptree,
-                                                                           Loader=yaml.SafeLoader))
-
-            # Store the current data for the next check
-            self.__pidHistory = pidData
+            frames = [frame for frame in list(frames.values()) if frame.pid and frame.pid > 0]
+            cgroupFrames = [frame for frame in frames if frame.cgroup is not None]
+            frames = [frame for frame in frames if frame.cgroup is None]
+
+            usageBefore = dict((frame.frameId, self.__frameUsage(frame))
+                               for frame in cgroupFrames + frames)
+
+            for frame in cgroupFrames:
+                self.__cgroupRssUpdate(frame)
+
+            usage = self.__processAccounting.update(
+                set(frame.pid for frame in frames), int(time.time()), self.getBootTime())
+
+            for frame in frames:
+                sessionUsage = usage.get(frame.pid)
+                if sessionUsage is None:
+                    continue
+
+                frame.rss = sessionUsage.rss
+                frame.maxRss = max(sessionUsage.rss, frame.maxRss)
+
+                frame.vsize = sessionUsage.vsize
+                frame.maxVsize = max(sessionUsage.vsize, frame.maxVsize)
+
+                frame.runFrame.attributes["pcpu"] = str(sessionUsage.pcpu)
+
+                if sessionUsage.ptree is not None:
+                    frame.runFrame.attributes["ptree"] = str(yaml.load(
+                        "list: %s" % sessionUsage.ptree, Loader=yaml.SafeLoader))
+
+            changed = [frame.frameId for frame in cgroupFrames + frames
+                       if self.__frameUsage(frame) != usageBefore[frame.frameId]]
+            with self.__frameInfoLock:
+                self.__dirtyFrames.update(changed)
 
         except Exception as e:
             log.exception('Failure with rss update due to: {0}'.format(e))
 
+    @staticmethod
+    def __frameUsage(frame):
+        """Returns the values of a frame reported in its RunningFrameInfo
+           that change while it runs"""
+        return (frame.rss, frame.maxRss, frame.vsize, frame.maxVsize,
+                dict(frame.runFrame.attributes))
+
+    def __cgroupRssUpdate(self, frame):
+        """Updates the rss, maxrss and cpu usage of a frame from its cgroup"""
+        try:
+            usage = frame.cgroup.usage()
+        except (IOError, OSError) as e:
+            log.warning('Failed to read cgroup %s: %s' % (frame.cgroup.path, e))
+            return
+
+        frame.rss = usage.rss
+        frame.maxRss = max(usage.maxRss, frame.maxRss)
+
+        frame.runFrame.attributes["pcpu"] = str(usage.pcpu)
+        frame.runFrame.attributes["rbytes"] = str(usage.readBytes)
+        frame.runFrame.attributes["wbytes"] = str(usage.writeBytes)
+
     def getLoadAvg(self):
         """Returns average number of processes waiting to be served
            for the last 1 minute multiplied by 100."""
@@ -300,7 +317,20 @@ class Machine(object):
                     return int(line.split()[1])
         return 0
 
-    @rqd.rqutil.Memoize
+    def getGpuMonitor(self):
+        """Returns the GpuMonitor, started on first use, None if gpus are not
+           enabled or no probe is available"""
+        if self.__gpuMonitor is None and rqd.rqconstants.ALLOW_GPU and \
+                not self.__gpuNotSupported:
+            provider = rqd.rqgpu.getProvider()
+            if provider is None:
+                log.warning('No GPU probe available, not reporting GPUs')
+                self.__gpuNotSupported = True
+                return None
+            self.__gpuMonitor = rqd.rqgpu.GpuMonitor(provider)
+            self.__gpuMonitor.start()
+        return self.__gpuMonitor
+
     def getGpuMemoryTotal(self):
         """Returns the total gpu memory in kb for CUE_GPU_MEMORY"""
         return self.__getGpuValues()['total']
@@ -310,33 +340,35 @@ class Machine(object):
         return self.__getGpuValues()['free']
 
     def __getGpuValues(self):
-        if not hasattr(self, 'gpuNotSupported'):
-            if not hasattr(self, 'gpuResults'):
-                self.gpuResults = {'total': 0, 'free': 0, 'updated': 0}
-            if rqd.rqconstants.ALLOW_PLAYBLAST and not rqd.rqconstants.ALLOW_GPU:
-                return {'total': 262144, 'free': 262144, 'updated': 0}
-            if not rqd.rqconstants.ALLOW_GPU:
-                self.gpuNotSupported = True
-                return self.gpuResults
-            if self.gpuResults['updated'] > time.time() - 60:
-                return self.gpuResults
-            try:
-                # /shots/spi/home/bin/spinux1/cudaInfo
-                # /shots/spi/home/bin/rhel7/cudaInfo
-                cudaInfo = subprocess.getoutput('/usr/local/spi/rqd3/cudaInfo')
-                if 'There is no device supporting CUDA' in cudaInfo:
-                    self.gpuNotSupported = True
-                else:
-                    results = cudaInfo.splitlines()[-1].split()
-                    #  TotalMem 1023 Mb  FreeMem 968 Mb
-                    # The int(math.ceil(int(x) / 32.0) * 32) rounds up to the next multiple of 32
-                    self.gpuResults['total'] = int(math.ceil(int(results[1]) / 32.0) * 32) * KILOBYTE
-                    self.gpuResults['free'] = int(results[4]) * KILOBYTE
-                    self.gpuResults['updated'] = time.time()
-            except Exception as e:
-                log.warning('Failed to get FreeMem from cudaInfo due to: %s at %s' % \
-                            (e, traceback.extract_tb(sys.exc_info()[2])))
-        return self.gpuResults
+        """Returns the gpu memory of the last probe, never waits on the probe"""
+        if rqd.rqconstants.ALLOW_PLAYBLAST and not rqd.rqconstants.ALLOW_GPU:
+            return {'total': 262144, 'free': 262144}
+        monitor = self.getGpuMonitor()
+        if monitor is None:
+            return {'total': 0, 'free': 0}
+        return {'total': monitor.getTotalMemory(), 'free': monitor.getFreeMemory()}
+
+    def reserveGpus(self, frameId, count):
+        """Assigns gpus to a frame
+        @type  frameId: str
+        @param frameId: The frame to assign gpus to
+        @type  count: int
+        @param count: The number of gpus
+        @rtype:  str
+        @return: The comma separated device indexes, None if not available"""
+        monitor = self.getGpuMonitor()
+        if monitor is None:
+            return None
+        indexes = monitor.reserve(frameId, count)
+        if not indexes:
+            log.warning('Unable to assign %d gpus to %s' % (count, frameId))
+            return None
+        return ','.join(str(index) for index in indexes)
+
+    def releaseGpus(self, frameId):
+        """Releases the gpus assigned to a frame"""
+        if self.__gpuMonitor is not None:
+            self.__gpuMonitor.release(frameId)
 
     def __getSwapout(self):
         if platform.system() == "Linux":
@@ -547,13 +579,18 @@ class Machine(object):
         else:
             self.__renderHost.free_swap = 0
 
-    def updateMachineStats(self):
-        """Updates dynamic machine information during runtime"""
+    def __updateMcp(self):
+        """Reads the free space of the temp directory"""
         if platform.system() == "Linux":
-            # Reads dynamic information for mcp
             mcpStat = os.statvfs(self.getTempPath())
             self.__renderHost.free_mcp = (mcpStat.f_bavail * mcpStat.f_bsize) // KILOBYTE
+        elif platform.system() == 'Windows':
+            TEMP_DEFAULT = 1048576
+            self.__renderHost.free_mcp = TEMP_DEFAULT
 
+    def __updateMemory(self):
+        """Reads the free memory and swap"""
+        if platform.system() == "Linux":
             # Reads dynamic information from /proc/meminfo
             with open(rqd.rqconstants.PATH_MEMINFO, "r") as fp:
                 for line in fp:
@@ -568,21 +605,53 @@ class Machine(object):
 
             self.__renderHost.free_swap = freeSwapMem
             self.__renderHost.free_mem = freeMem + cachedMem
-            self.__renderHost.attributes['freeGpu'] = str(self.getGpuMemory())
-            self.__renderHost.attributes['swapout'] = self.__getSwapout()
 
         elif platform.system() == 'Darwin':
             self.updateMacMemory()
 
         elif platform.system() == 'Windows':
-            TEMP_DEFAULT = 1048576
             stats = self.getWindowsMemory()
-            self.__renderHost.free_mcp = TEMP_DEFAULT
             self.__renderHost.free_swap = int(stats.ullAvailPageFile / 1024)
             self.__renderHost.free_mem = int(stats.ullAvailPhys / 1024)
 
-        # Updates dynamic information
+    def __updateSwapout(self):
+        """Reads the recent swap out rate"""
+        if platform.system() == "Linux":
+            self.__renderHost.attributes['swapout'] = self.__getSwapout()
+
+    def __updateGpu(self):
+        """Copies the gpu memory and devices of the last probe"""
+        if platform.system() == "Linux":
+            monitor = self.getGpuMonitor()
+            if monitor is not None:
+                self.__renderHost.attributes.update(monitor.attributes())
+            else:
+                self.__renderHost.attributes['freeGpu'] = str(self.getGpuMemory())
+
+    def __updateLoad(self):
+        """Reads the load average"""
         self.__renderHost.load = self.getLoadAvg()
+
+    def invalidateStats(self):
+        """Reads the memory again on the next status report, called
+           when frames start or finish"""
+        self.__memoryStat.invalidate()
+
+    def updateMachineStats(self, force=True):
+        """Updates dynamic machine information during runtime
+        @type  force: bool
+        @param force: Read every statistic, otherwise statistics are only read
+                      once per their RQD_*_INTERVAL_SEC unless invalidated"""
+        for stat in self.__stats:
+            stat.refresh(force)
+
+        if platform.system() == "Linux":
+            # Cost of the last rss update, to verify it stays bounded on busy hosts
+            self.__renderHost.attributes['rssUpdateMs'] = str(
+                int(self.__processTracker.updateTime * 1000))
+            self.__renderHost.attributes['rssUpdatePids'] = str(self.__processTracker.pidsTracked)
+
+        # Updates dynamic information
         self.__renderHost.nimby_enabled = self.__rqCore.nimby.active
         self.__renderHost.nimby_locked = self.__rqCore.nimby.locked
         self.__renderHost.state = self.state
@@ -593,16 +662,36 @@ class Machine(object):
         return self.__renderHost
 
     def getHostReport(self):
-        """Updates and returns the hostReport struct"""
-        self.__hostReport.host.CopyFrom(self.getHostInfo())
+        """Updates and returns the hostReport struct
+
+        Host statistics are read at their own interval and the RunningFrameInfo
+        of a frame is only rebuilt when its usage changed.  Every running frame
+        is in the report, the cuebot clears the procs of frames missing from
+        reports.
+        @rtype:  rqd.compiled_proto.report_pb2.HostReport
+        @return: The host report"""
+        self.updateMachineStats(force=False)
+        self.__hostReport.host.CopyFrom(self.__renderHost)
+
+        with self.__frameInfoLock:
+            dirtyFrames = self.__dirtyFrames
+            self.__dirtyFrames = set()
+
+        frameInfos = {}
+        frameIds = []
+        for frameKey in self.__rqCore.getFrameKeys():
+            info = self.__frameInfos.get(frameKey)
+            if info is None or frameKey in dirtyFrames:
+                try:
+                    info = self.__rqCore.getFrame(frameKey).runningFrameInfo()
+                except KeyError:
+                    continue
+            frameInfos[frameKey] = info
+            frameIds.append(frameKey)
+        self.__frameInfos = frameInfos
 
         self.__hostReport.ClearField('frames')
-        for frameKey in self.__rqCore.getFrameKeys():
-            try:
-                info = self.__rqCore.getFrame(frameKey).runningFrameInfo()
-                self.__hostReport.frames.extend([info])
-            except KeyError:
-                pass
+        self.__hostReport.frames.extend([frameInfos[frameId] for frameId in frameIds])
 
         self.__hostReport.core_info.CopyFrom(self.__rqCore.getCoreInfo())
 
@@ -620,20 +709,35 @@ class Machine(object):
     def setupHT(self):
         """ Setup rqd for hyper-threading """
 
-        if self.__enabledHT():
-            self.__tasksets = set(range(self.__coreInfo.total_cores // 100))
+        if self.__enabledHT() or rqd.rqconstants.RQD_PIN_ALL_FRAMES:
+            self.__coreAllocator = rqd.rqtopology.CoreAllocator(self.__getTopology())
+
+    def __getTopology(self):
+        """Returns the cpu topology from sysfs, or the topology assumed from the
+           core count if sysfs isn't available or doesn't match the cores reported"""
+        numCores = self.__coreInfo.total_cores // rqd.rqconstants.CORE_VALUE
+        if platform.system() == 'Linux':
+            try:
+                topology = rqd.rqtopology.CpuTopology.fromSysfs()
+                if len(topology.cores) == numCores:
+                    return topology
+                log.warning('Taskset: sysfs has %d cores, %d are reported, ignoring NUMA nodes'
+                            % (len(topology.cores), numCores))
+            except (IOError, OSError, ValueError) as e:
+                log.warning('Taskset: Unable to read the cpu topology: %s' % e)
+        return rqd.rqtopology.CpuTopology.fromCoreCount(
+            numCores, int(self.__renderHost.attributes.get('hyperthreadingMultiplier', '1')))
 
     def reserveHT(self, reservedCores):
-        """ Reserve cores for use by taskset
+        """ Reserve cores for use by taskset, on as few NUMA nodes as possible
         taskset -c 0,1,8,9 COMMAND
-        Not thread save, use with locking.
         @type   reservedCores: int
         @param  reservedCores: The total physical cores reserved by the frame.
         @rtype:  string
         @return: The cpu-list for taskset -c
         """
 
-        if not self.__enabledHT():
+        if self.__coreAllocator is None:
             return None
 
         if reservedCores % 100:
@@ -642,33 +746,38 @@ class Machine(object):
 
         log.debug('Taskset: Requesting reserve of %d' % (reservedCores // 100))
 
-        if len(self.__tasksets) < reservedCores // 100:
+        try:
+            cpus = self.__coreAllocator.reserve(reservedCores // 100)
+        except rqd.rqexceptions.CoreReservationFailureException:
             err = 'Not launching, insufficient hyperthreading cores to reserve based on reservedCores'
             log.critical(err)
             raise rqd.rqexceptions.CoreReservationFailureException(err)
 
-        tasksets = []
-        for x in range(reservedCores // 100):
-            core = self.__tasksets.pop()
-            tasksets.append(str(core))
-            tasksets.append(str(core + self.__coreInfo.total_cores // 100))
-
-        log.debug('Taskset: Reserving cores - %s' % ','.join(tasksets))
+        tasksets = ','.join(str(cpu) for cpu in cpus)
+        log.debug('Taskset: Reserving cores - %s' % tasksets)
 
-        return ','.join(tasksets)
+        return tasksets
 
     def releaseHT(self, reservedHT):
         """ Release cores used by taskset
         Format: 0,1,8,9
-        Not thread safe, use with locking.
         @type:  string
         @param: The cpu-list used for taskset to release. ex: '0,8,1,9'
         """
 
-        if not self.__enabledHT():
+        if self.__coreAllocator is None:
             return None
 
         log.debug('Taskset: Releasing cores - %s' % reservedHT)
-        for core in reservedHT.split(','):
-            if int(core) < self.__coreInfo.total_cores // 100:
-                self.__tasksets.add(int(core))
+        self.__coreAllocator.release(int(core) for core in reservedHT.split(','))
+
+    def getNumaNodes(self, reservedHT):
+        """Returns the NUMA nodes of the cores used by taskset
+        @type  reservedHT: str
+        @param reservedHT: The cpu-list returned by reserveHT
+        @rtype:  str
+        @return: The nodes, ex: '0,1'"""
+        if self.__coreAllocator is None:
+            return None
+        return ','.join(str(node) for node in self.__coreAllocator.nodesOf(
+            int(core) for core in reservedHT.split(',')))
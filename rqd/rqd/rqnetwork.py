@@ -26,10 +26,14 @@ from builtins import object
 from concurrent import futures
 from random import shuffle
 import atexit
+import bisect
+import collections
 import logging as log
 import os
 import platform
+import random
 import subprocess
+import threading
 import time
 
 import grpc
@@ -53,6 +57,7 @@ class RunningFrame(object):
         self.killMessage = ""
 
         self.pid = None
+        self.cgroup = None
         self.exitStatus = None
         self.frameAttendantThread = None
         self.exitSignal = 0
@@ -67,6 +72,9 @@ class RunningFrame(object):
         self.utime = 0
         self.stime = 0
 
+        # Set in log pipeline mode, see rqd.rqlogspool
+        self.logPipe = None
+
     def runningFrameInfo(self):
         """Returns the RunningFrameInfo object"""
         runningFrameInfo = rqd.compiled_proto.report_pb2.RunningFrameInfo(
@@ -87,8 +95,12 @@ class RunningFrame(object):
         return runningFrameInfo
 
     def status(self):
-        """Returns the status of the frame"""
-        return self.runningFrameInfo()
+        """Returns the status of the frame, with the last lines of its output
+           in the logTail attribute in log pipeline mode"""
+        runningFrameInfo = self.runningFrameInfo()
+        if self.logPipe is not None:
+            runningFrameInfo.attributes['logTail'] = self.logPipe.tail()
+        return runningFrameInfo
 
     def kill(self, message=""):
         """Kills the frame"""
@@ -107,6 +119,8 @@ class RunningFrame(object):
                 try:
                     if platform.system() == "Windows":
                         subprocess.Popen('taskkill /F /T /PID %i' % self.pid, shell=True)
+                    elif self.cgroup is not None:
+                        self.cgroup.kill(rqd.rqconstants.KILL_SIGNAL)
                     else:
                         os.killpg(self.pid, rqd.rqconstants.KILL_SIGNAL)
                 finally:
@@ -178,57 +192,463 @@ class GrpcServer(object):
             self.server.stop(0)
 
 
+class RpcStats(object):
+    """Counts the calls made over a CuebotConnection and their latency"""
+
+    # Upper bounds of the latency histogram buckets, in milliseconds
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.failovers = 0
+        self.histogram = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def record(self, seconds, failed=False):
+        """Records a finished call
+        @type  seconds: float
+        @param seconds: Time the call took
+        @type  failed: bool
+        @param failed: True if the call raised an error"""
+        bucket = bisect.bisect_left(self.BUCKETS_MS, seconds * 1000)
+        with self.__lock:
+            self.calls += 1
+            self.histogram[bucket] += 1
+            if failed:
+                self.errors += 1
+
+    def percentile(self, fraction):
+        """Returns the upper bound in ms of the bucket holding the given
+           fraction of the calls, None above the last bucket"""
+        with self.__lock:
+            histogram = list(self.histogram)
+        target = fraction * sum(histogram)
+        count = 0
+        for bucket, bucketCount in enumerate(histogram):
+            count += bucketCount
+            if count >= target and bucketCount:
+                return self.BUCKETS_MS[bucket] if bucket < len(self.BUCKETS_MS) else None
+        return 0
+
+    def attributes(self):
+        """Returns the counters as render host attributes
+        @rtype:  dict
+        @return: attribute name -> str value"""
+        histogram = ','.join(
+            '%s:%d' % (bound, count) for bound, count in
+            zip(self.BUCKETS_MS + ('inf',), self.histogram) if count)
+        p50 = self.percentile(0.5)
+        p99 = self.percentile(0.99)
+        return {
+            'cuebotRpcs': str(self.calls),
+            'cuebotRpcErrors': str(self.errors),
+            'cuebotReconnects': str(self.reconnects),
+            'cuebotFailovers': str(self.failovers),
+            'cuebotRpcP50Ms': 'inf' if p50 is None else str(p50),
+            'cuebotRpcP99Ms': 'inf' if p99 is None else str(p99),
+            'cuebotRpcLatencyMs': histogram,
+        }
+
+
+class CuebotConnection(object):
+    """A long lived channel to the cuebot and the stubs using it.
+
+    The channel is created once and kept open with HTTP/2 keepalive pings,
+    gRPC reconnects it on its own with a jittered backoff when the
+    connection drops. When several cuebots are configured and calls keep
+    failing as unavailable, the channel is replaced by one to the next
+    cuebot, again after a jittered backoff, so a farm losing a cuebot does
+    not move to the next one all at once."""
+
+    # Errors that mean the cuebot could not be reached
+    UNREACHABLE = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+    def __init__(self, hostnames=None, port=None):
+        """CuebotConnection class initialization
+        @type  hostnames: list<str>
+        @param hostnames: The cuebots, defaults to CUEBOT_HOSTNAME
+        @type  port: int
+        @param port: The cuebot gRPC port, defaults to CUEBOT_GRPC_PORT"""
+        self.__hostnames = hostnames
+        self.__port = port
+        self.__lock = threading.RLock()
+        self.__channel = None
+        self.__stubs = {}
+        self.__cuebots = []
+        self.__cuebotIndex = 0
+        self.__consecutiveFailures = 0
+        self.__nextFailover = 0
+        self.__connected = False
+        self.__atexitRegistered = False
+        self.state = None
+        self.stats = RpcStats()
+
+    @staticmethod
+    def channelOptions():
+        """Returns the options of the cuebot channel"""
+        return [
+            ('grpc.keepalive_time_ms', rqd.rqconstants.RQD_GRPC_KEEPALIVE_SEC * 1000),
+            ('grpc.keepalive_timeout_ms', rqd.rqconstants.RQD_GRPC_KEEPALIVE_TIMEOUT_SEC * 1000),
+            # The cuebot rejects pings on idle connections by default
+            ('grpc.keepalive_permit_without_calls', 0),
+            ('grpc.http2.max_pings_without_data', 0),
+            ('grpc.initial_reconnect_backoff_ms',
+             rqd.rqconstants.RQD_GRPC_RECONNECT_MIN_SEC * 1000),
+            ('grpc.min_reconnect_backoff_ms', rqd.rqconstants.RQD_GRPC_RECONNECT_MIN_SEC * 1000),
+            ('grpc.max_reconnect_backoff_ms', rqd.rqconstants.RQD_GRPC_RECONNECT_MAX_SEC * 1000),
+        ]
+
+    @property
+    def cuebot(self):
+        """The cuebot the channel connects to"""
+        with self.__lock:
+            self.__getChannel()
+            return self.__cuebots[self.__cuebotIndex]
+
+    def __getChannel(self):
+        if self.__channel is None:
+            if not self.__cuebots:
+                self.__cuebots = list(self.__hostnames or rqd.rqconstants.CUEBOT_HOSTNAME.split())
+                shuffle(self.__cuebots)
+            address = '%s:%s' % (self.__cuebots[self.__cuebotIndex],
+                                 self.__port or rqd.rqconstants.CUEBOT_GRPC_PORT)
+            log.info('Opening gRPC channel to %s' % address)
+            channel = grpc.insecure_channel(address, options=self.channelOptions())
+            channel.subscribe(lambda state: self.__onStateChange(channel, state))
+            self.__channel = channel
+            self.__stubs = {}
+            if not self.__atexitRegistered:
+                atexit.register(self.close)
+                self.__atexitRegistered = True
+        return self.__channel
+
+    def __onStateChange(self, channel, state):
+        """Tracks the connectivity of the channel, runs on a gRPC thread"""
+        with self.__lock:
+            if channel is not self.__channel:
+                return
+            self.state = state
+            if state == grpc.ChannelConnectivity.READY:
+                if self.__connected:
+                    self.stats.reconnects += 1
+                    log.info('Reconnected to cuebot %s' % self.__cuebots[self.__cuebotIndex])
+                self.__connected = True
+
+    def isHealthy(self):
+        """Returns False if the channel is failing to connect"""
+        return self.state not in (grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+                                  grpc.ChannelConnectivity.SHUTDOWN)
+
+    def waitForReady(self, timeout):
+        """Connects the channel and waits for it to be ready
+        @rtype:  bool
+        @return: False if the cuebot could not be reached in time"""
+        with self.__lock:
+            channel = self.__getChannel()
+        try:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+            return True
+        except grpc.FutureTimeoutError:
+            return False
+
+    def stub(self, stubClass):
+        """Returns the stub of the given class for the current channel
+        @type  stubClass: class
+        @param stubClass: A generated gRPC stub class"""
+        with self.__lock:
+            channel = self.__getChannel()
+            if stubClass not in self.__stubs:
+                self.__stubs[stubClass] = stubClass(channel)
+            return self.__stubs[stubClass]
+
+    def call(self, stubClass, method, request, timeout=None):
+        """Calls a unary method of the cuebot
+        @type  stubClass: class
+        @param stubClass: The generated stub class of the service
+        @type  method: str
+        @param method: The name of the method
+        @type  request: protobuf message
+        @param request: The request
+        @type  timeout: float
+        @param timeout: Seconds to wait for the reply, defaults to RQD_TIMEOUT
+        @return: The reply"""
+        rpc = getattr(self.stub(stubClass), method)
+        start = time.time()
+        try:
+            reply = rpc(request, timeout=timeout or rqd.rqconstants.RQD_TIMEOUT)
+        except grpc.RpcError as e:
+            self.__recordResult(start, e)
+            raise
+        self.__recordResult(start, None)
+        return reply
+
+    def callFuture(self, stubClass, method, request, timeout=None):
+        """Starts a call to a unary method of the cuebot without waiting for it
+        @rtype:  grpc.Future
+        @return: The call, its latency is recorded when it completes"""
+        rpc = getattr(self.stub(stubClass), method)
+        start = time.time()
+        future = rpc.future(request, timeout=timeout or rqd.rqconstants.RQD_TIMEOUT)
+        future.add_done_callback(lambda call: self.__recordResult(
+            start, None if call.cancelled() else call.exception()))
+        return future
+
+    def __recordResult(self, start, error):
+        self.stats.record(time.time() - start, failed=error is not None)
+        code = error.code() if error is not None and hasattr(error, 'code') else None
+        with self.__lock:
+            if code not in self.UNREACHABLE:
+                self.__consecutiveFailures = 0
+                return
+            self.__consecutiveFailures += 1
+            if (len(self.__cuebots) > 1 and
+                    self.__consecutiveFailures >= rqd.rqconstants.RQD_GRPC_FAILOVER_ERRORS and
+                    time.time() >= self.__nextFailover):
+                self.__failover()
+
+    def __failover(self):
+        """Replaces the channel by one to the next cuebot"""
+        previous = self.__cuebots[self.__cuebotIndex]
+        self.__cuebotIndex = (self.__cuebotIndex + 1) % len(self.__cuebots)
+        log.warning('Cuebot %s is unreachable, switching to %s' % (
+            previous, self.__cuebots[self.__cuebotIndex]))
+        self.stats.failovers += 1
+        backoff = min(rqd.rqconstants.RQD_GRPC_RECONNECT_MIN_SEC * 2 ** self.stats.failovers,
+                      rqd.rqconstants.RQD_GRPC_RECONNECT_MAX_SEC)
+        self.__nextFailover = time.time() + backoff * random.uniform(0.5, 1.5)
+        self.__consecutiveFailures = 0
+        self.__closeChannel()
+
+    def __closeChannel(self):
+        if self.__channel is not None:
+            self.__channel.close()
+        self.__channel = None
+        self.__stubs = {}
+        self.__connected = False
+        self.state = None
+
+    def close(self):
+        """Closes the channel, the next call opens a new one"""
+        with self.__lock:
+            self.__closeChannel()
+
+
+class CompletionReporter(threading.Thread):
+    """Sends frame completion reports to the cuebot in batches.
+
+    Reports queued within RQD_STATUS_COALESCE_SEC of the first one are sent
+    together, then a single status report is sent for the whole batch.
+    Reports that fail are kept and retried with an exponential backoff.
+    Reports stay queued until they are sent or dropped, and queue() blocks
+    the frame threads while RQD_COMPLETION_QUEUE_SIZE reports are waiting,
+    so a slow cuebot slows down rqd instead of growing its memory."""
+
+    def __init__(self, network, onBatchSent=None):
+        """CompletionReporter class initialization
+        @type  network: Network
+        @param network: Used to send the reports
+        @type  onBatchSent: callable
+        @param onBatchSent: Called after each batch, sends the status report"""
+        threading.Thread.__init__(self, name='RqdCompletionReporter')
+        self.daemon = True
+        self.__network = network
+        self.__onBatchSent = onBatchSent
+        self.__condition = threading.Condition()
+        # [report, attempts] in the order the frames completed
+        self.__queue = collections.deque()
+        self.__active = True
+        self.__retryDelay = 0
+        self.batchesSent = 0
+        self.reportsSent = 0
+        self.reportsDropped = 0
+
+    def queue(self, report):
+        """Queues a completion report, blocks while the queue is full
+        @type  report: report_pb2.FrameCompleteReport
+        @param report: The report to send"""
+        with self.__condition:
+            while self.__active and len(self.__queue) >= rqd.rqconstants.RQD_COMPLETION_QUEUE_SIZE:
+                log.warning('%d completion reports waiting for the cuebot, '
+                            'waiting for room in the queue' % len(self.__queue))
+                self.__condition.wait(rqd.rqconstants.RQD_COMPLETION_RETRY_SEC)
+            self.__queue.append([report, 0])
+            self.__condition.notify_all()
+
+    def pending(self):
+        """Returns the number of reports waiting to be sent"""
+        with self.__condition:
+            return len(self.__queue)
+
+    def flush(self, timeout=None):
+        """Waits for the queued reports to be sent
+        @type  timeout: float
+        @param timeout: Seconds to wait at most
+        @rtype:  bool
+        @return: True if every report was sent or dropped"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.__condition:
+            while self.__queue and self.is_alive():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.__condition.wait(remaining)
+            return not self.__queue
+
+    def stop(self):
+        """Sends what is queued without waiting for the batch window and
+           ends the thread once the queue is empty"""
+        with self.__condition:
+            self.__active = False
+            self.__condition.notify_all()
+
+    def run(self):
+        """Thread loop, collects a batch and sends it"""
+        while True:
+            with self.__condition:
+                while self.__active and not self.__queue:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                # Let the reports of the frames completing around this one join the batch
+                wait = max(rqd.rqconstants.RQD_STATUS_COALESCE_SEC, self.__retryDelay)
+                deadline = time.time() + wait
+                while self.__active and time.time() < deadline:
+                    self.__condition.wait(deadline - time.time())
+                batch = list(self.__queue)
+            self.__sendBatch(batch)
+
+    def __sendBatch(self, batch):
+        """Sends a batch and removes the reports that were sent or dropped
+           from the queue"""
+        try:
+            failed = self.__network.sendFrameCompletions([report for report, _ in batch])
+        except Exception as e:
+            log.warning('Unable to send %d completion reports: %s' % (len(batch), e))
+            failed = set(range(len(batch)))
+
+        done = set()
+        for index, entry in enumerate(batch):
+            if index not in failed:
+                done.add(id(entry))
+                continue
+            entry[1] += 1
+            if entry[1] >= rqd.rqconstants.RQD_COMPLETION_MAX_RETRIES:
+                log.error('Dropping the completion report of frame %s after %d attempts' % (
+                    entry[0].frame.frame_id, entry[1]))
+                self.reportsDropped += 1
+                done.add(id(entry))
+
+        with self.__condition:
+            self.__queue = collections.deque(
+                entry for entry in self.__queue if id(entry) not in done)
+            self.__condition.notify_all()
+
+        sent = len(batch) - len(failed)
+        self.reportsSent += sent
+        if failed:
+            self.__retryDelay = min(
+                max(self.__retryDelay * 2, rqd.rqconstants.RQD_COMPLETION_RETRY_SEC),
+                rqd.rqconstants.RQD_MAX_PING_INTERVAL_SEC)
+            log.warning('%d of %d completion reports failed, retrying in %ss' % (
+                len(failed), len(batch), self.__retryDelay))
+        else:
+            self.__retryDelay = 0
+        if sent:
+            self.batchesSent += 1
+            if self.__onBatchSent is not None:
+                try:
+                    self.__onBatchSent()
+                except Exception as e:
+                    log.warning('Unable to report status after completions: %s' % e)
+
+
 class Network(object):
     """Handles gRPC communication"""
     def __init__(self, rqCore):
         """Network class initialization"""
         self.rqCore = rqCore
         self.grpcServer = None
-        self.channel = None
+        self.connection = CuebotConnection()
+        self.completionReporter = None
+        self.__completionLock = threading.Lock()
 
     def start_grpc(self):
         self.grpcServer = GrpcServer(self.rqCore)
         self.grpcServer.serveForever()
 
     def stopGrpc(self):
+        self.stopCompletionReporter()
         self.grpcServer.shutdown()
         del self.grpcServer
 
     def closeChannel(self):
-        self.channel.close()
-        del self.channel
-        self.channel = None
-
-    def __getChannel(self):
-        # TODO(bcipriano) Add support for the facility nameserver or drop this concept? (Issue #152)
-        if self.channel is None:
-            cuebots = rqd.rqconstants.CUEBOT_HOSTNAME.split()
-            shuffle(cuebots)
-            for cuebotHostname in cuebots:
-                self.channel = grpc.insecure_channel('%s:%s' % (cuebotHostname,
-                                                                rqd.rqconstants.CUEBOT_GRPC_PORT))
-            atexit.register(self.closeChannel)
-
-    def __getReportStub(self):
-        self.__getChannel()
-        return rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub(self.channel)
+        self.connection.close()
+
+    def getConnectionStats(self):
+        """Returns the cuebot connection counters as render host attributes"""
+        return self.connection.stats.attributes()
+
+    def __getCompletionReporter(self):
+        with self.__completionLock:
+            if self.completionReporter is None:
+                self.completionReporter = CompletionReporter(self, self.__triggerStatusReport)
+                self.completionReporter.start()
+            return self.completionReporter
+
+    def __triggerStatusReport(self):
+        """Runs the next interval, which sends the status report, on the
+           scheduler thread that owns the host report"""
+        self.rqCore.scheduler.trigger('onInterval', 0)
+
+    def stopCompletionReporter(self, timeout=rqd.rqconstants.RQD_COMPLETION_RETRY_SEC):
+        """Sends the queued completion reports and stops the reporter thread"""
+        with self.__completionLock:
+            reporter = self.completionReporter
+            self.completionReporter = None
+        if reporter is not None:
+            reporter.stop()
+            reporter.join(timeout)
+            if reporter.pending():
+                log.warning('%d completion reports were not sent' % reporter.pending())
 
     def reportRqdStartup(self, report):
         """Wraps the ability to send a startup report to rqd via grpc"""
-        stub = self.__getReportStub()
         request = rqd.compiled_proto.report_pb2.RqdReportRqdStartupRequest(boot_report=report)
-        stub.ReportRqdStartup(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        self.connection.call(rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub,
+                             'ReportRqdStartup', request)
 
     def reportStatus(self, report):
         """Wraps the ability to send a status report to the cuebot via grpc"""
-        stub = self.__getReportStub()
         request = rqd.compiled_proto.report_pb2.RqdReportStatusRequest(host_report=report)
-        stub.ReportStatus(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        self.connection.call(rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub,
+                             'ReportStatus', request)
 
     def reportRunningFrameCompletion(self, report):
-        """Wraps the ability to send a running frame completion report
-           to the cuebot via grpc"""
-        stub = self.__getReportStub()
-        request = rqd.compiled_proto.report_pb2.RqdReportRunningFrameCompletionRequest(
-            frame_complete_report=report)
-        stub.ReportRunningFrameCompletion(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        """Queues a running frame completion report, it is sent to the cuebot
+           with the reports of the frames completing around the same time"""
+        self.__getCompletionReporter().queue(report)
+
+    def sendFrameCompletions(self, reports):
+        """Sends running frame completion reports to the cuebot via grpc.
+           The calls are started together and share the channel.
+        @type  reports: list<report_pb2.FrameCompleteReport>
+        @param reports: The reports to send
+        @rtype:  set<int>
+        @return: The indexes of the reports that failed"""
+        calls = [self.connection.callFuture(
+                     rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub,
+                     'ReportRunningFrameCompletion',
+                     rqd.compiled_proto.report_pb2.RqdReportRunningFrameCompletionRequest(
+                         frame_complete_report=report))
+                 for report in reports]
+        failed = set()
+        for index, call in enumerate(calls):
+            try:
+                call.result()
+            except grpc.RpcError as e:
+                log.warning('Completion report of frame %s failed: %s' % (
+                    reports[index].frame.frame_id, e))
+                failed.add(index)
+        return failed
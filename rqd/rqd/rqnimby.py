@@ -20,8 +20,13 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+from builtins import object
+import ctypes
+import ctypes.util
+import errno
 import os
 import select
+import struct
 import time
 import signal
 import threading
@@ -31,30 +36,109 @@ import rqd.rqconstants
 import rqd.rqutil
 
 
+# inotify flags, see inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Enough for a burst of input events, evdev only returns whole events.
+READ_SIZE = 4096
+
+
+def isInputDevice(name):
+    """Returns True for the /dev/input files nimby monitors"""
+    return name.startswith("event") or name.startswith("mice")
+
+
+class DeviceWatcher(object):
+    """Reports the files created or removed in a directory through inotify"""
+
+    def __init__(self, path):
+        """
+        @type    path: str
+        @param   path: The directory to watch"""
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            if libc.inotify_add_watch(fd, path.encode(),
+                                      IN_CREATE | IN_ATTRIB | IN_DELETE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed on %s" % path)
+            self.fd = fd
+        except (OSError, AttributeError) as e:
+            log.warning("Not watching %s for new devices: %s" % (path, e))
+
+    def read(self):
+        """Returns the names of the files that changed since the last read
+        @rtype:  set
+        @return: The changed file names"""
+        names = set()
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+            return names
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            names.add(data[offset:offset + length].rstrip(b"\0").decode())
+            offset += length
+        return names
+
+    def close(self):
+        """Closes the inotify file descriptor"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
 class Nimby(threading.Thread):
     """Nimby == Not In My Back Yard.
        If enabled, nimby will lock and kill all frames running on the host if
        keyboard or mouse activity is detected. If sufficient idle time has
        passed, defined in the Constants class, nimby will then unlock the host
-       and make it available for rendering."""
+       and make it available for rendering.
+
+       The input devices are opened once and registered with epoll, new devices
+       are picked up through inotify. Activity only updates lastActivity, the
+       lock and unlock decisions compare it to the current time."""
 
     def __init__(self, rqCore):
         """Nimby initialization
         @type    rqCore: RqCore
         @param   rqCore: Main RQD Object"""
-        threading.Thread.__init__(self)
+        threading.Thread.__init__(self, name="nimby")
 
         self.rqCore = rqCore
 
         self.locked = False
         self.active = False
+        self.__activeLock = threading.Lock()
 
-        self.fileObjList = []
-        self.results = [[]]
+        # Time of the last keyboard or mouse event
+        self.lastActivity = 0
+        self.lockedAt = 0
 
-        self.thread = None
+        # fd -> device name
+        self.devices = {}
+        self.poller = None
+        self.watcher = None
+        self.__wakeRead, self.__wakeWrite = None, None
 
-        signal.signal(signal.SIGINT, self.signalHandler)
+        try:
+            signal.signal(signal.SIGINT, self.signalHandler)
+        except ValueError:
+            # Only the main thread can set signal handlers
+            pass
 
     def signalHandler(self, sig, frame):
         """If a signal is detected, call .stop()"""
@@ -64,6 +148,7 @@ class Nimby(threading.Thread):
         """Activates the nimby lock, calls lockNimby() in rqcore"""
         if self.active and not self.locked:
             self.locked = True
+            self.lockedAt = time.time()
             log.info("Locked nimby")
             self.rqCore.onNimbyLock()
 
@@ -75,103 +160,186 @@ class Nimby(threading.Thread):
             log.info("Unlocked nimby")
             self.rqCore.onNimbyUnlock(asOf=asOf)
 
+    def idleSince(self):
+        """Returns the time since when the host has been idle while locked
+        @rtype:  float
+        @return: The later of the last activity and the lock time"""
+        return max(self.lastActivity, self.lockedAt)
+
     def _openEvents(self):
-        """Opens the /dev/input/event* files so nimby can monitor them"""
-        self._closeEvents()
+        """Opens the input devices that are not opened yet and registers
+        them with the poller"""
+        inputDir = rqd.rqconstants.NIMBY_INPUT_DIR
+        try:
+            names = [name for name in os.listdir(inputDir) if isInputDevice(name)]
+        except OSError as e:
+            log.warning("Failed to list %s: %s" % (inputDir, e))
+            return
+        self._openDevices(names)
 
+    def _openDevices(self, names):
+        """Opens the given input devices if not already opened
+        @type    names: list<str>
+        @param   names: Device file names in NIMBY_INPUT_DIR"""
+        opened = set(self.devices.values())
+        names = [name for name in names if name not in opened]
+        if not names:
+            return
         rqd.rqutil.permissionsHigh()
         try:
-            for device in os.listdir("/dev/input/"):
-                if device.startswith("event") or device.startswith("mice"):
-                    log.debug("Found device: %s" % device)
-                    try:
-                        self.fileObjList.append(open("/dev/input/%s" % device, "rb"))
-                    except IOError as e:
-                        # Bad device found
-                        log.debug("IOError: Failed to open %s, %s" % ("/dev/input/%s" % device, e))
+            for name in names:
+                path = os.path.join(rqd.rqconstants.NIMBY_INPUT_DIR, name)
+                try:
+                    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+                except (IOError, OSError) as e:
+                    # Bad device found
+                    log.debug("Failed to open %s, %s" % (path, e))
+                    continue
+                log.debug("Found device: %s" % name)
+                self.devices[fd] = name
+                self.poller.register(fd, select.EPOLLIN)
         finally:
             rqd.rqutil.permissionsLow()
 
+    def _closeDevice(self, fd):
+        """Unregisters and closes an input device"""
+        log.debug("Closing device: %s" % self.devices.get(fd))
+        self.devices.pop(fd, None)
+        try:
+            self.poller.unregister(fd)
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
     def _closeEvents(self):
-        """Closes the /dev/input/event* files"""
+        """Closes the input devices, the device watcher and the poller"""
         log.debug("_closeEvents")
-        if self.fileObjList:
-            for fileObj in self.fileObjList:
-                try:
-                    fileObj.close()
-                except:
-                    pass
-            self.fileObjList = []
-
-    def lockedInUse(self):
-        """Nimby State: Machine is in use, host is locked,
-                        waiting for sufficient idle time"""
-        log.debug("lockedInUse")
-        self._openEvents()
+        for fd in list(self.devices):
+            self._closeDevice(fd)
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        for fd in (self.__wakeRead, self.__wakeWrite):
+            if fd is not None:
+                os.close(fd)
+        self.__wakeRead, self.__wakeWrite = None, None
+        if self.poller is not None:
+            self.poller.close()
+            self.poller = None
+
+    def _readDevice(self, fd):
+        """Drains the pending events of a device
+        @rtype:  bool
+        @return: True if there were events"""
         try:
-            self.results = select.select(self.fileObjList, [], [], 5)
-        except:
-            pass
-        if self.active and self.results[0] == []:
-            self.lockedIdle()
-        elif self.active:
-            self._closeEvents()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
+            data = os.read(fd, READ_SIZE)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return False
+            # ENODEV once the device has been unplugged
+            self._closeDevice(fd)
+            return False
+        if not data:
+            self._closeDevice(fd)
+            return False
+        return True
 
-    def lockedIdle(self):
-        """Nimby State: Machine is idle,
-                        waiting for sufficient idle time to unlock"""
+    def _setup(self):
+        """Creates the poller and opens the input devices"""
+        self.poller = select.epoll()
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        self.poller.register(self.__wakeRead, select.EPOLLIN)
+        self.watcher = DeviceWatcher(rqd.rqconstants.NIMBY_INPUT_DIR)
+        if self.watcher.fd is not None:
+            self.poller.register(self.watcher.fd, select.EPOLLIN)
         self._openEvents()
-        waitStartTime = time.time()
+
+    def _timeout(self, now):
+        """Returns the seconds until the state has to be checked again"""
+        if not self.locked:
+            return rqd.rqconstants.CHECK_INTERVAL_UNLOCKED
+        remaining = self.idleSince() + rqd.rqconstants.MINIMUM_IDLE - now
+        if remaining > 0:
+            return remaining
+        return rqd.rqconstants.CHECK_INTERVAL_LOCKED
+
+    def poll(self, timeout):
+        """Waits up to timeout seconds for input and device changes,
+        updates lastActivity on input
+        @rtype:  bool
+        @return: True if there was input activity"""
         try:
-            self.results = select.select(self.fileObjList, [], [],
-                                         rqd.rqconstants.MINIMUM_IDLE)
-        except:
-            pass
-        if self.active and self.results[0] == [] and \
-           self.rqCore.machine.isNimbySafeToUnlock():
-            self._closeEvents()
-            self.unlockNimby(asOf=waitStartTime)
-            self.unlockedIdle()
-        elif self.active:
-            self._closeEvents()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
-
-    def unlockedIdle(self):
-        """Nimby State: Machine is idle, host is unlocked,
-                        waiting for user activity"""
-        while self.active and \
-              self.results[0] == [] and \
-              self.rqCore.machine.isNimbySafeToRunJobs():
-            try:
-                self._openEvents()
-                self.results = select.select(self.fileObjList, [], [], 5)
-            except:
-                pass
-            if not self.rqCore.machine.isNimbySafeToRunJobs():
+            events = self.poller.poll(timeout)
+        except (IOError, OSError) as e:
+            if e.errno != errno.EINTR:
+                raise
+            return False
+        activity = False
+        for fd, _ in events:
+            if fd == self.__wakeRead:
+                os.read(fd, READ_SIZE)
+            elif self.watcher is not None and fd == self.watcher.fd:
+                self._openDevices([name for name in self.watcher.read()
+                                   if isInputDevice(name)])
+            elif fd in self.devices:
+                activity = self._readDevice(fd) or activity
+        if activity:
+            self.lastActivity = time.time()
+        # Without inotify pick up new devices on every check
+        if self.watcher is None or self.watcher.fd is None:
+            self._openEvents()
+        return activity
+
+    def checkState(self, now, activity=False):
+        """Locks or unlocks nimby based on the time since the last activity
+        @type    now: float
+        @param   now: The current time
+        @type    activity: bool
+        @param   activity: True if there was input activity since the last check"""
+        if not self.active:
+            return
+        if not self.locked:
+            if activity:
+                self.lockNimby()
+            elif not self.rqCore.machine.isNimbySafeToRunJobs():
                 log.warning("memory threshold has been exceeded, locking nimby")
-                self.active = True
+                self.lockNimby()
+        elif now - self.idleSince() >= rqd.rqconstants.MINIMUM_IDLE and \
+                self.rqCore.machine.isNimbySafeToUnlock():
+            self.unlockNimby(asOf=self.idleSince())
 
-        if self.active:
-            self._closeEvents()
-            self.lockNimby()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
+    def start(self):
+        """Starts the Nimby thread, it is active once this returns so a stop()
+           right after is not lost"""
+        with self.__activeLock:
+            self.active = True
+        try:
+            threading.Thread.start(self)
+        except:
+            with self.__activeLock:
+                self.active = False
+            raise
 
     def run(self):
-        """Starts the Nimby thread"""
-        self.active = True
-        self.unlockedIdle()
+        """Runs until stop() is called"""
+        try:
+            self._setup()
+            while self.active:
+                activity = self.poll(self._timeout(time.time()))
+                self.checkState(time.time(), activity)
+        finally:
+            self._closeEvents()
 
     def stop(self):
         """Stops the Nimby thread"""
-        if self.thread:
-            self.thread.cancel()
-        self.active = False
-        self._closeEvents()
+        with self.__activeLock:
+            self.active = False
+        if self.__wakeWrite is not None:
+            try:
+                os.write(self.__wakeWrite, b"x")
+            except OSError:
+                pass
         self.unlockNimby()
@@ -0,0 +1,428 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Process accounting for running frames, read from /proc.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import errno
+import logging as log
+import os
+import time
+
+import rqd.rqconstants
+
+
+# Offsets of the /proc/<pid>/stat fields once the "pid (comm) " prefix has
+# been stripped, see "man proc". The comm field may itself contain spaces,
+# so the prefix is always located with the last closing parenthesis.
+STAT_PPID = 1
+STAT_SESSION = 3
+STAT_UTIME = 11
+STAT_STIME = 12
+STAT_CUTIME = 13
+STAT_CSTIME = 14
+STAT_NUM_THREADS = 17
+STAT_START_TIME = 19
+STAT_VSIZE = 20
+STAT_RSS = 21
+
+# totalTime is utime + stime + cutime + cstime in jiffies, so the cpu of dead
+# children is counted. startTime is in jiffies after boot, vsize in bytes and
+# rss in pages.
+PidStat = collections.namedtuple(
+    'PidStat',
+    ['pid', 'ppid', 'session', 'totalTime', 'numThreads', 'startTime', 'vsize', 'rss'])
+
+SessionUsage = collections.namedtuple('SessionUsage', ['rss', 'vsize', 'pcpu', 'ptree'])
+
+
+def parseStat(pid, data):
+    """Parses the contents of a /proc/<pid>/stat file
+    @type  pid: int
+    @param pid: The pid the stat file belongs to
+    @type  data: bytes
+    @param data: The raw contents of the stat file
+    @rtype:  PidStat
+    @return: The numeric fields used for accounting"""
+    fields = data[data.rindex(b')') + 2:].split()
+    return PidStat(pid,
+                   int(fields[STAT_PPID]),
+                   int(fields[STAT_SESSION]),
+                   int(fields[STAT_UTIME]) + int(fields[STAT_STIME]) +
+                   int(fields[STAT_CUTIME]) + int(fields[STAT_CSTIME]),
+                   int(fields[STAT_NUM_THREADS]),
+                   int(fields[STAT_START_TIME]),
+                   int(fields[STAT_VSIZE]),
+                   int(fields[STAT_RSS]))
+
+
+def readStat(pid, procPath=rqd.rqconstants.PATH_PROC):
+    """Reads and parses /proc/<pid>/stat
+    @type  pid: int
+    @param pid: The pid to read
+    @type  procPath: str
+    @param procPath: The mount point of procfs
+    @rtype:  PidStat or None
+    @return: The parsed stat, None if the process has gone away"""
+    try:
+        with open(os.path.join(procPath, str(pid), 'stat'), 'rb') as statFile:
+            return parseStat(pid, statFile.read())
+    except (IOError, OSError):
+        # The process exited between listing and reading it
+        return None
+    except (ValueError, IndexError) as e:
+        log.warning('failed to parse stat file for pid %s: %s' % (pid, e))
+        return None
+
+
+class ProcessIndex(object):
+    """A session indexed view of the processes in /proc.
+
+    The first update reads the stat file of every pid. Later updates only
+    read pids that are new or that belong to a tracked session; pids already
+    known to belong to some other session are carried over without being
+    reopened. A full read is forced every fullScanInterval updates to pick up
+    recycled pids and processes that changed session."""
+
+    def __init__(self, procPath=rqd.rqconstants.PATH_PROC,
+                 fullScanInterval=rqd.rqconstants.PROC_FULL_SCAN_INTERVAL):
+        """ProcessIndex class initialization
+        @type  procPath: str
+        @param procPath: The mount point of procfs
+        @type  fullScanInterval: int
+        @param fullScanInterval: Number of updates between full reads,
+                                 0 to always read every pid"""
+        self.__procPath = procPath
+        self.__fullScanInterval = fullScanInterval
+        self.__updates = 0
+        # pid -> session for every pid outside of the tracked sessions
+        self.__untracked = {}
+        self.statsRead = 0
+
+    def update(self, tracked):
+        """Refreshes the index and returns the processes of the tracked sessions
+        @type  tracked: set
+        @param tracked: The session ids (frame pids) to account for
+        @rtype:  dict
+        @return: session id -> list of PidStat"""
+        fullScan = (self.__fullScanInterval <= 0 or
+                    self.__updates % self.__fullScanInterval == 0)
+        self.__updates += 1
+
+        sessions = dict((session, []) for session in tracked)
+        previous = self.__untracked
+        untracked = {}
+        statsRead = 0
+
+        for name in os.listdir(self.__procPath):
+            if not name.isdigit():
+                continue
+            pid = int(name)
+            if not fullScan and pid not in tracked:
+                session = previous.get(pid)
+                if session is not None and session not in tracked:
+                    untracked[pid] = session
+                    continue
+
+            stat = readStat(pid, self.__procPath)
+            statsRead += 1
+            if stat is None:
+                continue
+            if stat.session in sessions:
+                sessions[stat.session].append(stat)
+            else:
+                untracked[pid] = stat.session
+
+        self.__untracked = untracked
+        self.statsRead = statsRead
+        return sessions
+
+
+def childrenSupported(procPath=rqd.rqconstants.PATH_PROC):
+    """Returns True if the kernel provides /proc/<pid>/task/<tid>/children
+       (CONFIG_PROC_CHILDREN)"""
+    pid = os.getpid()
+    return os.path.exists(os.path.join(procPath, str(pid), 'task', str(pid), 'children'))
+
+
+class FrameProcessTracker(object):
+    """Tracks the processes of each running frame incrementally.
+
+    Each frame session is seeded with the frame pid and grows by following
+    /proc/<pid>/task/<tid>/children, so an update only touches the processes
+    that belong to running frames. Up to maxOpenStats stat files are kept
+    open between updates and re-read in place, the others are opened on
+    every update; a read failing means the pid has exited and it is
+    dropped. Children are only looked up when a process was created anywhere
+    on the host since the previous update, which /proc/loadavg tells us.
+
+    A ProcessIndex session scan is used instead when the kernel has no
+    children files, and every fullScanInterval updates to pick up processes
+    whose parent exited before they were seen."""
+
+    def __init__(self, procPath=rqd.rqconstants.PATH_PROC,
+                 fullScanInterval=rqd.rqconstants.PROC_FULL_SCAN_INTERVAL,
+                 useChildren=None, maxOpenStats=rqd.rqconstants.PROC_MAX_OPEN_STATS):
+        """FrameProcessTracker class initialization
+        @type  procPath: str
+        @param procPath: The mount point of procfs
+        @type  fullScanInterval: int
+        @param fullScanInterval: Number of updates between session scans,
+                                 0 to never scan when children are available
+        @type  useChildren: bool
+        @param useChildren: Follow children files, detected when None
+        @type  maxOpenStats: int
+        @param maxOpenStats: Maximum stat files kept open between updates"""
+        self.__procPath = procPath
+        self.__fullScanInterval = fullScanInterval
+        self.__useChildren = childrenSupported(procPath) if useChildren is None else useChildren
+        self.__processIndex = ProcessIndex(
+            procPath, fullScanInterval=0 if self.__useChildren else fullScanInterval)
+        self.__updates = 0
+        self.__lastPid = None
+        # session -> {pid: file descriptor of /proc/<pid>/stat or None}
+        self.__sessions = {}
+        self.__maxOpenStats = maxOpenStats
+        self.openStats = 0
+
+        # Cost of the last update
+        self.statsRead = 0
+        self.pidsTracked = 0
+        self.updateTime = 0
+
+    def update(self, tracked):
+        """Refreshes the tracked sessions and returns their processes
+        @type  tracked: set
+        @param tracked: The session ids (frame pids) to account for
+        @rtype:  dict
+        @return: session id -> list of PidStat"""
+        startTime = time.time()
+
+        for session in list(self.__sessions):
+            if session not in tracked:
+                self.__closeSession(session)
+
+        scan = not self.__useChildren or (
+            self.__fullScanInterval > 0 and self.__updates % self.__fullScanInterval == 0)
+        self.__updates += 1
+
+        if scan:
+            sessions = self.__processIndex.update(tracked)
+            self.statsRead = self.__processIndex.statsRead
+            for session, stats in sessions.items():
+                self.__resetSession(session, [stat.pid for stat in stats])
+        else:
+            sessions = self.__follow(tracked)
+
+        self.pidsTracked = sum(len(stats) for stats in sessions.values())
+        self.updateTime = time.time() - startTime
+        return sessions
+
+    def close(self):
+        """Closes every open stat file"""
+        for session in list(self.__sessions):
+            self.__closeSession(session)
+
+    def __follow(self, tracked):
+        """Re-reads the known pids of each session and adds their new children"""
+        lastPid = self.__readLastPid()
+        births = lastPid is None or lastPid != self.__lastPid
+        self.__lastPid = lastPid
+        self.statsRead = 0
+
+        sessions = {}
+        for session in tracked:
+            handles = self.__sessions.setdefault(session, {})
+            newSession = not handles
+            if newSession:
+                handles[session] = None
+
+            stats = []
+            pending = list(handles)
+            seen = set()
+            while pending:
+                pid = pending.pop()
+                if pid in seen:
+                    continue
+                seen.add(pid)
+                stat = self.__readHandle(handles, pid)
+                if stat is None:
+                    continue
+                stats.append(stat)
+                if births or newSession:
+                    for child in self.__readChildren(stat):
+                        if child not in handles:
+                            handles[child] = None
+                            pending.append(child)
+            sessions[session] = stats
+        return sessions
+
+    def __readHandle(self, handles, pid):
+        """Reads the stat of a tracked pid, dropping it if it has exited"""
+        fd = handles.get(pid)
+        kept = fd is not None
+        data = None
+        try:
+            if fd is None:
+                fd = os.open(os.path.join(self.__procPath, str(pid), 'stat'), os.O_RDONLY)
+                if self.openStats < self.__maxOpenStats:
+                    handles[pid] = fd
+                    self.openStats += 1
+                    kept = True
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+            self.statsRead += 1
+            data = os.read(fd, 4096)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EMFILE, errno.ENFILE):
+                # The pid is still running, keep it and try again next update
+                log.warning('failed to open the stat file of pid %s, %d stat files '
+                            'open: %s' % (pid, self.openStats, e))
+                return None
+            # ESRCH once the process has exited
+        finally:
+            if not kept and fd is not None:
+                os.close(fd)
+
+        if data:
+            try:
+                return parseStat(pid, data)
+            except (ValueError, IndexError) as e:
+                log.warning('failed to parse stat file for pid %s: %s' % (pid, e))
+
+        self.__close(handles.pop(pid))
+        return None
+
+    def __readChildren(self, stat):
+        """Returns the pids of the children of every thread of a process"""
+        taskPath = os.path.join(self.__procPath, str(stat.pid), 'task')
+        try:
+            if stat.numThreads == 1:
+                tids = [str(stat.pid)]
+            else:
+                tids = os.listdir(taskPath)
+            children = []
+            for tid in tids:
+                with open(os.path.join(taskPath, tid, 'children'), 'rb') as childrenFile:
+                    children.extend(int(child) for child in childrenFile.read().split())
+            return children
+        except (IOError, OSError):
+            return []
+
+    def __readLastPid(self):
+        """Returns the most recently created pid on the host"""
+        try:
+            with open(os.path.join(self.__procPath, 'loadavg'), 'rb') as loadAvgFile:
+                return int(loadAvgFile.read().split()[4])
+        except (IOError, OSError, ValueError, IndexError):
+            return None
+
+    def __resetSession(self, session, pids):
+        """Replaces the known pids of a session, keeping still valid handles"""
+        handles = self.__sessions.setdefault(session, {})
+        pids = set(pids)
+        for pid in list(handles):
+            if pid not in pids:
+                self.__close(handles.pop(pid))
+        for pid in pids:
+            handles.setdefault(pid, None)
+
+    def __closeSession(self, session):
+        for fd in self.__sessions.pop(session).values():
+            self.__close(fd)
+
+    def __close(self, fd):
+        if fd is not None:
+            self.openStats -= 1
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class ProcessAccounting(object):
+    """Computes the rss, vsize and cpu usage of frame sessions.
+
+    The cpu usage of each pid is a decaying average, 50% from the previous
+    update and 50% from the time since then, so the history of the last
+    update is kept per pid."""
+
+    def __init__(self, processIndex=None):
+        """ProcessAccounting class initialization
+        @type  processIndex: ProcessIndex
+        @param processIndex: The source of process stats"""
+        self.processIndex = processIndex or ProcessIndex()
+        # pid -> (totalTime, seconds, pidPcpu) from the previous update
+        self.__pidHistory = {}
+
+    def update(self, sessions, now, bootTime):
+        """Samples the given sessions
+        @type  sessions: set
+        @param sessions: The session ids (frame pids) to account for
+        @type  now: int
+        @param now: The current epoch time in seconds
+        @type  bootTime: int
+        @param bootTime: Epoch when the system booted
+        @rtype:  dict
+        @return: session id -> SessionUsage, rss and vsize in kB"""
+        hertz = float(rqd.rqconstants.SYS_HERTZ)
+        pageKb = rqd.rqconstants.PAGE_SIZE // 1024
+        uptime = now - bootTime
+        history = self.__pidHistory
+        pidHistory = {}
+        usage = {}
+
+        for session, stats in self.processIndex.update(sessions).items():
+            rss = 0
+            vsize = 0
+            pcpu = 0
+            ptree = [] if rqd.rqconstants.ENABLE_PTREE else None
+            for stat in stats:
+                rss += stat.rss
+                vsize += stat.vsize
+
+                # Seconds of process life, boot time is already in seconds
+                seconds = uptime - stat.startTime / hertz
+                if seconds:
+                    old = history.get(stat.pid)
+                    if old is None:
+                        pidPcpu = stat.totalTime / seconds
+                        pcpu += pidPcpu
+                        pidHistory[stat.pid] = stat.totalTime, seconds, pidPcpu
+                    elif seconds != old[1]:
+                        pidPcpu = (stat.totalTime - old[0]) / (seconds - old[1])
+                        pcpu += (old[2] + pidPcpu) / 2
+                        pidHistory[stat.pid] = stat.totalTime, seconds, pidPcpu
+                    else:
+                        # Already sampled at this time
+                        pcpu += old[2]
+                        pidHistory[stat.pid] = old
+
+                if ptree is not None:
+                    ptree.append({"pid": str(stat.pid), "seconds": seconds,
+                                  "total_time": stat.totalTime})
+
+            usage[session] = SessionUsage(rss * pageKb, vsize // 1024, pcpu, ptree)
+
+        self.__pidHistory = pidHistory
+        return usage
@@ -0,0 +1,159 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Single threaded scheduler for the periodic work of rqd.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import heapq
+import itertools
+import logging as log
+import threading
+import time
+
+
+class ScheduledTask(object):
+    """A call waiting in the Scheduler"""
+
+    def __init__(self, name, func, args, when):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.when = when
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevents the task from running if it has not started yet"""
+        self.cancelled = True
+
+
+class Scheduler(threading.Thread):
+    """Runs scheduled calls one after the other on a single thread.
+
+    Tasks are kept in a heap ordered by due time. A named task exists at most
+    once: scheduling it again replaces the pending call, and trigger() only
+    ever moves it earlier, so a burst of requests for the same work results
+    in a single run. Tasks must not block for long, they delay every other
+    task while running."""
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='RqdScheduler')
+        self.daemon = True
+        self.__condition = threading.Condition()
+        self.__heap = []
+        self.__named = {}
+        self.__sequence = itertools.count()
+        self.__active = True
+
+    def schedule(self, delay, func, name=None, *args):
+        """Schedules a call
+        @type  delay: float
+        @param delay: Seconds to wait before the call
+        @type  func: callable
+        @param func: The function to call
+        @type  name: str
+        @param name: Replaces any pending task with the same name
+        @rtype:  ScheduledTask
+        @return: The scheduled task"""
+        with self.__condition:
+            if name is not None and name in self.__named:
+                self.__named.pop(name).cancel()
+            return self.__push(ScheduledTask(name, func, args, time.time() + delay))
+
+    def trigger(self, name, delay, *args):
+        """Brings a named task forward so it runs within delay seconds.
+           Does nothing if it is already due sooner.
+        @type  name: str
+        @param name: The name the task was scheduled with
+        @type  delay: float
+        @param delay: The latest the task should run, in seconds from now
+        @type  args: tuple
+        @param args: Replace the arguments of the call, if given
+        @rtype:  bool
+        @return: False if no task of that name is pending"""
+        with self.__condition:
+            task = self.__named.get(name)
+            if task is None:
+                return False
+            when = time.time() + delay
+            if when < task.when:
+                task.cancel()
+                self.__push(ScheduledTask(name, task.func, args or task.args, when))
+            return True
+
+    def cancel(self, name):
+        """Cancels a named task"""
+        with self.__condition:
+            task = self.__named.pop(name, None)
+            if task is not None:
+                task.cancel()
+
+    def pending(self, name):
+        """Returns the named task if it is waiting to run, else None"""
+        with self.__condition:
+            return self.__named.get(name)
+
+    def stop(self):
+        """Cancels all tasks and ends the scheduler thread"""
+        with self.__condition:
+            self.__active = False
+            for _, _, task in self.__heap:
+                task.cancel()
+            self.__heap = []
+            self.__named = {}
+            self.__condition.notify()
+
+    def run(self):
+        """Thread loop, waits for the next due task and runs it"""
+        while True:
+            with self.__condition:
+                task = self.__next()
+                if task is None:
+                    return
+            try:
+                task.func(*task.args)
+            except Exception:
+                log.exception('Scheduled task %s failed' % (task.name or task.func))
+
+    def __next(self):
+        """Waits for and removes the next due task, None once stopped"""
+        while self.__active:
+            while self.__heap and self.__heap[0][2].cancelled:
+                heapq.heappop(self.__heap)
+            if not self.__heap:
+                self.__condition.wait()
+                continue
+            wait = self.__heap[0][0] - time.time()
+            if wait > 0:
+                self.__condition.wait(wait)
+                continue
+            task = heapq.heappop(self.__heap)[2]
+            if task.name is not None and self.__named.get(task.name) is task:
+                del self.__named[task.name]
+            return task
+        return None
+
+    def __push(self, task):
+        if task.name is not None:
+            self.__named[task.name] = task
+        heapq.heappush(self.__heap, (task.when, next(self.__sequence), task))
+        self.__condition.notify()
+        return task
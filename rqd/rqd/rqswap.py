@@ -88,18 +88,13 @@ class RepeatedTimer(threading.Thread):
         self.__callable = function
         self.__args = args
         self.__kwargs = kwargs
-        self.__event = threading.Event()
-        self.__event.set()
+        self.__stopped = threading.Event()
 
     def run(self):
-        while self.__event.is_set():
+        # Waits on the stop event rather than starting a Timer thread per call
+        while not self.__stopped.wait(self.__interval):
             try:
-                timer = threading.Timer(self.__interval,
-                                        self.__callable,
-                                        self.__args,
-                                        self.__kwargs)
-                timer.start()
-                timer.join()
+                self.__callable(*self.__args, **self.__kwargs)
             except Exception:
                 # Catch all exceptions here.
                 pass
@@ -108,7 +103,7 @@ class RepeatedTimer(threading.Thread):
         """
         Cancel the repeated timer.
         """
-        self.__event.clear()
+        self.__stopped.set()
 
 
 class VmStat(object):
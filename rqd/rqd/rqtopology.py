@@ -0,0 +1,201 @@
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+CPU topology and core reservations.
+
+CpuTopology reads the physical cores, their hyper-threading siblings and
+their NUMA nodes from sysfs. CoreAllocator reserves whole physical cores
+for frames, packing each frame onto as few NUMA nodes as possible.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import logging as log
+import os
+import re
+import threading
+
+import rqd.rqconstants
+import rqd.rqexceptions
+
+
+NODE_PATTERN = re.compile(r'^node(\d+)$')
+
+# index is the position of the core in the topology, threads are the
+# logical cpus of the core, its hyper-threading siblings
+PhysicalCore = collections.namedtuple('PhysicalCore', ['index', 'node', 'socket', 'threads'])
+
+
+def parseCpuList(cpuList):
+    """Parses a kernel cpu list
+    @type  cpuList: str
+    @param cpuList: A cpu list, ex: 0-3,8,10-11
+    @rtype:  list<int>
+    @return: The cpus"""
+    cpus = []
+    for section in cpuList.strip().split(','):
+        if not section:
+            continue
+        if '-' in section:
+            first, last = section.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(section))
+    return cpus
+
+
+def _readValue(path):
+    with open(path) as valueFile:
+        return valueFile.read().strip()
+
+
+class CpuTopology(object):
+    """The physical cores of the host"""
+
+    def __init__(self, cores):
+        """
+        @type  cores: list<PhysicalCore>
+        @param cores: The physical cores, ordered by index"""
+        self.cores = cores
+        self.__coreOfCpu = dict(
+            (thread, core) for core in cores for thread in core.threads)
+
+    @classmethod
+    def fromSysfs(cls, root=None):
+        """Reads the topology from sysfs
+        @type  root: str
+        @param root: The system devices directory, defaults to PATH_SYSFS_SYSTEM
+        @rtype:  CpuTopology
+        @return: The topology of the online cpus"""
+        root = root or rqd.rqconstants.PATH_SYSFS_SYSTEM
+        cpuRoot = os.path.join(root, 'cpu')
+        nodeRoot = os.path.join(root, 'node')
+
+        nodeOfCpu = {}
+        if os.path.isdir(nodeRoot):
+            for entry in os.listdir(nodeRoot):
+                match = NODE_PATTERN.match(entry)
+                if match:
+                    for cpu in parseCpuList(_readValue(os.path.join(nodeRoot, entry, 'cpulist'))):
+                        nodeOfCpu[cpu] = int(match.group(1))
+
+        threads = collections.defaultdict(list)
+        for cpu in parseCpuList(_readValue(os.path.join(cpuRoot, 'online'))):
+            topology = os.path.join(cpuRoot, 'cpu%d' % cpu, 'topology')
+            socket = int(_readValue(os.path.join(topology, 'physical_package_id')))
+            coreId = int(_readValue(os.path.join(topology, 'core_id')))
+            threads[(socket, coreId)].append(cpu)
+
+        cores = sorted(
+            (nodeOfCpu.get(min(cpus), 0), socket, sorted(cpus))
+            for (socket, _), cpus in threads.items())
+        return cls([PhysicalCore(index, node, socket, cpus)
+                    for index, (node, socket, cpus) in enumerate(cores)])
+
+    @classmethod
+    def fromCoreCount(cls, numCores, threadsPerCore):
+        """The topology assumed without sysfs, a single node where the siblings
+           of core N are N + numCores, N + 2 * numCores...
+        @type  numCores: int
+        @param numCores: The number of physical cores
+        @type  threadsPerCore: int
+        @param threadsPerCore: The hyper-threading multiplier"""
+        return cls([PhysicalCore(index, 0, 0,
+                                 [index + numCores * thread for thread in range(threadsPerCore)])
+                    for index in range(numCores)])
+
+    def coreOf(self, cpu):
+        """Returns the physical core of a logical cpu, None if unknown"""
+        return self.__coreOfCpu.get(cpu)
+
+    def nodes(self):
+        """Returns the NUMA nodes"""
+        return sorted(set(core.node for core in self.cores))
+
+
+class CoreAllocator(object):
+    """Reserves physical cores of a CpuTopology. A frame gets the cores of
+       the node with the fewest free cores that fits it, so larger holes are
+       left for larger frames. Frames that fit no single node take the nodes
+       with the most free cores first. Thread safe."""
+
+    def __init__(self, topology):
+        """
+        @type  topology: CpuTopology
+        @param topology: The cores to reserve"""
+        self.topology = topology
+        self.__free = set(core.index for core in topology.cores)
+        self.__lock = threading.Lock()
+
+    def freeCores(self):
+        """Returns the number of free physical cores"""
+        return len(self.__free)
+
+    def reserve(self, numCores):
+        """Reserves physical cores
+        @type  numCores: int
+        @param numCores: The number of physical cores
+        @rtype:  list<int>
+        @return: The logical cpus of the cores, the siblings of each core
+                 following it
+        @raise CoreReservationFailureException: Not enough free cores"""
+        with self.__lock:
+            if numCores > len(self.__free):
+                raise rqd.rqexceptions.CoreReservationFailureException(
+                    'Not launching, insufficient free cores to reserve %d cores' % numCores)
+
+            freeByNode = collections.defaultdict(list)
+            for core in self.topology.cores:
+                if core.index in self.__free:
+                    freeByNode[core.node].append(core)
+
+            fitting = [node for node in freeByNode if len(freeByNode[node]) >= numCores]
+            if fitting:
+                nodes = [min(fitting, key=lambda node: (len(freeByNode[node]), node))]
+            else:
+                nodes = sorted(freeByNode, key=lambda node: (-len(freeByNode[node]), node))
+
+            cores = []
+            for node in nodes:
+                cores.extend(freeByNode[node][:numCores - len(cores)])
+                if len(cores) == numCores:
+                    break
+
+            self.__free.difference_update(core.index for core in cores)
+            if len(nodes) > 1:
+                log.debug('Reserved %d cores across nodes %s' % (
+                    numCores, sorted(set(core.node for core in cores))))
+            return [thread for core in cores for thread in core.threads]
+
+    def release(self, cpus):
+        """Releases the cores of logical cpus returned by reserve
+        @type  cpus: list<int>
+        @param cpus: The logical cpus"""
+        with self.__lock:
+            for cpu in cpus:
+                core = self.topology.coreOf(cpu)
+                if core is not None:
+                    self.__free.add(core.index)
+
+    def nodesOf(self, cpus):
+        """Returns the NUMA nodes of logical cpus"""
+        return sorted(set(self.topology.coreOf(cpu).node for cpu in cpus
+                          if self.topology.coreOf(cpu) is not None))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import os
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqcgroup
+import rqd.rqconstants
+
+
+CGROUP_ROOT = '/sys/fs/cgroup/opencue'
+
+CPU_STAT = '''usage_usec 3000000
+user_usec 2000000
+system_usec 1000000
+nr_periods 0
+'''
+
+IO_STAT = '''8:0 rbytes=1024 wbytes=2048 rios=1 wios=2 dbytes=0 dios=0
+8:16 rbytes=100 wbytes=200 rios=1 wios=1 dbytes=0 dios=0
+'''
+
+
+class CgroupTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file('/sys/fs/cgroup/cgroup.controllers', contents='cpuset cpu io memory pids')
+        rqd.rqconstants.SYS_HERTZ = 100
+
+    def createFrameCgroup(self, path):
+        self.fs.create_file(os.path.join(path, 'cgroup.procs'))
+        self.fs.create_file(os.path.join(path, 'memory.current'), contents='2097152\n')
+        self.fs.create_file(os.path.join(path, 'memory.peak'), contents='4194304\n')
+        self.fs.create_file(os.path.join(path, 'cpu.stat'), contents=CPU_STAT)
+        self.fs.create_file(os.path.join(path, 'io.stat'), contents=IO_STAT)
+
+    def test_setupRoot(self):
+        self.fs.create_file(os.path.join(CGROUP_ROOT, 'cgroup.controllers'),
+                            contents='cpuset cpu memory')
+
+        self.assertEqual(CGROUP_ROOT, rqd.rqcgroup.setupRoot(CGROUP_ROOT))
+
+        # The last controller written to subtree_control, io is not delegated.
+        self.assertEqual('+memory', rqd.rqcgroup.readValue(
+            os.path.join(CGROUP_ROOT, 'cgroup.subtree_control')))
+
+    def test_setupRootNotCgroup2(self):
+        self.fs.remove_object('/sys/fs/cgroup/cgroup.controllers')
+
+        self.assertIsNone(rqd.rqcgroup.setupRoot(CGROUP_ROOT))
+
+    def test_create(self):
+        self.fs.create_dir(CGROUP_ROOT)
+
+        cgroup = rqd.rqcgroup.FrameCgroup.create(CGROUP_ROOT, 'frame/id', cpuList='0,1,8,9')
+
+        self.assertEqual(os.path.join(CGROUP_ROOT, 'frame-frame_id'), cgroup.path)
+        self.assertEqual('0,1,8,9', rqd.rqcgroup.readValue(
+            os.path.join(cgroup.path, 'cpuset.cpus')))
+
+    def test_usage(self):
+        path = os.path.join(CGROUP_ROOT, 'frame-id')
+        self.createFrameCgroup(path)
+        cgroup = rqd.rqcgroup.FrameCgroup(path)
+        cgroup.usage(now=100)
+        self.fs.get_object(os.path.join(path, 'cpu.stat')).set_contents(
+            CPU_STAT.replace('usage_usec 3000000', 'usage_usec 8000000'))
+
+        usage = cgroup.usage(now=110)
+
+        self.assertEqual(rqd.rqcgroup.CgroupUsage(
+            rss=2048, maxRss=4096, pcpu=50.0, utime=2.0, stime=1.0,
+            readBytes=1124, writeBytes=2248), usage)
+
+    def test_usageWithoutPeak(self):
+        path = os.path.join(CGROUP_ROOT, 'frame-id')
+        self.createFrameCgroup(path)
+        self.fs.remove_object(os.path.join(path, 'memory.peak'))
+        cgroup = rqd.rqcgroup.FrameCgroup(path)
+        cgroup.maxRss = 3000
+
+        self.assertEqual(3000, cgroup.usage().maxRss)
+
+    def test_kill(self):
+        path = os.path.join(CGROUP_ROOT, 'frame-id')
+        self.createFrameCgroup(path)
+        self.fs.create_file(os.path.join(path, 'cgroup.kill'))
+
+        rqd.rqcgroup.FrameCgroup(path).kill(9)
+
+        self.assertEqual('1', rqd.rqcgroup.readValue(os.path.join(path, 'cgroup.kill')))
+
+    @mock.patch('os.kill')
+    def test_killWithoutKillFile(self, killMock):
+        path = os.path.join(CGROUP_ROOT, 'frame-id')
+        self.createFrameCgroup(path)
+        self.fs.get_object(os.path.join(path, 'cgroup.procs')).set_contents('100\n101\n')
+
+        rqd.rqcgroup.FrameCgroup(path).kill(9)
+
+        killMock.assert_has_calls([mock.call(100, 9), mock.call(101, 9)])
+
+    def test_remove(self):
+        path = os.path.join(CGROUP_ROOT, 'frame-id')
+        self.fs.create_dir(path)
+
+        rqd.rqcgroup.FrameCgroup(path).remove()
+
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
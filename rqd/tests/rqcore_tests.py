@@ -22,6 +22,9 @@ from __future__ import absolute_import
 from builtins import str
 import mock
 import os.path
+import pwd
+import shutil
+import tempfile
 import unittest
 
 import pyfakefs.fake_filesystem_unittest
@@ -32,19 +35,22 @@ import rqd.compiled_proto.rqd_pb2
 import rqd.rqconstants
 import rqd.rqcore
 import rqd.rqexceptions
+import rqd.rqlaunch
 import rqd.rqnetwork
 import rqd.rqnimby
 
 
 class RqCoreTests(unittest.TestCase):
 
+    @mock.patch('rqd.rqscheduler.Scheduler', autospec=True)
     @mock.patch('rqd.rqnimby.Nimby', autospec=True)
     @mock.patch('rqd.rqnetwork.Network', autospec=True)
     @mock.patch('rqd.rqmachine.Machine', autospec=True)
-    def setUp(self, machineMock, networkMock, nimbyMock):
+    def setUp(self, machineMock, networkMock, nimbyMock, schedulerMock):
         self.machineMock = machineMock
         self.networkMock = networkMock
         self.nimbyMock = nimbyMock
+        self.schedulerMock = schedulerMock
         self.rqcore = rqd.rqcore.RqCore()
 
     @mock.patch.object(rqd.rqcore.RqCore, 'nimbyOn')
@@ -110,37 +116,34 @@ class RqCoreTests(unittest.TestCase):
         networkMock.return_value.start_grpc.assert_called()
         nimbyOnMock.assert_not_called()
 
-    @mock.patch('threading.Timer')
-    def test_grpcConnected(self, timerMock):
-        update_rss_thread = mock.MagicMock()
-        interval_thread = mock.MagicMock()
-        timerMock.side_effect = [update_rss_thread, interval_thread]
+    def test_grpcConnected(self):
+        self.schedulerMock.return_value.is_alive.return_value = False
 
         self.rqcore.grpcConnected()
 
         self.networkMock.return_value.reportRqdStartup.assert_called()
-        update_rss_thread.start.assert_called()
-        interval_thread.start.assert_called()
+        self.schedulerMock.return_value.start.assert_called()
+        self.schedulerMock.return_value.schedule.assert_has_calls([
+            mock.call(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.rqcore.updateRss, 'updateRss'),
+            mock.call(mock.ANY, self.rqcore.onInterval, 'onInterval')])
 
     @mock.patch.object(rqd.rqcore.RqCore, 'sendStatusReport', autospec=True)
-    @mock.patch('threading.Timer')
-    def test_onInterval(self, timerMock, sendStatusReportMock):
+    def test_onInterval(self, sendStatusReportMock):
         self.rqcore.onInterval()
 
-        timerMock.return_value.start.assert_called()
+        self.schedulerMock.return_value.schedule.assert_called_with(
+            mock.ANY, self.rqcore.onInterval, 'onInterval')
         sendStatusReportMock.assert_called_with(self.rqcore)
 
-    @mock.patch('threading.Timer', autospec=True)
-    def test_onIntervalWithSleepTime(self, timerMock):
+    def test_onIntervalWithSleepTime(self):
         sleep_time = 72
 
         self.rqcore.onInterval(sleepTime=sleep_time)
 
-        timerMock.assert_called_with(sleep_time, mock.ANY)
-        timerMock.return_value.start.assert_called()
+        self.schedulerMock.return_value.schedule.assert_called_with(
+            sleep_time, self.rqcore.onInterval, 'onInterval')
 
     @mock.patch.object(rqd.rqcore.RqCore, 'shutdownRqdNow')
-    @mock.patch('threading.Timer', new=mock.MagicMock())
     def test_onIntervalShutdown(self, shutdownRqdNowMock):
         self.rqcore.shutdownRqdIdle()
         self.machineMock.return_value.isUserLoggedIn.return_value = False
@@ -151,14 +154,21 @@ class RqCoreTests(unittest.TestCase):
 
         shutdownRqdNowMock.assert_called_with()
 
-    @mock.patch('threading.Timer')
-    def test_updateRss(self, timerMock):
+    def test_updateRss(self):
         self.rqcore.storeFrame('frame-id', mock.MagicMock(spec=rqd.rqnetwork.RunningFrame))
 
         self.rqcore.updateRss()
 
         self.machineMock.return_value.rssUpdate.assert_called()
-        timerMock.return_value.start.assert_called()
+        self.schedulerMock.return_value.schedule.assert_called_with(
+            rqd.rqconstants.RSS_UPDATE_INTERVAL, self.rqcore.updateRss, 'updateRss')
+
+    def test_updateRssNoFrames(self):
+        self.rqcore.updateRss()
+
+        self.machineMock.return_value.rssUpdate.assert_not_called()
+        self.schedulerMock.return_value.schedule.assert_called_with(
+            rqd.rqconstants.RSS_UPDATE_INTERVAL, self.rqcore.updateRss, 'updateRss')
 
     def test_getFrame(self):
         frame_id = 'arbitrary-frame-id'
@@ -258,14 +268,11 @@ class RqCoreTests(unittest.TestCase):
 
     @mock.patch.object(rqd.rqcore.RqCore, 'nimbyOff')
     def test_shutdown(self, nimbyOffMock):
-        self.rqcore.onIntervalThread = mock.MagicMock()
-        self.rqcore.updateRssThread = mock.MagicMock()
-
         self.rqcore.shutdown()
 
         nimbyOffMock.assert_called()
-        self.rqcore.onIntervalThread.cancel.assert_called()
-        self.rqcore.updateRssThread.cancel.assert_called()
+        self.schedulerMock.return_value.stop.assert_called()
+        self.networkMock.return_value.stopCompletionReporter.assert_called()
 
     @mock.patch('rqd.rqnetwork.Network', autospec=True)
     @mock.patch('sys.exit')
@@ -287,6 +294,52 @@ class RqCoreTests(unittest.TestCase):
 
         frameThreadMock.return_value.start.assert_called()
 
+    @mock.patch('rqd.rqcore.FrameAttendantThread')
+    def test_launchFrameWithGpus(self, frameThreadMock):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=100, idle_cores=20)
+        self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.UP
+        self.machineMock.return_value.reserveGpus.return_value = '0,1'
+        self.nimbyMock.return_value.locked = False
+        frame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            uid=22, num_cores=10, frame_id='frame1', environment={'CUE_GPUS': '2'})
+
+        self.rqcore.launchFrame(frame)
+
+        self.machineMock.return_value.reserveGpus.assert_called_with('frame1', 2)
+        self.assertEqual('0,1', frame.attributes['GPU_LIST'])
+
+    @mock.patch('rqd.rqcore.FrameAttendantThread')
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMBIND', True)
+    def test_launchThreadableFrameOnNumaNode(self, frameThreadMock):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=800, idle_cores=800)
+        self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.UP
+        self.machineMock.return_value.reserveHT.return_value = '4,12,5,13'
+        self.machineMock.return_value.getNumaNodes.return_value = '1'
+        self.nimbyMock.return_value.locked = False
+        frame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            uid=22, num_cores=200, environment={'CUE_THREADABLE': '1'})
+
+        self.rqcore.launchFrame(frame)
+
+        self.machineMock.return_value.reserveHT.assert_called_with(200)
+        self.assertEqual('4,12,5,13', frame.attributes['CPU_LIST'])
+        self.assertEqual('1', frame.attributes['NUMA_NODES'])
+
+    @mock.patch('rqd.rqcore.FrameAttendantThread')
+    @mock.patch.object(rqd.rqconstants, 'RQD_PIN_ALL_FRAMES', True)
+    def test_launchFrameUnpinnedWithoutFreeCores(self, frameThreadMock):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=800, idle_cores=800)
+        self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.UP
+        self.machineMock.return_value.reserveHT.side_effect = \
+            rqd.rqexceptions.CoreReservationFailureException()
+        self.nimbyMock.return_value.locked = False
+        frame = rqd.compiled_proto.rqd_pb2.RunFrame(uid=22, num_cores=200)
+
+        self.rqcore.launchFrame(frame)
+
+        self.assertNotIn('CPU_LIST', frame.attributes)
+        frameThreadMock.return_value.start.assert_called()
+
     def test_launchFrameOnDownHost(self):
         self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.DOWN
         frame = rqd.compiled_proto.rqd_pb2.RunFrame()
@@ -440,10 +493,25 @@ class RqCoreTests(unittest.TestCase):
     @mock.patch('platform.system', new=mock.MagicMock(return_value='Linux'))
     def test_nimbyOn(self):
         self.nimbyMock.return_value.active = False
+        self.nimbyMock.return_value.ident = None
+
+        self.rqcore.nimbyOn()
+
+        self.nimbyMock.return_value.start.assert_called_with()
+
+    @mock.patch('os.getuid', new=mock.MagicMock(return_value=0))
+    @mock.patch('platform.system', new=mock.MagicMock(return_value='Linux'))
+    @mock.patch('rqd.rqnimby.Nimby', autospec=True)
+    def test_nimbyOnAfterNimbyOff(self, newNimbyMock):
+        self.nimbyMock.return_value.active = False
+        self.nimbyMock.return_value.ident = 1234
 
         self.rqcore.nimbyOn()
 
-        self.nimbyMock.return_value.run.assert_called_with()
+        # A stopped nimby thread can't be restarted, a new one is created.
+        newNimbyMock.assert_called_with(self.rqcore)
+        newNimbyMock.return_value.start.assert_called_with()
+        self.nimbyMock.return_value.start.assert_not_called()
 
     def test_nimbyOff(self):
         self.nimbyMock.return_value.active = True
@@ -548,9 +616,16 @@ class RqCoreTests(unittest.TestCase):
 @mock.patch('time.time')
 @mock.patch('rqd.rqutil.permissionsUser', spec=True)
 class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
+    # time.time is mocked, every launch stage takes no time
+    launchAttributes = {
+        'launchMs': '0.0',
+        'launchStagesMs': 'logDir:0.0,rotateLog:0.0,openLog:0.0,environment:0.0,header:0.0,'
+                          'spawn:0.0'}
+
     def setUp(self):
         self.setUpPyfakefs()
         rqd.rqconstants.SU_ARGUEMENT = '-c'
+        rqd.rqlaunch.logDirCache.clear()
 
     @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
     @mock.patch('tempfile.gettempdir')
@@ -624,9 +699,65 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
-                    job_name=jobName, frame_id=frameId, frame_name=frameName),
+                    job_name=jobName, frame_id=frameId, frame_name=frameName,
+                    attributes=self.launchAttributes),
                 exit_status=returnCode))
 
+    @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
+    @mock.patch.object(rqd.rqconstants, 'RQD_DIRECT_SPAWN', True)
+    @mock.patch('rqd.rqlaunch.canSpawnDirect', new=mock.Mock(return_value=True))
+    @mock.patch('rqd.rqlaunch.wait')
+    @mock.patch('rqd.rqlaunch.spawn')
+    @mock.patch('tempfile.gettempdir')
+    def test_runLinuxDirectSpawn(self, getTempDirMock, spawnMock, waitMock, permsUser, timeMock,
+                                 popenMock):
+        # given
+        currentTime = 1568070634.3
+        jobTempPath = '/job/temp/path/'
+        tempDir = '/some/random/temp/dir'
+        frameId = 'arbitrary-frame-id'
+        frameUsername = 'my-random-user'
+        renderHost = rqd.compiled_proto.report_pb2.RenderHost(name='arbitrary-host-name')
+
+        self.fs.create_dir(tempDir)
+
+        timeMock.return_value = currentTime
+        getTempDirMock.return_value = tempDir
+        waitMock.return_value = (-9, mock.Mock(ru_utime=12.5, ru_stime=0.25))
+
+        rqCore = mock.MagicMock()
+        rqCore.machine.getTempPath.return_value = jobTempPath
+        rqCore.machine.isDesktop.return_value = False
+        rqCore.machine.getHostInfo.return_value = renderHost
+        rqCore.nimby.locked = False
+
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=frameId,
+            job_name='arbitrary-job-name',
+            frame_name='arbitrary-frame-name',
+            uid=928,
+            user_name=frameUsername,
+            log_dir='/path/to/log/dir/',
+            attributes={'CPU_LIST': '0,1'})
+        frameInfo = rqd.rqnetwork.RunningFrame(rqCore, runFrame)
+
+        # when
+        attendantThread = rqd.rqcore.FrameAttendantThread(rqCore, runFrame, frameInfo)
+        attendantThread.start()
+        attendantThread.join()
+
+        # then
+        popenMock.assert_not_called()
+        spawnMock.assert_called_with(
+            ['taskset', '-c', '0,1', '/bin/sh',
+             tempDir + '/rqd-cmd-' + frameId + '-' + str(currentTime)],
+            frameUsername, mock.ANY, jobTempPath, mock.ANY, preexec=mock.ANY)
+        waitMock.assert_called_with(spawnMock.return_value)
+        self.assertEqual(1, frameInfo.exitStatus)
+        self.assertEqual(9, frameInfo.exitSignal)
+        self.assertEqual('12.50', frameInfo.utime)
+        self.assertEqual('0.25', frameInfo.stime)
+
     # TODO(bcipriano) Re-enable this test once Windows is supported. The main sticking point here
     #   is that the log directory is always overridden on Windows which makes mocking difficult.
     @mock.patch('platform.system', new=mock.Mock(return_value='Windows'))
@@ -682,7 +813,8 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
-                    job_name=jobName, frame_id=frameId, frame_name=frameName),
+                    job_name=jobName, frame_id=frameId, frame_name=frameName,
+                    attributes=self.launchAttributes),
                 exit_status=returnCode))
 
     @mock.patch('platform.system', new=mock.Mock(return_value='Darwin'))
@@ -754,9 +886,53 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
-                    job_name=jobName, frame_id=frameId, frame_name=frameName),
+                    job_name=jobName, frame_id=frameId, frame_name=frameName,
+                    attributes=self.launchAttributes),
                 exit_status=returnCode))
 
 
+
+@unittest.skipUnless(rqd.rqlaunch.canSpawnDirect(), 'Direct spawn requires Linux')
+@mock.patch('rqd.rqutil.checkAndCreateUser', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsUser', new=mock.MagicMock())
+@mock.patch.object(rqd.rqconstants, 'RQD_DIRECT_SPAWN', True)
+class FrameAttendantDirectSpawnTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempDir)
+        rqd.rqlaunch.logDirCache.clear()
+
+    def test_runLinuxCommandFile(self):
+        logDir = os.path.join(self.tempDir, 'logs')
+        rqCore = mock.MagicMock()
+        rqCore.machine.getTempPath.return_value = self.tempDir
+        rqCore.machine.isDesktop.return_value = False
+        rqCore.machine.getHostInfo.return_value = rqd.compiled_proto.report_pb2.RenderHost(
+            name='arbitrary-host-name')
+        rqCore.nimby.locked = False
+
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id='arbitrary-frame-id',
+            job_name='arbitrary-job-name',
+            frame_name='arbitrary-frame-name',
+            uid=os.getuid(),
+            user_name=pwd.getpwuid(os.getuid()).pw_name,
+            log_dir=logDir,
+            command='echo "frame output"; exit 3')
+        frameInfo = rqd.rqnetwork.RunningFrame(rqCore, runFrame)
+
+        attendantThread = rqd.rqcore.FrameAttendantThread(rqCore, runFrame, frameInfo)
+        attendantThread.start()
+        attendantThread.join()
+
+        self.assertEqual(3, frameInfo.exitStatus)
+        self.assertEqual(0, frameInfo.exitSignal)
+        with open(os.path.join(logDir, 'arbitrary-job-name.arbitrary-frame-name.rqlog')) as log:
+            self.assertIn('frame output', log.read())
+
+
 if __name__ == '__main__':
     unittest.main()
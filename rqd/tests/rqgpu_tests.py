@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+import mock
+
+import rqd.rqconstants
+import rqd.rqgpu
+
+
+NVIDIA_SMI_OUTPUT = '''0, Quadro RTX 6000, 24220, 23000, 5
+1, Quadro RTX 6000, 24220, 1024, [N/A]
+'''
+
+CUDAINFO = ' TotalMem 1023 Mb  FreeMem 968 Mb'
+
+
+class HangingProvider(rqd.rqgpu.GpuProvider):
+    """A probe stuck in the driver"""
+
+    name = 'hanging'
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def isAvailable(self):
+        return True
+
+    def probe(self, timeout):
+        self.release.wait(5)
+        return [rqd.rqgpu.GpuDevice(0, 'gpu0', 1024, 512, 0)]
+
+
+class ProviderTests(unittest.TestCase):
+
+    @mock.patch('rqd.rqgpu.runCommand', return_value=NVIDIA_SMI_OUTPUT)
+    def test_nvidiaSmi(self, runCommandMock):
+        devices = rqd.rqgpu.NvidiaSmiProvider().probe(10)
+
+        self.assertEqual([
+            rqd.rqgpu.GpuDevice(0, 'Quadro RTX 6000', 24801280, 23552000, 5),
+            rqd.rqgpu.GpuDevice(1, 'Quadro RTX 6000', 24801280, 1048576, 0)], devices)
+        self.assertEqual(10, runCommandMock.call_args[0][1])
+
+    @mock.patch('rqd.rqgpu.runCommand', return_value=CUDAINFO)
+    def test_cudaInfo(self, runCommandMock):
+        devices = rqd.rqgpu.CudaInfoProvider().probe(10)
+
+        self.assertEqual([rqd.rqgpu.GpuDevice(0, 'cuda', 1048576, 991232, 0)], devices)
+
+    @mock.patch('rqd.rqgpu.runCommand',
+                return_value='There is no device supporting CUDA\n')
+    def test_cudaInfoNoDevice(self, runCommandMock):
+        self.assertEqual([], rqd.rqgpu.CudaInfoProvider().probe(10))
+
+    def test_runCommandTimeout(self):
+        start = time.time()
+
+        self.assertRaises(rqd.rqgpu.GpuProbeException,
+                          rqd.rqgpu.runCommand, ['sleep', '10'], 0.1)
+        self.assertLess(time.time() - start, 5)
+
+    def test_getProvider(self):
+        self.assertIsInstance(rqd.rqgpu.getProvider('fake'), rqd.rqgpu.FakeProvider)
+
+    @mock.patch.object(rqd.rqgpu.NvmlProvider, 'isAvailable', return_value=False)
+    @mock.patch.object(rqd.rqgpu.NvidiaSmiProvider, 'isAvailable', return_value=False)
+    @mock.patch.object(rqd.rqgpu.CudaInfoProvider, 'isAvailable', return_value=True)
+    def test_getProviderAuto(self, *_):
+        self.assertIsInstance(rqd.rqgpu.getProvider('auto'), rqd.rqgpu.CudaInfoProvider)
+
+
+class GpuMonitorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = rqd.rqgpu.FakeProvider([
+            rqd.rqgpu.GpuDevice(1, 'gpu1', 2048, 1024, 50),
+            rqd.rqgpu.GpuDevice(0, 'gpu0', 2048, 2000, 0)])
+        self.monitor = rqd.rqgpu.GpuMonitor(self.provider, interval=60, timeout=1)
+
+    def test_probe(self):
+        self.assertTrue(self.monitor.probe())
+
+        self.assertEqual([0, 1], [device.index for device in self.monitor.devices])
+        self.assertEqual(4096, self.monitor.getTotalMemory())
+        self.assertEqual(3024, self.monitor.getFreeMemory())
+        self.assertEqual('0:2000/2048:0,1:1024/2048:50', self.monitor.attributes()['gpus'])
+
+    def test_probeFailureKeepsCache(self):
+        self.monitor.probe()
+        self.provider.probe = mock.MagicMock(side_effect=rqd.rqgpu.GpuProbeException())
+
+        self.assertFalse(self.monitor.probe())
+
+        self.assertEqual(2, len(self.monitor.devices))
+        self.assertEqual(1, self.monitor.failures)
+
+    def test_hungProbeDoesNotBlockReaders(self):
+        provider = HangingProvider()
+        monitor = rqd.rqgpu.GpuMonitor(provider, interval=60, timeout=1)
+        monitor.start()
+        self.addCleanup(provider.release.set)
+        self.addCleanup(monitor.stop)
+
+        start = time.time()
+        self.assertEqual(0, monitor.getFreeMemory())
+        self.assertEqual('', monitor.attributes()['gpus'])
+        self.assertLess(time.time() - start, 1)
+
+        provider.release.set()
+        monitor.join(0)
+        end = time.time() + 5
+        while monitor.updated is None and time.time() < end:
+            time.sleep(0.01)
+        self.assertEqual(512, monitor.getFreeMemory())
+
+    def test_runProbesUntilStopped(self):
+        self.monitor.interval = 0.01
+        self.monitor.start()
+        end = time.time() + 5
+        while self.provider.probes < 2 and time.time() < end:
+            time.sleep(0.01)
+
+        self.monitor.stop()
+        self.monitor.join(5)
+
+        self.assertFalse(self.monitor.is_alive())
+        self.assertGreaterEqual(self.provider.probes, 2)
+
+    def test_reserve(self):
+        self.monitor.probe()
+
+        # The device with the most free memory first
+        self.assertEqual([0], self.monitor.reserve('frame1', 1))
+        self.assertEqual([1], self.monitor.reserve('frame2', 1))
+        self.assertEqual([0, 1], self.monitor.reserve('frame3', 2))
+        self.assertEqual([], self.monitor.reserve('frame4', 3))
+        self.assertEqual([1], self.monitor.getAssignment('frame2'))
+
+        self.monitor.release('frame2')
+
+        self.assertEqual([], self.monitor.getAssignment('frame2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import pwd
+import subprocess
+import unittest
+
+import mock
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqlaunch
+
+
+@mock.patch('time.time')
+class LaunchTimerTests(unittest.TestCase):
+
+    def test_stages(self, timeMock):
+        timeMock.return_value = 100.0
+        timer = rqd.rqlaunch.LaunchTimer()
+        timeMock.return_value = 100.25
+        timer.mark('logDir')
+        timeMock.return_value = 100.5
+        timer.mark('spawn')
+
+        self.assertEqual([('logDir', 250.0), ('spawn', 250.0)], timer.stages)
+        self.assertEqual(500.0, timer.total())
+        self.assertEqual('logDir:250.0,spawn:250.0', timer.format())
+
+
+class DirectoryCacheTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.cache = rqd.rqlaunch.DirectoryCache(ttl=60)
+
+    def test_ensureCreatesDirectory(self):
+        self.cache.ensure('/shots/log/dir')
+
+        self.assertTrue(os.path.isdir('/shots/log/dir'))
+
+    @mock.patch('os.access')
+    def test_ensureIsCached(self, accessMock):
+        accessMock.return_value = True
+
+        self.cache.ensure('/shots/log/dir')
+        self.cache.ensure('/shots/log/dir')
+
+        self.assertEqual(2, accessMock.call_count)
+
+    def test_ensureChecksAgainAfterTtl(self):
+        self.fs.create_dir('/shots/log/dir')
+        with mock.patch('time.time', return_value=1000):
+            self.cache.ensure('/shots/log/dir')
+        with mock.patch('os.access', return_value=True) as accessMock:
+            with mock.patch('time.time', return_value=1030):
+                self.cache.ensure('/shots/log/dir')
+            accessMock.assert_not_called()
+            with mock.patch('time.time', return_value=1061):
+                self.cache.ensure('/shots/log/dir')
+            self.assertEqual(2, accessMock.call_count)
+
+    def test_invalidate(self):
+        self.cache.ensure('/shots/log/dir')
+        self.cache.invalidate('/shots/log/dir')
+
+        with mock.patch('os.access', return_value=True) as accessMock:
+            self.cache.ensure('/shots/log/dir')
+            self.assertEqual(2, accessMock.call_count)
+
+    @mock.patch('os.makedirs', new=mock.Mock(side_effect=OSError('read-only')))
+    def test_ensureFailsIfDirectoryIsMissing(self):
+        self.assertRaises(RuntimeError, self.cache.ensure, '/shots/log/dir')
+
+        # Failures aren't cached
+        self.assertRaises(RuntimeError, self.cache.ensure, '/shots/log/dir')
+
+
+class RotateLogTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir('/logs')
+        self.logFile = '/logs/job.frame.rqlog'
+
+    def test_noLog(self):
+        self.assertIsNone(rqd.rqlaunch.rotateLog(self.logFile))
+
+    def test_firstFreeIndex(self):
+        for name in ('job.frame.rqlog', 'job.frame.rqlog.1', 'job.frame.rqlog.2',
+                     'job.frame.rqlog.4', 'job.frame.rqlog.bak', 'other.rqlog.3'):
+            self.fs.create_file(os.path.join('/logs', name))
+
+        self.assertEqual(self.logFile + '.3', rqd.rqlaunch.rotateLog(self.logFile))
+        self.assertFalse(os.path.exists(self.logFile))
+        self.assertTrue(os.path.exists(self.logFile + '.3'))
+
+    def test_overwritesLastLog(self):
+        self.fs.create_file(self.logFile, contents='new')
+        for index in range(1, 4):
+            self.fs.create_file('%s.%d' % (self.logFile, index), contents='old')
+
+        self.assertEqual(self.logFile + '.3', rqd.rqlaunch.rotateLog(self.logFile, 3))
+        with open(self.logFile + '.3') as rotated:
+            self.assertEqual('new', rotated.read())
+
+
+@unittest.skipUnless(rqd.rqlaunch.canSpawnDirect(), 'Direct spawn requires Linux')
+class SpawnTests(unittest.TestCase):
+
+    def test_spawnAsCurrentUser(self):
+        userName = pwd.getpwuid(os.getuid()).pw_name
+        with open(os.devnull, 'w') as devnull:
+            proc = rqd.rqlaunch.spawn(['/bin/sh', '-c', 'exit 3'], userName, {}, '/', devnull)
+            returncode, rusage = rqd.rqlaunch.wait(proc)
+
+        self.assertEqual(3, returncode)
+        self.assertEqual(3, proc.returncode)
+        self.assertGreaterEqual(rusage.ru_utime, 0)
+
+    def test_waitSignaled(self):
+        proc = subprocess.Popen(['/bin/sh', '-c', 'kill -9 $$'])
+
+        returncode, _ = rqd.rqlaunch.wait(proc)
+
+        self.assertEqual(-9, returncode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+import mock
+
+import rqd.compiled_proto.rqd_pb2
+import rqd.rqlogspool
+import rqd.rqnetwork
+
+
+class FrameLogPipeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.logFile = os.path.join(self.tempDir, 'job.frame.rqlog')
+        self.pipe = None
+
+    def tearDown(self):
+        if self.pipe is not None:
+            self.pipe.close()
+        shutil.rmtree(self.tempDir)
+
+    def __createPipe(self, **kwargs):
+        self.pipe = rqd.rqlogspool.FrameLogPipe(self.logFile, spoolDir=self.tempDir, **kwargs)
+        return self.pipe
+
+    def __readLog(self):
+        with open(self.logFile) as logFile:
+            return logFile.read()
+
+    def __run(self, pipe, script):
+        proc = subprocess.Popen(['/bin/sh', '-c', script], stdout=pipe, stderr=pipe,
+                                close_fds=True)
+        pipe.closeWriter()
+        proc.wait()
+
+    def test_frameOutput(self):
+        pipe = self.__createPipe()
+
+        print('header', file=pipe)
+        self.__run(pipe, 'echo out; echo err >&2')
+        print('footer', file=pipe)
+        pipe.close()
+
+        self.assertEqual('header\nout\nerr\nfooter\n', self.__readLog())
+
+    def test_spoolIsUnlinked(self):
+        self.__createPipe()
+
+        self.assertEqual([], [name for name in os.listdir(self.tempDir)
+                              if name != 'job.frame.rqlog'])
+
+    def test_tail(self):
+        pipe = self.__createPipe(tailLines=3)
+
+        self.__run(pipe, 'for i in 1 2 3 4 5; do echo line$i; done; printf progress')
+        pipe.write('')
+
+        self.assertEqual('line4\nline5\nprogress', pipe.tail())
+
+    def test_flushBytes(self):
+        pipe = self.__createPipe(flushInterval=60, flushBytes=10)
+
+        pipe.write('0123456789\n')
+
+        deadline = time.time() + 5
+        while self.__readLog() != '0123456789\n' and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('0123456789\n', self.__readLog())
+
+    def test_flushInterval(self):
+        pipe = self.__createPipe(flushInterval=0.05)
+
+        pipe.write('small\n')
+
+        deadline = time.time() + 5
+        while self.__readLog() != 'small\n' and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('small\n', self.__readLog())
+
+    def test_closeWithoutFrame(self):
+        pipe = self.__createPipe()
+
+        pipe.write('launch failed\n')
+        pipe.close()
+        pipe.close()
+
+        self.assertEqual('launch failed\n', self.__readLog())
+        self.assertRaises(ValueError, pipe.fileno)
+
+    def test_statusIncludesTail(self):
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(frame_id='frame')
+        runningFrame = rqd.rqnetwork.RunningFrame(mock.MagicMock(), runFrame)
+
+        self.assertNotIn('logTail', runningFrame.status().attributes)
+
+        runningFrame.logPipe = self.__createPipe()
+        runningFrame.logPipe.write('rendering\n')
+        self.assertEqual('rendering', runningFrame.status().attributes['logTail'])
+        self.assertNotIn('logTail', runningFrame.runningFrameInfo().attributes)
+
+
+if __name__ == '__main__':
+    unittest.main()
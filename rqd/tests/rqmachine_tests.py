@@ -25,8 +25,10 @@ import unittest
 
 import pyfakefs.fake_filesystem_unittest
 
+import rqd.rqcgroup
 import rqd.rqconstants
 import rqd.rqcore
+import rqd.rqgpu
 import rqd.rqmachine
 import rqd.rqnetwork
 import rqd.rqnimby
@@ -152,6 +154,39 @@ PROC_PID_STAT = ('105 (time) S 7 105 105 0 -1 4210688 317 0 1 0 31 13 0 0 20 0 1
 
 CUDAINFO = ' TotalMem 1023 Mb  FreeMem 968 Mb'
 
+FAKE_GPUS = rqd.rqgpu.FakeProvider([
+    rqd.rqgpu.GpuDevice(0, 'gpu0', 1048576, 991232, 10),
+    rqd.rqgpu.GpuDevice(1, 'gpu1', 2097152, 991232, 0)])
+
+
+class CachedStatTests(unittest.TestCase):
+
+    def test_refresh(self):
+        update = mock.MagicMock()
+        stat = rqd.rqmachine.CachedStat(update, 60)
+
+        self.assertTrue(stat.refresh())
+        self.assertFalse(stat.refresh())
+        self.assertTrue(stat.refresh(force=True))
+        stat.invalidate()
+        self.assertTrue(stat.refresh())
+
+        self.assertEqual(3, update.call_count)
+
+    @mock.patch('time.time')
+    def test_refreshAfterInterval(self, timeMock):
+        update = mock.MagicMock()
+        stat = rqd.rqmachine.CachedStat(update, 5)
+
+        timeMock.return_value = 100
+        stat.refresh()
+        timeMock.return_value = 104
+        stat.refresh()
+        timeMock.return_value = 105
+        stat.refresh()
+
+        self.assertEqual(2, update.call_count)
+
 
 @mock.patch('subprocess.getoutput', new=mock.MagicMock(return_value=CUDAINFO))
 @mock.patch.object(rqd.rqutil.Memoize, 'isCached', new=mock.MagicMock(return_value=False))
@@ -176,6 +211,7 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.nimby.active = False
         self.nimby.locked = False
         self.coreDetail = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=2)
+        self.rqCore.getCoreInfo.return_value = self.coreDetail
 
         self.machine = rqd.rqmachine.Machine(self.rqCore, self.coreDetail)
 
@@ -299,6 +335,42 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
             {'list': [{'seconds': 1277.4100000000035, 'total_time': 44, 'pid': '105'}]},
             eval(updatedFrameInfo.attributes['ptree']))
 
+    def test_rssUpdateCgroup(self):
+        frameId = 'unused-frame-id'
+        runningFrame = rqd.rqnetwork.RunningFrame(self.rqCore,
+                                                  rqd.compiled_proto.rqd_pb2.RunFrame())
+        runningFrame.pid = 105
+        runningFrame.maxRss = 1000
+        runningFrame.cgroup = mock.MagicMock()
+        runningFrame.cgroup.usage.return_value = rqd.rqcgroup.CgroupUsage(
+            rss=500, maxRss=800, pcpu=12.5, utime=1.0, stime=0.5, readBytes=10, writeBytes=20)
+
+        self.machine.rssUpdate({frameId: runningFrame})
+
+        updatedFrameInfo = runningFrame.runningFrameInfo()
+        self.assertEqual(500, updatedFrameInfo.rss)
+        self.assertEqual(1000, updatedFrameInfo.max_rss)
+        self.assertEqual('12.5', updatedFrameInfo.attributes['pcpu'])
+        self.assertEqual('20', updatedFrameInfo.attributes['wbytes'])
+
+    @mock.patch('time.time', new=mock.MagicMock(return_value=1570057887.61))
+    def test_rssUpdateMarksFramesDirty(self):
+        rqd.rqconstants.SYS_HERTZ = 100
+        self.fs.create_file('/proc/105/stat', contents=PROC_PID_STAT)
+        procFrame = rqd.rqnetwork.RunningFrame(
+            self.rqCore, rqd.compiled_proto.rqd_pb2.RunFrame(frame_id='procFrame'))
+        procFrame.pid = 105
+        cgroupFrame = rqd.rqnetwork.RunningFrame(
+            self.rqCore, rqd.compiled_proto.rqd_pb2.RunFrame(frame_id='cgroupFrame'))
+        cgroupFrame.pid = 106
+        cgroupFrame.cgroup = mock.MagicMock()
+        cgroupFrame.cgroup.usage.return_value = rqd.rqcgroup.CgroupUsage(
+            rss=500, maxRss=800, pcpu=12.5, utime=1.0, stime=0.5, readBytes=10, writeBytes=20)
+
+        self.machine.rssUpdate({'procFrame': procFrame, 'cgroupFrame': cgroupFrame})
+
+        self.assertEqual({'procFrame', 'cgroupFrame'}, self.machine._Machine__dirtyFrames)
+
     @mock.patch.object(
         rqd.rqmachine.Machine, '_Machine__enabledHT', new=mock.MagicMock(return_value=False))
     def test_getLoadAvg(self):
@@ -321,26 +393,36 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
     @mock.patch(
         'subprocess.getoutput',
         new=mock.MagicMock(return_value=' TotalMem 1023 Mb  FreeMem 968 Mb'))
+    @mock.patch.object(rqd.rqconstants, 'ALLOW_GPU', True)
+    @mock.patch('rqd.rqgpu.getProvider', new=mock.MagicMock(return_value=FAKE_GPUS))
     def test_getGpuMemoryTotal(self):
-        if hasattr(self.machine, 'gpuNotSupported'):
-            delattr(self.machine, 'gpuNotSupported')
-        if hasattr(self.machine, 'gpuResults'):
-            delattr(self.machine, 'gpuResults')
-        rqd.rqconstants.ALLOW_GPU = True
+        self.machine.getGpuMonitor().probe()
 
-        self.assertEqual(1048576, self.machine.getGpuMemoryTotal())
+        self.assertEqual(3145728, self.machine.getGpuMemoryTotal())
 
-    @mock.patch(
-        'subprocess.getoutput',
-        new=mock.MagicMock(return_value=' TotalMem 1023 Mb  FreeMem 968 Mb'))
+    @mock.patch.object(rqd.rqconstants, 'ALLOW_GPU', True)
+    @mock.patch('rqd.rqgpu.getProvider', new=mock.MagicMock(return_value=FAKE_GPUS))
     def test_getGpuMemory(self):
-        if hasattr(self.machine, 'gpuNotSupported'):
-            delattr(self.machine, 'gpuNotSupported')
-        if hasattr(self.machine, 'gpuResults'):
-            delattr(self.machine, 'gpuResults')
-        rqd.rqconstants.ALLOW_GPU = True
+        self.machine.getGpuMonitor().probe()
+
+        self.assertEqual(1982464, self.machine.getGpuMemory())
+
+    @mock.patch.object(rqd.rqconstants, 'ALLOW_GPU', True)
+    @mock.patch('rqd.rqgpu.getProvider', new=mock.MagicMock(return_value=None))
+    def test_getGpuMemoryNoProbe(self):
+        self.assertIsNone(self.machine.getGpuMonitor())
+        self.assertEqual(0, self.machine.getGpuMemory())
 
-        self.assertEqual(991232, self.machine.getGpuMemory())
+    @mock.patch.object(rqd.rqconstants, 'ALLOW_GPU', True)
+    @mock.patch('rqd.rqgpu.getProvider', new=mock.MagicMock(return_value=FAKE_GPUS))
+    def test_reserveGpus(self):
+        self.machine.getGpuMonitor().probe()
+
+        self.assertEqual('0', self.machine.reserveGpus('frame1', 1))
+        self.assertEqual('1', self.machine.reserveGpus('frame2', 1))
+        self.assertIsNone(self.machine.reserveGpus('frame3', 3))
+        self.machine.releaseGpus('frame1')
+        self.assertEqual('0', self.machine.reserveGpus('frame4', 1))
 
     def test_getPathEnv(self):
         self.assertEqual(
@@ -365,15 +447,18 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
 
         popenMock.assert_called_with(['/usr/bin/sudo', '/sbin/reboot', '-f'])
 
-    @mock.patch(
-        'subprocess.getoutput',
-        new=mock.MagicMock(return_value=' TotalMem 1023 Mb  FreeMem 968 Mb'))
+    @mock.patch.object(rqd.rqconstants, 'ALLOW_GPU', True)
+    @mock.patch('rqd.rqgpu.getProvider', new=mock.MagicMock(return_value=FAKE_GPUS))
     def test_getHostInfo(self):
+        self.machine.getGpuMonitor().probe()
+
         hostInfo = self.machine.getHostInfo()
 
         self.assertEqual(4105212, hostInfo.free_swap)
         self.assertEqual(25699176, hostInfo.free_mem)
-        self.assertEqual('991232', hostInfo.attributes['freeGpu'])
+        self.assertEqual('1982464', hostInfo.attributes['freeGpu'])
+        self.assertEqual('3145728', hostInfo.attributes['totalGpu'])
+        self.assertEqual('0:991232/1048576:10,1:991232/2097152:0', hostInfo.attributes['gpus'])
         self.assertEqual('0', hostInfo.attributes['swapout'])
         self.assertEqual(25, hostInfo.load)
         self.assertEqual(False, hostInfo.nimby_enabled)
@@ -409,6 +494,48 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         # Verify core info was copied into the report.
         self.assertEqual(coreDetail, hostReport.core_info)
 
+    def test_getHostReportReusesStats(self):
+        self.machine.getHostReport()
+        self.meminfo.set_contents(MEMINFO_NONE_FREE)
+
+        # Memory is read at most every RQD_MEMINFO_INTERVAL_SEC.
+        self.assertEqual(25699176, self.machine.getHostReport().host.free_mem)
+
+        self.machine.invalidateStats()
+
+        self.assertNotEqual(25699176, self.machine.getHostReport().host.free_mem)
+
+    def test_getHostReportReusesFrameInfo(self):
+        frame = mock.MagicMock(spec=rqd.rqnetwork.RunningFrame)
+        frame.runningFrameInfo.return_value = rqd.compiled_proto.report_pb2.RunningFrameInfo(
+            frame_id='frame1')
+        self.rqCore.getFrameKeys.return_value = ['frame1']
+        self.rqCore.getFrame.return_value = frame
+
+        self.machine.getHostReport()
+        hostReport = self.machine.getHostReport()
+
+        frame.runningFrameInfo.assert_called_once_with()
+        self.assertEqual('frame1', hostReport.frames[0].frame_id)
+
+    def test_getHostReportKeepsUnchangedFrames(self):
+        frames = {}
+        for frameId in ('frame1', 'frame2'):
+            frames[frameId] = mock.MagicMock(spec=rqd.rqnetwork.RunningFrame)
+            frames[frameId].runningFrameInfo.return_value = \
+                rqd.compiled_proto.report_pb2.RunningFrameInfo(frame_id=frameId)
+        self.rqCore.getFrame.side_effect = lambda frameId: frames[frameId]
+        self.rqCore.getFrameKeys.return_value = ['frame1', 'frame2']
+
+        self.machine.getHostReport()
+        self.machine._Machine__dirtyFrames.add('frame2')
+        hostReport = self.machine.getHostReport()
+
+        # Frames whose usage didn't change are still reported.
+        self.assertEqual(['frame1', 'frame2'], [info.frame_id for info in hostReport.frames])
+        frames['frame1'].runningFrameInfo.assert_called_once_with()
+        self.assertEqual(2, frames['frame2'].runningFrameInfo.call_count)
+
     def test_getBootReport(self):
         bootReport = self.machine.getBootReport()
 
@@ -428,7 +555,30 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
 
         self.machine.releaseHT(tasksets)
 
-        self.assertEqual({0, 1, 2, 3, 4, 5, 6, 7}, self.machine._Machine__tasksets)
+        self.assertEqual(8, self.machine._Machine__coreAllocator.freeCores())
+
+    def test_reserveHTNuma(self):
+        cpuInfo = os.path.join(os.path.dirname(__file__), 'cpuinfo', '_cpuinfo_shark_ht_8-4-2-2')
+        self.fs.add_real_file(cpuInfo)
+        self.machine.testInitMachineStats(cpuInfo)
+        # Two nodes of 4 cores, the siblings of cpu N are N + 8
+        for cpu in range(16):
+            topology = '/sys/devices/system/cpu/cpu%d/topology' % cpu
+            self.fs.create_file(topology + '/physical_package_id', contents=str(cpu % 8 // 4))
+            self.fs.create_file(topology + '/core_id', contents=str(cpu % 4))
+        self.fs.create_file('/sys/devices/system/cpu/online', contents='0-15')
+        self.fs.create_file('/sys/devices/system/node/node0/cpulist', contents='0-3,8-11')
+        self.fs.create_file('/sys/devices/system/node/node1/cpulist', contents='4-7,12-15')
+
+        self.machine.setupHT()
+        first = self.machine.reserveHT(100)
+        second = self.machine.reserveHT(300)
+
+        self.assertEqual('0,8', first)
+        # The frame fits in the remaining cores of node 0
+        self.assertEqual('1,9,2,10,3,11', second)
+        self.assertEqual('0', self.machine.getNumaNodes(second))
+        self.assertEqual('1', self.machine.getNumaNodes(self.machine.reserveHT(200)))
 
 
 class CpuinfoTests(unittest.TestCase):
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+import grpc
+import mock
+
+import rqd.compiled_proto.report_pb2
+import rqd.rqconstants
+import rqd.rqnetwork
+
+
+class UnavailableError(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+
+def frameCompleteReport(frameId):
+    report = rqd.compiled_proto.report_pb2.FrameCompleteReport()
+    report.frame.frame_id = frameId
+    return report
+
+
+class CompletionReporterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.network = mock.MagicMock(spec=rqd.rqnetwork.Network)
+        self.network.sendFrameCompletions.return_value = set()
+        self.onBatchSent = mock.MagicMock()
+        self.reporter = rqd.rqnetwork.CompletionReporter(self.network, self.onBatchSent)
+
+        for name, value in (('RQD_STATUS_COALESCE_SEC', 0.05),
+                            ('RQD_COMPLETION_RETRY_SEC', 0.01),
+                            ('RQD_COMPLETION_MAX_RETRIES', 10),
+                            ('RQD_COMPLETION_QUEUE_SIZE', 256)):
+            patcher = mock.patch.object(rqd.rqconstants, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.reporter.stop()
+        self.reporter.join(5)
+
+    def test_batch(self):
+        reports = [frameCompleteReport('frame%d' % i) for i in range(10)]
+        for report in reports:
+            self.reporter.queue(report)
+
+        self.reporter.start()
+
+        self.assertTrue(self.reporter.flush(5))
+        self.network.sendFrameCompletions.assert_called_once_with(reports)
+        self.onBatchSent.assert_called_once_with()
+        self.assertEqual(10, self.reporter.reportsSent)
+        self.assertEqual(1, self.reporter.batchesSent)
+
+    def test_retry(self):
+        reports = [frameCompleteReport('frame1'), frameCompleteReport('frame2')]
+        self.network.sendFrameCompletions.side_effect = [{1}, set()]
+        for report in reports:
+            self.reporter.queue(report)
+
+        self.reporter.start()
+
+        self.assertTrue(self.reporter.flush(5))
+        self.network.sendFrameCompletions.assert_has_calls([
+            mock.call(reports), mock.call([reports[1]])])
+        self.assertEqual(2, self.reporter.reportsSent)
+        self.assertEqual(2, self.onBatchSent.call_count)
+
+    def test_dropAfterMaxRetries(self):
+        rqd.rqconstants.RQD_COMPLETION_MAX_RETRIES = 2
+        self.network.sendFrameCompletions.side_effect = grpc.RpcError()
+        self.reporter.queue(frameCompleteReport('frame1'))
+
+        self.reporter.start()
+
+        self.assertTrue(self.reporter.flush(5))
+        self.assertEqual(2, self.network.sendFrameCompletions.call_count)
+        self.assertEqual(1, self.reporter.reportsDropped)
+        self.onBatchSent.assert_not_called()
+
+    def test_queueBlocksWhenFull(self):
+        rqd.rqconstants.RQD_COMPLETION_QUEUE_SIZE = 1
+        self.reporter.queue(frameCompleteReport('frame1'))
+        queued = threading.Event()
+        producer = threading.Thread(
+            target=lambda: (self.reporter.queue(frameCompleteReport('frame2')), queued.set()))
+        producer.start()
+
+        self.assertFalse(queued.wait(0.1))
+        self.reporter.start()
+
+        self.assertTrue(queued.wait(5))
+        self.assertTrue(self.reporter.flush(5))
+
+    def test_stopSendsQueuedReports(self):
+        rqd.rqconstants.RQD_STATUS_COALESCE_SEC = 60
+        self.reporter.queue(frameCompleteReport('frame1'))
+        self.reporter.start()
+
+        self.reporter.stop()
+        self.reporter.join(5)
+
+        self.assertFalse(self.reporter.is_alive())
+        self.network.sendFrameCompletions.assert_called_once()
+
+
+class RpcStatsTests(unittest.TestCase):
+
+    def test_attributes(self):
+        stats = rqd.rqnetwork.RpcStats()
+        for seconds in (0.001, 0.002, 0.02, 0.3, 20):
+            stats.record(seconds)
+        stats.record(0.004, failed=True)
+
+        attributes = stats.attributes()
+
+        self.assertEqual('6', attributes['cuebotRpcs'])
+        self.assertEqual('1', attributes['cuebotRpcErrors'])
+        self.assertEqual('5:3,25:1,500:1,inf:1', attributes['cuebotRpcLatencyMs'])
+        self.assertEqual('5', attributes['cuebotRpcP50Ms'])
+        self.assertEqual('inf', attributes['cuebotRpcP99Ms'])
+
+
+@mock.patch('grpc.insecure_channel')
+class CuebotConnectionTests(unittest.TestCase):
+
+    def test_channelAndStubReused(self, channelMock):
+        stubClass = mock.MagicMock()
+        connection = rqd.rqnetwork.CuebotConnection(['cuebot1'], 8443)
+
+        for _ in range(3):
+            connection.call(stubClass, 'ReportStatus', 'request')
+
+        channelMock.assert_called_once_with('cuebot1:8443', options=mock.ANY)
+        stubClass.assert_called_once_with(channelMock.return_value)
+        self.assertEqual(3, stubClass.return_value.ReportStatus.call_count)
+        self.assertEqual(3, connection.stats.calls)
+
+    def test_keepaliveOptions(self, channelMock):
+        connection = rqd.rqnetwork.CuebotConnection(['cuebot1'], 8443)
+
+        connection.stub(mock.MagicMock())
+
+        options = dict(channelMock.call_args[1]['options'])
+        self.assertEqual(rqd.rqconstants.RQD_GRPC_KEEPALIVE_SEC * 1000,
+                         options['grpc.keepalive_time_ms'])
+        self.assertEqual(rqd.rqconstants.RQD_GRPC_RECONNECT_MAX_SEC * 1000,
+                         options['grpc.max_reconnect_backoff_ms'])
+
+    def test_reconnectCounted(self, channelMock):
+        connection = rqd.rqnetwork.CuebotConnection(['cuebot1'], 8443)
+        connection.stub(mock.MagicMock())
+        onStateChange = channelMock.return_value.subscribe.call_args[0][0]
+
+        for state in (grpc.ChannelConnectivity.READY,
+                      grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+                      grpc.ChannelConnectivity.READY):
+            onStateChange(state)
+
+        self.assertEqual(1, connection.stats.reconnects)
+        self.assertTrue(connection.isHealthy())
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_GRPC_FAILOVER_ERRORS', 2)
+    def test_failover(self, channelMock):
+        stubClass = mock.MagicMock()
+        stubClass.return_value.ReportStatus.side_effect = UnavailableError()
+        connection = rqd.rqnetwork.CuebotConnection(['cuebot1', 'cuebot2'], 8443)
+        first = connection.cuebot
+
+        for _ in range(2):
+            self.assertRaises(grpc.RpcError, connection.call, stubClass, 'ReportStatus', 'request')
+
+        self.assertNotEqual(first, connection.cuebot)
+        self.assertEqual(1, connection.stats.failovers)
+        self.assertEqual(2, connection.stats.errors)
+        channelMock.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_GRPC_FAILOVER_ERRORS', 1)
+    def test_noFailoverWithSingleCuebot(self, channelMock):
+        stubClass = mock.MagicMock()
+        stubClass.return_value.ReportStatus.side_effect = UnavailableError()
+        connection = rqd.rqnetwork.CuebotConnection(['cuebot1'], 8443)
+
+        for _ in range(3):
+            self.assertRaises(grpc.RpcError, connection.call, stubClass, 'ReportStatus', 'request')
+
+        channelMock.assert_called_once()
+        self.assertEqual(0, connection.stats.failovers)
+
+
+class NetworkTests(unittest.TestCase):
+
+    @mock.patch('grpc.insecure_channel', new=mock.MagicMock())
+    @mock.patch('rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub')
+    def test_sendFrameCompletions(self, stubMock):
+        calls = [mock.MagicMock(), mock.MagicMock(), mock.MagicMock()]
+        calls[1].result.side_effect = grpc.RpcError()
+        stubMock.return_value.ReportRunningFrameCompletion.future.side_effect = calls
+        network = rqd.rqnetwork.Network(mock.MagicMock())
+
+        failed = network.sendFrameCompletions(
+            [frameCompleteReport('frame%d' % i) for i in range(3)])
+
+        self.assertEqual({1}, failed)
+        self.assertEqual(3, stubMock.return_value.ReportRunningFrameCompletion.future.call_count)
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_STATUS_COALESCE_SEC', 0.01)
+    def test_reportRunningFrameCompletion(self):
+        rqCore = mock.MagicMock()
+        network = rqd.rqnetwork.Network(rqCore)
+        network.sendFrameCompletions = mock.MagicMock(return_value=set())
+        report = frameCompleteReport('frame1')
+
+        network.reportRunningFrameCompletion(report)
+        network.stopCompletionReporter(5)
+
+        network.sendFrameCompletions.assert_called_once_with([report])
+        rqCore.scheduler.trigger.assert_called_once_with('onInterval', 0)
+        rqCore.onInterval.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,105 +18,176 @@ from __future__ import print_function
 from __future__ import division
 from __future__ import absolute_import
 
+import os
+import shutil
+import tempfile
+import threading
+import time
 import mock
 import unittest
 
-import pyfakefs.fake_filesystem_unittest
-
+import rqd.rqconstants
 import rqd.rqcore
 import rqd.rqmachine
 import rqd.rqnimby
+import rqd.rqutil
+
+
+def waitFor(condition, timeout=5):
+    """Waits until condition() is true"""
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.01)
+    return True
 
 
 @mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
 @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
-class RqNimbyTests(pyfakefs.fake_filesystem_unittest.TestCase):
+class RqNimbyTests(unittest.TestCase):
     def setUp(self):
-        self.setUpPyfakefs()
-        self.inputDevice = self.fs.create_file('/dev/input/event0', contents='mouse event')
+        # Fake input devices, fifos can be polled like /dev/input files
+        self.inputDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.inputDir)
+        patcher = mock.patch.object(rqd.rqconstants, 'NIMBY_INPUT_DIR', self.inputDir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writers = []
+        self.addDevice('event0')
+        os.mkfifo(os.path.join(self.inputDir, 'js0'))
 
         self.rqMachine = mock.MagicMock(spec=rqd.rqmachine.Machine)
         self.rqCore = mock.MagicMock(spec=rqd.rqcore.RqCore)
         self.rqCore.machine = self.rqMachine
+        self.rqMachine.isNimbySafeToRunJobs.return_value = True
+        self.rqMachine.isNimbySafeToUnlock.return_value = True
         self.nimby = rqd.rqnimby.Nimby(self.rqCore)
         self.nimby.daemon = True
 
-    @mock.patch.object(rqd.rqnimby.Nimby, 'unlockedIdle')
-    def test_initialState(self, unlockedIdleMock):
-        self.nimby.daemon = True
+    def tearDown(self):
+        self.nimby.stop()
+        if self.nimby.ident is not None:
+            self.nimby.join(5)
+        for writer in self.writers:
+            os.close(writer)
 
+    def addDevice(self, name):
+        os.mkfifo(os.path.join(self.inputDir, name))
+
+    def sendEvent(self, name):
+        """Writes an input event to a fake device"""
+        writer = os.open(os.path.join(self.inputDir, name), os.O_WRONLY | os.O_NONBLOCK)
+        self.writers.append(writer)
+        os.write(writer, b'mouse event')
+
+    def test_initialState(self):
         self.nimby.start()
-        self.nimby.join()
 
         # Initial state should be "unlocked and idle".
-        unlockedIdleMock.assert_called()
+        self.assertTrue(waitFor(lambda: self.nimby.devices))
+        self.assertTrue(self.nimby.active)
+        self.assertFalse(self.nimby.locked)
+        self.assertEqual(['event0'], list(self.nimby.devices.values()))
 
         self.nimby.stop()
+        self.nimby.join(5)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_unlockedIdle(self, timerMock):
-        self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.assertFalse(self.nimby.is_alive())
+        self.assertEqual({}, self.nimby.devices)
 
-        self.nimby.unlockedIdle()
+    def test_activeOnceStarted(self):
+        with mock.patch.object(threading.Thread, 'start'):
+            self.nimby.start()
+
+            # Active before the thread runs, a stop right after isn't lost.
+            self.assertTrue(self.nimby.active)
+            self.nimby.stop()
+            self.assertFalse(self.nimby.active)
+
+    def test_stopBeforeRun(self):
+        self.nimby.start()
+        self.nimby.stop()
+        self.nimby.join(5)
+
+        self.assertFalse(self.nimby.is_alive())
+        self.assertFalse(self.nimby.active)
+
+    def test_unlockedInUse(self):
+        self.nimby.start()
+        self.assertTrue(waitFor(lambda: self.nimby.devices))
+
+        self.sendEvent('event0')
 
         # Given a mouse event, Nimby should transition to "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        self.assertTrue(waitFor(lambda: self.nimby.locked))
+        self.rqCore.onNimbyLock.assert_called_with()
+        self.assertGreater(self.nimby.lastActivity, 0)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[[], [], []]))
-    @mock.patch.object(rqd.rqnimby.Nimby, 'unlockedIdle')
-    @mock.patch('threading.Timer')
-    def test_lockedIdleWhenIdle(self, timerMock, unlockedIdleMock):
+    def test_devicesOpenedOnce(self):
+        rqd.rqutil.permissionsHigh.reset_mock()
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.nimby._setup()
+        self.addCleanup(self.nimby._closeEvents)
+        fds = list(self.nimby.devices)
 
-        self.nimby.lockedIdle()
+        for _ in range(3):
+            self.nimby.poll(0)
 
-        # Given no events, Nimby should transition to "unlocked and idle".
-        unlockedIdleMock.assert_called()
+        self.assertEqual(fds, list(self.nimby.devices))
+        self.assertEqual(1, rqd.rqutil.permissionsHigh.call_count)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_lockedIdleWhenInUse(self, timerMock):
+    def test_hotplug(self):
+        self.nimby.start()
+        self.assertTrue(waitFor(lambda: self.nimby.devices))
+
+        self.addDevice('event1')
+
+        self.assertTrue(waitFor(lambda: 'event1' in self.nimby.devices.values()))
+        self.sendEvent('event1')
+        self.assertTrue(waitFor(lambda: self.nimby.locked))
+
+    def test_unlockedIdleLowMemory(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.rqMachine.isNimbySafeToRunJobs.return_value = False
 
-        self.nimby.lockedIdle()
+        self.nimby.checkState(time.time())
 
-        # Given a mouse event, Nimby should transition to "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        self.assertTrue(self.nimby.locked)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[[], [], []]))
-    @mock.patch.object(rqd.rqnimby.Nimby, 'lockedIdle')
-    @mock.patch('threading.Timer')
-    def test_lockedInUseWhenIdle(self, timerMock, lockedIdleMock):
+    def test_lockedIdle(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.nimby.lockNimby()
+        lockedAt = self.nimby.lockedAt
 
-        self.nimby.lockedInUse()
+        self.nimby.checkState(lockedAt + rqd.rqconstants.MINIMUM_IDLE)
 
-        # Given no events, Nimby should transition to "locked and idle".
-        lockedIdleMock.assert_called()
+        # Given no events, Nimby should transition to "unlocked and idle".
+        self.assertFalse(self.nimby.locked)
+        self.rqCore.onNimbyUnlock.assert_called_with(asOf=lockedAt)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_lockedInUseWhenInUse(self, timerMock):
+    def test_lockedInUse(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.nimby.lockNimby()
+        self.nimby.lastActivity = self.nimby.lockedAt + 100
+
+        self.nimby.checkState(self.nimby.lockedAt + rqd.rqconstants.MINIMUM_IDLE)
+
+        # Given a recent mouse event, Nimby should stay "locked and in use".
+        self.assertTrue(self.nimby.locked)
+        self.assertEqual(100, self.nimby._timeout(
+            self.nimby.lockedAt + rqd.rqconstants.MINIMUM_IDLE))
 
-        self.nimby.lockedInUse()
+    def test_lockedIdleNotSafeToUnlock(self):
+        self.nimby.active = True
+        self.nimby.lockNimby()
+        self.rqMachine.isNimbySafeToUnlock.return_value = False
+        now = self.nimby.lockedAt + rqd.rqconstants.MINIMUM_IDLE
 
-        # Given a mouse event, Nimby should stay in state "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        self.nimby.checkState(now)
+
+        self.assertTrue(self.nimby.locked)
+        self.assertEqual(rqd.rqconstants.CHECK_INTERVAL_LOCKED, self.nimby._timeout(now))
 
     def test_lockNimby(self):
         self.nimby.active = True
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import errno
+import mock
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqconstants
+import rqd.rqproc
+
+
+PROC_PID_STAT = ('%(pid)d (%(comm)s) S 7 %(session)d %(session)d 0 -1 4210688 317 0 1 0 '
+                 '31 13 0 0 20 0 1 0 17385159 4460544 154 18446744073709551615 4194304 '
+                 '4204692 140725890735264 0 0 0 0 16781318 0 0 0 0 17 4 0 0 0 0 0 6303248 '
+                 '6304296 23932928 140725890743234 140725890743420 140725890743420 '
+                 '140725890744298 0')
+
+
+def pidStat(pid, session, comm='time'):
+    return PROC_PID_STAT % {'pid': pid, 'session': session, 'comm': comm}
+
+
+class ParseStatTests(unittest.TestCase):
+
+    def test_parseStat(self):
+        stat = rqd.rqproc.parseStat(105, pidStat(105, 105).encode())
+
+        self.assertEqual(rqd.rqproc.PidStat(pid=105, ppid=7, session=105, totalTime=44,
+                                            numThreads=1, startTime=17385159, vsize=4460544,
+                                            rss=154),
+                         stat)
+
+    def test_parseStatCommWithSpaces(self):
+        stat = rqd.rqproc.parseStat(105, pidStat(105, 42, comm='my (odd) name').encode())
+
+        self.assertEqual(42, stat.session)
+        self.assertEqual(154, stat.rss)
+
+
+class ProcessIndexTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file('/proc/meminfo')
+        for pid, session in ((100, 100), (101, 100), (200, 200), (300, 1)):
+            self.fs.create_file('/proc/%d/stat' % pid, contents=pidStat(pid, session))
+
+    def test_update(self):
+        index = rqd.rqproc.ProcessIndex(procPath='/proc', fullScanInterval=0)
+
+        sessions = index.update({100, 500})
+
+        self.assertEqual([100, 101], sorted(stat.pid for stat in sessions[100]))
+        self.assertEqual([], sessions[500])
+        self.assertNotIn(200, sessions)
+        self.assertEqual(4, index.statsRead)
+
+    def test_updateSkipsUntrackedPids(self):
+        index = rqd.rqproc.ProcessIndex(procPath='/proc', fullScanInterval=10)
+        index.update({100})
+        self.fs.create_file('/proc/102/stat', contents=pidStat(102, 100))
+
+        sessions = index.update({100})
+
+        # Only the pids of session 100 and the new pid are read.
+        self.assertEqual(3, index.statsRead)
+        self.assertEqual([100, 101, 102], sorted(stat.pid for stat in sessions[100]))
+
+    def test_updateNewlyTrackedSession(self):
+        index = rqd.rqproc.ProcessIndex(procPath='/proc', fullScanInterval=10)
+        index.update({100})
+
+        sessions = index.update({100, 200})
+
+        self.assertEqual([200], [stat.pid for stat in sessions[200]])
+
+    def test_updateDeadPid(self):
+        index = rqd.rqproc.ProcessIndex(procPath='/proc', fullScanInterval=0)
+        index.update({100})
+        self.fs.remove_object('/proc/101/stat')
+
+        sessions = index.update({100})
+
+        self.assertEqual([100], [stat.pid for stat in sessions[100]])
+
+
+class FrameProcessTrackerTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.loadavg = self.fs.create_file('/proc/loadavg', contents='0.25 0.16 0.11 2/1655 100')
+        self.createPid(100, 100, children=[101])
+        self.createPid(101, 100)
+        self.createPid(200, 200)
+        self.tracker = rqd.rqproc.FrameProcessTracker(
+            procPath='/proc', fullScanInterval=0, useChildren=True)
+
+    def tearDown(self):
+        self.tracker.close()
+
+    def createPid(self, pid, session, children=()):
+        self.fs.create_file('/proc/%d/stat' % pid, contents=pidStat(pid, session))
+        self.fs.create_file('/proc/%d/task/%d/children' % (pid, pid),
+                            contents=' '.join(str(child) for child in children))
+
+    def test_update(self):
+        sessions = self.tracker.update({100})
+
+        self.assertEqual([100, 101], sorted(stat.pid for stat in sessions[100]))
+        self.assertEqual(2, self.tracker.statsRead)
+        self.assertEqual(2, self.tracker.pidsTracked)
+
+    def test_updateNewChild(self):
+        self.tracker.update({100})
+        self.createPid(102, 100)
+        self.fs.get_object('/proc/101/task/101/children').set_contents('102')
+        self.loadavg.set_contents('0.25 0.16 0.11 2/1655 102')
+
+        sessions = self.tracker.update({100})
+
+        self.assertEqual([100, 101, 102], sorted(stat.pid for stat in sessions[100]))
+
+    def test_updateSkipsChildrenWithoutBirths(self):
+        self.tracker.update({100})
+        self.createPid(102, 100)
+        self.fs.get_object('/proc/101/task/101/children').set_contents('102')
+
+        sessions = self.tracker.update({100})
+
+        # /proc/loadavg reports no new pid, so children are not looked up.
+        self.assertEqual([100, 101], sorted(stat.pid for stat in sessions[100]))
+
+    def test_updateDeadPid(self):
+        self.tracker.update({100})
+        # An open stat file of an exited process can no longer be read.
+        self.fs.get_object('/proc/101/stat').set_contents('')
+
+        sessions = self.tracker.update({100})
+
+        self.assertEqual([100], [stat.pid for stat in sessions[100]])
+        self.assertEqual(1, self.tracker.pidsTracked)
+
+    def test_updateFrameEnded(self):
+        self.tracker.update({100})
+
+        sessions = self.tracker.update({200})
+
+        self.assertEqual({200: [rqd.rqproc.readStat(200, '/proc')]}, sessions)
+
+    def test_updateBeyondMaxOpenStats(self):
+        tracker = rqd.rqproc.FrameProcessTracker(
+            procPath='/proc', fullScanInterval=0, useChildren=True, maxOpenStats=1)
+
+        tracker.update({100})
+        sessions = tracker.update({100})
+
+        self.assertEqual([100, 101], sorted(stat.pid for stat in sessions[100]))
+        self.assertEqual(1, tracker.openStats)
+        tracker.close()
+        self.assertEqual(0, tracker.openStats)
+
+    def test_updateOutOfFiles(self):
+        with mock.patch('os.open', side_effect=OSError(errno.EMFILE, 'Too many open files')), \
+                mock.patch('rqd.rqproc.log.warning') as warningMock:
+            self.assertEqual({200: []}, self.tracker.update({200}))
+        warningMock.assert_called_once()
+
+        # The pid is still tracked once files can be opened again.
+        sessions = self.tracker.update({200})
+        self.assertEqual([200], [stat.pid for stat in sessions[200]])
+
+    def test_updateWithoutChildren(self):
+        tracker = rqd.rqproc.FrameProcessTracker(
+            procPath='/proc', fullScanInterval=0, useChildren=False)
+
+        sessions = tracker.update({100})
+
+        self.assertEqual([100, 101], sorted(stat.pid for stat in sessions[100]))
+        # Every pid is read by the session scan.
+        self.assertEqual(3, tracker.statsRead)
+
+
+class ProcessAccountingTests(unittest.TestCase):
+
+    def setUp(self):
+        rqd.rqconstants.SYS_HERTZ = 100
+        rqd.rqconstants.PAGE_SIZE = 4096
+        rqd.rqconstants.ENABLE_PTREE = False
+        self.processIndex = mock.MagicMock(spec=rqd.rqproc.ProcessIndex)
+        self.accounting = rqd.rqproc.ProcessAccounting(self.processIndex)
+
+    def _stat(self, pid, totalTime, rss=10):
+        return rqd.rqproc.PidStat(pid=pid, ppid=1, session=100, totalTime=totalTime,
+                                  numThreads=1, startTime=0, vsize=2048, rss=rss)
+
+    def test_update(self):
+        self.processIndex.update.return_value = {
+            100: [self._stat(100, 500), self._stat(101, 1000, rss=20)]}
+
+        usage = self.accounting.update({100}, now=100, bootTime=0)
+
+        self.assertEqual(120, usage[100].rss)
+        self.assertEqual(4, usage[100].vsize)
+        self.assertAlmostEqual(15.0, usage[100].pcpu)
+        self.assertIsNone(usage[100].ptree)
+
+    def test_updateDecayingAverage(self):
+        self.processIndex.update.return_value = {100: [self._stat(100, 500)]}
+        self.accounting.update({100}, now=100, bootTime=0)
+        self.processIndex.update.return_value = {100: [self._stat(100, 1500)]}
+
+        usage = self.accounting.update({100}, now=200, bootTime=0)
+
+        # 50% from the previous 5.0 and 50% from the last 10.0
+        self.assertAlmostEqual(7.5, usage[100].pcpu)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+import mock
+
+import rqd.rqscheduler
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = rqd.rqscheduler.Scheduler()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_schedule(self):
+        done = threading.Event()
+        func = mock.MagicMock(side_effect=lambda *args: done.set())
+        self.scheduler.start()
+
+        self.scheduler.schedule(0, func, 'task', 1, 2)
+
+        self.assertTrue(done.wait(5))
+        func.assert_called_once_with(1, 2)
+        self.assertIsNone(self.scheduler.pending('task'))
+
+    def test_scheduleReplacesNamedTask(self):
+        first = self.scheduler.schedule(60, mock.MagicMock(), 'task')
+
+        second = self.scheduler.schedule(30, mock.MagicMock(), 'task')
+
+        self.assertTrue(first.cancelled)
+        self.assertIs(second, self.scheduler.pending('task'))
+
+    def test_trigger(self):
+        func = mock.MagicMock()
+        task = self.scheduler.schedule(60, func, 'task')
+
+        self.assertTrue(self.scheduler.trigger('task', 1, 'arg'))
+
+        pending = self.scheduler.pending('task')
+        self.assertTrue(task.cancelled)
+        self.assertLess(pending.when, task.when)
+        self.assertEqual(('arg',), pending.args)
+
+    def test_triggerCoalesces(self):
+        self.scheduler.schedule(60, mock.MagicMock(), 'task')
+        self.scheduler.trigger('task', 1)
+        task = self.scheduler.pending('task')
+
+        for _ in range(100):
+            self.scheduler.trigger('task', 5)
+
+        self.assertIs(task, self.scheduler.pending('task'))
+
+    def test_triggerMissingTask(self):
+        self.assertFalse(self.scheduler.trigger('task', 1))
+
+    def test_cancel(self):
+        task = self.scheduler.schedule(60, mock.MagicMock(), 'task')
+
+        self.scheduler.cancel('task')
+
+        self.assertTrue(task.cancelled)
+        self.assertIsNone(self.scheduler.pending('task'))
+
+    def test_failingTaskDoesNotStopScheduler(self):
+        done = threading.Event()
+        self.scheduler.start()
+
+        self.scheduler.schedule(0, mock.MagicMock(side_effect=ValueError), 'fails')
+        self.scheduler.schedule(0.01, done.set, 'next')
+
+        self.assertTrue(done.wait(5))
+
+    def test_stop(self):
+        task = self.scheduler.schedule(60, mock.MagicMock(), 'task')
+        self.scheduler.start()
+
+        self.scheduler.stop()
+        self.scheduler.join(5)
+
+        self.assertFalse(self.scheduler.is_alive())
+        self.assertTrue(task.cancelled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+#  Copyright (c) 2018 Sony Pictures Imageworks Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqexceptions
+import rqd.rqtopology
+
+
+SYSFS = '/sys/devices/system'
+
+
+class FakeSysfsTestCase(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+
+    def createSysfs(self, sockets, coresPerSocket, threadsPerCore, nodes=True):
+        """Creates the sysfs of a host enumerating the first thread of every
+           core, then the second thread of every core..."""
+        numCores = sockets * coresPerSocket
+        cpusOfNode = {}
+        for thread in range(threadsPerCore):
+            for core in range(numCores):
+                cpu = core + thread * numCores
+                socket = core // coresPerSocket
+                topology = '%s/cpu/cpu%d/topology' % (SYSFS, cpu)
+                self.fs.create_file(topology + '/physical_package_id', contents='%d\n' % socket)
+                self.fs.create_file(topology + '/core_id', contents='%d\n' % (core % coresPerSocket))
+                cpusOfNode.setdefault(socket, []).append(str(cpu))
+        self.fs.create_file(SYSFS + '/cpu/online', contents='0-%d\n' % (numCores * threadsPerCore - 1))
+        if nodes:
+            for node, cpus in cpusOfNode.items():
+                self.fs.create_file('%s/node/node%d/cpulist' % (SYSFS, node),
+                                    contents=','.join(cpus) + '\n')
+
+
+class CpuTopologyTests(FakeSysfsTestCase):
+
+    def test_parseCpuList(self):
+        self.assertEqual([0, 1, 2, 3, 8, 10, 11], rqd.rqtopology.parseCpuList('0-3,8,10-11\n'))
+        self.assertEqual([], rqd.rqtopology.parseCpuList(''))
+
+    def test_fromSysfs(self):
+        self.createSysfs(sockets=2, coresPerSocket=2, threadsPerCore=2)
+
+        topology = rqd.rqtopology.CpuTopology.fromSysfs(SYSFS)
+
+        self.assertEqual([
+            rqd.rqtopology.PhysicalCore(0, 0, 0, [0, 4]),
+            rqd.rqtopology.PhysicalCore(1, 0, 0, [1, 5]),
+            rqd.rqtopology.PhysicalCore(2, 1, 1, [2, 6]),
+            rqd.rqtopology.PhysicalCore(3, 1, 1, [3, 7]),
+        ], topology.cores)
+        self.assertEqual([0, 1], topology.nodes())
+        self.assertEqual(2, topology.coreOf(6).index)
+
+    def test_fromSysfsWithoutNodes(self):
+        self.createSysfs(sockets=2, coresPerSocket=2, threadsPerCore=1, nodes=False)
+
+        topology = rqd.rqtopology.CpuTopology.fromSysfs(SYSFS)
+
+        self.assertEqual([0], topology.nodes())
+        self.assertEqual(4, len(topology.cores))
+
+    def test_fromCoreCount(self):
+        topology = rqd.rqtopology.CpuTopology.fromCoreCount(4, 2)
+
+        self.assertEqual([[0, 4], [1, 5], [2, 6], [3, 7]],
+                         [core.threads for core in topology.cores])
+
+
+class CoreAllocatorTests(FakeSysfsTestCase):
+
+    def setUp(self):
+        FakeSysfsTestCase.setUp(self)
+        # Nodes 0 and 1 of 4 cores, the siblings of cpu N are N + 8
+        self.createSysfs(sockets=2, coresPerSocket=4, threadsPerCore=2)
+        self.allocator = rqd.rqtopology.CoreAllocator(
+            rqd.rqtopology.CpuTopology.fromSysfs(SYSFS))
+
+    def test_siblingsReservedTogether(self):
+        self.assertEqual([0, 8, 1, 9], self.allocator.reserve(2))
+        self.assertEqual(6, self.allocator.freeCores())
+
+    def test_bestFittingNode(self):
+        self.allocator.reserve(3)
+        self.allocator.reserve(2)
+
+        # Node 0 has one free core left, node 1 two
+        self.assertEqual([3, 11], self.allocator.reserve(1))
+        self.assertEqual([1], self.allocator.nodesOf(self.allocator.reserve(2)))
+
+    def test_fewestNodes(self):
+        self.allocator.reserve(1)
+
+        cpus = self.allocator.reserve(6)
+
+        # All of node 1 and three cores of node 0
+        self.assertEqual([4, 12, 5, 13, 6, 14, 7, 15, 1, 9, 2, 10], cpus)
+
+    def test_insufficientCores(self):
+        self.allocator.reserve(5)
+
+        self.assertRaises(rqd.rqexceptions.CoreReservationFailureException,
+                          self.allocator.reserve, 4)
+        self.assertEqual(3, self.allocator.freeCores())
+
+    def test_release(self):
+        cpus = self.allocator.reserve(4)
+
+        self.allocator.release(cpus)
+        self.allocator.release(cpus)
+
+        self.assertEqual(8, self.allocator.freeCores())
+        self.assertEqual(cpus, self.allocator.reserve(4))
+
+    def test_concurrentReservations(self):
+        reserved = []
+
+        def reserve():
+            reserved.extend(self.allocator.reserve(1))
+
+        threads = [threading.Thread(target=reserve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(list(range(16)), sorted(reserved))
+        self.assertEqual(0, self.allocator.freeCores())
+
+
+if __name__ == '__main__':
+    unittest.main()